@@ -0,0 +1,22 @@
+"""流式统计与分析模块"""
+
+from .sketches import SpaceSaving, ReservoirSample, HyperLogLog, CountMinSketch, HeavyHitters
+from .report import StreamingReport
+from .coalescer import EventCoalescer, url_template
+from .metrics import EWMAMeter, LatencyHistogram, MetricsRegistry
+from .rollups import TimeRollups
+
+__all__ = [
+    "SpaceSaving",
+    "ReservoirSample",
+    "HyperLogLog",
+    "CountMinSketch",
+    "HeavyHitters",
+    "StreamingReport",
+    "EventCoalescer",
+    "url_template",
+    "EWMAMeter",
+    "LatencyHistogram",
+    "MetricsRegistry",
+    "TimeRollups"
+]
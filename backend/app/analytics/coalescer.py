@@ -0,0 +1,180 @@
+"""攻击事件合并
+
+sqlmap等工具一次扫描会产生成千上万个几乎相同的攻击事件。合并器把
+(来源IP, 归一化URL模板, 命中规则集合) 相同、且落在同一时间窗口内的攻击事件
+合并为一个聚合事件，记录次数、首次/末次出现时间和少量载荷样本。
+
+- 时间按请求自身的时间戳计算，批量分析历史日志时同样按日志时间合并
+- 分组按创建顺序保存在OrderedDict中，窗口到期或分组数超过上限时从最旧的分组开始输出，
+  内存占用与攻击规模无关
+- 到期的分组在加入新事件时输出；事件源空闲时调用方用expire按推算的当前时间输出到期分组
+- 非攻击事件不合并，直接输出
+"""
+
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+# 路径段中的数字、UUID和长十六进制串替换为占位符
+_UUID_SEGMENT = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.IGNORECASE)
+_HEX_SEGMENT = re.compile(r'^[0-9a-f]{16,}$', re.IGNORECASE)
+_NUMBER_SEGMENT = re.compile(r'^\d+$')
+
+CoalesceKey = Tuple[str, str, Tuple[str, ...]]
+
+
+def url_template(url: str) -> str:
+    """归一化URL模板：去掉参数值，只保留排序后的参数名，路径中的ID类片段替换为占位符
+
+    例如 /users/42/orders?id=1' OR 1=1--&sort=asc -> /users/{n}/orders?id&sort
+    """
+    path, _, query = url.partition('?')
+    segments = []
+    for segment in path.split('/'):
+        if _NUMBER_SEGMENT.match(segment):
+            segments.append('{n}')
+        elif _UUID_SEGMENT.match(segment) or _HEX_SEGMENT.match(segment):
+            segments.append('{id}')
+        else:
+            segments.append(segment)
+    template = '/'.join(segments)
+    if query:
+        names = sorted({pair.split('=', 1)[0] for pair in query.split('&') if pair})
+        template = f"{template}?{'&'.join(names)}"
+    return template
+
+
+@dataclass
+class _Group:
+    """合并中的一组攻击事件"""
+    event: Any                      # 组内第一个事件，作为聚合事件的代表
+    first_seen: datetime
+    last_seen: datetime
+    count: int = 1
+    max_confidence: float = 0.0
+    samples: List[str] = field(default_factory=list)
+
+
+class EventCoalescer:
+    """按 (来源IP, URL模板, 命中规则) 在时间窗口内合并攻击事件"""
+
+    def __init__(self, window_seconds: float = 60.0, max_groups: int = 10000, max_samples: int = 3):
+        """初始化合并器
+
+        Args:
+            window_seconds: 合并窗口（秒），从分组的第一个事件开始计算
+            max_groups: 同时保留的分组数上限，超出时提前输出最旧的分组
+            max_samples: 每个聚合事件保留的不同载荷样本数
+        """
+        self.window = timedelta(seconds=window_seconds)
+        self.max_groups = max_groups
+        self.max_samples = max_samples
+        self._groups: "OrderedDict[CoalesceKey, _Group]" = OrderedDict()
+        self.stats = {
+            'events_in': 0,
+            'events_out': 0,
+            'coalesced': 0,          # 被并入已有分组、没有单独输出的事件数
+            'groups_expired': 0,
+            'groups_evicted': 0
+        }
+
+    def add(self, event) -> List[Any]:
+        """加入一个事件（需有request、detection_result属性），返回此时可以输出的事件
+
+        非攻击事件原样返回；攻击事件进入分组，返回的是因窗口到期或超出容量而关闭的聚合事件。
+        """
+        self.stats['events_in'] += 1
+        now = event.request.timestamp
+        output = self._expire(now)
+
+        detection = event.detection_result
+        if not detection.is_attack:
+            output.append(event)
+            self.stats['events_out'] += len(output)
+            return output
+
+        key = self.key_for(event)
+        group = self._groups.get(key)
+        if group is not None and now - group.first_seen >= self.window:
+            # 时间戳乱序时到期分组可能不在队首，单独关闭
+            output.append(self._close(self._groups.pop(key)))
+            self.stats['groups_expired'] += 1
+            group = None
+
+        if group is None:
+            group = _Group(event=event, first_seen=now, last_seen=now, max_confidence=detection.confidence)
+            self._add_sample(group, detection.payload)
+            self._groups[key] = group
+            if len(self._groups) > self.max_groups:
+                _, oldest = self._groups.popitem(last=False)
+                output.append(self._close(oldest))
+                self.stats['groups_evicted'] += 1
+        else:
+            group.count += 1
+            group.last_seen = max(group.last_seen, now)
+            group.max_confidence = max(group.max_confidence, detection.confidence)
+            self._add_sample(group, detection.payload)
+            self.stats['coalesced'] += 1
+
+        self.stats['events_out'] += len(output)
+        return output
+
+    def expire(self, now: datetime) -> List[Any]:
+        """关闭到now时窗口已到期的分组，返回它们的聚合事件（事件源空闲、没有新事件触发输出时调用）"""
+        output = self._expire(now)
+        self.stats['events_out'] += len(output)
+        return output
+
+    def flush(self) -> List[Any]:
+        """关闭所有分组，返回全部聚合事件（流结束时调用）"""
+        output = [self._close(group) for group in self._groups.values()]
+        self._groups.clear()
+        self.stats['events_out'] += len(output)
+        return output
+
+    @staticmethod
+    def key_for(event) -> CoalesceKey:
+        """合并键：(来源IP, URL模板, 排序后的命中规则)"""
+        return (
+            event.request.source_ip,
+            url_template(event.request.url),
+            tuple(sorted(event.detection_result.matched_rules))
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取合并统计"""
+        stats = dict(self.stats)
+        stats['open_groups'] = len(self._groups)
+        return stats
+
+    def _expire(self, now: datetime) -> List[Any]:
+        """关闭窗口已到期的分组；分组按创建顺序排列，只需检查队首"""
+        output = []
+        while self._groups:
+            key, group = next(iter(self._groups.items()))
+            if now - group.first_seen < self.window:
+                break
+            del self._groups[key]
+            output.append(self._close(group))
+            self.stats['groups_expired'] += 1
+        return output
+
+    def _add_sample(self, group: _Group, payload: Optional[str]):
+        if payload and len(group.samples) < self.max_samples and payload not in group.samples:
+            group.samples.append(payload)
+
+    def _close(self, group: _Group):
+        """生成聚合事件：代表事件附带aggregate信息，单个事件的分组原样输出"""
+        if group.count == 1:
+            return group.event
+        group.event.aggregate = {
+            'count': group.count,
+            'first_seen': group.first_seen,
+            'last_seen': group.last_seen,
+            'url_template': url_template(group.event.request.url),
+            'max_confidence': group.max_confidence,
+            'sample_payloads': list(group.samples)
+        }
+        return group.event
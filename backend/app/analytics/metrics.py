@@ -0,0 +1,197 @@
+"""滑动窗口速率与延迟直方图
+
+- EWMAMeter: 1秒/1分钟/5分钟指数加权移动平均速率。mark只读一次时钟并累加计数，
+  跨过一个衰减间隔（默认1秒）时才折算并衰减各窗口的速率
+- LatencyHistogram: HDR风格的对数分桶直方图。每个2的幂区间再均分为16个子桶，
+  相对误差约6%，桶数固定，记录一次只是一次位运算和一次列表计数
+- MetricsRegistry: 按名称管理速率计和直方图
+
+这些结构不加锁，设计为只在事件循环线程中更新；跨进程的耗时通过
+检测结果details["timings"]带回主进程再记录。
+"""
+
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# EWMA窗口：名称 -> 窗口长度（秒）
+EWMA_WINDOWS = (('1s', 1.0), ('1m', 60.0), ('5m', 300.0))
+
+# 直方图每个2的幂区间的子桶数（2**SUB_BUCKET_BITS）
+SUB_BUCKET_BITS = 4
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# 64位纳秒值需要的桶数
+_BUCKET_COUNT = (64 - SUB_BUCKET_BITS + 1) * _SUB_BUCKETS
+
+
+class EWMAMeter:
+    """1秒/1分钟/5分钟指数加权移动平均速率计"""
+
+    def __init__(self, tick_interval: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        """初始化速率计
+
+        Args:
+            tick_interval: 衰减间隔（秒），未计入速率的计数每隔一个间隔折算一次
+            clock: 单调时钟，测试时可替换
+        """
+        self.tick_interval = tick_interval
+        self.clock = clock
+        self.count = 0
+        self._uncounted = 0
+        self._start = clock()
+        self._last_tick = self._start
+        self._alphas = [1 - math.exp(-tick_interval / window) for _, window in EWMA_WINDOWS]
+        self._rates = [0.0] * len(EWMA_WINDOWS)
+
+    def mark(self, n: int = 1):
+        """记录n次事件"""
+        # 先折算已结束的间隔，本次计数归入当前间隔
+        if self.clock() - self._last_tick >= self.tick_interval:
+            self._tick()
+        self.count += n
+        self._uncounted += n
+
+    def rates(self) -> Dict[str, float]:
+        """各窗口的每秒速率，以及启动以来的平均速率（mean）"""
+        self._tick()
+        elapsed = self.clock() - self._start
+        result = {name: rate for (name, _), rate in zip(EWMA_WINDOWS, self._rates)}
+        result['mean'] = self.count / elapsed if elapsed > 0 else 0.0
+        result['count'] = self.count
+        return result
+
+    def _tick(self):
+        """折算经过的完整间隔：第一个间隔计入累积的计数，其余间隔按0衰减"""
+        ticks = int((self.clock() - self._last_tick) / self.tick_interval)
+        if ticks <= 0:
+            return
+        self._last_tick += ticks * self.tick_interval
+        instant = self._uncounted / self.tick_interval
+        self._uncounted = 0
+        for index, alpha in enumerate(self._alphas):
+            rate = self._rates[index] + alpha * (instant - self._rates[index])
+            if ticks > 1:
+                rate *= (1 - alpha) ** (ticks - 1)
+            self._rates[index] = rate
+
+
+class LatencyHistogram:
+    """HDR风格的对数分桶延迟直方图（纳秒）"""
+
+    def __init__(self):
+        self.counts: List[int] = [0] * _BUCKET_COUNT
+        self.total = 0
+        self.sum_ns = 0
+        self.min_ns: Optional[int] = None
+        self.max_ns = 0
+
+    @staticmethod
+    def bucket_index(value: int) -> int:
+        """值所在的桶：小于2*子桶数的值每个值一个桶，更大的值按最高位所在区间再细分"""
+        if value < 2 * _SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        return (shift + 1) * _SUB_BUCKETS + (value >> shift) - _SUB_BUCKETS
+
+    @staticmethod
+    def bucket_upper(index: int) -> int:
+        """桶能表示的最大值"""
+        if index < 2 * _SUB_BUCKETS:
+            return index
+        shift = index // _SUB_BUCKETS - 1
+        mantissa = index % _SUB_BUCKETS + _SUB_BUCKETS
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value_ns: int):
+        """记录一次耗时"""
+        value_ns = max(0, int(value_ns))
+        self.counts[self.bucket_index(value_ns)] += 1
+        self.total += 1
+        self.sum_ns += value_ns
+        if self.min_ns is None or value_ns < self.min_ns:
+            self.min_ns = value_ns
+        if value_ns > self.max_ns:
+            self.max_ns = value_ns
+
+    def percentile(self, percent: float) -> int:
+        """百分位数（纳秒），返回所在桶的上界，不超过记录到的最大值"""
+        if not self.total:
+            return 0
+        target = max(1, math.ceil(percent / 100 * self.total))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.bucket_upper(index), self.max_ns)
+        return self.max_ns
+
+    def merge(self, other: "LatencyHistogram"):
+        """合并另一个直方图"""
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        self.sum_ns += other.sum_ns
+        if other.min_ns is not None and (self.min_ns is None or other.min_ns < self.min_ns):
+            self.min_ns = other.min_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """汇总为微秒单位的字典"""
+        return {
+            'count': self.total,
+            'min_us': (self.min_ns or 0) / 1000,
+            'mean_us': self.sum_ns / self.total / 1000 if self.total else 0.0,
+            'p50_us': self.percentile(50) / 1000,
+            'p90_us': self.percentile(90) / 1000,
+            'p99_us': self.percentile(99) / 1000,
+            'p999_us': self.percentile(99.9) / 1000,
+            'max_us': self.max_ns / 1000
+        }
+
+
+class MetricsRegistry:
+    """按名称管理的速率计和延迟直方图"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.meters: Dict[str, EWMAMeter] = {}
+        self.histograms: Dict[str, LatencyHistogram] = {}
+
+    def meter(self, name: str) -> EWMAMeter:
+        """获取（不存在时创建）速率计"""
+        meter = self.meters.get(name)
+        if meter is None:
+            meter = self.meters[name] = EWMAMeter(clock=self.clock)
+        return meter
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        """获取（不存在时创建）延迟直方图"""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        return histogram
+
+    def mark(self, name: str, n: int = 1):
+        """速率计记录n次事件"""
+        self.meter(name).mark(n)
+
+    def record(self, name: str, value_ns: int):
+        """直方图记录一次耗时（纳秒）"""
+        self.histogram(name).record(value_ns)
+
+    def record_timings(self, timings: Optional[Dict[str, int]]):
+        """记录检测结果details["timings"]中的解码和检测耗时"""
+        if not timings:
+            return
+        if 'decode_ns' in timings:
+            self.record('decode', timings['decode_ns'])
+        if 'detect_ns' in timings:
+            self.record('detect', timings['detect_ns'])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出所有速率（每秒）和延迟分布（微秒）"""
+        return {
+            'rates': {name: meter.rates() for name, meter in self.meters.items()},
+            'latency': {name: histogram.to_dict() for name, histogram in self.histograms.items()}
+        }
@@ -0,0 +1,87 @@
+"""增量安全分析报告
+
+逐个事件累加统计，事件处理完即可丢弃，内存占用与日志大小无关：
+- 风险级别分布、攻击类型：精确计数器（取值种类有限）
+- 攻击IP：Space-Saving 固定容量的高频项统计
+- 攻击事件样本：可选的蓄水池抽样
+"""
+
+from typing import Any, Dict, Optional
+
+from .sketches import ReservoirSample, SpaceSaving
+
+
+class StreamingReport:
+    """增量构建的批量分析报告"""
+
+    def __init__(
+        self,
+        top_k: int = 10,
+        ip_capacity: int = 1000,
+        sample_size: int = 0,
+        seed: Optional[int] = None
+    ):
+        """初始化报告
+
+        Args:
+            top_k: 报告中攻击类型和攻击IP的排行数量
+            ip_capacity: 攻击IP统计跟踪的IP数量上限
+            sample_size: 保留的攻击事件样本数，0表示不保留
+            seed: 抽样随机种子
+        """
+        self.top_k = top_k
+        self.total_events = 0
+        self.attack_events = 0
+        self.risk_distribution = {'HIGH': 0, 'MEDIUM': 0, 'LOW': 0, 'SAFE': 0}
+        self.attack_types: Dict[str, int] = {}
+        self.attack_ips = SpaceSaving(ip_capacity)
+        self.samples = ReservoirSample(sample_size, seed) if sample_size > 0 else None
+
+    def add(self, event):
+        """累加一个安全事件（需有request、detection_result、risk_level属性）
+
+        合并后的聚合事件（aggregate不为空）按其代表的事件数计数。
+        """
+        aggregate = getattr(event, 'aggregate', None)
+        count = aggregate['count'] if aggregate else 1
+        self.total_events += count
+        self.risk_distribution[event.risk_level] = self.risk_distribution.get(event.risk_level, 0) + count
+
+        detection = event.detection_result
+        if not detection.is_attack:
+            return
+
+        self.attack_events += count
+        for attack_type in detection.attack_types:
+            self.attack_types[attack_type.value] = self.attack_types.get(attack_type.value, 0) + count
+        self.attack_ips.add(event.request.source_ip, count)
+        if self.samples is not None:
+            self.samples.add(event)
+
+    def build(self, processing_stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """生成报告字典"""
+        if not self.total_events:
+            report = {
+                'summary': '没有处理任何请求',
+                'total_events': 0,
+                'attack_events': 0,
+                'attack_rate': 0.0,
+                'top_attack_types': [],
+                'top_attack_ips': [],
+                'risk_distribution': {}
+            }
+        else:
+            report = {
+                'summary': f'分析了{self.total_events}个请求，发现{self.attack_events}个攻击',
+                'total_events': self.total_events,
+                'attack_events': self.attack_events,
+                'attack_rate': self.attack_events / self.total_events * 100,
+                'top_attack_types': sorted(self.attack_types.items(), key=lambda x: x[1], reverse=True)[:self.top_k],
+                'top_attack_ips': self.attack_ips.top(self.top_k),
+                'risk_distribution': dict(self.risk_distribution),
+                'processing_stats': processing_stats
+            }
+
+        if self.samples is not None:
+            report['sample_attacks'] = [event.to_dict() for event in self.samples.items]
+        return report
@@ -0,0 +1,380 @@
+"""预聚合的时间分桶统计（rollup）
+
+每个桶保存总事件数、攻击数、高危数、各攻击类型的数量；有攻击的桶另有固定大小的攻击草图：
+攻击来源IP和被攻击路径各一个HyperLogLog（不同数量）和HeavyHitters（Space-Saving + Count-Min，高频项）。
+桶分为分钟、小时、天三层，三层按时间划分互不重叠：
+- 最近minute_retention内的事件记在分钟桶中
+- 更早、hour_retention以内的记在小时桶中，分钟桶过了保留期后合并进所在小时的桶
+- 再早的记在天桶中，小时桶过了保留期后合并进所在天的桶
+
+查询一个时间窗口只需要遍历与窗口相交的桶，代价与桶数量成正比，与事件数无关。
+窗口两端按所在层的桶边界向外对齐：最近的数据精确到分钟，较早的数据精确到小时或天。
+来源IP和路径的计数是草图的估计值（只会高估），不同数量是HyperLogLog的估计值，误差见sketches中各草图的说明；
+删除和更新只回退计数，不回退攻击草图。
+"""
+
+import math
+import time
+from collections import namedtuple
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .sketches import HeavyHitters, HyperLogLog, hash64
+from app.core.models import AttackType, SecurityEvent, Severity
+
+MINUTE, HOUR, DAY = 60, 3600, 86400
+
+# 趋势统计的周期（秒）
+PERIOD_SECONDS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+
+# 桶统计用到的事件字段
+EventFacts = namedtuple('EventFacts', ['ts', 'source_ip', 'is_attack', 'attack_types', 'high_risk', 'path'])
+
+# 攻击草图的大小：来源/路径跟踪的候选项数、HyperLogLog精度、Count-Min的宽和深
+SketchShape = namedtuple('SketchShape', ['capacity', 'precision', 'width', 'depth'])
+
+
+def event_facts(event: SecurityEvent) -> EventFacts:
+    """提取事件在rollup中的统计字段；事件时间为请求时间，缺失时为创建时间"""
+    timestamp = event.request.timestamp if event.request and event.request.timestamp else event.created_at
+    is_attack = bool(event.detection.is_attack)
+    attack_types = tuple(dict.fromkeys(t.value for t in event.detection.attack_types)) if is_attack else ()
+    high_risk = event.llm_analysis is not None and event.llm_analysis.severity == Severity.HIGH
+    path = (urlsplit(event.request.url).path or '/') if is_attack else None
+    return EventFacts(timestamp.timestamp(), event.request.source_ip, is_attack, attack_types, high_risk, path)
+
+
+class AttackSketches:
+    """一个桶内攻击事件的来源IP和被攻击路径草图，内存由SketchShape固定"""
+
+    __slots__ = ('sources', 'paths', 'distinct_sources', 'distinct_paths')
+
+    def __init__(self, shape: SketchShape):
+        self.sources = HeavyHitters(shape.capacity, shape.width, shape.depth)
+        self.paths = HeavyHitters(shape.capacity, shape.width, shape.depth)
+        self.distinct_sources = HyperLogLog(shape.precision)
+        self.distinct_paths = HyperLogLog(shape.precision)
+
+    def add(self, source_ip: str, path: str):
+        source_hash, path_hash = hash64(source_ip), hash64(path)
+        self.sources.add(source_ip, hash_value=source_hash)
+        self.paths.add(path, hash_value=path_hash)
+        self.distinct_sources.add(source_ip, source_hash)
+        self.distinct_paths.add(path, path_hash)
+
+    def merge(self, other: "AttackSketches"):
+        self.sources.merge(other.sources)
+        self.paths.merge(other.paths)
+        self.distinct_sources.merge(other.distinct_sources)
+        self.distinct_paths.merge(other.distinct_paths)
+
+
+class RollupBucket:
+    """一个时间桶的计数和攻击草图"""
+
+    __slots__ = ('total', 'attacks', 'high_risk', 'attack_types', 'shape', 'sketches', 'last_attack')
+
+    def __init__(self, shape: SketchShape):
+        self.total = 0
+        self.attacks = 0
+        self.high_risk = 0
+        self.attack_types: Dict[str, int] = {}
+        self.shape = shape
+        # 只有良性流量的桶不分配攻击草图
+        self.sketches: Optional[AttackSketches] = None
+        self.last_attack: Dict[str, float] = {}  # 草图中跟踪的来源IP -> 最近一次攻击的时间戳
+
+    def apply(self, facts: EventFacts, sign: int = 1):
+        """计入（sign=1）或回退（sign=-1）一个事件"""
+        self.total += sign
+        self.high_risk += sign if facts.high_risk else 0
+        if not facts.is_attack:
+            return
+        self.attacks += sign
+        for attack_type in facts.attack_types:
+            count = self.attack_types.get(attack_type, 0) + sign
+            if count:
+                self.attack_types[attack_type] = count
+            else:
+                self.attack_types.pop(attack_type, None)
+        if sign > 0:
+            if self.sketches is None:
+                self.sketches = AttackSketches(self.shape)
+            self.sketches.add(facts.source_ip, facts.path)
+            if facts.ts > self.last_attack.get(facts.source_ip, -math.inf):
+                self.last_attack[facts.source_ip] = facts.ts
+            self._prune()
+
+    def merge(self, other: "RollupBucket"):
+        """合并另一个桶"""
+        self.total += other.total
+        self.attacks += other.attacks
+        self.high_risk += other.high_risk
+        for attack_type, count in other.attack_types.items():
+            self.attack_types[attack_type] = self.attack_types.get(attack_type, 0) + count
+        if other.sketches is not None:
+            if self.sketches is None:
+                self.sketches = AttackSketches(self.shape)
+            self.sketches.merge(other.sketches)
+        for source_ip, last in other.last_attack.items():
+            if last > self.last_attack.get(source_ip, -math.inf):
+                self.last_attack[source_ip] = last
+        self._prune()
+
+    def _prune(self):
+        """只保留草图仍在跟踪的IP的最近攻击时间"""
+        if self.sketches is None:
+            return
+        tracked = self.sketches.sources.candidates
+        if len(self.last_attack) > 2 * tracked.capacity:
+            self.last_attack = {ip: self.last_attack[ip] for ip in tracked.counts if ip in self.last_attack}
+
+
+class TimeRollups:
+    """分钟/小时/天三层的预聚合统计"""
+
+    def __init__(
+        self,
+        minute_retention: float = 2 * HOUR,
+        hour_retention: float = 8 * DAY,
+        source_capacity: int = 64,
+        clock: Callable[[], float] = time.time,
+        utc_offset: Optional[float] = None,
+        hll_precision: int = 10,
+        cms_width: int = 272,
+        cms_depth: int = 4
+    ):
+        """初始化
+
+        Args:
+            minute_retention: 分钟桶保留多少秒后合并进小时桶
+            hour_retention: 小时桶保留多少秒后合并进天桶（应覆盖仪表板的最大时间范围）
+            source_capacity: 每个桶的来源IP、路径草图跟踪的候选项数量
+            clock: 当前时间（秒），决定何时合并
+            utc_offset: 桶按本地时间对齐所用的UTC偏移（秒），默认为当前时区
+            hll_precision: 不同来源IP、路径数量的HyperLogLog精度，每个草图2^hll_precision字节
+            cms_width: 来源IP、路径计数的Count-Min每行计数器数量
+            cms_depth: Count-Min的行数
+        """
+        self.minute_retention = minute_retention
+        self.hour_retention = hour_retention
+        self.source_capacity = source_capacity
+        self.shape = SketchShape(source_capacity, hll_precision, cms_width, cms_depth)
+        self.clock = clock
+        self.offset = utc_offset if utc_offset is not None else \
+            datetime.now().astimezone().utcoffset().total_seconds()
+        self._tiers: Dict[int, Dict[int, RollupBucket]] = {MINUTE: {}, HOUR: {}, DAY: {}}
+        # 本地时间（秒）：不早于minute_horizon的在分钟层，不早于hour_horizon的在小时层，其余在天层
+        self.minute_horizon = -math.inf
+        self.hour_horizon = -math.inf
+        self._next_compact = -math.inf
+
+    def add(self, event: SecurityEvent):
+        self.apply(event_facts(event), 1)
+
+    def remove(self, event: SecurityEvent):
+        self.apply(event_facts(event), -1)
+
+    def apply(self, facts: EventFacts, sign: int = 1):
+        """把事件计入（或回退出）所在层的桶"""
+        self._bucket(facts.ts).apply(facts, sign)
+
+    def add_counts(
+        self, timestamp: float, total: int, attacks: int = 0, high_risk: int = 0,
+        attack_types: Optional[Dict[str, int]] = None
+    ):
+        """计入已经汇总好的计数（如已删除分区的退役统计），没有事件明细，不更新攻击草图"""
+        bucket = self._bucket(timestamp)
+        bucket.total += total
+        bucket.attacks += attacks
+        bucket.high_risk += high_risk
+        for attack_type, count in (attack_types or {}).items():
+            bucket.attack_types[attack_type] = bucket.attack_types.get(attack_type, 0) + count
+
+    def _bucket(self, timestamp: float) -> RollupBucket:
+        """时间戳所在层的桶，不存在时创建"""
+        now = self.clock()
+        if now >= self._next_compact:
+            self.compact(now)
+        local = timestamp + self.offset
+        size = self._tier_size(local)
+        tier = self._tiers[size]
+        key = int(local // size)
+        bucket = tier.get(key)
+        if bucket is None:
+            bucket = tier[key] = RollupBucket(self.shape)
+        return bucket
+
+    def compact(self, now: Optional[float] = None):
+        """把过了保留期的分钟桶合并进小时桶、小时桶合并进天桶"""
+        now = self.clock() if now is None else now
+        local_now = now + self.offset
+        minute_horizon = (local_now - self.minute_retention) // HOUR * HOUR
+        hour_horizon = min((local_now - self.hour_retention) // DAY * DAY, minute_horizon)
+        if hour_horizon > self.hour_horizon:
+            self.hour_horizon = hour_horizon
+            self._demote(HOUR, lambda start: start < hour_horizon)
+        if minute_horizon > self.minute_horizon:
+            self.minute_horizon = minute_horizon
+            self._demote(MINUTE, lambda start: start < minute_horizon)
+        self._next_compact = now + MINUTE
+
+    def _demote(self, size: int, expired: Callable[[int], bool]):
+        tier = self._tiers[size]
+        for key in [key for key in tier if expired(key * size)]:
+            bucket = tier.pop(key)
+            start = key * size
+            target_size = self._tier_size(start)
+            target = self._tiers[target_size]
+            target_key = start // target_size
+            if target_key in target:
+                target[target_key].merge(bucket)
+            else:
+                # 合并进空桶时直接复用
+                target[target_key] = bucket
+
+    def _tier_size(self, local: float) -> int:
+        if local >= self.minute_horizon:
+            return MINUTE
+        if local >= self.hour_horizon:
+            return HOUR
+        return DAY
+
+    def buckets(
+        self, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None
+    ) -> Iterator[Tuple[int, int, RollupBucket]]:
+        """与时间窗口相交的桶 (桶大小, 本地起始秒, 桶)"""
+        low = start_time.timestamp() + self.offset if start_time is not None else -math.inf
+        high = end_time.timestamp() + self.offset if end_time is not None else math.inf
+        tier_ranges = (
+            (MINUTE, max(low, self.minute_horizon), high),
+            (HOUR, max(low, self.hour_horizon), min(high, self.minute_horizon - 1)),
+            (DAY, low, min(high, self.hour_horizon - 1)),
+        )
+        for size, tier_low, tier_high in tier_ranges:
+            tier = self._tiers[size]
+            if not tier or tier_low > tier_high:
+                continue
+            first = tier_low // size if tier_low > -math.inf else -math.inf
+            last = tier_high // size if tier_high < math.inf else math.inf
+            if last - first + 1 <= len(tier):
+                for key in range(int(first), int(last) + 1):
+                    bucket = tier.get(key)
+                    if bucket is not None:
+                        yield size, key * size, bucket
+            else:
+                for key, bucket in tier.items():
+                    if first <= key <= last:
+                        yield size, key * size, bucket
+
+    def statistics(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        period: str = 'hour',
+        limit: int = 10
+    ) -> Dict[str, Any]:
+        """与存储的get_statistics结构相同的统计结果
+
+        趋势按period分组；比period更粗的天桶计入其起始时间所在的周期
+        """
+        seconds = PERIOD_SECONDS.get(period, PERIOD_SECONDS['hour'])
+        total = attacks = high_risk = 0
+        distribution: Dict[str, int] = {}
+        trend: Dict[int, List[int]] = {}
+        sources = HeavyHitters(self.shape.capacity, self.shape.width, self.shape.depth)
+        last_attack: Dict[str, float] = {}
+        for size, start, bucket in self.buckets(start_time, end_time):
+            if bucket.total <= 0:
+                continue
+            total += bucket.total
+            attacks += bucket.attacks
+            high_risk += bucket.high_risk
+            for attack_type, count in bucket.attack_types.items():
+                distribution[attack_type] = distribution.get(attack_type, 0) + count
+            point = trend.setdefault(start // seconds, [0, 0])
+            point[0] += bucket.total
+            point[1] += bucket.attacks
+            if bucket.attacks and bucket.sketches is not None:
+                sources.merge(bucket.sketches.sources)
+                # 草图合并时才进入跟踪集合的IP没有记录时间，取桶的结束时间
+                bucket_end = start + size - 1 - self.offset
+                for source_ip in bucket.sketches.sources.candidates.counts:
+                    last = bucket.last_attack.get(source_ip, bucket_end)
+                    if last > last_attack.get(source_ip, -math.inf):
+                        last_attack[source_ip] = last
+
+        return {
+            "total_events": total,
+            "attack_events": attacks,
+            "high_risk_events": high_risk,
+            "attack_distribution": {
+                attack_type.value: distribution[attack_type.value]
+                for attack_type in AttackType if distribution.get(attack_type.value)
+            },
+            "trend_data": [
+                {
+                    "timestamp": datetime.fromtimestamp(key * seconds - self.offset),
+                    "total_events": counts[0],
+                    "attack_events": counts[1]
+                }
+                for key, counts in sorted(trend.items())
+            ],
+            "top_attack_sources": [
+                {
+                    "source_ip": source_ip,
+                    "attack_count": count,
+                    "last_attack": datetime.fromtimestamp(last_attack[source_ip])
+                }
+                for source_ip, count, _ in sources.top(limit)
+            ]
+        }
+
+    def cardinality(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        limit: int = 10
+    ) -> Dict[str, Any]:
+        """时间窗口内攻击的不同来源IP数、不同被攻击路径数和高频来源/路径，由窗口内各桶的草图合并得到"""
+        merged = AttackSketches(self.shape)
+        attacks = 0
+        for _, _, bucket in self.buckets(start_time, end_time):
+            if bucket.attacks > 0 and bucket.sketches is not None:
+                attacks += bucket.attacks
+                merged.merge(bucket.sketches)
+        return {
+            "attack_events": attacks,
+            "distinct_sources": {
+                "estimate": merged.distinct_sources.count(),
+                "relative_error": round(merged.distinct_sources.relative_error, 4)
+            },
+            "distinct_paths": {
+                "estimate": merged.distinct_paths.count(),
+                "relative_error": round(merged.distinct_paths.relative_error, 4)
+            },
+            "top_sources": [
+                {"source_ip": source_ip, "attack_count": count, "max_error": error}
+                for source_ip, count, error in merged.sources.top(limit)
+            ],
+            "top_paths": [
+                {"path": path, "attack_count": count, "max_error": error}
+                for path, count, error in merged.paths.top(limit)
+            ],
+            "count_error_bound": merged.sources.error_bound()
+        }
+
+    def sketch_bytes(self) -> int:
+        """一个有攻击的桶的攻击草图占用的固定内存（字节，不含Space-Saving的候选项）"""
+        sketches = AttackSketches(self.shape)
+        return sketches.sources.nbytes + sketches.paths.nbytes + \
+            sketches.distinct_sources.nbytes + sketches.distinct_paths.nbytes
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各层的桶数量"""
+        return {
+            'minute_buckets': len(self._tiers[MINUTE]),
+            'hour_buckets': len(self._tiers[HOUR]),
+            'day_buckets': len(self._tiers[DAY])
+        }
@@ -0,0 +1,287 @@
+"""流式统计草图（sketch）
+
+在不保存原始数据的前提下，用固定内存近似统计大规模事件流。
+HyperLogLog、Count-Min和HeavyHitters都可以合并：分别统计的草图合并后与一起统计的结果相同（或误差保证相同），
+适合按时间桶统计、查询时合并窗口内的桶。
+"""
+
+import hashlib
+import heapq
+import itertools
+import math
+import random
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+def hash64(item: Hashable) -> int:
+    """与进程无关的64位哈希（内置hash()在不同进程间会随机化，不能用于需要合并的草图）"""
+    data = item if isinstance(item, bytes) else str(item).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+class SpaceSaving:
+    """Space-Saving 高频项（heavy hitters）统计
+
+    最多跟踪capacity个项。新项到来且已满时，替换计数最小的项，
+    新项继承其计数作为误差上界。
+
+    误差保证：对任意项，估计值 - error(item) <= 真实计数 <= 估计值；
+    真实频次超过 total / capacity 的项一定在跟踪集合中。
+    """
+
+    def __init__(self, capacity: int = 1000):
+        if capacity < 1:
+            raise ValueError("capacity必须大于0")
+        self.capacity = capacity
+        self.total = 0
+        self.counts: Dict[Hashable, int] = {}
+        self.errors: Dict[Hashable, int] = {}
+        # 每个被跟踪项在堆中恰有一个条目，计数只增不减，因此条目计数是真实计数的下界
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._seq = itertools.count()
+
+    def add(self, item: Hashable, count: int = 1):
+        """记录item出现count次"""
+        self.total += count
+        if item in self.counts:
+            self.counts[item] += count
+            return
+
+        if len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+            heapq.heappush(self._heap, (count, next(self._seq), item))
+            return
+
+        min_count, min_item = self._pop_min()
+        del self.counts[min_item]
+        del self.errors[min_item]
+        self.counts[item] = min_count + count
+        self.errors[item] = min_count
+        heapq.heappush(self._heap, (min_count + count, next(self._seq), item))
+
+    def _pop_min(self) -> Tuple[int, Hashable]:
+        """弹出当前计数最小的项"""
+        while True:
+            count, _, item = heapq.heappop(self._heap)
+            actual = self.counts[item]
+            if actual == count:
+                return count, item
+            # 条目过期（计数已增加），按最新计数重新入堆
+            heapq.heappush(self._heap, (actual, next(self._seq), item))
+
+    def estimate(self, item: Hashable) -> int:
+        """估计item的计数（未跟踪的项返回0）"""
+        return self.counts.get(item, 0)
+
+    def error(self, item: Hashable) -> int:
+        """item计数估计的最大高估量"""
+        return self.errors.get(item, 0)
+
+    def top(self, n: int = 10) -> List[Tuple[Hashable, int]]:
+        """返回计数最高的n个项 [(item, count), ...]"""
+        return sorted(self.counts.items(), key=lambda x: x[1], reverse=True)[:n]
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """合并另一个草图（可合并摘要）：未被一方跟踪的项按该方的最小计数补足，保留计数最高的capacity项
+
+        合并后的误差保证与两边分别统计后相加相同：估计值 - error(item) <= 真实计数 <= 估计值
+        """
+        floor_self = self._floor()
+        floor_other = other._floor()
+        merged = {}
+        for item in set(self.counts) | set(other.counts):
+            count = self.counts.get(item, floor_self) + other.counts.get(item, floor_other)
+            error = self.errors.get(item, floor_self) + other.errors.get(item, floor_other)
+            merged[item] = (count, error)
+        kept = heapq.nlargest(self.capacity, merged.items(), key=lambda x: x[1][0])
+        self.total += other.total
+        self.counts = {item: count for item, (count, _) in kept}
+        self.errors = {item: error for item, (_, error) in kept}
+        self._heap = [(count, next(self._seq), item) for item, count in self.counts.items()]
+        heapq.heapify(self._heap)
+        return self
+
+    def _floor(self) -> int:
+        """未跟踪项真实计数的上界：未满时为0，满时为最小计数"""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+
+class HyperLogLog:
+    """HyperLogLog 基数（不同元素数量）估计
+
+    2^precision个6位以内的寄存器，每个占1字节，内存固定为2^precision字节。
+    误差保证：相对标准误差约为 1.04 / sqrt(2^precision)（precision=10时约3.3%，12时约1.6%）；
+    基数小于约2.5 * 2^precision时使用线性计数，结果接近精确值。
+    """
+
+    def __init__(self, precision: int = 10):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision必须在4到16之间")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        """估计值的相对标准误差"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    @property
+    def nbytes(self) -> int:
+        return self.registers.nbytes
+
+    def add(self, item: Hashable, hash_value: Optional[int] = None):
+        """记录一个元素；已计算过hash64时可直接传入hash_value"""
+        h = hash64(item) if hash_value is None else hash_value
+        bits = 64 - self.precision
+        index = h >> bits
+        rank = bits - (h & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """合并另一个草图，结果等同于两边的元素一起统计"""
+        if other.precision != self.precision:
+            raise ValueError("只能合并precision相同的HyperLogLog")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        """估计不同元素的数量"""
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / float(np.ldexp(1.0, -self.registers.astype(np.int32)).sum())
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class CountMinSketch:
+    """Count-Min 频次估计
+
+    depth行、每行width个计数器，内存固定为 depth * width * 4 字节。
+    误差保证：估计值 >= 真实计数；以 1 - e^(-depth) 的概率，估计值 <= 真实计数 + e / width * total。
+    """
+
+    def __init__(self, width: int = 272, depth: int = 4):
+        if width < 1 or depth < 1:
+            raise ValueError("width和depth必须大于0")
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.table = np.zeros((depth, width), dtype=np.uint32)
+        self._rows = np.arange(depth)
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes
+
+    def _columns(self, h: int) -> List[int]:
+        # 双重哈希：从一个64位哈希派生depth个列下标
+        low, high = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(low + row * high) % self.width for row in range(self.depth)]
+
+    def add(self, item: Hashable, count: int = 1, hash_value: Optional[int] = None):
+        """记录item出现count次"""
+        h = hash64(item) if hash_value is None else hash_value
+        self.table[self._rows, self._columns(h)] += count
+        self.total += count
+
+    def estimate(self, item: Hashable, hash_value: Optional[int] = None) -> int:
+        """估计item的计数（只会高估）"""
+        h = hash64(item) if hash_value is None else hash_value
+        return int(self.table[self._rows, self._columns(h)].min())
+
+    def error_bound(self) -> int:
+        """以 1 - e^(-depth) 的概率成立的最大高估量"""
+        return int(math.ceil(math.e / self.width * self.total))
+
+    def merge(self, other: "CountMinSketch") -> "CountMinSketch":
+        """合并另一个草图，结果等同于两边一起统计"""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("只能合并width和depth相同的CountMinSketch")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class HeavyHitters:
+    """高频项统计：Space-Saving给出候选项，Count-Min给出候选项的计数
+
+    两者都只会高估，取较小值作为计数。多个草图合并后Space-Saving的计数会叠加各自的最小计数，
+    而Count-Min的合并是精确的，合并窗口内大量时间桶时计数明显更准。
+    top()返回的误差为确定的最大高估量（来自Space-Saving）；Count-Min另有概率误差界error_bound()。
+    """
+
+    def __init__(self, capacity: int = 64, width: int = 272, depth: int = 4):
+        self.candidates = SpaceSaving(capacity)
+        self.sketch = CountMinSketch(width, depth)
+
+    @property
+    def total(self) -> int:
+        return self.candidates.total
+
+    @property
+    def nbytes(self) -> int:
+        """Count-Min部分的内存；Space-Saving最多跟踪capacity项"""
+        return self.sketch.nbytes
+
+    def add(self, item: Hashable, count: int = 1, hash_value: Optional[int] = None):
+        """记录item出现count次"""
+        self.candidates.add(item, count)
+        self.sketch.add(item, count, hash_value)
+
+    def merge(self, other: "HeavyHitters") -> "HeavyHitters":
+        self.candidates.merge(other.candidates)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def top(self, n: int = 10) -> List[Tuple[Hashable, int, int]]:
+        """返回计数最高的n个项 [(item, 计数, 最大高估量), ...]"""
+        result = []
+        for item, count in self.candidates.counts.items():
+            estimate = min(count, self.sketch.estimate(item))
+            lower = max(count - self.candidates.error(item), 0)
+            result.append((item, estimate, estimate - min(lower, estimate)))
+        result.sort(key=lambda x: x[1], reverse=True)
+        return result[:n]
+
+    def error_bound(self) -> int:
+        return self.sketch.error_bound()
+
+
+class ReservoirSample:
+    """蓄水池抽样（Algorithm R）
+
+    从任意长度的流中等概率保留最多size个元素。
+    """
+
+    def __init__(self, size: int, seed: Optional[int] = None):
+        if size < 0:
+            raise ValueError("size不能为负数")
+        self.size = size
+        self.seen = 0
+        self.items: List[Any] = []
+        self._random = random.Random(seed)
+
+    def add(self, item: Any):
+        """向抽样中提供一个元素"""
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        if self.size == 0:
+            return
+        index = self._random.randrange(self.seen)
+        if index < self.size:
+            self.items[index] = item
+
+    def __len__(self) -> int:
+        return len(self.items)
@@ -1,13 +1,20 @@
 """事件相关API接口"""
 
+import time
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel
 
+from app.config.settings import settings
 from app.core.models import SecurityEvent, HTTPRequest
-from app.detector import DetectionEngine  
-from app.storage.base import BaseStorage
+from app.core.exceptions import LLMException, StorageException
+from app.detector import DetectionEngine, DeepAnalysisScheduler
+from app.analytics import MetricsRegistry
+from app.storage import (
+    BaseStorage, PartitionedStorage, RollupStorage, StorageFactory, TieredStorage, WriteBehindStorage
+)
+from app.storage.pagination import COUNT_FILTERS, TotalsCache, decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/events", tags=["events"])
 
@@ -28,6 +35,9 @@ class DetectResponse(BaseModel):
     confidence: float
     severity: Optional[str] = None
     recommendations: List[str] = []
+    analysis_tier: str = "fast"
+    deep_analysis_pending: bool = False
+    incomplete: bool = False
 
 class EventResponse(BaseModel):
     """事件响应模型"""
@@ -44,81 +54,122 @@ class EventResponse(BaseModel):
 class EventListResponse(BaseModel):
     """事件列表响应模型"""
     events: List[EventResponse]
-    total: int
+    total: Optional[int]
     page: int
     page_size: int
+    total_exact: bool = True  # total是否为本次请求精确计数的结果
+    next_cursor: Optional[str] = None  # 下一页的游标，没有更多事件时为None
+
+# 检测引擎初始化时会编译规则，全局复用一个实例
+_detection_engine = DetectionEngine()
+
+# 检测接口的请求/攻击/错误速率和decode/detect/store各阶段延迟
+_metrics = MetricsRegistry()
 
 # 依赖注入
 async def get_detection_engine() -> DetectionEngine:
     """获取检测引擎实例"""
-    return DetectionEngine()
+    return _detection_engine
 
-# 临时的内存存储实现，避免运行时错误
-class MemoryStorage(BaseStorage):
-    """临时的内存存储实现"""
-    
-    def __init__(self):
-        self.events = {}
-        self.event_counter = 0
-    
-    async def save_event(self, event: SecurityEvent) -> str:
-        self.event_counter += 1
-        event_id = f"event_{self.event_counter}"
-        event.event_id = event_id
-        self.events[event_id] = event
-        return event_id
-    
-    async def get_event(self, event_id: str) -> Optional[SecurityEvent]:
-        return self.events.get(event_id)
-    
-    async def query_events(self, **filters) -> List[SecurityEvent]:
-        # 简化实现，返回所有事件
-        page = filters.get("page", 1)
-        page_size = filters.get("page_size", 20)
-        start = (page - 1) * page_size
-        end = start + page_size
-        
-        all_events = list(self.events.values())
-        return all_events[start:end]
-    
-    async def delete_event(self, event_id: str) -> bool:
-        if event_id in self.events:
-            del self.events[event_id]
-            return True
-        return False
-    
-    async def update_event(self, event_id: str, event: SecurityEvent) -> bool:
-        if event_id in self.events:
-            self.events[event_id] = event
-            return True
-        return False
-    
-    async def count_events(self, **filters) -> int:
-        return len(self.events)
-    
-    async def get_statistics(self, **filters) -> Dict[str, Any]:
-        return {
-            "total_events": len(self.events),
-            "attack_events": 0,
-            "attack_distribution": {},
-            "trend_data": [],
-            "top_attack_sources": []
-        }
+async def get_metrics() -> MetricsRegistry:
+    """获取检测接口的指标"""
+    return _metrics
+
+def _create_storage() -> BaseStorage:
+    """按database.backend创建存储（配置partition_by时按时间分区），
+    开启write_behind时包装写后缓冲，开启tiered_persistence时包装分级保存，开启statistics_rollups时包装预聚合统计；
+    statistics_rollups未配置时只在不被多个进程共享的存储上开启"""
+    database = settings.database
+    if database.partition_by:
+        storage = PartitionedStorage({
+            'backend': database.backend,
+            'directory': database.partition_dir,
+            'granularity': database.partition_by,
+            'attack_retention_days': database.attack_retention_days,
+            'benign_retention_days': database.benign_retention_days,
+            'raw_retention_days': database.raw_retention_days
+        })
+    else:
+        storage = StorageFactory.create_storage(database.backend, database.dict())
+    # 预聚合数据只在本进程内维护：多个worker共享数据库时，每个worker的统计只包含自己保存的事件
+    rollups = database.statistics_rollups
+    if rollups is None:
+        rollups = not storage.shared
+    elif rollups and storage.shared:
+        print(f"{database.backend}存储可能被多个worker共享，预聚合统计只包含本进程保存的事件，只应在单worker部署时开启")
+    if database.write_behind:
+        storage = WriteBehindStorage(storage, {
+            'batch_size': database.write_behind_batch_size,
+            'flush_interval_ms': database.write_behind_flush_ms,
+            'max_pending': database.write_behind_max_pending
+        })
+    if database.tiered_persistence:
+        # 在预聚合统计之内，只计数的请求也计入统计
+        storage = TieredStorage(storage, {
+            'benign_sample_rate': database.benign_sample_rate,
+            'buffer_size': database.benign_buffer_size,
+            'buffer_seconds': database.benign_buffer_seconds,
+            'counters_path': database.benign_counters_path
+        })
+    if rollups:
+        # 在写后缓冲之外，保存时立即计入统计
+        storage = RollupStorage(storage, {
+            'minute_retention_hours': database.rollup_minute_retention_hours,
+            'hour_retention_days': database.rollup_hour_retention_days
+        })
+    return storage
 
 # 创建全局存储实例
-_storage_instance = MemoryStorage()
+_storage_instance = _create_storage()
+
+# 事件列表的总数缓存，detect保存的事件增量计入
+_totals_cache = TotalsCache()
 
 async def get_storage() -> BaseStorage:
     """获取存储实例"""
     return _storage_instance
 
+_deep_scheduler: Optional[DeepAnalysisScheduler] = None
+
+def _create_llm_provider():
+    """配置了API key时创建LLM提供者，否则不做LLM分析"""
+    if not settings.llm.api_key:
+        return None
+    try:
+        from app.llm import LLMProviderFactory
+        return LLMProviderFactory.create_provider(settings.llm.provider, settings.llm.dict())
+    except LLMException as e:
+        print(f"LLM提供者初始化失败，深度分析不做LLM分析: {e}")
+        return None
+
+async def get_deep_scheduler(storage: BaseStorage = Depends(get_storage)) -> DeepAnalysisScheduler:
+    """获取深度分析调度器（首次使用时启动）"""
+    global _deep_scheduler
+    if _deep_scheduler is None:
+        _deep_scheduler = DeepAnalysisScheduler(storage, llm_provider=_create_llm_provider())
+    if not _deep_scheduler.is_running:
+        await _deep_scheduler.start()
+    return _deep_scheduler
+
+async def stop_deep_analysis():
+    """停止深度分析调度器，等待已调度的事件分析完成"""
+    if _deep_scheduler is not None:
+        await _deep_scheduler.stop()
+
 @router.post("/detect", response_model=DetectResponse)
 async def detect_request(
     request: DetectRequest,
     detection_engine: DetectionEngine = Depends(get_detection_engine),
-    storage: BaseStorage = Depends(get_storage)
+    storage: BaseStorage = Depends(get_storage),
+    deep_scheduler: DeepAnalysisScheduler = Depends(get_deep_scheduler),
+    metrics: MetricsRegistry = Depends(get_metrics),
+    durable: bool = Query(False, description="等待事件落盘后再返回（开启写后缓冲时有效）")
 ):
-    """检测HTTP请求"""
+    """检测HTTP请求
+
+    先进行快速检测并立即返回；判定为攻击或可疑的请求安排后台深度分析
+    （完整检测 + LLM分析），完成后更新已保存的事件。
+    """
     try:
         # 构建HTTP请求对象
         http_request = HTTPRequest(
@@ -132,8 +183,13 @@ async def detect_request(
             raw_data=f"{request.method} {request.url}"
         )
         
-        # 执行检测
-        detection_result = detection_engine.detect_all(http_request)
+        # 快速检测，超过时间上限返回部分结果，由深度分析补全
+        deadline = time.monotonic() + settings.detection.inline_timeout_ms / 1000
+        detection_result = detection_engine.detect_fast(http_request, deadline=deadline)
+        metrics.mark('requests')
+        metrics.record_timings(detection_result.details.get('timings'))
+        if detection_result.is_attack:
+            metrics.mark('attacks')
         
         # 创建安全事件
         security_event = SecurityEvent(
@@ -145,17 +201,28 @@ async def detect_request(
         )
         
         # 保存事件
-        event_id = await storage.save_event(security_event)
+        store_start = time.perf_counter_ns()
+        event_id = await storage.save_event(security_event, durable=durable)
+        metrics.record('store', time.perf_counter_ns() - store_start)
+        _totals_cache.observe_saved(security_event)
+        
+        # 攻击、可疑或检测不完整的请求安排深度分析
+        deep_pending = False
+        if detection_engine.needs_deep_analysis(detection_result):
+            deep_pending = deep_scheduler.schedule(security_event)
         
         return DetectResponse(
             event_id=event_id,
             is_attack=detection_result.is_attack,
             attack_types=[t.value for t in detection_result.attack_types],
             confidence=detection_result.confidence,
-            recommendations=[]
+            recommendations=[],
+            deep_analysis_pending=deep_pending,
+            incomplete=detection_result.incomplete
         )
         
     except Exception as e:
+        metrics.mark('errors')
         raise HTTPException(status_code=500, detail=f"检测失败: {str(e)}")
 
 @router.get("/{event_id}", response_model=EventResponse)
@@ -195,9 +262,17 @@ async def query_events(
     source_ip: Optional[str] = Query(None, description="来源IP"),
     start_time: Optional[datetime] = Query(None, description="开始时间"),
     end_time: Optional[datetime] = Query(None, description="结束时间"),
+    cursor: Optional[str] = Query(None, description="分页游标，取上一页返回的next_cursor，指定时忽略page"),
+    total_mode: Literal["exact", "cached", "none"] = Query(
+        "exact", description="总数：exact精确计数，cached使用缓存（写入时增量更新），none不返回"
+    ),
     storage: BaseStorage = Depends(get_storage)
 ):
-    """查询事件列表"""
+    """查询事件列表
+
+    翻页较深时使用cursor：按 (事件时间, event_id) 从上一页最后一个事件之后继续取，
+    不随页数变慢；频繁刷新的列表可以用total_mode=cached避免每次精确计数。
+    """
     try:
         # 构建过滤条件
         filters = {
@@ -215,10 +290,20 @@ async def query_events(
             filters["start_time"] = start_time
         if end_time:
             filters["end_time"] = end_time
+        if cursor:
+            try:
+                filters["after"] = decode_cursor(cursor)
+            except StorageException as e:
+                raise HTTPException(status_code=400, detail=str(e))
         
         # 查询事件
         events = await storage.query_events(**filters)
-        total = await storage.count_events(**filters)
+        count_filters = {name: value for name, value in filters.items() if name in COUNT_FILTERS}
+        total, total_exact = None, False
+        if total_mode == "exact":
+            total, total_exact = await storage.count_events(**count_filters), True
+        elif total_mode == "cached":
+            total, total_exact = await _totals_cache.get(storage, count_filters)
         
         # 转换响应格式
         event_responses = [
@@ -240,9 +325,13 @@ async def query_events(
             events=event_responses,
             total=total,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            total_exact=total_exact,
+            next_cursor=encode_cursor(events[-1]) if len(events) == page_size else None
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"查询事件失败: {str(e)}")
 
@@ -254,6 +343,7 @@ async def delete_event(
     """删除事件"""
     try:
         success = await storage.delete_event(event_id)
+        _totals_cache.invalidate()
         if not success:
             raise HTTPException(status_code=404, detail="事件未找到")
         
@@ -1,17 +1,33 @@
 """统计相关API接口"""
 
+import asyncio
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel
 
 from app.storage.base import BaseStorage
+from app.analytics import MetricsRegistry
+from app.config.settings import settings
+from app.core.exceptions import StorageException
+from app.forensics import EventArchive
 
 # 导入事件API中的存储实例
-from .events import get_storage
+from .events import get_storage, get_metrics
 
 router = APIRouter(prefix="/statistics", tags=["statistics"])
 
+_archive: Optional[EventArchive] = None
+
+async def get_archive() -> EventArchive:
+    """获取database.archive_dir配置的列式事件归档"""
+    global _archive
+    if not settings.database.archive_dir:
+        raise HTTPException(status_code=404, detail="未配置事件归档（database.archive_dir）")
+    if _archive is None:
+        _archive = EventArchive(settings.database.archive_dir)
+    return _archive
+
 class DashboardStats(BaseModel):
     """仪表板统计数据"""
     total_events: int
@@ -201,4 +217,103 @@ async def get_attack_sources(
         }
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取攻击来源统计失败: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"获取攻击来源统计失败: {str(e)}") 
+
+@router.get("/cardinality")
+async def get_attack_cardinality(
+    hours: int = Query(24, ge=1, le=168, description="统计时间范围(小时)"),
+    limit: int = Query(10, ge=1, le=50, description="高频来源/路径返回数量"),
+    storage: BaseStorage = Depends(get_storage)
+):
+    """获取攻击的不同来源IP数、不同被攻击路径数和高频来源/路径
+
+    开启预聚合统计时由时间桶草图合并得到，误差：
+    - distinct_sources / distinct_paths：HyperLogLog估计，relative_error为相对标准误差
+    - top_sources / top_paths：attack_count只会高估，真实计数不小于 attack_count - max_error；
+      count_error_bound为Count-Min以约98%概率成立的高估上界
+    未开启时逐个统计攻击事件，误差均为0
+    """
+    try:
+        end_time = datetime.now()
+        start_time = end_time - timedelta(hours=hours)
+
+        cardinality = await storage.get_cardinality(
+            start_time=start_time,
+            end_time=end_time,
+            limit=limit
+        )
+
+        return {
+            "time_range": {
+                "start": start_time,
+                "end": end_time,
+                "hours": hours
+            },
+            **cardinality
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取攻击基数统计失败: {str(e)}")
+
+def _split(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+@router.get("/archive/groups")
+async def get_archive_groups(
+    group_by: str = Query(..., description="逗号分隔的分组键，如 attack_type,hour,path_prefix"),
+    start_time: Optional[datetime] = Query(None, description="开始时间"),
+    end_time: Optional[datetime] = Query(None, description="结束时间"),
+    is_attack: Optional[bool] = Query(None, description="是否为攻击"),
+    attack_type: Optional[str] = Query(None, description="攻击类型"),
+    path_prefix: Optional[str] = Query(None, description="路径前缀"),
+    limit: int = Query(100, ge=1, le=10000, description="返回的分组数量"),
+    archive: EventArchive = Depends(get_archive)
+):
+    """在列式事件归档上分组计数
+
+    分组键：hour、day、attack_type、rule、source_ip、path、path_prefix[:N]、method、user_agent、ua_family、risk_level、is_attack
+    """
+    keys = _split(group_by)
+    try:
+        query = archive.query(start_time=start_time, end_time=end_time, is_attack=is_attack,
+                              attack_type=attack_type, path_prefix=path_prefix)
+        # 大归档的扫描耗时较长，放到线程中执行
+        groups = await asyncio.to_thread(query.group_count, *keys, limit=limit)
+    except StorageException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"归档分组统计失败: {str(e)}")
+    return {"group_by": keys, "groups": groups}
+
+@router.get("/archive/percentiles")
+async def get_archive_percentiles(
+    by: Optional[str] = Query(None, description="逗号分隔的分组键，如 rule"),
+    q: str = Query("50,90,99", description="逗号分隔的分位数"),
+    start_time: Optional[datetime] = Query(None, description="开始时间"),
+    end_time: Optional[datetime] = Query(None, description="结束时间"),
+    is_attack: Optional[bool] = Query(None, description="是否为攻击"),
+    attack_type: Optional[str] = Query(None, description="攻击类型"),
+    path_prefix: Optional[str] = Query(None, description="路径前缀"),
+    archive: EventArchive = Depends(get_archive)
+):
+    """在列式事件归档上按分组计算检测置信度的分位数"""
+    keys = _split(by)
+    try:
+        quantiles = [float(value) for value in _split(q)]
+        query = archive.query(start_time=start_time, end_time=end_time, is_attack=is_attack,
+                              attack_type=attack_type, path_prefix=path_prefix)
+        groups = await asyncio.to_thread(query.percentiles, keys, 'confidence', quantiles)
+    except (StorageException, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"归档分位数统计失败: {str(e)}")
+    return {"by": keys, "groups": groups}
+
+@router.get("/metrics")
+async def get_runtime_metrics(metrics: MetricsRegistry = Depends(get_metrics)):
+    """获取检测接口的实时指标
+
+    rates为请求、攻击、错误的1秒/1分钟/5分钟滑动速率（每秒），
+    latency为decode/detect/store各阶段的延迟分布（微秒）
+    """
+    return metrics.to_dict()
@@ -2,8 +2,26 @@
 
 from .base import BaseCapturer
 from .log_capturer import LogFileCapturer
+from .multi_file_capturer import MultiFileCapturer
+from .syslog_capturer import SyslogCapturer
+from .audit_log_capturer import AuditLogCapturer, AuditLogParser
+from .pcap_capturer import PcapCapturer
+from .asgi_capturer import ASGICaptureMiddleware
+from .archive_capturer import ArchiveLogCapturer
+from .formats import register_format, get_format, list_formats, parse_line
 
 __all__ = [
     "BaseCapturer",
-    "LogFileCapturer"
+    "LogFileCapturer",
+    "MultiFileCapturer",
+    "SyslogCapturer",
+    "AuditLogCapturer",
+    "AuditLogParser",
+    "PcapCapturer",
+    "ASGICaptureMiddleware",
+    "ArchiveLogCapturer",
+    "register_format",
+    "get_format",
+    "list_formats",
+    "parse_line"
 ] 
\ No newline at end of file
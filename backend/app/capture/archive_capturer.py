@@ -0,0 +1,158 @@
+"""归档日志捕获器
+
+按顺序读取一组已落盘的访问日志（支持.gz压缩），用于离线取证分析：
+- 读取位置以 (文件序号, 行号) 表示，可以保存后从该位置继续（gzip无法随机定位，恢复时逐行跳过）
+- chunk_lines 限制每次capture_stream读取的行数，调用方可以在分块之间保存检查点
+- 解压和读取在线程池中按批进行，不阻塞事件循环
+- 每个请求的source记录为 "文件路径:行号"，便于回溯原始日志
+"""
+
+import asyncio
+import gzip
+from typing import AsyncGenerator, Dict, IO, List, Optional, Tuple
+
+from .base import BaseCapturer
+from .formats import get_format
+from app.core.models import HTTPRequest
+from app.core.exceptions import CaptureException
+
+
+def open_log(path: str) -> IO[str]:
+    """打开日志文件，.gz文件透明解压，无法解码的字节替换处理"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+
+class ArchiveLogCapturer(BaseCapturer):
+    """按顺序读取多个归档日志文件的捕获器"""
+
+    def __init__(
+        self,
+        paths: List[str],
+        log_format: str = "auto",
+        chunk_lines: Optional[int] = None,
+        read_batch: int = 1000
+    ):
+        """初始化捕获器
+
+        Args:
+            paths: 日志文件路径列表，按给定顺序读取
+            log_format: 日志格式名，见formats.list_formats()
+            chunk_lines: 每次capture_stream最多读取的行数，None表示一次读完全部文件
+            read_batch: 每次在线程池中读取的行数
+        """
+        super().__init__()
+        if not paths:
+            raise CaptureException("至少需要一个日志文件")
+        self.paths = list(paths)
+        self.log_format = log_format
+        self.chunk_lines = chunk_lines
+        self.read_batch = read_batch
+        self._parser = get_format(log_format)
+
+        self.file_index = 0
+        self.line = 0            # 当前文件中已读取的行数
+        self._handle: Optional[IO[str]] = None
+        self.stats = {
+            'lines_read': 0,
+            'parse_errors': 0,
+            'files_completed': 0
+        }
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        """当前读取位置 (文件序号, 已读取行数)"""
+        return self.file_index, self.line
+
+    @property
+    def exhausted(self) -> bool:
+        """所有文件是否已读完"""
+        return self.file_index >= len(self.paths)
+
+    def seek(self, file_index: int, line: int):
+        """从指定位置继续读取（用于从检查点恢复）"""
+        self._close_handle()
+        self.file_index = file_index
+        self.line = 0
+        if line and not self.exhausted:
+            self._handle = open_log(self.paths[file_index])
+            for _ in range(line):
+                if not self._handle.readline():
+                    break
+                self.line += 1
+
+    async def start_capture(self):
+        """开始捕获"""
+        self.is_running = True
+
+    async def stop_capture(self):
+        """停止捕获，关闭打开的文件"""
+        self.is_running = False
+        self._close_handle()
+
+    async def capture_single(self) -> Optional[HTTPRequest]:
+        """读取下一个能解析的请求，文件全部读完时返回None"""
+        loop = asyncio.get_running_loop()
+        while not self.exhausted:
+            batch = await loop.run_in_executor(None, self._read_lines, 1)
+            if batch:
+                return batch[0]
+        return None
+
+    async def capture_stream(self) -> AsyncGenerator[HTTPRequest, None]:
+        """从当前位置读取请求，读满chunk_lines行或文件全部读完时结束"""
+        loop = asyncio.get_running_loop()
+        remaining = self.chunk_lines
+        while self.is_running and not self.exhausted and (remaining is None or remaining > 0):
+            limit = self.read_batch if remaining is None else min(self.read_batch, remaining)
+            start = self.stats['lines_read']
+            try:
+                batch = await loop.run_in_executor(None, self._read_lines, limit)
+            except OSError as e:
+                raise CaptureException(f"读取归档日志失败: {e}")
+            if remaining is not None:
+                remaining -= self.stats['lines_read'] - start
+            for request in batch:
+                yield request
+
+    def get_stats(self) -> Dict:
+        """获取读取统计"""
+        stats = dict(self.stats)
+        stats['file_index'] = self.file_index
+        stats['line'] = self.line
+        stats['files_total'] = len(self.paths)
+        return stats
+
+    def _read_lines(self, limit: int) -> List[HTTPRequest]:
+        """读取最多limit行并解析（在线程池中执行），当前文件读完时切换到下一个文件"""
+        results: List[HTTPRequest] = []
+        read = 0
+        while read < limit and not self.exhausted:
+            if self._handle is None:
+                self._handle = open_log(self.paths[self.file_index])
+            line = self._handle.readline()
+            if not line:
+                self._close_handle()
+                self.file_index += 1
+                self.line = 0
+                self.stats['files_completed'] += 1
+                continue
+            read += 1
+            self.line += 1
+            self.stats['lines_read'] += 1
+            line = line.strip()
+            if not line:
+                continue
+            request = self._timed_parse(self._parser, line)
+            if request is None:
+                self.stats['parse_errors'] += 1
+                continue
+            request.source = f"{self.paths[self.file_index]}:{self.line}"
+            results.append(request)
+        return results
+
+    def _close_handle(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
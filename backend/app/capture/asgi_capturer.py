@@ -0,0 +1,333 @@
+"""ASGI中间件捕获器
+
+挂载在FastAPI/Starlette等ASGI服务前，直接检查实时流量：
+1. 从scope和请求体流构建HTTPRequest
+2. 在微秒级预算内运行快速检测引擎，结果写入scope["state"]["security_verdict"]
+3. 把请求放入后台有界队列，由检测进程池完整检测后存储（不占用被保护服务进程的GIL）
+4. 后台队列饱和时退化为直通模式，不做任何检查，保证不拖慢被保护的服务
+5. 可选的自适应采样器：积压升高时按比例放过无触发特征的良性路径请求
+
+使用示例：
+    app.add_middleware(ASGICaptureMiddleware, fast_engine=fast_engine, storage=storage)
+"""
+
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import AsyncGenerator, Dict, List, Optional
+
+from .base import BaseCapturer
+from .formats import parse_query_string
+from app.core.models import HTTPRequest, SecurityEvent
+
+# 队列结束标记
+_EOF = object()
+
+class ASGICaptureMiddleware(BaseCapturer):
+    """ASGI中间件形式的HTTP请求捕获器
+
+    同时也是一个BaseCapturer：未配置storage时，后台队列可以由
+    SecurityCapturer(capturer=middleware) 等外部消费者通过capture_stream()读取。
+    """
+
+    def __init__(
+        self,
+        app,
+        fast_engine=None,
+        budget_us: int = 500,
+        analysis_engine=None,
+        storage=None,
+        max_queue_size: int = 10000,
+        max_body_size: int = 64 * 1024,
+        workers: int = 1,
+        batch_size: int = 64,
+        sampler=None
+    ):
+        """初始化中间件
+
+        Args:
+            app: 被保护的ASGI应用
+            fast_engine: 内联快速检测引擎（DetectionEngine，使用其detect_fast），None表示不做内联检测
+            budget_us: 内联检测的时间预算（微秒），超出会计数，且后续请求跳过内联检测直到开销回落
+            analysis_engine: 后台完整检测引擎，会被复制到检测进程中（须可pickle），None表示使用默认DetectionEngine
+            storage: 存储后端，配置后由后台worker完成检测和保存
+            max_queue_size: 后台队列容量，队列满时新请求直通
+            max_body_size: 检查请求体的最大字节数，超出部分不检查但照常转发
+            workers: 检测进程数，也是后台worker数量
+            batch_size: 每次交给检测进程的最大请求数，用于摊薄进程间通信开销
+            sampler: 自适应采样器（AdaptiveSampler），未抽中的请求不做内联检测也不进入后台队列；
+                未设置queue_depth回调时使用后台队列深度
+        """
+        super().__init__()
+        self.app = app
+        self.fast_engine = fast_engine
+        self.budget_ns = budget_us * 1000
+        self.analysis_engine = analysis_engine
+        self.storage = storage
+        self.max_queue_size = max_queue_size
+        self.max_body_size = max_body_size
+        self.workers = workers
+        self.batch_size = batch_size
+        self.sampler = sampler
+        if sampler is not None and sampler.queue_depth is None:
+            sampler.queue_depth = self.backlog
+
+        self.queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # 最近一次内联检测耗时的指数加权平均，用于判断是否跳过内联检测
+        self._inline_ewma_ns = 0.0
+        self.stats = {
+            'requests': 0,
+            'inspected': 0,
+            'passthrough': 0,
+            'sampled_out': 0,
+            'inline_detections': 0,
+            'inline_skipped': 0,
+            'inline_attacks': 0,
+            'over_budget': 0,
+            'inline_incomplete': 0,
+            'overhead_total_ns': 0,
+            'overhead_max_ns': 0,
+            'sampled_out_overhead_ns': 0,
+            'analyzed': 0,
+            'analysis_errors': 0
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope.get('type') != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        if not self.is_running:
+            await self.start_capture()
+
+        start_ns = time.perf_counter_ns()
+        self.stats['requests'] += 1
+
+        if self.queue.full():
+            # 后台分析跟不上，直通以保护业务服务
+            self.stats['passthrough'] += 1
+            await self.app(scope, receive, send)
+            return
+
+        chunks, pending_message = await self._read_body(receive)
+        body = b''.join(chunk.get('body', b'') for chunk in chunks)
+        request = self._build_request(scope, body)
+
+        sampled_out = self.sampler is not None and not self.sampler.decide(request).analyze
+        if sampled_out:
+            self.stats['sampled_out'] += 1
+        else:
+            self.stats['inspected'] += 1
+            if self.fast_engine is not None:
+                self._run_inline(scope, request)
+
+            try:
+                self.queue.put_nowait(request)
+            except asyncio.QueueFull:
+                self.stats['passthrough'] += 1
+
+        overhead = time.perf_counter_ns() - start_ns
+        # 平均开销只按检查过的请求计算，未抽中的请求开销单独累计
+        self.stats['sampled_out_overhead_ns' if sampled_out else 'overhead_total_ns'] += overhead
+        if overhead > self.stats['overhead_max_ns']:
+            self.stats['overhead_max_ns'] = overhead
+
+        replay = deque(chunks)
+        if pending_message is not None:
+            replay.append(pending_message)
+
+        async def replay_receive():
+            if replay:
+                return replay.popleft()
+            return await receive()
+
+        await self.app(scope, replay_receive, send)
+
+    async def start_capture(self):
+        """创建后台队列，配置了storage时启动检测进程池和后台worker"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        if self.storage is not None:
+            from app.pipeline.workers import init_detection_worker
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=init_detection_worker,
+                initargs=(self.analysis_engine,)
+            )
+            self._worker_tasks = [
+                asyncio.create_task(self._analysis_worker()) for _ in range(self.workers)
+            ]
+
+    async def stop_capture(self):
+        """停止捕获，等待后台worker处理完队列中的请求"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        if self._worker_tasks:
+            await self.queue.join()
+            for task in self._worker_tasks:
+                task.cancel()
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+            self._worker_tasks = []
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        else:
+            try:
+                self.queue.put_nowait(_EOF)
+            except asyncio.QueueFull:
+                pass
+
+    async def capture_single(self) -> Optional[HTTPRequest]:
+        """从后台队列取出一个请求"""
+        if self.queue is None:
+            return None
+        item = await self.queue.get()
+        self.queue.task_done()
+        if item is _EOF:
+            self.queue.put_nowait(_EOF)
+            return None
+        return item
+
+    async def capture_stream(self) -> AsyncGenerator[HTTPRequest, None]:
+        """持续读取后台队列中的请求"""
+        if self.queue is None:
+            await self.start_capture()
+        while True:
+            item = await self.queue.get()
+            self.queue.task_done()
+            if item is _EOF:
+                self.queue.put_nowait(_EOF)
+                break
+            yield item
+
+    def backlog(self) -> int:
+        """后台队列中待分析的请求数"""
+        return self.queue.qsize() if self.queue else 0
+
+    def get_stats(self) -> Dict:
+        """获取中间件统计信息，包括检查过的请求的平均开销、未抽中请求的平均开销和最大开销（微秒）"""
+        stats = dict(self.stats)
+        stats['overhead_avg_us'] = stats['overhead_total_ns'] / (stats['inspected'] or 1) / 1000
+        stats['sampled_out_overhead_avg_us'] = stats['sampled_out_overhead_ns'] / (stats['sampled_out'] or 1) / 1000
+        stats['overhead_max_us'] = stats['overhead_max_ns'] / 1000
+        stats['queue_size'] = self.queue.qsize() if self.queue else 0
+        if self.sampler is not None:
+            stats['sampling'] = self.sampler.get_stats()
+        return stats
+
+    def _run_inline(self, scope, request: HTTPRequest):
+        """运行内联快速检测；平均耗时超出预算时跳过，只交给后台分析"""
+        if self._inline_ewma_ns > self.budget_ns:
+            self.stats['inline_skipped'] += 1
+            # 跳过期间让平均值逐步衰减，以便负载下降后恢复内联检测
+            self._inline_ewma_ns *= 0.9
+            return
+
+        detect_start = time.perf_counter_ns()
+        try:
+            # DetectionEngine提供快速检测模式时优先使用，时间预算同时作为检测截止时间
+            detect_fast = getattr(self.fast_engine, 'detect_fast', None)
+            if detect_fast is not None:
+                verdict = detect_fast(request, deadline=time.monotonic() + self.budget_ns / 1e9)
+            else:
+                verdict = self.fast_engine.detect_all(request)
+        except Exception:
+            return
+        elapsed = time.perf_counter_ns() - detect_start
+
+        self._inline_ewma_ns = 0.8 * self._inline_ewma_ns + 0.2 * elapsed
+        self.stats['inline_detections'] += 1
+        if elapsed > self.budget_ns:
+            self.stats['over_budget'] += 1
+        if verdict.is_attack:
+            self.stats['inline_attacks'] += 1
+        if getattr(verdict, 'incomplete', False):
+            self.stats['inline_incomplete'] += 1
+        scope.setdefault('state', {})['security_verdict'] = verdict
+
+    async def _read_body(self, receive):
+        """读取请求体（最多max_body_size字节），返回已读消息和遇到的非请求体消息"""
+        chunks = []
+        size = 0
+        while size < self.max_body_size:
+            message = await receive()
+            if message.get('type') != 'http.request':
+                return chunks, message
+            chunks.append(message)
+            size += len(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        return chunks, None
+
+    def _build_request(self, scope, body: bytes) -> HTTPRequest:
+        """从ASGI scope构建HTTPRequest"""
+        headers: Dict[str, str] = {}
+        for raw_key, raw_value in scope.get('headers', []):
+            key = raw_key.decode('latin-1')
+            value = raw_value.decode('latin-1')
+            headers[key] = f"{headers[key]}, {value}" if key in headers else value
+
+        path = scope.get('raw_path') or scope.get('path', '/').encode()
+        url = path.decode('latin-1') if isinstance(path, bytes) else path
+        query_string = scope.get('query_string', b'').decode('latin-1')
+        if query_string:
+            url = f"{url}?{query_string}"
+
+        client = scope.get('client') or ('unknown', 0)
+        source_ip = client[0]
+
+        return HTTPRequest(
+            url=url,
+            method=scope.get('method', 'GET'),
+            headers=headers,
+            params=parse_query_string(query_string),
+            body=body[:self.max_body_size].decode('utf-8', errors='replace') if body else None,
+            source_ip=source_ip,
+            timestamp=datetime.now(),
+            raw_data=f"{scope.get('method', 'GET')} {url}",
+            user_agent=headers.get('user-agent'),
+            source='asgi'
+        )
+
+    async def _analysis_worker(self):
+        """后台worker：按批取出请求交给检测进程池完整检测，保存安全事件"""
+        from app.pipeline.workers import detect_batch
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            requests = [request for request in batch if request is not _EOF]
+            try:
+                if requests:
+                    # CPU密集的完整检测在独立进程中执行，不与被保护的服务争用GIL
+                    results = await loop.run_in_executor(self._executor, detect_batch, requests)
+                    events = [
+                        SecurityEvent(
+                            event_id="",
+                            request=request,
+                            detection=detection,
+                            llm_analysis=None,
+                            created_at=datetime.now()
+                        )
+                        for request, detection in results if detection is not None
+                    ]
+                    self.stats['analysis_errors'] += len(results) - len(events)
+                    if events:
+                        await self.storage.save_events(events)
+                    self.stats['analyzed'] += len(events)
+            except Exception as e:
+                self.stats['analysis_errors'] += len(requests)
+                print(f"后台分析失败: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
@@ -0,0 +1,375 @@
+"""ModSecurity/Coraza审计日志捕获器
+
+访问日志不包含请求头和请求体，审计日志则完整记录了它们。
+本模块以流式方式逐行解析审计日志，生成带完整headers和body的HTTPRequest。
+
+支持ModSecurity 2.x/Coraza（分段边界 --<id>-A--）和ModSecurity 3.x（---<id>---A--）两种分段边界，
+以及两种SecAuditLogType：
+- Serial:     所有事务顺序写入同一个文件
+- Concurrent: 每个事务一个文件，主日志只是索引（每行末尾给出事务文件的相对路径）
+
+解析的分段（section）：
+- A: 审计头（时间、事务ID、源/目的地址）
+- B: 请求行与请求头
+- C: 请求体
+- F: 响应行与响应头（仅提取状态码）
+- H: 审计尾（规则命中消息，2.x为 "Message: "、3.x为 "ModSecurity: " 开头的行）
+其它分段被跳过。每个分段都有字节上限，单个事务的内存占用有界。
+"""
+
+import asyncio
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncGenerator, Dict, List, Optional
+
+import aiofiles
+
+from .base import BaseCapturer
+from .formats import parse_query_string
+from app.config.settings import settings
+from app.core.models import HTTPRequest
+from app.core.exceptions import CaptureException
+
+# 分段边界：--<boundary>-<section>--（2.x / Coraza）或 ---<boundary>---<section>--（3.x）
+BOUNDARY_PATTERN = re.compile(r'^(?:--([0-9A-Za-z]+)-|---([0-9A-Za-z]+)---)([A-Z])--\s*$')
+
+# H段中规则命中消息的前缀（2.x / 3.x）
+MESSAGE_PREFIXES = ('Message: ', 'ModSecurity: ')
+
+# A段中可能出现的时间格式（ModSecurity 2.x / 3.x / Coraza）
+A_TIMESTAMP_FORMATS = (
+    '%d/%b/%Y:%H:%M:%S %z',
+    '%d/%b/%Y:%H:%M:%S.%f %z',
+    '%a %b %d %H:%M:%S %Y',
+    '%Y/%m/%d %H:%M:%S',
+)
+
+# 单次读取的最大字符数：超长的单行请求体会被分块读入，避免一次性占用大量内存
+READ_CHUNK_SIZE = 64 * 1024
+
+# Concurrent索引行中事务文件的相对路径（如 /20231225/20231225-1000/20231225-100000-XYZ）
+INDEX_PATH_PATTERN = re.compile(r'\s(/\S+)\s+\d+\s+\d+\s+\S+\s*$')
+
+@dataclass
+class AuditLogEntry:
+    """一个审计日志事务"""
+    transaction_id: str = ""
+    timestamp: Optional[datetime] = None
+    source_ip: str = ""
+    source_port: int = 0
+    dest_ip: str = ""
+    dest_port: int = 0
+    method: str = ""
+    url: str = ""
+    protocol: str = ""
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: Optional[str] = None
+    response_status: Optional[int] = None
+    messages: List[str] = field(default_factory=list)
+    truncated: bool = False
+    raw_data: str = ""
+
+    def to_http_request(self) -> Optional[HTTPRequest]:
+        """转换为HTTPRequest，缺少请求行时返回None"""
+        if not self.method or not self.url:
+            return None
+
+        url_parts = self.url.split('?', 1)
+        params = parse_query_string(url_parts[1]) if len(url_parts) > 1 else {}
+        user_agent = None
+        for key, value in self.headers.items():
+            if key.lower() == 'user-agent':
+                user_agent = value
+                break
+
+        return HTTPRequest(
+            url=self.url,
+            method=self.method,
+            headers=self.headers,
+            params=params,
+            body=self.body,
+            source_ip=self.source_ip,
+            timestamp=self.timestamp or datetime.now(),
+            raw_data=self.raw_data,
+            user_agent=user_agent
+        )
+
+class AuditLogParser:
+    """审计日志增量解析器
+
+    逐行喂入，每当遇到Z段（事务结束）时返回一个完整的AuditLogEntry。
+    各分段超出上限的内容直接丢弃并标记truncated，不会累积在内存中。
+    """
+
+    def __init__(self, max_body_size: int = None, max_section_size: int = 64 * 1024):
+        self.max_body_size = max_body_size or settings.detection.max_request_size
+        self.max_section_size = max_section_size
+        self.entries_parsed = 0
+        self.entries_truncated = 0
+        self._reset()
+
+    def _reset(self):
+        self._entry: Optional[AuditLogEntry] = None
+        self._boundary: Optional[str] = None
+        self._section: Optional[str] = None
+        self._lines: List[str] = []
+        self._size = 0
+
+    def feed_line(self, line: str) -> Optional[AuditLogEntry]:
+        """喂入一行，事务结束时返回解析好的条目"""
+        match = BOUNDARY_PATTERN.match(line)
+        if match:
+            boundary = match.group(1) or match.group(2)
+            section = match.group(3)
+            if section == 'A' or self._entry is None or boundary != self._boundary:
+                # 新事务开始；上一个没有Z段的事务视为损坏，直接丢弃
+                self._reset()
+                self._entry = AuditLogEntry()
+                self._boundary = boundary
+            else:
+                self._finish_section()
+
+            if section == 'Z':
+                entry = self._entry
+                self._reset()
+                self.entries_parsed += 1
+                if entry.truncated:
+                    self.entries_truncated += 1
+                return entry
+
+            self._section = section
+            self._lines = []
+            self._size = 0
+            return None
+
+        if self._entry is None or self._section not in ('A', 'B', 'C', 'F', 'H'):
+            return None
+
+        limit = self.max_body_size if self._section == 'C' else self.max_section_size
+        remaining = limit - self._size
+        if remaining <= 0:
+            self._entry.truncated = True
+            return None
+        if len(line) > remaining:
+            line = line[:remaining]
+            self._entry.truncated = True
+        self._lines.append(line)
+        self._size += len(line)
+        return None
+
+    def _finish_section(self):
+        """处理已收集完的分段"""
+        entry = self._entry
+        section = self._section
+        lines = self._lines
+        if section == 'A':
+            self._parse_section_a(entry, ''.join(lines).strip())
+        elif section == 'B':
+            self._parse_section_b(entry, lines)
+        elif section == 'C':
+            body = ''.join(lines)
+            # 分段末尾的换行符是日志格式添加的，不属于请求体
+            entry.body = body[:-1] if body.endswith('\n') else body
+        elif section == 'F':
+            self._parse_section_f(entry, lines)
+        elif section == 'H':
+            for line in lines:
+                for prefix in MESSAGE_PREFIXES:
+                    if line.startswith(prefix):
+                        entry.messages.append(line.rstrip('\r\n')[len(prefix):])
+                        break
+        self._lines = []
+        self._size = 0
+
+    def _parse_section_a(self, entry: AuditLogEntry, text: str):
+        """[时间] 事务ID 源IP 源端口 目的IP 目的端口"""
+        if text.startswith('['):
+            end = text.find(']')
+            entry.timestamp = self._parse_timestamp(text[1:end])
+            text = text[end + 1:]
+        parts = text.split()
+        if len(parts) >= 5:
+            entry.transaction_id = parts[0]
+            entry.source_ip = parts[1]
+            entry.source_port = int(parts[2]) if parts[2].isdigit() else 0
+            entry.dest_ip = parts[3]
+            entry.dest_port = int(parts[4]) if parts[4].isdigit() else 0
+        entry.raw_data += f"A: {text.strip()}\n"
+
+    def _parse_section_b(self, entry: AuditLogEntry, lines: List[str]):
+        """请求行 + 请求头"""
+        request_line_seen = False
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if not line:
+                continue
+            if not request_line_seen:
+                parts = line.split(' ')
+                if len(parts) >= 2:
+                    entry.method = parts[0]
+                    entry.url = ' '.join(parts[1:-1]) if len(parts) > 2 else parts[1]
+                    entry.protocol = parts[-1] if len(parts) > 2 else ''
+                request_line_seen = True
+                entry.raw_data += line + '\n'
+                continue
+            if ':' in line:
+                key, value = line.split(':', 1)
+                key = key.strip()
+                value = value.strip()
+                if key in entry.headers:
+                    entry.headers[key] = f"{entry.headers[key]}, {value}"
+                else:
+                    entry.headers[key] = value
+            entry.raw_data += line + '\n'
+
+    def _parse_section_f(self, entry: AuditLogEntry, lines: List[str]):
+        """响应行，只提取状态码"""
+        for line in lines:
+            parts = line.split()
+            if parts and parts[0].startswith('HTTP/') and len(parts) > 1 and parts[1].isdigit():
+                entry.response_status = int(parts[1])
+                return
+
+    @staticmethod
+    def _parse_timestamp(text: str) -> Optional[datetime]:
+        for fmt in A_TIMESTAMP_FORMATS:
+            try:
+                return datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+        return None
+
+class AuditLogCapturer(BaseCapturer):
+    """审计日志捕获器
+
+    serial模式下直接流式读取审计日志；concurrent模式下读取索引文件，
+    再逐个流式读取storage_dir下的事务文件。任何情况下都不会把整个文件读入内存。
+    """
+
+    def __init__(
+        self,
+        log_file_path: str,
+        log_type: str = "serial",
+        storage_dir: str = None,
+        follow: bool = False,
+        max_body_size: int = None,
+        max_section_size: int = 64 * 1024
+    ):
+        """初始化审计日志捕获器
+
+        Args:
+            log_file_path: 审计日志（serial）或索引文件（concurrent）路径
+            log_type: serial / concurrent
+            storage_dir: concurrent模式下的SecAuditLogStorageDir，默认为索引文件所在目录
+            follow: 是否实时跟踪新写入的内容
+            max_body_size: 请求体最大保留字节数，默认取detection.max_request_size
+            max_section_size: 其它分段最大保留字节数
+        """
+        super().__init__()
+        if log_type not in ("serial", "concurrent"):
+            raise CaptureException(f"不支持的审计日志类型: {log_type}")
+
+        self.log_file_path = log_file_path
+        self.log_type = log_type
+        self.storage_dir = storage_dir or os.path.dirname(os.path.abspath(log_file_path))
+        self.follow = follow
+        self.file_position = 0
+        self.parser = AuditLogParser(max_body_size, max_section_size)
+        self.stats = {
+            'entries_parsed': 0,
+            'entries_truncated': 0,
+            'entries_skipped': 0,
+            'missing_files': 0
+        }
+
+    async def start_capture(self):
+        """开始捕获"""
+        self.is_running = True
+
+    async def stop_capture(self):
+        """停止捕获"""
+        self.is_running = False
+
+    async def capture_single(self) -> Optional[HTTPRequest]:
+        """从上次位置继续读取，直到得到一个完整事务"""
+        try:
+            async with aiofiles.open(self.log_file_path, 'r', errors='replace') as f:
+                await f.seek(self.file_position)
+                while True:
+                    line = await f.readline(READ_CHUNK_SIZE)
+                    if not line:
+                        return None
+                    self.file_position = await f.tell()
+                    request = await self._handle_line(line)
+                    if request:
+                        return request
+        except CaptureException:
+            raise
+        except Exception as e:
+            raise CaptureException(f"读取审计日志失败: {e}")
+
+    async def capture_stream(self) -> AsyncGenerator[HTTPRequest, None]:
+        """流式读取审计日志"""
+        try:
+            async with aiofiles.open(self.log_file_path, 'r', errors='replace') as f:
+                await f.seek(self.file_position)
+                while self.is_running:
+                    line = await f.readline(READ_CHUNK_SIZE)
+                    if not line:
+                        if not self.follow:
+                            break
+                        await asyncio.sleep(0.1)
+                        continue
+                    request = await self._handle_line(line)
+                    if request:
+                        yield request
+                self.file_position = await f.tell()
+        except CaptureException:
+            raise
+        except Exception as e:
+            raise CaptureException(f"读取审计日志流失败: {e}")
+
+    def get_stats(self) -> Dict:
+        """获取解析统计信息"""
+        stats = dict(self.stats)
+        stats['entries_parsed'] = self.parser.entries_parsed
+        stats['entries_truncated'] = self.parser.entries_truncated
+        return stats
+
+    async def _handle_line(self, line: str) -> Optional[HTTPRequest]:
+        """处理主日志中的一行"""
+        if self.log_type == "serial":
+            entry = self.parser.feed_line(line)
+            return self._entry_to_request(entry) if entry else None
+
+        match = INDEX_PATH_PATTERN.search(line.rstrip('\r\n'))
+        if not match:
+            self.stats['entries_skipped'] += 1
+            return None
+        return await self._read_transaction_file(match.group(1))
+
+    async def _read_transaction_file(self, relative_path: str) -> Optional[HTTPRequest]:
+        """流式读取concurrent模式下的单个事务文件"""
+        path = os.path.join(self.storage_dir, relative_path.lstrip('/'))
+        if not os.path.isfile(path):
+            self.stats['missing_files'] += 1
+            return None
+
+        async with aiofiles.open(path, 'r', errors='replace') as f:
+            while True:
+                line = await f.readline(READ_CHUNK_SIZE)
+                if not line:
+                    return None
+                entry = self.parser.feed_line(line)
+                if entry:
+                    return self._entry_to_request(entry)
+
+    def _entry_to_request(self, entry: AuditLogEntry) -> Optional[HTTPRequest]:
+        request = entry.to_http_request()
+        if request is None:
+            self.stats['entries_skipped'] += 1
+            return None
+        request.source = self.log_file_path
+        return request
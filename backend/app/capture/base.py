@@ -1,7 +1,8 @@
 """HTTP请求捕获基类"""
 
+import time
 from abc import ABC, abstractmethod
-from typing import AsyncGenerator, Optional
+from typing import AsyncGenerator, Callable, Optional
 from app.core.models import HTTPRequest
 from app.core.exceptions import CaptureException
 
@@ -11,6 +12,8 @@ class BaseCapturer(ABC):
     def __init__(self, config: dict = None):
         self.config = config or {}
         self.is_running = False
+        # 解析耗时回调（纳秒），由使用方设置（如SecurityCapturer记入parse延迟），只计解析，不含读取和等待新数据
+        self.parse_observer: Optional[Callable[[int], None]] = None
     
     @abstractmethod
     async def capture_single(self) -> Optional[HTTPRequest]:
@@ -32,6 +35,20 @@ class BaseCapturer(ABC):
         """停止捕获"""
         pass
     
+    def _timed_parse(self, parse: Callable, *args):
+        """调用解析函数，设置了parse_observer时报告这次解析的耗时"""
+        if self.parse_observer is None:
+            return parse(*args)
+        start = time.perf_counter_ns()
+        try:
+            return parse(*args)
+        finally:
+            self.parse_observer(time.perf_counter_ns() - start)
+    
+    def backlog(self) -> int:
+        """已捕获但尚未被消费的请求数，供自适应采样等按负载调节；没有内部缓冲的捕获器返回0"""
+        return 0
+    
     async def __aenter__(self):
         """异步上下文管理器入口"""
         await self.start_capture()
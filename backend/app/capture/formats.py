@@ -0,0 +1,221 @@
+"""日志格式注册表
+
+把"一行日志 -> HTTPRequest"的解析逻辑按格式名集中注册，
+供文件、网络等各类捕获器共用。
+
+内置格式：
+- combined: Apache Combined / Nginx默认访问日志
+- common:   Apache Common Log Format（无Referer和User-Agent）
+- json:     每行一个JSON对象的访问日志（Nginx log_format escape=json 等）
+- auto:     按行内容自动选择以上格式
+"""
+
+import json
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from app.core.models import HTTPRequest
+from app.core.exceptions import ParseException
+
+# 解析函数签名：输入一行日志，返回HTTPRequest或None（格式不匹配）
+LineParser = Callable[[str], Optional[HTTPRequest]]
+
+_FORMATS: Dict[str, LineParser] = {}
+
+# Apache Combined Log Format
+COMBINED_PATTERN = re.compile(
+    r'(\S+) \S+ \S+ \[([^\]]+)\] "(\S+) (\S+) \S+" (\d+) (\d+) "([^"]*)" "([^"]*)"'
+)
+# Apache Common Log Format，响应大小可能为"-"
+COMMON_PATTERN = re.compile(
+    r'(\S+) \S+ \S+ \[([^\]]+)\] "(\S+) (\S+) \S+" (\d+) (\d+|-)'
+)
+
+def register_format(name: str, parser: LineParser = None):
+    """注册日志格式，可直接调用也可作为装饰器使用"""
+    def decorator(func: LineParser) -> LineParser:
+        _FORMATS[name] = func
+        return func
+
+    if parser is not None:
+        return decorator(parser)
+    return decorator
+
+def get_format(name: str) -> LineParser:
+    """获取指定格式的解析函数"""
+    if name not in _FORMATS:
+        raise ParseException(f"未注册的日志格式: {name}")
+    return _FORMATS[name]
+
+def list_formats() -> List[str]:
+    """列出所有已注册的格式名"""
+    return list(_FORMATS.keys())
+
+def parse_line(line: str, log_format: str = "auto") -> Optional[HTTPRequest]:
+    """按指定格式解析一行日志"""
+    return get_format(log_format)(line)
+
+def parse_query_string(query_string: str) -> dict:
+    """解析查询字符串为参数字典（不做URL解码，保留原始载荷）"""
+    params = {}
+    if not query_string:
+        return params
+
+    for pair in query_string.split('&'):
+        if '=' in pair:
+            key, value = pair.split('=', 1)
+            params[key] = value
+        else:
+            params[pair] = ''
+    return params
+
+@lru_cache(maxsize=4096)
+def parse_clf_timestamp(timestamp_str: str) -> datetime:
+    """解析CLF时间戳
+
+    同一秒内的日志共享时间戳字符串，缓存后可省去大部分strptime开销。
+    """
+    return datetime.strptime(timestamp_str, '%d/%b/%Y:%H:%M:%S %z')
+
+def build_request(
+    line: str,
+    source_ip: str,
+    timestamp: datetime,
+    method: str,
+    url: str,
+    user_agent: str = None,
+    referer: str = None,
+    headers: Dict[str, str] = None,
+    body: str = None
+) -> HTTPRequest:
+    """根据解析出的字段构建HTTPRequest"""
+    url_parts = url.split('?', 1)
+    params = parse_query_string(url_parts[1]) if len(url_parts) > 1 else {}
+
+    if headers is None:
+        headers = {}
+        if user_agent is not None:
+            headers['User-Agent'] = user_agent
+        if referer is not None:
+            headers['Referer'] = referer
+
+    return HTTPRequest(
+        url=url,
+        method=method,
+        headers=headers,
+        params=params,
+        body=body,
+        source_ip=source_ip,
+        timestamp=timestamp,
+        raw_data=line,
+        user_agent=user_agent
+    )
+
+@register_format("combined")
+def parse_combined(line: str) -> Optional[HTTPRequest]:
+    """解析Apache Combined / Nginx默认格式"""
+    match = COMBINED_PATTERN.match(line)
+    if not match:
+        return None
+
+    try:
+        source_ip, timestamp_str, method, url, _, _, referer, user_agent = match.groups()
+        return build_request(
+            line,
+            source_ip=source_ip,
+            timestamp=parse_clf_timestamp(timestamp_str),
+            method=method,
+            url=url,
+            user_agent=user_agent,
+            referer=referer
+        )
+    except Exception:
+        return None
+
+@register_format("common")
+def parse_common(line: str) -> Optional[HTTPRequest]:
+    """解析Apache Common Log Format"""
+    match = COMMON_PATTERN.match(line)
+    if not match:
+        return None
+
+    try:
+        source_ip, timestamp_str, method, url = match.groups()[:4]
+        return build_request(
+            line,
+            source_ip=source_ip,
+            timestamp=parse_clf_timestamp(timestamp_str),
+            method=method,
+            url=url
+        )
+    except Exception:
+        return None
+
+# JSON日志中各字段的常见键名（按优先级）
+JSON_FIELD_ALIASES = {
+    'source_ip': ('remote_addr', 'client_ip', 'source_ip', 'ip'),
+    'timestamp': ('time_iso8601', 'timestamp', 'time', '@timestamp', 'time_local'),
+    'method': ('request_method', 'method'),
+    'url': ('request_uri', 'uri', 'url', 'path'),
+    'user_agent': ('http_user_agent', 'user_agent'),
+    'referer': ('http_referer', 'referer'),
+    'body': ('request_body', 'body'),
+}
+
+def _json_field(record: dict, field: str):
+    for key in JSON_FIELD_ALIASES[field]:
+        value = record.get(key)
+        if value not in (None, '', '-'):
+            return value
+    return None
+
+@register_format("json")
+def parse_json(line: str) -> Optional[HTTPRequest]:
+    """解析JSON格式访问日志"""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+
+    method = _json_field(record, 'method')
+    url = _json_field(record, 'url')
+    source_ip = _json_field(record, 'source_ip')
+    if not (method and url and source_ip):
+        return None
+
+    try:
+        timestamp_value = _json_field(record, 'timestamp')
+        if isinstance(timestamp_value, (int, float)):
+            timestamp = datetime.fromtimestamp(timestamp_value)
+        elif timestamp_value and '/' in timestamp_value:
+            timestamp = parse_clf_timestamp(timestamp_value)
+        elif timestamp_value:
+            timestamp = datetime.fromisoformat(timestamp_value.replace('Z', '+00:00'))
+        else:
+            timestamp = datetime.now()
+
+        headers = record.get('headers') if isinstance(record.get('headers'), dict) else None
+        return build_request(
+            line,
+            source_ip=source_ip,
+            timestamp=timestamp,
+            method=method,
+            url=url,
+            user_agent=_json_field(record, 'user_agent'),
+            referer=_json_field(record, 'referer'),
+            headers=headers,
+            body=_json_field(record, 'body')
+        )
+    except Exception:
+        return None
+
+@register_format("auto")
+def parse_auto(line: str) -> Optional[HTTPRequest]:
+    """根据行内容自动识别格式"""
+    if line.startswith('{'):
+        return parse_json(line)
+    return parse_combined(line) or parse_common(line)
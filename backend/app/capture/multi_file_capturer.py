@@ -0,0 +1,187 @@
+"""多文件汇聚捕获器
+
+监控一个目录或glob模式下的全部日志文件，每个文件一个轻量读取协程，
+所有请求汇入同一个有界队列，由下游共享的检测流程统一消费。
+"""
+
+import asyncio
+import glob
+import os
+from typing import AsyncGenerator, Dict, Optional
+
+from .base import BaseCapturer
+from .log_capturer import LogFileCapturer
+from app.core.models import HTTPRequest
+from app.core.exceptions import CaptureException
+
+# 队列结束标记：所有读取协程结束后放入队列，通知消费者退出
+_EOF = object()
+
+class MultiFileCapturer(BaseCapturer):
+    """多文件汇聚捕获器
+
+    - 每个日志文件对应一个LogFileCapturer读取协程
+    - 所有读取协程写入同一个有界asyncio.Queue
+    - 队列满时读取协程在put处等待，形成背压，检测跟不上时不会无限占用内存
+    - 每个HTTPRequest的source字段标记为其来源文件路径
+    - 多个消费者可以同时调用capture_stream()，共享同一个队列
+    """
+
+    def __init__(
+        self,
+        path: str,
+        pattern: str = "*.log",
+        follow: bool = False,
+        max_queue_size: int = 10000,
+        rescan_interval: float = 5.0,
+        log_format: str = "combined"
+    ):
+        """初始化多文件捕获器
+
+        Args:
+            path: 日志目录或glob模式（如 /var/log/nginx/*.access.log）
+            pattern: path为目录时使用的文件匹配模式
+            follow: 是否实时跟踪文件（实时模式下会定期发现新文件）
+            max_queue_size: 共享队列容量，决定背压阈值
+            rescan_interval: 实时模式下重新扫描新文件的间隔（秒）
+            log_format: 日志格式名，见formats.list_formats()
+        """
+        super().__init__()
+        if os.path.isdir(path):
+            self.glob_pattern = os.path.join(path, pattern)
+        else:
+            self.glob_pattern = path
+        self.follow = follow
+        self.max_queue_size = max_queue_size
+        self.rescan_interval = rescan_interval
+        self.log_format = log_format
+
+        self.queue: Optional[asyncio.Queue] = None
+        self._readers: Dict[str, asyncio.Task] = {}
+        self._file_capturers: Dict[str, LogFileCapturer] = {}
+        self._supervisor: Optional[asyncio.Task] = None
+        self._initial_files = set()
+        self.stats = {
+            'files_watched': 0,
+            'requests_enqueued': 0,
+            'backpressure_waits': 0,
+            'reader_errors': 0,
+            'per_file': {}
+        }
+
+    def discover_files(self):
+        """按glob模式列出当前匹配的文件"""
+        return sorted(p for p in glob.glob(self.glob_pattern) if os.path.isfile(p))
+
+    async def start_capture(self):
+        """开始捕获：启动所有文件的读取协程"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+
+        self._initial_files = set(self.discover_files())
+        for path in sorted(self._initial_files):
+            self._start_reader(path, seek_to_end=self.follow)
+
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    async def stop_capture(self):
+        """停止捕获：停止所有读取协程"""
+        self.is_running = False
+        for capturer in self._file_capturers.values():
+            await capturer.stop_capture()
+
+        tasks = list(self._readers.values())
+        if self._supervisor:
+            tasks.append(self._supervisor)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self._readers.clear()
+        self._file_capturers.clear()
+        self._supervisor = None
+
+    async def capture_single(self) -> Optional[HTTPRequest]:
+        """从共享队列取出一个请求，所有文件读完时返回None"""
+        if not self.is_running:
+            await self.start_capture()
+
+        item = await self.queue.get()
+        if item is _EOF:
+            # 放回结束标记，让其它消费者也能看到
+            self.queue.put_nowait(_EOF)
+            return None
+        return item
+
+    async def capture_stream(self) -> AsyncGenerator[HTTPRequest, None]:
+        """从共享队列持续产出请求
+
+        可被多个消费者并发调用，每个请求只会被其中一个消费者取到。
+        """
+        if not self.is_running:
+            await self.start_capture()
+
+        try:
+            while self.is_running:
+                item = await self.queue.get()
+                if item is _EOF:
+                    self.queue.put_nowait(_EOF)
+                    break
+                yield item
+        except Exception as e:
+            raise CaptureException(f"读取多文件日志流失败: {e}")
+
+    def backlog(self) -> int:
+        """共享队列中待消费的请求数"""
+        return self.queue.qsize() if self.queue else 0
+
+    def get_stats(self) -> Dict:
+        """获取捕获统计信息"""
+        stats = dict(self.stats)
+        stats['queue_size'] = self.queue.qsize() if self.queue else 0
+        stats['active_readers'] = sum(1 for t in self._readers.values() if not t.done())
+        return stats
+
+    def _start_reader(self, path: str, seek_to_end: bool):
+        """为单个文件启动读取协程"""
+        capturer = LogFileCapturer(
+            path, follow=self.follow, seek_to_end=seek_to_end, log_format=self.log_format
+        )
+        capturer.parse_observer = self.parse_observer
+        self._file_capturers[path] = capturer
+        self._readers[path] = asyncio.create_task(self._read_file(path, capturer))
+        self.stats['files_watched'] += 1
+        self.stats['per_file'].setdefault(path, 0)
+
+    async def _read_file(self, path: str, capturer: LogFileCapturer):
+        """读取单个文件并写入共享队列"""
+        await capturer.start_capture()
+        try:
+            async for request in capturer.capture_stream():
+                request.source = path
+                if self.queue.full():
+                    # 下游检测跟不上，等待队列腾出空间
+                    self.stats['backpressure_waits'] += 1
+                await self.queue.put(request)
+                self.stats['requests_enqueued'] += 1
+                self.stats['per_file'][path] += 1
+        except CaptureException as e:
+            # 单个文件出错（如被轮转删除）不影响其它文件
+            self.stats['reader_errors'] += 1
+            print(f"读取日志文件失败 {path}: {e}")
+
+    async def _supervise(self):
+        """监督读取协程：实时模式下发现新文件，批量模式下等待全部读完"""
+        if not self.follow:
+            await asyncio.gather(*self._readers.values(), return_exceptions=True)
+            await self.queue.put(_EOF)
+            return
+
+        while self.is_running:
+            await asyncio.sleep(self.rescan_interval)
+            for path in self.discover_files():
+                if path not in self._readers:
+                    # 启动后新出现的文件需要从头读取
+                    self._start_reader(path, seek_to_end=False)
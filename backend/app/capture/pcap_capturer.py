@@ -0,0 +1,676 @@
+"""离线抓包文件捕获器
+
+流式读取pcap/pcapng文件，重组TCP流并解析其中的HTTP/1.x请求（含chunked请求体）。
+
+设计要点：
+- 逐个数据包读取，不把文件载入内存，可处理远大于内存的抓包文件
+- 每个TCP方向一个重组缓冲区，乱序段和请求体都有字节上限
+- 流按空闲超时和最大流数量淘汰，淘汰时输出已完成请求头的未完成请求
+- 不做IP分片重组（分片的数据包会被计数后跳过）
+"""
+
+import asyncio
+import ipaddress
+import struct
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncGenerator, BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+from .base import BaseCapturer
+from .formats import parse_query_string
+from app.core.models import HTTPRequest
+from app.core.exceptions import CaptureException
+
+SEQ_MASK = 0xFFFFFFFF
+SEQ_HALF = 0x80000000
+
+# pcap文件头魔数 -> (字节序, 时间戳是否为纳秒)
+PCAP_MAGICS = {
+    b'\xd4\xc3\xb2\xa1': ('<', False),
+    b'\xa1\xb2\xc3\xd4': ('>', False),
+    b'\x4d\x3c\xb2\xa1': ('<', True),
+    b'\xa1\xb2\x3c\x4d': ('>', True),
+}
+PCAPNG_SHB = b'\x0a\x0d\x0d\x0a'
+
+# 链路层类型
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = {12, 14, 101}
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+HTTP_METHODS = {
+    b'GET', b'POST', b'PUT', b'DELETE', b'HEAD', b'OPTIONS', b'PATCH',
+    b'TRACE', b'CONNECT', b'PROPFIND', b'PROPPATCH', b'MKCOL', b'COPY', b'MOVE',
+    b'LOCK', b'UNLOCK'
+}
+
+# 单个数据包：(时间戳, 链路层类型, 数据)
+Packet = Tuple[float, int, bytes]
+
+# 流式读取时每处理这么多个数据包让出一次事件循环（与产出的HTTP请求数无关）
+YIELD_EVERY_PACKETS = 1000
+
+def iter_packets(stream: BinaryIO) -> Iterator[Packet]:
+    """从pcap或pcapng文件对象中逐个读取数据包"""
+    magic = stream.read(4)
+    if magic == PCAPNG_SHB:
+        yield from _iter_pcapng(stream, magic)
+    elif magic in PCAP_MAGICS:
+        yield from _iter_pcap(stream, magic)
+    else:
+        raise CaptureException("不是有效的pcap/pcapng文件")
+
+def _iter_pcap(stream: BinaryIO, magic: bytes) -> Iterator[Packet]:
+    endian, nanosecond = PCAP_MAGICS[magic]
+    header = stream.read(20)
+    if len(header) < 20:
+        return
+    linktype = struct.unpack(endian + 'I', header[16:20])[0] & 0x0FFFFFFF
+    record = struct.Struct(endian + 'IIII')
+    divisor = 1e9 if nanosecond else 1e6
+
+    while True:
+        record_header = stream.read(16)
+        if len(record_header) < 16:
+            return
+        ts_sec, ts_frac, incl_len, _ = record.unpack(record_header)
+        data = stream.read(incl_len)
+        if len(data) < incl_len:
+            return
+        yield ts_sec + ts_frac / divisor, linktype, data
+
+def _iter_pcapng(stream: BinaryIO, first: bytes) -> Iterator[Packet]:
+    endian = '<'
+    interfaces: List[Tuple[int, float]] = []  # (链路层类型, 时间戳单位)
+    block_type_raw = first
+
+    while True:
+        if block_type_raw is None:
+            block_type_raw = stream.read(4)
+        if len(block_type_raw) < 4:
+            return
+        length_raw = stream.read(4)
+        if len(length_raw) < 4:
+            return
+
+        if block_type_raw == PCAPNG_SHB:
+            bom = stream.read(4)
+            endian = '<' if bom == b'\x4d\x3c\x2b\x1a' else '>'
+            block_length = struct.unpack(endian + 'I', length_raw)[0]
+            body = stream.read(block_length - 12)
+            interfaces = []
+            block_type_raw = None
+            continue
+
+        block_type = struct.unpack(endian + 'I', block_type_raw)[0]
+        block_length = struct.unpack(endian + 'I', length_raw)[0]
+        if block_length < 12:
+            raise CaptureException("pcapng块长度无效")
+        body = stream.read(block_length - 8)
+        block_type_raw = None
+        if len(body) < block_length - 8:
+            return
+        body = body[:-4]  # 去掉结尾的重复长度字段
+
+        if block_type == 1:  # Interface Description Block
+            linktype = struct.unpack(endian + 'H', body[0:2])[0]
+            interfaces.append((linktype, _pcapng_ts_unit(body[8:], endian)))
+        elif block_type == 6:  # Enhanced Packet Block
+            interface_id, ts_high, ts_low, cap_len = struct.unpack(endian + 'IIII', body[0:16])
+            if interface_id >= len(interfaces):
+                continue
+            linktype, unit = interfaces[interface_id]
+            yield ((ts_high << 32) | ts_low) * unit, linktype, body[20:20 + cap_len]
+        elif block_type == 3:  # Simple Packet Block
+            if not interfaces:
+                continue
+            orig_len = struct.unpack(endian + 'I', body[0:4])[0]
+            yield 0.0, interfaces[0][0], body[4:4 + orig_len]
+        # 其它块（统计、名称解析等）忽略
+
+def _pcapng_ts_unit(options: bytes, endian: str) -> float:
+    """从IDB选项中读取if_tsresol，默认微秒"""
+    pos = 0
+    while pos + 4 <= len(options):
+        code, length = struct.unpack(endian + 'HH', options[pos:pos + 4])
+        if code == 0:
+            break
+        value = options[pos + 4:pos + 4 + length]
+        if code == 9 and value:
+            resolution = value[0]
+            if resolution & 0x80:
+                return 2.0 ** -(resolution & 0x7F)
+            return 10.0 ** -resolution
+        pos += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+def _format_ipv6(raw: bytes) -> str:
+    return str(ipaddress.IPv6Address(raw))
+
+class HTTPStreamParser:
+    """单方向TCP字节流上的HTTP/1.x请求增量解析器"""
+
+    def __init__(self, max_header_size: int, max_body_size: int):
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self.buffer = bytearray()
+        self.state = 'headers'
+        self.closed = False  # 非HTTP流或协议错误后不再解析
+        self._current: Optional[dict] = None
+        self._remaining = 0
+
+    def feed(self, data: bytes, timestamp: float) -> List[dict]:
+        """喂入按序的数据，返回解析完成的请求列表"""
+        if self.closed:
+            return []
+        self.buffer += data
+        completed = []
+
+        while not self.closed:
+            if self.state == 'headers':
+                if not self._parse_headers(timestamp):
+                    break
+                if self.state == 'headers':
+                    completed.append(self._finish())
+            elif self.state == 'body':
+                if not self._consume_body(len(self.buffer)):
+                    break
+                if self._remaining == 0:
+                    completed.append(self._finish())
+            elif self.state == 'chunk_size':
+                if not self._parse_chunk_size():
+                    break
+            elif self.state == 'chunk_data':
+                if not self._consume_chunk_data():
+                    break
+            elif self.state == 'chunk_trailer':
+                if not self._parse_chunk_trailer():
+                    break
+                completed.append(self._finish())
+
+        if self.closed:
+            self.buffer.clear()
+        return completed
+
+    def flush(self) -> Optional[dict]:
+        """流结束时返回已读完请求头但请求体不完整的请求"""
+        if self._current is not None and not self.closed:
+            self._current['incomplete'] = True
+            return self._finish()
+        return None
+
+    def _parse_headers(self, timestamp: float) -> bool:
+        # 跳过请求之间多余的空行
+        while self.buffer[:2] == b'\r\n':
+            del self.buffer[:2]
+        if not self.buffer:
+            return False
+        # 尽早识别非HTTP请求流（如响应方向），避免无谓缓冲
+        space = self.buffer.find(b' ', 0, 16)
+        if space < 0:
+            if len(self.buffer) >= 16:
+                self.closed = True
+            return False
+        if bytes(self.buffer[:space]) not in HTTP_METHODS:
+            self.closed = True
+            return False
+
+        end = self.buffer.find(b'\r\n\r\n')
+        if end < 0:
+            if len(self.buffer) > self.max_header_size:
+                self.closed = True
+            return False
+
+        head = bytes(self.buffer[:end]).decode('utf-8', errors='replace')
+        del self.buffer[:end + 4]
+        lines = head.split('\r\n')
+        parts = lines[0].split(' ')
+        if len(parts) < 3 or not parts[-1].startswith('HTTP/1.'):
+            self.closed = True
+            return False
+
+        headers: Dict[str, str] = {}
+        for line in lines[1:]:
+            if ':' not in line:
+                continue
+            key, value = line.split(':', 1)
+            key = key.strip()
+            value = value.strip()
+            headers[key] = f"{headers[key]}, {value}" if key in headers else value
+
+        self._current = {
+            'method': parts[0],
+            'target': ' '.join(parts[1:-1]),
+            'headers': headers,
+            'head': head,
+            'body': bytearray(),
+            'truncated': False,
+            'timestamp': timestamp,
+            'incomplete': False,
+        }
+
+        lowered = {k.lower(): v for k, v in headers.items()}
+        if 'chunked' in lowered.get('transfer-encoding', '').lower():
+            self.state = 'chunk_size'
+        else:
+            try:
+                length = int(lowered.get('content-length', '0') or 0)
+            except ValueError:
+                length = 0
+            if length > 0:
+                self._remaining = length
+                self.state = 'body'
+        return True
+
+    def _consume_body(self, available: int) -> bool:
+        count = min(available, self._remaining)
+        if count == 0:
+            return False
+        self._append_body(self.buffer[:count])
+        del self.buffer[:count]
+        self._remaining -= count
+        return True
+
+    def _append_body(self, data):
+        body = self._current['body']
+        room = self.max_body_size - len(body)
+        if room >= len(data):
+            body += data
+        else:
+            if room > 0:
+                body += data[:room]
+            self._current['truncated'] = True
+
+    def _parse_chunk_size(self) -> bool:
+        end = self.buffer.find(b'\r\n')
+        if end < 0:
+            if len(self.buffer) > 1024:
+                self.closed = True
+            return False
+        line = bytes(self.buffer[:end]).split(b';', 1)[0].strip()
+        del self.buffer[:end + 2]
+        try:
+            size = int(line, 16)
+        except ValueError:
+            self.closed = True
+            return False
+        if size == 0:
+            self.state = 'chunk_trailer'
+        else:
+            self._remaining = size
+            self.state = 'chunk_data'
+        return True
+
+    def _consume_chunk_data(self) -> bool:
+        if self._remaining > 0:
+            return self._consume_body(len(self.buffer))
+        # 块数据后的CRLF
+        if len(self.buffer) < 2:
+            return False
+        del self.buffer[:2]
+        self.state = 'chunk_size'
+        return True
+
+    def _parse_chunk_trailer(self) -> bool:
+        if self.buffer[:2] == b'\r\n':
+            del self.buffer[:2]
+            return True
+        end = self.buffer.find(b'\r\n\r\n')
+        if end < 0:
+            if len(self.buffer) > self.max_header_size:
+                self.closed = True
+            return False
+        del self.buffer[:end + 4]
+        return True
+
+    def _finish(self) -> dict:
+        current = self._current
+        self._current = None
+        self._remaining = 0
+        self.state = 'headers'
+        return current
+
+class _TCPStream:
+    """单方向TCP流的按序重组"""
+
+    __slots__ = ('client_ip', 'next_seq', 'pending', 'pending_bytes', 'parser', 'last_seen')
+
+    def __init__(self, client_ip: str, parser: HTTPStreamParser):
+        self.client_ip = client_ip
+        self.next_seq: Optional[int] = None
+        self.pending: Dict[int, bytes] = {}
+        self.pending_bytes = 0
+        self.parser = parser
+        self.last_seen = 0.0
+
+class PcapCapturer(BaseCapturer):
+    """pcap/pcapng离线HTTP请求捕获器
+
+    可直接作为SecurityCapturer(capturer=...)的数据源，
+    也可以用于batch_analyze_log批量分析。
+    """
+
+    def __init__(
+        self,
+        pcap_file_path: str,
+        server_ports: Optional[Set[int]] = None,
+        flow_timeout: float = 120.0,
+        max_flows: int = 10000,
+        max_flow_buffer: int = 256 * 1024,
+        max_header_size: int = 64 * 1024,
+        max_body_size: int = 1024 * 1024
+    ):
+        """初始化抓包捕获器
+
+        Args:
+            pcap_file_path: pcap或pcapng文件路径
+            server_ports: 只解析发往这些端口的流量，None表示全部端口
+            flow_timeout: 流空闲超时（按抓包时间计，秒）
+            max_flows: 同时跟踪的最大流数量，超出时淘汰最久未活动的流
+            max_flow_buffer: 每个流乱序段缓冲的最大字节数，超出则放弃该流
+            max_header_size: 请求头最大字节数
+            max_body_size: 请求体最大保留字节数，超出部分丢弃
+        """
+        super().__init__()
+        self.pcap_file_path = pcap_file_path
+        self.server_ports = set(server_ports) if server_ports else None
+        self.flow_timeout = flow_timeout
+        self.max_flows = max_flows
+        self.max_flow_buffer = max_flow_buffer
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+
+        self._flows: "OrderedDict[tuple, _TCPStream]" = OrderedDict()
+        self._iterator: Optional[Iterator[HTTPRequest]] = None
+        self._last_sweep = 0.0
+        self.stats = {
+            'packets': 0,
+            'tcp_segments': 0,
+            'non_tcp_packets': 0,
+            'ip_fragments_skipped': 0,
+            'requests': 0,
+            'truncated_bodies': 0,
+            'flows_timed_out': 0,
+            'flows_evicted': 0,
+            'flows_dropped_overflow': 0,
+        }
+
+    async def start_capture(self):
+        """开始捕获"""
+        self.is_running = True
+
+    async def stop_capture(self):
+        """停止捕获"""
+        self.is_running = False
+
+    async def capture_single(self) -> Optional[HTTPRequest]:
+        """读取下一个HTTP请求，文件读完返回None"""
+        if self._iterator is None:
+            self._iterator = self._iter_requests()
+        try:
+            return next(request for request in self._iterator if request is not None)
+        except StopIteration:
+            return None
+        except CaptureException:
+            raise
+        except Exception as e:
+            raise CaptureException(f"读取抓包文件失败: {e}")
+
+    async def capture_stream(self) -> AsyncGenerator[HTTPRequest, None]:
+        """流式产出抓包文件中的HTTP请求"""
+        if self._iterator is None:
+            self._iterator = self._iter_requests()
+        try:
+            for request in self._iterator:
+                if not self.is_running:
+                    break
+                if request is None:
+                    # 大文件解析是同步的，按处理的数据包数定期让出事件循环，非HTTP流量为主时也不会阻塞
+                    await asyncio.sleep(0)
+                    continue
+                yield request
+        except CaptureException:
+            raise
+        except Exception as e:
+            raise CaptureException(f"读取抓包流失败: {e}")
+
+    def get_stats(self) -> Dict:
+        """获取解析统计信息"""
+        stats = dict(self.stats)
+        stats['active_flows'] = len(self._flows)
+        return stats
+
+    def _iter_requests(self) -> Iterator[Optional[HTTPRequest]]:
+        """同步生成器：读取数据包 -> 重组 -> 解析HTTP；每YIELD_EVERY_PACKETS个数据包产出一个None，供调用方让出事件循环"""
+        with open(self.pcap_file_path, 'rb') as f:
+            for timestamp, linktype, data in iter_packets(f):
+                self.stats['packets'] += 1
+                if self.stats['packets'] % YIELD_EVERY_PACKETS == 0:
+                    yield None
+                for request in self._handle_packet(timestamp, linktype, data):
+                    yield request
+                if timestamp - self._last_sweep > 1.0:
+                    self._last_sweep = timestamp
+                    yield from self._expire_flows(timestamp)
+
+        # 文件结束，输出所有流中未完成的请求
+        for key in list(self._flows):
+            yield from self._close_flow(key)
+
+    def _handle_packet(self, timestamp: float, linktype: int, data: bytes) -> List[HTTPRequest]:
+        parsed = self._parse_tcp(linktype, data)
+        if parsed is None:
+            self.stats['non_tcp_packets'] += 1
+            return []
+
+        src_ip, dst_ip, sport, dport, seq, flags, payload = parsed
+        if self.server_ports is not None and dport not in self.server_ports:
+            return []
+        self.stats['tcp_segments'] += 1
+
+        key = (src_ip, sport, dst_ip, dport)
+        stream = self._flows.get(key)
+        if stream is None:
+            if not payload and not flags & 0x02:
+                return []
+            stream = _TCPStream(src_ip, HTTPStreamParser(self.max_header_size, self.max_body_size))
+            self._flows[key] = stream
+            if len(self._flows) > self.max_flows:
+                oldest = next(iter(self._flows))
+                self.stats['flows_evicted'] += 1
+                results = list(self._close_flow(oldest))
+            else:
+                results = []
+        else:
+            self._flows.move_to_end(key)
+            results = []
+        stream.last_seen = timestamp
+
+        if flags & 0x02:  # SYN
+            stream.next_seq = (seq + 1) & SEQ_MASK
+            return results
+        if payload:
+            results.extend(self._reassemble(stream, key, seq, payload, timestamp))
+        if flags & 0x05:  # FIN 或 RST
+            results.extend(self._close_flow(key))
+        return results
+
+    def _reassemble(self, stream: _TCPStream, key: tuple, seq: int, payload: bytes, timestamp: float) -> List[HTTPRequest]:
+        if stream.next_seq is None:
+            # 抓包开始时连接已建立，从看到的第一个数据段开始
+            stream.next_seq = seq
+
+        diff = (seq - stream.next_seq) & SEQ_MASK
+        if diff >= SEQ_HALF:
+            # 重传或部分重叠：只取新数据
+            overlap = (stream.next_seq - seq) & SEQ_MASK
+            if overlap >= len(payload):
+                return []
+            payload = payload[overlap:]
+            diff = 0
+
+        if diff > 0:
+            # 乱序到达，暂存等待缺口补齐
+            if seq not in stream.pending:
+                stream.pending[seq] = payload
+                stream.pending_bytes += len(payload)
+                if stream.pending_bytes > self.max_flow_buffer:
+                    self.stats['flows_dropped_overflow'] += 1
+                    self._flows.pop(key, None)
+            return []
+
+        results = self._deliver(stream, payload, timestamp)
+        while stream.pending:
+            progressed = False
+            for pending_seq in list(stream.pending):
+                offset = (pending_seq - stream.next_seq) & SEQ_MASK
+                if offset != 0 and offset < SEQ_HALF:
+                    continue
+                data = stream.pending.pop(pending_seq)
+                stream.pending_bytes -= len(data)
+                overlap = 0 if offset == 0 else (stream.next_seq - pending_seq) & SEQ_MASK
+                if overlap < len(data):
+                    results.extend(self._deliver(stream, data[overlap:], timestamp))
+                progressed = True
+            if not progressed:
+                break
+        return results
+
+    def _deliver(self, stream: _TCPStream, data: bytes, timestamp: float) -> List[HTTPRequest]:
+        stream.next_seq = (stream.next_seq + len(data)) & SEQ_MASK
+        return [self._build_request(stream.client_ip, item) for item in stream.parser.feed(data, timestamp)]
+
+    def _close_flow(self, key: tuple) -> Iterator[HTTPRequest]:
+        stream = self._flows.pop(key, None)
+        if stream is None:
+            return
+        item = stream.parser.flush()
+        if item is not None:
+            yield self._build_request(stream.client_ip, item)
+
+    def _expire_flows(self, now: float) -> Iterator[HTTPRequest]:
+        # OrderedDict按最近活动排序，从头部检查即可
+        while self._flows:
+            key, stream = next(iter(self._flows.items()))
+            if now - stream.last_seen <= self.flow_timeout:
+                break
+            self.stats['flows_timed_out'] += 1
+            yield from self._close_flow(key)
+
+    def _build_request(self, client_ip: str, item: dict) -> HTTPRequest:
+        self.stats['requests'] += 1
+        if item['truncated']:
+            self.stats['truncated_bodies'] += 1
+
+        target = item['target']
+        url_parts = target.split('?', 1)
+        params = parse_query_string(url_parts[1]) if len(url_parts) > 1 else {}
+        headers = item['headers']
+        user_agent = next((v for k, v in headers.items() if k.lower() == 'user-agent'), None)
+        body = bytes(item['body']).decode('utf-8', errors='replace') if item['body'] else None
+
+        return HTTPRequest(
+            url=target,
+            method=item['method'],
+            headers=headers,
+            params=params,
+            body=body,
+            source_ip=client_ip,
+            timestamp=datetime.fromtimestamp(item['timestamp']),
+            raw_data=item['head'],
+            user_agent=user_agent,
+            source=self.pcap_file_path
+        )
+
+    def _parse_tcp(self, linktype: int, data: bytes):
+        """解析链路层/IP/TCP头，返回(源IP, 目的IP, 源端口, 目的端口, seq, flags, payload)"""
+        ip_version, offset = self._link_payload(linktype, data)
+        if ip_version == 4:
+            if len(data) < offset + 20:
+                return None
+            ihl = (data[offset] & 0x0F) * 4
+            total_length = struct.unpack('!H', data[offset + 2:offset + 4])[0]
+            frag = struct.unpack('!H', data[offset + 6:offset + 8])[0]
+            if frag & 0x3FFF:
+                self.stats['ip_fragments_skipped'] += 1
+                return None
+            if data[offset + 9] != 6:
+                return None
+            src_ip = '.'.join(str(b) for b in data[offset + 12:offset + 16])
+            dst_ip = '.'.join(str(b) for b in data[offset + 16:offset + 20])
+            end = offset + total_length if total_length else len(data)
+            tcp_offset = offset + ihl
+        elif ip_version == 6:
+            if len(data) < offset + 40:
+                return None
+            payload_length = struct.unpack('!H', data[offset + 4:offset + 6])[0]
+            next_header = data[offset + 6]
+            src_ip = _format_ipv6(data[offset + 8:offset + 24])
+            dst_ip = _format_ipv6(data[offset + 24:offset + 40])
+            end = offset + 40 + payload_length
+            tcp_offset = offset + 40
+            # 跳过扩展头（逐跳、路由、目的选项）
+            while next_header in (0, 43, 60) and tcp_offset + 8 <= len(data):
+                next_header = data[tcp_offset]
+                tcp_offset += (data[tcp_offset + 1] + 1) * 8
+            if next_header == 44:
+                self.stats['ip_fragments_skipped'] += 1
+                return None
+            if next_header != 6:
+                return None
+        else:
+            return None
+
+        if len(data) < tcp_offset + 20:
+            return None
+        sport, dport, seq = struct.unpack('!HHI', data[tcp_offset:tcp_offset + 8])
+        data_offset = (data[tcp_offset + 12] >> 4) * 4
+        flags = data[tcp_offset + 13]
+        payload = data[tcp_offset + data_offset:end]
+        return src_ip, dst_ip, sport, dport, seq, flags, payload
+
+    @staticmethod
+    def _link_payload(linktype: int, data: bytes) -> Tuple[Optional[int], int]:
+        """返回(IP版本, IP头偏移)"""
+        if linktype == LINKTYPE_ETHERNET:
+            if len(data) < 14:
+                return None, 0
+            offset = 12
+            ethertype = struct.unpack('!H', data[offset:offset + 2])[0]
+            while ethertype in (0x8100, 0x88A8) and len(data) >= offset + 6:
+                offset += 4
+                ethertype = struct.unpack('!H', data[offset:offset + 2])[0]
+            offset += 2
+        elif linktype == LINKTYPE_LINUX_SLL:
+            if len(data) < 16:
+                return None, 0
+            ethertype = struct.unpack('!H', data[14:16])[0]
+            offset = 16
+        elif linktype == LINKTYPE_LINUX_SLL2:
+            if len(data) < 20:
+                return None, 0
+            ethertype = struct.unpack('!H', data[0:2])[0]
+            offset = 20
+        elif linktype == LINKTYPE_NULL:
+            if len(data) < 4:
+                return None, 0
+            family = struct.unpack('<I', data[0:4])[0]
+            if family > 0xFFFF:
+                family = struct.unpack('>I', data[0:4])[0]
+            return (4 if family == 2 else 6 if family in (24, 28, 30) else None), 4
+        elif linktype in LINKTYPE_RAW or linktype in (LINKTYPE_IPV4, LINKTYPE_IPV6):
+            if not data:
+                return None, 0
+            return data[0] >> 4, 0
+        else:
+            return None, 0
+
+        if ethertype == 0x0800:
+            return 4, offset
+        if ethertype == 0x86DD:
+            return 6, offset
+        return None, offset
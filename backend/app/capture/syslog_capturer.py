@@ -0,0 +1,291 @@
+"""网络日志捕获器
+
+运行asyncio服务端，接收边缘代理通过syslog(UDP/TCP)或纯TCP行流发送的访问日志。
+
+支持的报文格式：
+- RFC 5424: <PRI>1 TIMESTAMP HOSTNAME APP-NAME PROCID MSGID SD MSG
+- RFC 3164: <PRI>Mmm dd hh:mm:ss HOSTNAME TAG: MSG
+- 无syslog头的原始日志行
+
+TCP分帧同时支持换行分隔和RFC 6587的八位组计数（"LEN SP MSG"）。
+"""
+
+import asyncio
+import re
+from collections import deque
+from typing import AsyncGenerator, Dict, Optional, Tuple
+
+from .base import BaseCapturer
+from .formats import get_format
+from app.core.models import HTTPRequest
+from app.core.exceptions import CaptureException
+
+# RFC 5424: <PRI>VERSION TIMESTAMP HOSTNAME APP-NAME PROCID MSGID
+RFC5424_HEADER = re.compile(r'<\d{1,3}>\d{1,2} \S+ (\S+) \S+ \S+ \S+ ')
+# RFC 3164: <PRI>Mmm dd hh:mm:ss HOSTNAME TAG:
+RFC3164_HEADER = re.compile(r'<\d{1,3}>[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d (\S+) [^:\s]*: ?')
+
+def strip_syslog_header(message: str) -> Tuple[str, Optional[str]]:
+    """去掉syslog头，返回(日志正文, 发送主机名)"""
+    if not message.startswith('<'):
+        return message, None
+
+    match = RFC5424_HEADER.match(message)
+    if match:
+        rest = message[match.end():]
+        # 跳过STRUCTURED-DATA："-" 或若干个 [..] 元素
+        if rest.startswith('- '):
+            rest = rest[2:]
+        elif rest == '-':
+            rest = ''
+        elif rest.startswith('['):
+            depth_end = _skip_structured_data(rest)
+            rest = rest[depth_end:].lstrip(' ')
+        if rest.startswith('\ufeff'):
+            rest = rest[1:]
+        return rest, match.group(1)
+
+    match = RFC3164_HEADER.match(message)
+    if match:
+        return message[match.end():], match.group(1)
+
+    # 只有PRI部分的非标准报文
+    end = message.find('>')
+    return message[end + 1:], None
+
+def _skip_structured_data(text: str) -> int:
+    """返回STRUCTURED-DATA结束位置（处理转义的 \\] ）"""
+    pos = 0
+    while pos < len(text) and text[pos] == '[':
+        pos += 1
+        while pos < len(text):
+            char = text[pos]
+            if char == '\\':
+                pos += 2
+                continue
+            pos += 1
+            if char == ']':
+                break
+    return pos
+
+class _SyslogUDPProtocol(asyncio.DatagramProtocol):
+    """UDP syslog协议：每个数据报是一条消息"""
+
+    def __init__(self, capturer: "SyslogCapturer"):
+        self.capturer = capturer
+
+    def datagram_received(self, data: bytes, addr):
+        self.capturer._enqueue(data.rstrip(b'\r\n'), addr[0])
+
+class SyslogCapturer(BaseCapturer):
+    """Syslog/TCP网络日志捕获器
+
+    接收到的原始消息先进入有界缓冲区，由capture_stream()在消费端统一去头、解析。
+    缓冲区满时直接丢弃新消息并计数，保证接收端不会拖慢发送方或耗尽内存。
+    """
+
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 5140,
+        protocol: str = "tcp",
+        log_format: str = "auto",
+        max_buffer_size: int = 100000,
+        max_message_size: int = 64 * 1024
+    ):
+        """初始化网络日志捕获器
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0表示由系统分配
+            protocol: tcp / udp / both
+            log_format: 消息正文的日志格式名
+            max_buffer_size: 待解析消息缓冲区上限
+            max_message_size: 单条消息最大字节数，超出的TCP帧会被截断丢弃
+        """
+        super().__init__()
+        if protocol not in ("tcp", "udp", "both"):
+            raise CaptureException(f"不支持的协议: {protocol}")
+
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.log_format = log_format
+        self.max_buffer_size = max_buffer_size
+        self.max_message_size = max_message_size
+        self._parser = get_format(log_format)
+
+        self._buffer: deque = deque()
+        self._data_ready = asyncio.Event()
+        self._tcp_server: Optional[asyncio.AbstractServer] = None
+        self._udp_transport: Optional[asyncio.DatagramTransport] = None
+        self.tcp_port: Optional[int] = None
+        self.udp_port: Optional[int] = None
+
+        self.stats = {
+            'messages_received': 0,
+            'messages_parsed': 0,
+            'parse_errors': 0,
+            'dropped_overflow': 0,
+            'dropped_oversize': 0,
+            'connections': 0
+        }
+
+    async def start_capture(self):
+        """启动TCP/UDP监听"""
+        if self.is_running:
+            return
+        self._data_ready = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        try:
+            if self.protocol in ("tcp", "both"):
+                self._tcp_server = await asyncio.start_server(
+                    self._handle_tcp, self.host, self.port
+                )
+                self.tcp_port = self._tcp_server.sockets[0].getsockname()[1]
+
+            if self.protocol in ("udp", "both"):
+                self._udp_transport, _ = await loop.create_datagram_endpoint(
+                    lambda: _SyslogUDPProtocol(self),
+                    local_addr=(self.host, self.port)
+                )
+                self.udp_port = self._udp_transport.get_extra_info('sockname')[1]
+        except OSError as e:
+            await self.stop_capture()
+            raise CaptureException(f"启动网络监听失败: {e}")
+
+        self.is_running = True
+
+    async def stop_capture(self):
+        """停止监听并唤醒等待中的消费者"""
+        self.is_running = False
+        if self._tcp_server:
+            self._tcp_server.close()
+            await self._tcp_server.wait_closed()
+            self._tcp_server = None
+        if self._udp_transport:
+            self._udp_transport.close()
+            self._udp_transport = None
+        self._data_ready.set()
+
+    async def capture_single(self) -> Optional[HTTPRequest]:
+        """取出并解析一条消息，停止后缓冲区为空时返回None"""
+        while True:
+            if not self._buffer:
+                if not self.is_running:
+                    return None
+                self._data_ready.clear()
+                await self._data_ready.wait()
+                continue
+
+            raw, peer = self._buffer.popleft()
+            request = self._timed_parse(self._parse_message, raw, peer, self._parser)
+            if request is not None:
+                return request
+
+    async def capture_stream(self) -> AsyncGenerator[HTTPRequest, None]:
+        """持续产出解析后的请求，停止捕获后把缓冲区剩余消息处理完再退出"""
+        buffer = self._buffer
+        parser = self._parser
+        while True:
+            if not buffer:
+                if not self.is_running:
+                    break
+                self._data_ready.clear()
+                await self._data_ready.wait()
+                continue
+
+            # 批量处理已缓冲的消息，减少每条消息的事件循环切换
+            while buffer:
+                raw, peer = buffer.popleft()
+                request = self._timed_parse(self._parse_message, raw, peer, parser)
+                if request is not None:
+                    yield request
+
+    def backlog(self) -> int:
+        """缓冲区中待解析的消息数"""
+        return len(self._buffer)
+
+    def get_stats(self) -> Dict:
+        """获取接收统计信息"""
+        stats = dict(self.stats)
+        stats['buffer_size'] = len(self._buffer)
+        return stats
+
+    def _enqueue(self, raw: bytes, peer: str):
+        """放入缓冲区，满时丢弃并计数"""
+        self.stats['messages_received'] += 1
+        if len(self._buffer) >= self.max_buffer_size:
+            self.stats['dropped_overflow'] += 1
+            return
+        self._buffer.append((raw, peer))
+        self._data_ready.set()
+
+    def _parse_message(self, raw: bytes, peer: str, parser) -> Optional[HTTPRequest]:
+        """去syslog头并按格式注册表解析"""
+        try:
+            message = raw.decode('utf-8', errors='replace')
+            body, hostname = strip_syslog_header(message)
+            request = parser(body)
+        except Exception:
+            request = None
+
+        if request is None:
+            self.stats['parse_errors'] += 1
+            return None
+
+        request.source = f"syslog://{hostname or peer}"
+        self.stats['messages_parsed'] += 1
+        return request
+
+    async def _handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个TCP连接：按块读取后批量分帧"""
+        peer = (writer.get_extra_info('peername') or ('unknown',))[0]
+        self.stats['connections'] += 1
+        pending = b''
+
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                pending = self._split_frames(pending + chunk, peer)
+                if len(pending) > self.max_message_size:
+                    # 没有分隔符的超长帧，丢弃以限制内存
+                    self.stats['dropped_oversize'] += 1
+                    pending = b''
+            if pending.strip():
+                self._enqueue(pending.rstrip(b'\r\n'), peer)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def _split_frames(self, data: bytes, peer: str) -> bytes:
+        """从data中切出完整帧放入缓冲区，返回未完成的剩余部分"""
+        pos = 0
+        length = len(data)
+        while pos < length:
+            first = data[pos:pos + 1]
+            if first.isdigit():
+                # RFC 6587 八位组计数："LEN SP MSG"
+                space = data.find(b' ', pos, pos + 10)
+                if space > pos and data[pos:space].isdigit():
+                    msg_len = int(data[pos:space])
+                    end = space + 1 + msg_len
+                    if end > length:
+                        break
+                    self._enqueue(data[space + 1:end], peer)
+                    pos = end
+                    continue
+
+            newline = data.find(b'\n', pos)
+            if newline < 0:
+                break
+            frame = data[pos:newline].rstrip(b'\r')
+            if frame:
+                self._enqueue(frame, peer)
+            pos = newline + 1
+
+        return data[pos:]
@@ -29,10 +29,31 @@ CONFIG_DATA = load_config_file()
 
 class DatabaseSettings(BaseSettings):
     """数据库配置"""
+    backend: str = Field(default="memory")  # 存储后端: memory/sqlite/sqlalchemy
     url: str = Field(default="sqlite:///security_events.db")
     echo: bool = Field(default=False)
     pool_size: int = Field(default=10)
     max_overflow: int = Field(default=20)
+    pool_timeout: float = Field(default=30.0)  # 等待空闲连接的秒数
+    pool_recycle: int = Field(default=1800)  # 连接最长复用秒数，避免被服务端断开
+    write_behind: bool = Field(default=False)  # 检测接口写入先进缓冲，后台批量写入
+    write_behind_batch_size: int = Field(default=500)
+    write_behind_flush_ms: float = Field(default=20.0)
+    write_behind_max_pending: int = Field(default=10000)
+    statistics_rollups: Optional[bool] = Field(default=None)  # 统计接口使用预聚合的时间桶，None时多进程共享的后端不开启
+    rollup_minute_retention_hours: float = Field(default=2.0)
+    rollup_hour_retention_days: float = Field(default=8.0)
+    archive_dir: Optional[str] = Field(default=None)  # 列式事件归档目录，/statistics/archive/*在其上查询
+    partition_by: Optional[str] = Field(default=None)  # 按时间分区保存事件: day/hour，None不分区
+    partition_dir: str = Field(default="partitions")  # sqlite分区文件目录
+    attack_retention_days: float = Field(default=180.0)  # 分区存储中攻击事件的保留天数
+    benign_retention_days: float = Field(default=7.0)  # 分区存储中良性请求的保留天数，之后只保留统计计数
+    raw_retention_days: float = Field(default=7.0)  # 分区存储中原始请求（请求头、请求体、原始日志）的保留天数
+    tiered_persistence: bool = Field(default=False)  # 只完整保存攻击和抽样的良性请求，其余良性请求只计数
+    benign_sample_rate: float = Field(default=0.01)
+    benign_buffer_size: int = Field(default=10000)  # 只计数的良性请求在内存环形缓冲中保留的数量，0为不缓冲
+    benign_buffer_seconds: float = Field(default=900.0)
+    benign_counters_path: Optional[str] = Field(default=None)  # 只计数请求的按小时计数文件
     
     def __init__(self, **kwargs):
         # 从配置文件读取数据库配置
@@ -71,6 +92,7 @@ class DetectionSettings(BaseSettings):
     enable_xss_detection: bool = Field(default=True)
     enable_cmd_detection: bool = Field(default=True)
     max_request_size: int = Field(default=1024*1024)
+    inline_timeout_ms: float = Field(default=50.0)  # 同步检测接口的检测时间上限
     
     def __init__(self, **kwargs):
         # 从配置文件读取检测配置
@@ -29,6 +29,7 @@ class HTTPRequest:
     timestamp: datetime
     raw_data: str
     user_agent: Optional[str] = None
+    source: Optional[str] = None  # 请求来源标识（如日志文件路径）
 
 @dataclass  
 class DetectionResult:
@@ -39,6 +40,7 @@ class DetectionResult:
     details: Dict[str, Any]  # 详细检测信息
     payload: Optional[str]   # 攻击载荷
     matched_rules: List[str] # 匹配的规则
+    incomplete: bool = False # 因超过截止时间只完成了部分检测
 
 @dataclass
 class LLMAnalysis:
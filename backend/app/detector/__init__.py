@@ -3,10 +3,15 @@
 from .base import BaseDetector, PatternDetector
 from .coraza_detector import CorazaDetector
 from .detection_engine import DetectionEngine
+from .deep_analysis import DeepAnalysisScheduler
+from .sampler import AdaptiveSampler, SamplingDecision
 
 __all__ = [
     "BaseDetector",
     "PatternDetector", 
     "CorazaDetector",
-    "DetectionEngine"
+    "DetectionEngine",
+    "DeepAnalysisScheduler",
+    "AdaptiveSampler",
+    "SamplingDecision"
 ] 
\ No newline at end of file
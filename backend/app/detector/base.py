@@ -8,6 +8,9 @@ from app.core.exceptions import DetectionException
 class BaseDetector(ABC):
     """检测器基类"""
     
+    # detect是否接受deadline参数（在规则类别之间检查截止时间）
+    supports_deadline = False
+    
     def __init__(self, rules: List[str] = None):
         self.rules = rules or []
         self.attack_type = AttackType.UNKNOWN
@@ -8,6 +8,7 @@ import html
 import urllib.parse
 import base64
 import json
+import time
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 
@@ -24,12 +25,24 @@ class RuleMatch:
     severity: str
     confidence: float
 
+# 快速检测只使用的规则严重级别
+FAST_SEVERITIES = ('critical', 'high')
+
+# 快速检测不做的深层解码（双重URL编码、转义序列、Base64）的痕迹，命中时标记为可疑
+_SUSPICIOUS_ENCODING = re.compile(r'(?i)%25[0-9a-f]{2}|\\x[0-9a-f]{2}|\\u[0-9a-f]{4}')
+# 疑似Base64片段：只检查参数值、请求头和请求体，URL路径本身就由同样的字符组成
+_BASE64_TOKEN = re.compile(
+    r'(?<![A-Za-z0-9+/])(?=[A-Za-z0-9+/]*\d)(?=[A-Za-z0-9+/]*[A-Za-z])[A-Za-z0-9+/]{20,}={0,2}'
+)
+
 class CorazaDetector(BaseDetector):
     """
     Coraza WAF检测器
     实现企业级WAF检测能力，覆盖OWASP Top 10攻击类型
     """
     
+    supports_deadline = True
+    
     def __init__(self):
         super().__init__()
         self.name = "CorazaDetector"
@@ -42,64 +55,196 @@ class CorazaDetector(BaseDetector):
         self._init_path_traversal_rules()
         self._init_protocol_rules()
         self._init_scanner_rules()
+        self._init_fast_rules()
         
-    def detect(self, request: HTTPRequest) -> DetectionResult:
-        """执行全面的安全检测"""
+    def detect(self, request: HTTPRequest, deadline: Optional[float] = None) -> DetectionResult:
+        """执行全面的安全检测
+        
+        Args:
+            request: HTTP请求
+            deadline: time.monotonic()截止时间，在规则类别之间检查，
+                超时后返回已完成类别的部分结果（incomplete=True）
+        """
         try:
             matches = []
             attack_types = set()
             max_confidence = 0.0
             
             # 预处理请求数据
+            decode_start = time.perf_counter_ns()
             processed_data = self._preprocess_request(request)
+            decode_ns = time.perf_counter_ns() - decode_start
             
             # 执行各类检测
             detectors = [
-                (self._detect_sql_injection, AttackType.SQL_INJECTION),
-                (self._detect_xss, AttackType.XSS),
-                (self._detect_command_injection, AttackType.COMMAND_INJECTION),
-                (self._detect_path_traversal, AttackType.PATH_TRAVERSAL),
-                (self._detect_protocol_violations, AttackType.UNKNOWN),
-                (self._detect_scanner_activity, AttackType.UNKNOWN)
+                ('sql_injection', self._detect_sql_injection, AttackType.SQL_INJECTION),
+                ('xss', self._detect_xss, AttackType.XSS),
+                ('command_injection', self._detect_command_injection, AttackType.COMMAND_INJECTION),
+                ('path_traversal', self._detect_path_traversal, AttackType.PATH_TRAVERSAL),
+                ('protocol', self._detect_protocol_violations, AttackType.UNKNOWN),
+                ('scanner', self._detect_scanner_activity, AttackType.UNKNOWN)
             ]
             
-            for detector_func, attack_type in detectors:
+            completed = []
+            for category, detector_func, attack_type in detectors:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
                 rule_matches = detector_func(processed_data)
                 if rule_matches:
                     matches.extend(rule_matches)
                     attack_types.add(attack_type)
                     for match in rule_matches:
                         max_confidence = max(max_confidence, match.confidence)
+                completed.append(category)
+            
+            if len(completed) < len(detectors):
+                return self._build_incomplete_result(
+                    matches, attack_types, max_confidence, len(processed_data),
+                    completed, [category for category, _, _ in detectors[len(completed):]],
+                    decode_ns=decode_ns
+                )
+            return self._build_result(matches, attack_types, max_confidence, len(processed_data), decode_ns=decode_ns)
+            
+        except Exception as e:
+            raise DetectionException(f"Coraza检测器执行失败: {e}")
+    
+    def detect_fast(self, request: HTTPRequest, deadline: Optional[float] = None) -> DetectionResult:
+        """快速检测：只做单层URL/HTML解码，只应用critical/high规则
+
+        先用合并后的预过滤正则扫描一遍，未命中时直接返回，命中后才逐条匹配规则。
+        请求中带有深层编码痕迹，或没有命中关键规则、但单层解码的数据出现了任何规则（包括medium/low）的触发特征时，
+        结果details中suspicious为True，调用方可据此安排完整检测；快速检测本身不做双重URL解码和Base64解码。
+        deadline含义同detect，在规则类别之间检查。
+        """
+        try:
+            decode_start = time.perf_counter_ns()
+            processed_data = self._preprocess_request(request, deep=False)
+            decode_ns = time.perf_counter_ns() - decode_start
+            matches = []
+            attack_types = set()
+            max_confidence = 0.0
+            completed = []
             
-            is_attack = len(matches) > 0
+            if any(self._fast_prefilter.search(item) for item in processed_data):
+                for category, rules in self.fast_rules:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        break
+                    for rule, attack_type, compiled in rules:
+                        for data_item in processed_data:
+                            match = compiled.search(data_item)
+                            if match:
+                                matches.append(self._make_match(rule, match))
+                                attack_types.add(attack_type)
+                                max_confidence = max(max_confidence, rule['confidence'])
+                                break
+                    completed.append(category)
+            else:
+                completed = [category for category, _ in self.fast_rules]
             
-            return self._create_result(
-                is_attack=is_attack,
-                confidence=max_confidence,
-                matched_rules=[match.rule_id for match in matches],
-                payload=self._extract_payload(matches),
-                details={
-                    'detected_attacks': list(attack_types),
-                    'rule_matches': [
-                        {
-                            'rule_id': match.rule_id,
-                            'message': match.rule_msg,
-                            'matched_data': match.matched_data,
-                            'severity': match.severity,
-                            'confidence': match.confidence
-                        } for match in matches
-                    ],
-                    'processed_data_count': len(processed_data),
-                    'detector': self.name,
-                    'version': self.version
-                }
+            suspicious = self._has_deep_encoding(request) or (
+                not matches and any(self._trigger_prefilter.search(item) for item in processed_data)
+            )
+            
+            if len(completed) < len(self.fast_rules):
+                return self._build_incomplete_result(
+                    matches, attack_types, max_confidence, len(processed_data),
+                    completed, [category for category, _ in self.fast_rules[len(completed):]],
+                    tier='fast', suspicious=suspicious, decode_ns=decode_ns
+                )
+            return self._build_result(
+                matches, attack_types, max_confidence, len(processed_data),
+                tier='fast', suspicious=suspicious, decode_ns=decode_ns
             )
             
         except Exception as e:
-            raise DetectionException(f"Coraza检测器执行失败: {e}")
+            raise DetectionException(f"Coraza快速检测执行失败: {e}")
     
-    def _preprocess_request(self, request: HTTPRequest) -> List[str]:
-        """预处理请求数据，处理编码和变换"""
+    def prefilter(self, request: HTTPRequest) -> bool:
+        """廉价预检：请求中是否出现任何规则的触发特征或深层编码痕迹
+
+        先检查深层编码痕迹（覆盖双重URL编码和较长的Base64载荷），再用全部规则（不限严重级别）合并的正则
+        扫描单层解码的数据，最后只对完整检测会Base64解码的短字母数字片段（如路径/health）解码后扫描，
+        不对每个请求做完整的深层解码。返回False的请求完整检测也不会命中任何规则，可以安全地降级处理（例如按比例采样）。
+        """
+        if self._has_deep_encoding(request):
+            return True
+        processed_data = self._preprocess_request(request, deep=False)
+        if any(self._trigger_prefilter.search(item) for item in processed_data):
+            return True
+        return any(
+            self._trigger_prefilter.search(decoded)
+            for decoded in map(self._base64_variant, processed_data) if decoded
+        )
+    
+    def _has_deep_encoding(self, request: HTTPRequest) -> bool:
+        """URL、参数、请求头或请求体中是否带有双重编码、转义序列或Base64载荷等深层编码痕迹"""
+        values = [v for v in request.params.values() if isinstance(v, str)]
+        values.extend(v for v in request.headers.values() if isinstance(v, str))
+        if request.body:
+            values.append(request.body)
+        return bool(_SUSPICIOUS_ENCODING.search(request.url)) or any(
+            _SUSPICIOUS_ENCODING.search(v) or _BASE64_TOKEN.search(v) for v in values
+        )
+    
+    def _build_result(
+        self,
+        matches: List[RuleMatch],
+        attack_types: set,
+        max_confidence: float,
+        processed_count: int,
+        **extra_details
+    ) -> DetectionResult:
+        """根据规则匹配结果构建检测结果"""
+        details = {
+            'detected_attacks': list(attack_types),
+            'rule_matches': [
+                {
+                    'rule_id': match.rule_id,
+                    'message': match.rule_msg,
+                    'matched_data': match.matched_data,
+                    'severity': match.severity,
+                    'confidence': match.confidence
+                } for match in matches
+            ],
+            'processed_data_count': processed_count,
+            'detector': self.name,
+            'version': self.version
+        }
+        details.update(extra_details)
+        
+        return self._create_result(
+            is_attack=len(matches) > 0,
+            confidence=max_confidence,
+            matched_rules=[match.rule_id for match in matches],
+            payload=self._extract_payload(matches),
+            details=details
+        )
+    
+    def _build_incomplete_result(
+        self,
+        matches: List[RuleMatch],
+        attack_types: set,
+        max_confidence: float,
+        processed_count: int,
+        completed: List[str],
+        skipped: List[str],
+        **extra_details
+    ) -> DetectionResult:
+        """超过截止时间时构建部分检测结果"""
+        result = self._build_result(
+            matches, attack_types, max_confidence, processed_count,
+            incomplete=True, completed_categories=completed, skipped_categories=skipped,
+            **extra_details
+        )
+        result.incomplete = True
+        return result
+    
+    def _preprocess_request(self, request: HTTPRequest, deep: bool = True) -> List[str]:
+        """预处理请求数据，处理编码和变换
+
+        Args:
+            deep: 是否进行双重URL解码和Base64解码
+        """
         data_items = []
         
         # URL和查询参数
@@ -119,11 +264,11 @@ class CorazaDetector(BaseDetector):
         processed_items = []
         for item in data_items:
             if isinstance(item, str):
-                processed_items.extend(self._decode_variations(item))
+                processed_items.extend(self._decode_variations(item, deep))
         
         return processed_items
     
-    def _decode_variations(self, data: str) -> List[str]:
+    def _decode_variations(self, data: str, deep: bool = True) -> List[str]:
         """生成数据的各种解码变体"""
         variations = [data]  # 原始数据
         
@@ -133,9 +278,10 @@ class CorazaDetector(BaseDetector):
             if url_decoded != data:
                 variations.append(url_decoded)
                 # 双重URL解码
-                double_decoded = urllib.parse.unquote(url_decoded)
-                if double_decoded != url_decoded:
-                    variations.append(double_decoded)
+                if deep:
+                    double_decoded = urllib.parse.unquote(url_decoded)
+                    if double_decoded != url_decoded:
+                        variations.append(double_decoded)
         except:
             pass
         
@@ -147,21 +293,29 @@ class CorazaDetector(BaseDetector):
         except:
             pass
         
-        try:
-            # Base64解码尝试
-            if len(data) > 4 and data.replace('+', '').replace('/', '').replace('=', '').isalnum():
-                try:
-                    base64_decoded = base64.b64decode(data + '===').decode('utf-8', errors='ignore')
-                    if base64_decoded and base64_decoded != data:
-                        variations.append(base64_decoded)
-                except:
-                    pass
-        except:
-            pass
+        if not deep:
+            return list(set(variations))
+        
+        # Base64解码尝试
+        base64_decoded = self._base64_variant(data)
+        if base64_decoded:
+            variations.append(base64_decoded)
         
         # 去除重复
         return list(set(variations))
     
+    @staticmethod
+    def _base64_variant(data: str) -> Optional[str]:
+        """只由Base64字符组成的数据的解码结果，不能解码或与原数据相同时返回None"""
+        try:
+            if len(data) > 4 and data.replace('+', '').replace('/', '').replace('=', '').isalnum():
+                decoded = base64.b64decode(data + '===').decode('utf-8', errors='ignore')
+                if decoded and decoded != data:
+                    return decoded
+        except Exception:
+            pass
+        return None
+    
     def _init_sql_injection_rules(self):
         """初始化SQL注入检测规则"""
         self.sql_rules = [
@@ -384,6 +538,44 @@ class CorazaDetector(BaseDetector):
             }
         ]
     
+    def _init_fast_rules(self):
+        """编译快速检测使用的关键规则，并合并为一个预过滤正则"""
+        rule_sets = [
+            ('sql_injection', self.sql_rules, AttackType.SQL_INJECTION),
+            ('xss', self.xss_rules, AttackType.XSS),
+            ('command_injection', self.cmd_rules, AttackType.COMMAND_INJECTION),
+            ('path_traversal', self.path_rules, AttackType.PATH_TRAVERSAL),
+            ('protocol', self.protocol_rules, AttackType.UNKNOWN),
+            ('scanner', self.scanner_rules, AttackType.UNKNOWN)
+        ]
+        # [(类别, [(规则, 攻击类型, 编译后的正则), ...]), ...]
+        self.fast_rules = []
+        for category, rules, attack_type in rule_sets:
+            compiled = [
+                (rule, attack_type, re.compile(rule['pattern']))
+                for rule in rules
+                if rule['severity'] in FAST_SEVERITIES
+            ]
+            if compiled:
+                self.fast_rules.append((category, compiled))
+        self._fast_prefilter = self._combine_patterns(
+            rule for _, rules in self.fast_rules for rule, _, _ in rules
+        )
+        # 触发特征预过滤使用全部规则，供prefilter判断请求是否可以降级处理
+        self._trigger_prefilter = self._combine_patterns(
+            rule for _, rules, _ in rule_sets for rule in rules
+        )
+    
+    @staticmethod
+    def _combine_patterns(rules) -> re.Pattern:
+        """把多条规则的正则合并为一个忽略大小写的选择分支"""
+        # 内联标志只能出现在整个正则开头，合并前去掉，统一忽略大小写
+        parts = [
+            rule['pattern'][4:] if rule['pattern'].startswith('(?i)') else rule['pattern']
+            for rule in rules
+        ]
+        return re.compile('|'.join(f'(?:{part})' for part in parts), re.IGNORECASE)
+    
     def _detect_sql_injection(self, data_items: List[str]) -> List[RuleMatch]:
         """检测SQL注入攻击"""
         return self._apply_rules(data_items, self.sql_rules)
@@ -418,19 +610,23 @@ class CorazaDetector(BaseDetector):
                 try:
                     match = re.search(pattern, data_item)
                     if match:
-                        matches.append(RuleMatch(
-                            rule_id=rule['id'],
-                            rule_msg=rule['msg'],
-                            matched_data=match.group(0)[:100] + '...' if len(match.group(0)) > 100 else match.group(0),
-                            severity=rule['severity'],
-                            confidence=rule['confidence']
-                        ))
+                        matches.append(self._make_match(rule, match))
                         break  # 一个规则匹配一次即可
                 except re.error:
                     continue  # 忽略正则表达式错误
         
         return matches
     
+    def _make_match(self, rule: Dict, match: re.Match) -> RuleMatch:
+        """由规则和正则匹配创建RuleMatch"""
+        return RuleMatch(
+            rule_id=rule['id'],
+            rule_msg=rule['msg'],
+            matched_data=match.group(0)[:100] + '...' if len(match.group(0)) > 100 else match.group(0),
+            severity=rule['severity'],
+            confidence=rule['confidence']
+        )
+    
     def _extract_payload(self, matches: List[RuleMatch]) -> Optional[str]:
         """提取攻击载荷"""
         if not matches:
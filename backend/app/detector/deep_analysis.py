@@ -0,0 +1,134 @@
+"""深度分析调度器
+
+两级检测中的第二级：快速检测判定为攻击、可疑或因超时不完整的事件先以快速结果保存，
+再放入后台有界队列，由worker执行完整检测（全部解码变体、全部规则），
+可选地调用LLM分析，完成后更新已保存的事件。
+"""
+
+import asyncio
+import dataclasses
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.core.models import SecurityEvent
+
+
+class DeepAnalysisScheduler:
+    """后台深度分析调度器"""
+
+    def __init__(
+        self,
+        storage,
+        engine=None,
+        llm_provider=None,
+        workers: int = 2,
+        max_queue_size: int = 1000
+    ):
+        """初始化调度器
+
+        Args:
+            storage: 存储后端，分析完成后调用update_event更新事件
+            engine: 完整检测引擎，None表示使用默认DetectionEngine
+            llm_provider: 可选的LLM提供者，完整检测确认为攻击的事件会进行LLM分析
+            workers: 后台worker数量
+            max_queue_size: 待分析队列容量，满时新的调度请求被丢弃并计数
+        """
+        if engine is None:
+            from .detection_engine import DetectionEngine
+            engine = DetectionEngine()
+        self.storage = storage
+        self.engine = engine
+        self.llm_provider = llm_provider
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+
+        self.queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.is_running = False
+        self.stats = {
+            'scheduled': 0,
+            'dropped': 0,
+            'completed': 0,
+            'upgraded': 0,       # 快速检测未判定为攻击、完整检测确认为攻击
+            'downgraded': 0,     # 快速检测判定为攻击、完整检测未确认
+            'llm_analyzed': 0,
+            'llm_errors': 0,
+            'errors': 0
+        }
+
+    async def start(self):
+        """启动后台worker"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain: bool = True):
+        """停止调度器
+
+        Args:
+            drain: 是否等待队列中已调度的事件分析完成
+        """
+        if not self.is_running:
+            return
+        self.is_running = False
+        if drain:
+            await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def schedule(self, event: SecurityEvent) -> bool:
+        """安排事件进行深度分析（事件需已保存并有event_id），队列已满时返回False"""
+        if not self.is_running:
+            return False
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.stats['dropped'] += 1
+            return False
+        self.stats['scheduled'] += 1
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取调度统计"""
+        stats = dict(self.stats)
+        stats['queue_size'] = self.queue.qsize() if self.queue else 0
+        return stats
+
+    async def _worker(self):
+        while True:
+            event = await self.queue.get()
+            try:
+                await self._analyze(event)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"深度分析失败: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _analyze(self, event: SecurityEvent):
+        """完整检测 + 可选LLM分析，然后更新存储中的事件"""
+        loop = asyncio.get_running_loop()
+        # 完整检测是CPU密集操作，放到线程池避免阻塞事件循环
+        detection = await loop.run_in_executor(None, self.engine.detect_all, event.request)
+        detection.details['tier'] = 'deep'
+
+        if detection.is_attack and not event.detection.is_attack:
+            self.stats['upgraded'] += 1
+        elif event.detection.is_attack and not detection.is_attack:
+            self.stats['downgraded'] += 1
+
+        updated = dataclasses.replace(event, detection=detection, updated_at=datetime.now())
+        if self.llm_provider is not None and detection.is_attack:
+            try:
+                updated.llm_analysis = await self.llm_provider.analyze_security_event(updated)
+                self.stats['llm_analyzed'] += 1
+            except Exception as e:
+                self.stats['llm_errors'] += 1
+                print(f"LLM分析失败: {e}")
+
+        await self.storage.update_event(event.event_id, updated)
+        self.stats['completed'] += 1
@@ -1,6 +1,7 @@
 """检测引擎聚合器"""
 
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
 from .base import BaseDetector
 from .coraza_detector import CorazaDetector
 from app.core.models import HTTPRequest, DetectionResult, AttackType
@@ -22,19 +23,91 @@ class DetectionEngine:
                 # CommandInjectionDetector(), # 可选：传统命令注入检测
             ]
     
-    def detect_all(self, request: HTTPRequest) -> DetectionResult:
-        """运行所有检测器"""
+    def detect_all(self, request: HTTPRequest, deadline: Optional[float] = None) -> DetectionResult:
+        """运行所有检测器
+        
+        Args:
+            request: HTTP请求
+            deadline: time.monotonic()截止时间，None表示不限时。在检测器之间检查，
+                支持截止时间的检测器（supports_deadline）还会在规则类别之间检查。
+                超时返回部分结果：incomplete=True，details["incomplete"]记录已完成的检测器和类别
+        """
+        return self._run_detectors(request, fast=False, deadline=deadline)
+    
+    def detect_fast(self, request: HTTPRequest, deadline: Optional[float] = None) -> DetectionResult:
+        """快速检测：只运行检测器的快速模式（detect_fast），用于内联判定
+        
+        没有快速模式的检测器被跳过，留给完整检测处理。
+        结果details中tier为"fast"，是否需要完整检测由needs_deep_analysis判断。
+        deadline含义同detect_all。
+        """
+        result = self._run_detectors(request, fast=True, deadline=deadline)
+        result.details['tier'] = 'fast'
+        return result
+    
+    def needs_deep_analysis(self, result: DetectionResult) -> bool:
+        """检测结果是否需要完整检测：判定为攻击、因超时不完整，或某个检测器标记了可疑"""
+        if result.is_attack or result.incomplete:
+            return True
+        return any(
+            isinstance(details, dict) and details.get('suspicious')
+            for details in result.details.values()
+        )
+    
+    def prefilter(self, request: HTTPRequest) -> bool:
+        """廉价预检：任一检测器的预过滤发现触发特征时返回True
+
+        没有预过滤（prefilter）的检测器无法排除请求，视为已触发。
+        """
+        for detector in self.detectors:
+            check = getattr(detector, 'prefilter', None)
+            if check is None or check(request):
+                return True
+        return False
+
+    def _run_detectors(self, request: HTTPRequest, fast: bool, deadline: Optional[float] = None) -> DetectionResult:
+        """运行检测器并合并结果
+
+        details["timings"]记录本次检测的总耗时和其中解码（预处理）的耗时（纳秒），供统计使用。
+        """
         try:
+            detect_start = time.perf_counter_ns()
+            decode_ns = 0
             all_attack_types = []
             all_matched_rules = []
             max_confidence = 0.0
             is_attack = False
             combined_details = {}
             final_payload = None
+            completed_detectors = []
+            skipped_detectors = []
+            completed_categories = []
+            incomplete = False
             
             for detector in self.detectors:
+                detector_name = detector.__class__.__name__
+                detect = getattr(detector, 'detect_fast', None) if fast else detector.detect
+                if detect is None:
+                    continue
+                
+                if deadline is not None and time.monotonic() >= deadline:
+                    skipped_detectors.append(detector_name)
+                    continue
+                
                 try:
-                    result = detector.detect(request)
+                    if deadline is not None and getattr(detector, 'supports_deadline', False):
+                        result = detect(request, deadline=deadline)
+                    else:
+                        result = detect(request)
+                    
+                    if result.incomplete:
+                        incomplete = True
+                        completed_categories.extend(
+                            f"{detector_name}.{category}"
+                            for category in result.details.get('completed_categories', [])
+                        )
+                    else:
+                        completed_detectors.append(detector_name)
                     
                     if result.is_attack:
                         is_attack = True
@@ -46,25 +119,39 @@ class DetectionEngine:
                             final_payload = result.payload
                     
                     # 合并详细信息
-                    detector_name = detector.__class__.__name__
                     combined_details[detector_name] = result.details
+                    decode_ns += result.details.get('decode_ns', 0)
                     
                 except Exception as e:
                     # 单个检测器错误不影响其他检测器
-                    detector_name = detector.__class__.__name__
                     combined_details[detector_name] = {"error": str(e)}
                     continue
             
             # 去重攻击类型
             unique_attack_types = list(set(all_attack_types))
             
+            if skipped_detectors:
+                incomplete = True
+            if incomplete:
+                combined_details['incomplete'] = {
+                    'completed_detectors': completed_detectors,
+                    'completed_categories': completed_categories,
+                    'skipped_detectors': skipped_detectors
+                }
+            
+            combined_details['timings'] = {
+                'detect_ns': time.perf_counter_ns() - detect_start,
+                'decode_ns': decode_ns
+            }
+            
             return DetectionResult(
                 is_attack=is_attack,
                 attack_types=unique_attack_types,
                 confidence=max_confidence,
                 details=combined_details,
                 payload=final_payload,
-                matched_rules=all_matched_rules
+                matched_rules=all_matched_rules,
+                incomplete=incomplete
             )
             
         except Exception as e:
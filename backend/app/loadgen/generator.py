@@ -0,0 +1,333 @@
+"""确定性的合成访问日志生成器
+
+相同的种子和参数生成逐字节相同的日志，用于性能测试和回归对比：
+- 格式：apache（Combined）、nginx（默认main格式，多一个X-Forwarded-For字段）、json（Nginx escape=json风格）
+- 大小：按行数或按（未压缩）字节数生成，流式写出，可生成GB级文件；路径以.gz结尾时压缩写入
+- 攻击：按类别配置占全部请求的比例，载荷取自CRS规则针对的攻击族
+- 基数：客户端IP、商品、User-Agent按Zipf分布抽取，少量攻击者IP发出大部分攻击
+- 请求体模式（仅json格式）：部分正常请求和攻击以POST携带请求体
+"""
+
+import gzip
+import json
+import random
+import re
+import sys
+import urllib.parse
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Dict, IO, Iterator, List, Optional, Tuple
+
+from app.core.exceptions import ConfigurationException
+from .corpus import (
+    ATTACK_CATEGORIES, ATTACK_PAYLOADS, BOT_AGENTS, CATEGORIES, DEFAULT_ATTACK_RATIOS,
+    INJECTION_POINTS, POST_BODIES, QUERY_WORDS, ROUTES, SCANNER_AGENTS, SCANNER_PATHS,
+    SEARCH_REFERERS, SLUG_WORDS, browser_agents
+)
+
+FORMATS = ('apache', 'nginx', 'json')
+
+BENIGN = 'benign'
+
+# 默认起始时间与tests/sample_logs一致
+DEFAULT_START_TIME = datetime(2023, 12, 25, 0, 0, 0, tzinfo=timezone(timedelta(hours=8)))
+
+# URL中部分编码时保留的字符（空格、引号、#、&等必须编码，否则破坏日志行或查询串结构）
+_PARTIAL_SAFE = "/'()*,:=;<>!$@"
+
+_SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*$', re.IGNORECASE)
+_SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+
+def parse_size(value: str) -> int:
+    """解析 "500M"、"2GB"、"1.5GiB" 这样的大小为字节数（1024进制）"""
+    match = _SIZE_PATTERN.match(str(value))
+    if not match:
+        raise ConfigurationException(f"无法解析的大小: {value}")
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[unit.lower()])
+
+
+def _zipf_cum_weights(n: int, exponent: float) -> List[float]:
+    """前n个排名的Zipf累积权重，用于random.choices(cum_weights=...)"""
+    return list(accumulate(1.0 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+class SyntheticLogGenerator:
+    """合成访问日志生成器"""
+
+    def __init__(
+        self,
+        fmt: str = "apache",
+        attack_ratios: Optional[Dict[str, float]] = None,
+        seed: int = 0,
+        bodies: bool = False,
+        start_time: Optional[datetime] = None,
+        requests_per_second: float = 500.0,
+        clients: int = 20000,
+        attackers: int = 200,
+        products: int = 50000,
+        host: str = "shop.example.com"
+    ):
+        """初始化生成器
+
+        Args:
+            fmt: 日志格式，apache / nginx / json
+            attack_ratios: {攻击类别: 占全部请求的比例}，None使用DEFAULT_ATTACK_RATIOS，未列出的类别为0
+            seed: 随机种子，相同种子和参数生成相同的日志
+            bodies: 是否生成请求体（只有json格式能记录请求体）
+            start_time: 第一条日志的时间
+            requests_per_second: 日志时间推进的速率
+            clients: 正常客户端IP数量
+            attackers: 攻击者IP数量
+            products: 商品数量（商品页、图片等路径的基数）
+            host: Referer中使用的站点域名
+        """
+        if fmt not in FORMATS:
+            raise ConfigurationException(f"不支持的日志格式: {fmt}，可选: {', '.join(FORMATS)}")
+        if bodies and fmt != 'json':
+            raise ConfigurationException("请求体只能写入json格式的日志")
+        ratios = dict(DEFAULT_ATTACK_RATIOS if attack_ratios is None else attack_ratios)
+        unknown = set(ratios) - set(ATTACK_CATEGORIES)
+        if unknown:
+            raise ConfigurationException(
+                f"未知的攻击类别: {', '.join(sorted(unknown))}，可选: {', '.join(ATTACK_CATEGORIES)}"
+            )
+        if any(ratio < 0 for ratio in ratios.values()) or sum(ratios.values()) > 1:
+            raise ConfigurationException("攻击比例必须非负且合计不超过1")
+        if requests_per_second <= 0:
+            raise ConfigurationException("requests_per_second必须大于0")
+
+        self.fmt = fmt
+        self.attack_ratios = {category: ratios.get(category, 0.0) for category in ATTACK_CATEGORIES}
+        self.seed = seed
+        self.bodies = bodies
+        self.start_time = start_time or DEFAULT_START_TIME
+        self.requests_per_second = requests_per_second
+        self.host = host
+        self.stats = {'lines': 0, 'bytes': 0, 'by_category': Counter()}
+
+        self._rng = random.Random(seed)
+        # 累积阈值：一次random()决定请求类别
+        self._thresholds = list(zip(accumulate(self.attack_ratios.values()), ATTACK_CATEGORIES))
+
+        # 所有池都由同一个种子生成，池的内容和顺序决定了日志内容
+        rng = self._rng
+        self._clients = [self._random_ip(rng) for _ in range(clients)]
+        self._client_weights = _zipf_cum_weights(clients, 1.1)
+        self._attackers = [self._random_ip(rng) for _ in range(attackers)]
+        self._attacker_weights = _zipf_cum_weights(attackers, 1.5)
+        self._products = products
+        self._product_weights = _zipf_cum_weights(products, 1.05)
+        self._agents = browser_agents()
+        rng.shuffle(self._agents)
+        self._agent_weights = _zipf_cum_weights(len(self._agents), 1.2)
+        self._slugs = [
+            '-'.join(rng.choice(SLUG_WORDS) for _ in range(rng.randint(3, 6))) + f"-{n}"
+            for n in range(2000)
+        ]
+        self._slug_weights = _zipf_cum_weights(len(self._slugs), 1.0)
+        self._assets = [f"{name}.{rng.getrandbits(32):08x}" for name in ("app", "vendor", "main", "runtime", "checkout") for _ in range(8)]
+        self._routes = [route for route, _ in ROUTES]
+        self._route_weights = list(accumulate(weight for _, weight in ROUTES))
+
+        self._index = 0
+        self._second = -1
+        self._timestamp = ''
+
+    @staticmethod
+    def _random_ip(rng: random.Random) -> str:
+        return f"{rng.choice((10, 23, 45, 66, 81, 103, 117, 151, 172, 185, 192, 203))}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+    def generate(self) -> Iterator[Tuple[str, str]]:
+        """无限生成 (日志行, 类别)，正常请求的类别为'benign'；多次调用时日志时间接着推进"""
+        rng = self._rng
+        while True:
+            roll = rng.random()
+            category = BENIGN
+            for threshold, name in self._thresholds:
+                if roll < threshold:
+                    category = name
+                    break
+            if category == BENIGN:
+                fields = self._benign()
+            elif category == 'scanner':
+                fields = self._scanner()
+            else:
+                fields = self._attack(category)
+            yield self._format(self._index, *fields), category
+            self._index += 1
+
+    def write_to(self, stream: IO[str], lines: Optional[int] = None, size: Optional[int] = None,
+                 labels: Optional[IO[str]] = None, batch: int = 1000) -> Dict:
+        """向文本流写出日志，达到行数或（未压缩）字节数时停止
+
+        Args:
+            stream: 输出文本流
+            lines: 行数上限
+            size: 字节数上限，写到超过该大小的第一行为止
+            labels: 可选，写出攻击行的标注（CSV: 行号,类别）
+            batch: 每次写出的行数
+        """
+        if lines is None and size is None:
+            raise ConfigurationException("需要指定行数或大小")
+        buffer: List[str] = []
+        generator = self.generate()
+        while (lines is None or self.stats['lines'] < lines) and (size is None or self.stats['bytes'] < size):
+            line, category = next(generator)
+            line += '\n'
+            buffer.append(line)
+            self.stats['lines'] += 1
+            self.stats['bytes'] += len(line) if line.isascii() else len(line.encode('utf-8'))
+            self.stats['by_category'][category] += 1
+            if labels is not None and category != BENIGN:
+                labels.write(f"{self.stats['lines']},{category}\n")
+            if len(buffer) >= batch:
+                stream.write(''.join(buffer))
+                buffer = []
+        if buffer:
+            stream.write(''.join(buffer))
+        return self.get_stats()
+
+    def write(self, path: str, lines: Optional[int] = None, size: Optional[int] = None,
+              labels_path: Optional[str] = None) -> Dict:
+        """写出日志文件（.gz结尾时gzip压缩，"-"表示标准输出），参数同write_to"""
+        labels = open(labels_path, 'w', encoding='utf-8') if labels_path else None
+        try:
+            if labels is not None:
+                labels.write("line,category\n")
+            if path == '-':
+                return self.write_to(sys.stdout, lines, size, labels)
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path, 'wt', encoding='utf-8', newline='\n') as stream:
+                return self.write_to(stream, lines, size, labels)
+        finally:
+            if labels is not None:
+                labels.close()
+
+    def get_stats(self) -> Dict:
+        """已生成的行数、字节数和各类别数量"""
+        stats = dict(self.stats)
+        stats['by_category'] = dict(self.stats['by_category'])
+        attacks = stats['lines'] - stats['by_category'].get(BENIGN, 0)
+        stats['attack_ratio'] = attacks / stats['lines'] if stats['lines'] else 0.0
+        return stats
+
+    def _product(self) -> int:
+        return self._rng.choices(range(1, self._products + 1), cum_weights=self._product_weights)[0]
+
+    def _agent(self) -> str:
+        rng = self._rng
+        if rng.random() < 0.04:
+            return rng.choice(BOT_AGENTS).format(k=rng.randint(50, 90))
+        return rng.choices(self._agents, cum_weights=self._agent_weights)[0]
+
+    def _referer(self) -> str:
+        rng = self._rng
+        roll = rng.random()
+        if roll < 0.4:
+            return '-'
+        if roll < 0.8:
+            return f"https://{self.host}{self._path(rng.choices(self._routes, cum_weights=self._route_weights)[0])}"
+        return rng.choice(SEARCH_REFERERS)
+
+    def _path(self, route: str) -> str:
+        """填充路由模板中的占位符"""
+        rng = self._rng
+        if '{' not in route:
+            return route
+        values = {}
+        if '{product}' in route:
+            values['product'] = self._product()
+        if '{page}' in route:
+            values['page'] = rng.choices((1, 2, 3, 4, 5, 10), cum_weights=(50, 70, 80, 87, 92, 95))[0]
+        if '{category}' in route:
+            values['category'] = rng.choice(CATEGORIES)
+        if '{query}' in route:
+            values['query'] = '+'.join(rng.choice(QUERY_WORDS) for _ in range(rng.randint(1, 3)))
+        if '{slug}' in route:
+            values['slug'] = rng.choices(self._slugs, cum_weights=self._slug_weights)[0]
+        if '{asset}' in route:
+            values['asset'] = rng.choice(self._assets)
+        return route.format(**values)
+
+    def _benign(self):
+        """(IP, 方法, URL, 状态码, 响应大小, Referer, UA, 请求体)"""
+        rng = self._rng
+        route = rng.choices(self._routes, cum_weights=self._route_weights)[0]
+        url = self._path(route)
+        method, body = 'GET', None
+        if route in POST_BODIES and rng.random() < 0.5:
+            method = 'POST'
+            if self.bodies:
+                body = POST_BODIES[route].format(product=self._product(), page=rng.randint(1, 5))
+        if url.startswith(('/static/', '/images/')):
+            status = 304 if rng.random() < 0.3 else 200
+            size = 0 if status == 304 else rng.randint(2000, 250000)
+        else:
+            status = 404 if rng.random() < 0.01 else (302 if method == 'POST' else 200)
+            size = rng.randint(200, 60000) if status == 200 else rng.randint(0, 500)
+        ip = rng.choices(self._clients, cum_weights=self._client_weights)[0]
+        return ip, method, url, status, size, self._referer(), self._agent(), body
+
+    def _payload(self, category: str) -> str:
+        rng = self._rng
+        _, template = rng.choice(ATTACK_PAYLOADS[category])
+        return template.format(n=rng.randint(1, 9999), k=rng.randint(1, 9))
+
+    def _attack(self, category: str):
+        rng = self._rng
+        path, param = rng.choice(INJECTION_POINTS[category])
+        payload = self._payload(category)
+        method, body = 'GET', None
+        if self.bodies and rng.random() < 0.5:
+            method = 'POST'
+            # 空格编码为%20而不是+，与查询串中的载荷保持同样的解码方式
+            body = f"{param}={urllib.parse.quote(payload, safe='')}"
+            url = path
+        else:
+            # 一半完全编码，一半只编码会破坏日志结构的字符（工具和浏览器发出的两种常见形态）
+            safe = _PARTIAL_SAFE if rng.random() < 0.5 else ''
+            url = f"{path}?{param}={urllib.parse.quote(payload, safe=safe)}"
+        status = rng.choices((403, 404, 200, 500), cum_weights=(40, 70, 90, 100))[0]
+        ip = rng.choices(self._attackers, cum_weights=self._attacker_weights)[0]
+        agent = self._agent() if rng.random() < 0.6 else f"python-requests/2.{rng.randint(20, 31)}.0"
+        return ip, method, url, status, rng.randint(0, 5000), '-', agent, body
+
+    def _scanner(self):
+        rng = self._rng
+        url = rng.choice(SCANNER_PATHS).format(n=rng.randint(1, 9999))
+        agent = rng.choice(SCANNER_AGENTS).format(n=rng.randint(1, 9), k=rng.randint(1, 9))
+        status = rng.choices((404, 403, 200), cum_weights=(80, 95, 100))[0]
+        ip = rng.choices(self._attackers, cum_weights=self._attacker_weights)[0]
+        return ip, 'GET', url, status, rng.randint(0, 2000), '-', agent, None
+
+    def _time(self, index: int) -> datetime:
+        return self.start_time + timedelta(seconds=index / self.requests_per_second)
+
+    def _format(self, index: int, ip, method, url, status, size, referer, agent, body) -> str:
+        if self.fmt == 'json':
+            record = {
+                'time_iso8601': self._time(index).isoformat(timespec='seconds'),
+                'remote_addr': ip,
+                'request_method': method,
+                'request_uri': url,
+                'status': status,
+                'body_bytes_sent': size,
+                'http_referer': referer,
+                'http_user_agent': agent
+            }
+            if self.bodies:
+                record['request_body'] = body or ''
+            return json.dumps(record, separators=(',', ':'))
+
+        # 同一秒的日志共用格式化好的时间字符串
+        second = int(index / self.requests_per_second)
+        if second != self._second:
+            self._second = second
+            self._timestamp = (self.start_time + timedelta(seconds=second)).strftime('%d/%b/%Y:%H:%M:%S %z')
+        line = f'{ip} - - [{self._timestamp}] "{method} {url} HTTP/1.1" {status} {size} "{referer}" "{agent}"'
+        if self.fmt == 'nginx':
+            line += ' "-"'
+        return line
@@ -0,0 +1,18 @@
+"""分阶段并发处理流水线模块"""
+
+from .stage import Stage, StageMetrics
+from .pipeline import Pipeline
+from .workers import init_detection_worker, detect_batch, parse_batch
+from .sharding import ShardedAnalyzer, IPStateTable, shard_for
+
+__all__ = [
+    "Stage",
+    "StageMetrics",
+    "Pipeline",
+    "init_detection_worker",
+    "detect_batch",
+    "parse_batch",
+    "ShardedAnalyzer",
+    "IPStateTable",
+    "shard_for"
+]
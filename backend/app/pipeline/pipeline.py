@@ -0,0 +1,228 @@
+"""分阶段并发流水线
+
+source -> [stage 1] -> [stage 2] -> ... -> 输出
+
+阶段之间通过有界asyncio.Queue连接：下游处理不过来时上游在put处等待（背压），
+内存占用由队列容量决定。I/O阶段与CPU阶段（进程池）同时运行，互不阻塞。
+
+关闭流程：
+- 数据源读完或调用stop()后，向第一个队列放入结束标记
+- 每个阶段的worker处理完队列中剩余数据后退出，阶段再把结束标记传给下游
+- 输出端读到结束标记时，所有在途数据都已处理完毕（排空关闭）
+
+多worker阶段不保证输出顺序。
+"""
+
+import asyncio
+import inspect
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncGenerator, AsyncIterable, Dict, List, Optional
+
+from .stage import Stage, StageMetrics
+from app.core.exceptions import ConfigurationException
+
+# 队列结束标记
+_EOF = object()
+
+
+class Pipeline:
+    """分阶段并发流水线运行时"""
+
+    def __init__(self, source: AsyncIterable, stages: List[Stage], output_queue_size: int = 1000):
+        """初始化流水线
+
+        Args:
+            source: 异步可迭代数据源（如capturer.capture_stream()）
+            stages: 按顺序执行的阶段列表
+            output_queue_size: 输出队列容量
+        """
+        if not stages:
+            raise ConfigurationException("流水线至少需要一个阶段")
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ConfigurationException("阶段名称不能重复")
+
+        self.source = source
+        self.stages = stages
+        self.output_queue_size = output_queue_size
+
+        self.source_metrics = StageMetrics("source")
+        self.metrics: Dict[str, StageMetrics] = {stage.name: StageMetrics(stage.name) for stage in stages}
+        self._queues: List[asyncio.Queue] = []
+        self._executors: List[Optional[Executor]] = []
+        self._tasks: List[asyncio.Task] = []
+        self._feeder: Optional[asyncio.Task] = None
+        self._draining = False
+        self._source_error: Optional[BaseException] = None
+        self.is_running = False
+
+    async def run(self) -> AsyncGenerator[Any, None]:
+        """运行流水线，产出最后一个阶段的结果"""
+        if self.is_running:
+            raise ConfigurationException("流水线已在运行")
+        self.is_running = True
+
+        self._queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        self._queues.append(asyncio.Queue(maxsize=self.output_queue_size))
+        self._executors = [self._create_executor(stage) for stage in self.stages]
+
+        self._feeder = asyncio.create_task(self._feed())
+        self._tasks = [self._feeder]
+        for index, stage in enumerate(self.stages):
+            workers = [
+                asyncio.create_task(self._stage_worker(index, stage))
+                for _ in range(stage.workers)
+            ]
+            self._tasks.extend(workers)
+            self._tasks.append(asyncio.create_task(self._close_stage(index, workers)))
+
+        output = self._queues[-1]
+        try:
+            while True:
+                item = await output.get()
+                if item is _EOF:
+                    break
+                yield item
+            if self._source_error is not None:
+                raise self._source_error
+        finally:
+            await self._shutdown()
+
+    def stop(self):
+        """停止读取数据源，已进入流水线的数据会被处理完后再结束"""
+        if self._feeder is not None and not self._feeder.done():
+            self._draining = True
+            self._feeder.cancel()
+
+    def backlog(self) -> int:
+        """各阶段输入队列中等待处理的数据项总数"""
+        return sum(queue.qsize() for queue in self._queues)
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """获取各阶段的吞吐、队列深度等指标"""
+        result = {'source': self.source_metrics.to_dict()}
+        for index, stage in enumerate(self.stages):
+            depth = self._queues[index].qsize() if self._queues else 0
+            result[stage.name] = self.metrics[stage.name].to_dict(depth)
+            result[stage.name]['workers'] = stage.workers
+            result[stage.name]['executor'] = stage.executor
+        return result
+
+    def _create_executor(self, stage: Stage) -> Optional[Executor]:
+        if stage.executor == "process":
+            return ProcessPoolExecutor(
+                max_workers=stage.workers,
+                initializer=stage.initializer,
+                initargs=stage.initargs
+            )
+        if stage.executor == "thread":
+            return ThreadPoolExecutor(
+                max_workers=stage.workers,
+                initializer=stage.initializer,
+                initargs=stage.initargs
+            )
+        return None
+
+    async def _put(self, queue: asyncio.Queue, item: Any, metrics: StageMetrics):
+        """放入下游队列，队列已满时等待并计数"""
+        if queue.full():
+            metrics.backpressure_waits += 1
+        await queue.put(item)
+
+    async def _feed(self):
+        """把数据源读入第一个阶段的队列"""
+        metrics = self.source_metrics
+        metrics.started_at = time.perf_counter()
+        first = self._queues[0]
+        try:
+            async for item in self.source:
+                metrics.items_out += 1
+                await self._put(first, item, metrics)
+                self.metrics[self.stages[0].name].observe_queue(first.qsize())
+        except asyncio.CancelledError:
+            if not self._draining:
+                raise
+        except Exception as e:
+            self._source_error = e
+        metrics.finished_at = time.perf_counter()
+        await first.put(_EOF)
+
+    async def _stage_worker(self, index: int, stage: Stage):
+        """阶段worker：按批取出数据并处理"""
+        inq = self._queues[index]
+        outq = self._queues[index + 1]
+        metrics = self.metrics[stage.name]
+        executor = self._executors[index]
+        loop = asyncio.get_running_loop()
+        is_coroutine = inspect.iscoroutinefunction(stage.func)
+        if metrics.started_at is None:
+            metrics.started_at = time.perf_counter()
+
+        while True:
+            item = await inq.get()
+            if item is _EOF:
+                # 放回结束标记，让同阶段其他worker也能退出
+                inq.put_nowait(_EOF)
+                return
+
+            batch = [item]
+            while len(batch) < stage.batch_size:
+                try:
+                    item = inq.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is _EOF:
+                    inq.put_nowait(_EOF)
+                    break
+                batch.append(item)
+
+            metrics.items_in += len(batch)
+            metrics.batches += 1
+            start = time.perf_counter()
+            results = []
+            if executor is None:
+                for item in batch:
+                    try:
+                        result = stage.func(item)
+                        if is_coroutine:
+                            result = await result
+                        results.append(result)
+                    except Exception as e:
+                        metrics.errors += 1
+                        print(f"流水线阶段 {stage.name} 处理失败: {e}")
+            else:
+                try:
+                    results = await loop.run_in_executor(executor, stage.func, batch)
+                except Exception as e:
+                    metrics.errors += len(batch)
+                    print(f"流水线阶段 {stage.name} 批处理失败: {e}")
+            metrics.busy_seconds += time.perf_counter() - start
+
+            for result in results:
+                if result is None:
+                    metrics.dropped += 1
+                    continue
+                metrics.items_out += 1
+                await self._put(outq, result, metrics)
+            if index + 1 < len(self.stages):
+                self.metrics[self.stages[index + 1].name].observe_queue(outq.qsize())
+
+    async def _close_stage(self, index: int, workers: List[asyncio.Task]):
+        """等待阶段所有worker退出后，把结束标记传给下游"""
+        await asyncio.gather(*workers, return_exceptions=True)
+        self.metrics[self.stages[index].name].finished_at = time.perf_counter()
+        await self._queues[index + 1].put(_EOF)
+
+    async def _shutdown(self):
+        """取消仍在运行的任务并关闭线程/进程池"""
+        for task in self._tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for executor in self._executors:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._tasks = []
+        self._feeder = None
+        self.is_running = False
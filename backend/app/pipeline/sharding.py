@@ -0,0 +1,343 @@
+"""按来源IP分片的多进程分析
+
+dispatcher 按 crc32(source_ip) % N 把请求分配给N个工作进程，同一IP的请求
+始终由同一个进程按到达顺序处理，因此每个进程可以独立维护按IP的状态
+（请求数、攻击数、速率等），无需跨进程同步。
+
+进程间通信：
+- 每个分片一对单向Pipe，请求按批（batch_size条）pickle后发送，摊薄通信开销
+- 发送在单独线程中进行，Pipe写满时发送阻塞，dispatcher随之停止读取数据源（背压）
+- 收集线程用 multiprocessing.connection.wait 同时等待所有分片的结果，
+  写入有界asyncio队列，合并为一个结果流
+
+低流量分片的未满批次会在flush_interval后发送，避免实时跟踪模式下结果长时间滞留。
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from multiprocessing import connection as mp_connection
+from typing import Any, AsyncGenerator, AsyncIterable, Dict, List, Optional, Tuple
+
+from app.core.models import HTTPRequest, DetectionResult
+from app.core.exceptions import ConfigurationException
+
+# 结果流结束标记
+_EOF = object()
+
+
+def shard_for(key: str, shards: int) -> int:
+    """计算key所属分片（进程间稳定，不受PYTHONHASHSEED影响）"""
+    return zlib.crc32((key or '').encode('utf-8', errors='replace')) % shards
+
+
+class IPStateTable:
+    """单个分片内按IP维护的状态，超出容量时淘汰最久未出现的IP"""
+
+    def __init__(self, max_ips: int = 100000):
+        self.max_ips = max_ips
+        self.states: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.evicted = 0
+
+    def update(self, request: HTTPRequest, result: DetectionResult) -> Dict[str, Any]:
+        """更新IP状态，返回该请求处理后的IP上下文快照"""
+        ip = request.source_ip
+        state = self.states.get(ip)
+        if state is None:
+            state = {
+                'requests': 0,
+                'attacks': 0,
+                'first_seen': request.timestamp,
+                'last_seen': request.timestamp,
+                'attack_types': set()
+            }
+            self.states[ip] = state
+            if len(self.states) > self.max_ips:
+                self.states.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.states.move_to_end(ip)
+
+        state['requests'] += 1
+        if request.timestamp and (state['last_seen'] is None or request.timestamp > state['last_seen']):
+            state['last_seen'] = request.timestamp
+        if result.is_attack:
+            state['attacks'] += 1
+            state['attack_types'].update(t.value for t in result.attack_types)
+
+        span = 0.0
+        if state['first_seen'] and state['last_seen']:
+            span = (state['last_seen'] - state['first_seen']).total_seconds()
+        return {
+            'ip_requests': state['requests'],
+            'ip_attacks': state['attacks'],
+            'ip_first_seen': state['first_seen'],
+            'ip_last_seen': state['last_seen'],
+            'ip_request_rate': state['requests'] / span if span > 0 else None,
+            'ip_attack_types': sorted(state['attack_types'])
+        }
+
+    def top_attackers(self, n: int = 20) -> List[Tuple[str, int, int]]:
+        """按攻击数返回前n个IP [(ip, attacks, requests), ...]"""
+        ranked = sorted(self.states.items(), key=lambda x: x[1]['attacks'], reverse=True)[:n]
+        return [(ip, s['attacks'], s['requests']) for ip, s in ranked if s['attacks'] > 0]
+
+
+def _shard_worker(shard_id: int, in_conn, out_conn, engine, max_ips: int):
+    """分片工作进程：批量检测并维护本分片的IP状态"""
+    if engine is None:
+        from app.detector import DetectionEngine
+        engine = DetectionEngine()
+    table = IPStateTable(max_ips)
+    processed = attacks = errors = 0
+
+    while True:
+        try:
+            batch = in_conn.recv()
+        except EOFError:
+            break
+        if batch is None:
+            break
+
+        results = []
+        for request in batch:
+            processed += 1
+            try:
+                result = engine.detect_all(request)
+            except Exception:
+                errors += 1
+                results.append((request, None, None))
+                continue
+            if result.is_attack:
+                attacks += 1
+            context = table.update(request, result)
+            context['shard'] = shard_id
+            results.append((request, result, context))
+        out_conn.send(('batch', results))
+
+    out_conn.send(('done', {
+        'shard': shard_id,
+        'processed': processed,
+        'attacks': attacks,
+        'errors': errors,
+        'tracked_ips': len(table.states),
+        'evicted_ips': table.evicted,
+        'top_attackers': table.top_attackers()
+    }))
+    out_conn.close()
+
+
+class ShardedAnalyzer:
+    """按来源IP分片的多进程检测器"""
+
+    def __init__(
+        self,
+        shards: Optional[int] = None,
+        batch_size: int = 256,
+        engine=None,
+        max_ips_per_shard: int = 100000,
+        max_pending_batches: int = 64,
+        flush_interval: float = 0.1
+    ):
+        """初始化分片检测器
+
+        Args:
+            shards: 工作进程数，None表示CPU核数
+            batch_size: 每批发送给工作进程的请求数
+            engine: 检测引擎实例（复制到各工作进程），None表示默认DetectionEngine
+            max_ips_per_shard: 每个分片跟踪的IP数上限
+            max_pending_batches: 合并后尚未被消费的结果批次数上限
+            flush_interval: 未满批次的最长等待时间（秒）
+        """
+        self.shards = shards or os.cpu_count() or 1
+        if self.shards < 1 or batch_size < 1 or max_pending_batches < 1:
+            raise ConfigurationException("shards、batch_size和max_pending_batches必须大于0")
+        self.batch_size = batch_size
+        self.engine = engine
+        self.max_ips_per_shard = max_ips_per_shard
+        self.max_pending_batches = max_pending_batches
+        self.flush_interval = flush_interval
+
+        self.shard_summaries: Dict[int, Dict[str, Any]] = {}
+        self.stats = {
+            'dispatched': [0] * self.shards,
+            'batches_sent': 0,
+            'send_wait_seconds': 0.0,
+            'results': 0
+        }
+        self.is_running = False
+        self._processes: List[multiprocessing.Process] = []
+        self._send_conns = []
+        self._recv_conns = []
+        self._buffers: List[List[HTTPRequest]] = []
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._draining = False
+        self._closing = False
+        self._source_error: Optional[BaseException] = None
+
+    async def run(self, source: AsyncIterable[HTTPRequest]) -> AsyncGenerator[Tuple[HTTPRequest, Optional[DetectionResult], Optional[Dict[str, Any]]], None]:
+        """运行分片检测，产出 (request, result, ip_context)；检测失败时result为None
+
+        同一IP的结果保持到达顺序，不同IP之间不保证顺序。
+        """
+        if self.is_running:
+            raise ConfigurationException("分片检测器已在运行")
+        self.is_running = True
+        self._closing = False
+        self._draining = False
+        self._start_workers()
+
+        loop = asyncio.get_running_loop()
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending_batches)
+        send_pool = ThreadPoolExecutor(max_workers=1)
+        collect_pool = ThreadPoolExecutor(max_workers=1)
+        collector = loop.run_in_executor(collect_pool, self._collect, loop, results)
+        self._dispatcher = asyncio.create_task(self._dispatch(source, loop, send_pool))
+        flusher = asyncio.create_task(self._flush_periodically(loop, send_pool))
+
+        try:
+            while True:
+                batch = await results.get()
+                if batch is _EOF:
+                    break
+                self.stats['results'] += len(batch)
+                for item in batch:
+                    yield item
+            await self._dispatcher
+            if self._source_error is not None:
+                raise self._source_error
+        finally:
+            self._closing = True
+            for task in (self._dispatcher, flusher):
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(self._dispatcher, flusher, return_exceptions=True)
+            self._stop_workers()
+            await asyncio.gather(collector, return_exceptions=True)
+            send_pool.shutdown(wait=False, cancel_futures=True)
+            collect_pool.shutdown(wait=False)
+            self._dispatcher = None
+            self.is_running = False
+
+    def stop(self):
+        """停止读取数据源，已分发的请求会处理完后再结束"""
+        if self._dispatcher is not None and not self._dispatcher.done():
+            self._draining = True
+            self._dispatcher.cancel()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取分片分发与处理统计"""
+        return {
+            'shards': self.shards,
+            'batch_size': self.batch_size,
+            'dispatched_per_shard': list(self.stats['dispatched']),
+            'batches_sent': self.stats['batches_sent'],
+            'send_wait_seconds': round(self.stats['send_wait_seconds'], 6),
+            'results': self.stats['results'],
+            'shard_summaries': [self.shard_summaries[i] for i in sorted(self.shard_summaries)]
+        }
+
+    def _start_workers(self):
+        ctx = multiprocessing.get_context()
+        self._processes, self._send_conns, self._recv_conns = [], [], []
+        self._buffers = [[] for _ in range(self.shards)]
+        for shard_id in range(self.shards):
+            in_recv, in_send = ctx.Pipe(duplex=False)
+            out_recv, out_send = ctx.Pipe(duplex=False)
+            process = ctx.Process(
+                target=_shard_worker,
+                args=(shard_id, in_recv, out_send, self.engine, self.max_ips_per_shard),
+                daemon=True
+            )
+            process.start()
+            # 子进程持有的一端在父进程中关闭，子进程退出时父进程才能收到EOF
+            in_recv.close()
+            out_send.close()
+            self._processes.append(process)
+            self._send_conns.append(in_send)
+            self._recv_conns.append(out_recv)
+
+    def _stop_workers(self):
+        for conn in self._send_conns:
+            try:
+                conn.close()
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._processes = []
+
+    async def _send(self, shard_id: int, loop, send_pool):
+        """发送分片缓冲区中的请求（取出缓冲区与提交发送之间没有await，保证分片内顺序）"""
+        batch = self._buffers[shard_id]
+        if not batch:
+            return
+        self._buffers[shard_id] = []
+        start = time.perf_counter()
+        await loop.run_in_executor(send_pool, self._send_conns[shard_id].send, batch)
+        self.stats['send_wait_seconds'] += time.perf_counter() - start
+        self.stats['batches_sent'] += 1
+
+    async def _dispatch(self, source: AsyncIterable[HTTPRequest], loop, send_pool):
+        """读取数据源并按IP分发到各分片"""
+        try:
+            async for request in source:
+                shard_id = shard_for(request.source_ip, self.shards)
+                self._buffers[shard_id].append(request)
+                self.stats['dispatched'][shard_id] += 1
+                if len(self._buffers[shard_id]) >= self.batch_size:
+                    await self._send(shard_id, loop, send_pool)
+        except asyncio.CancelledError:
+            if not self._draining:
+                raise
+        except Exception as e:
+            self._source_error = e
+
+        for shard_id in range(self.shards):
+            await self._send(shard_id, loop, send_pool)
+        for conn in self._send_conns:
+            await loop.run_in_executor(send_pool, conn.send, None)
+
+    async def _flush_periodically(self, loop, send_pool):
+        """定期发送未满的批次"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            for shard_id in range(self.shards):
+                await self._send(shard_id, loop, send_pool)
+
+    def _collect(self, loop, results: asyncio.Queue):
+        """收集线程：合并各分片结果写入有界队列"""
+        pending = list(self._recv_conns)
+        while pending and not self._closing:
+            for conn in mp_connection.wait(pending, timeout=0.1):
+                try:
+                    kind, payload = conn.recv()
+                except (EOFError, OSError):
+                    pending.remove(conn)
+                    continue
+                if kind == 'done':
+                    self.shard_summaries[payload['shard']] = payload
+                    pending.remove(conn)
+                    continue
+                if not self._put_threadsafe(loop, results, payload):
+                    return
+        self._put_threadsafe(loop, results, _EOF)
+
+    def _put_threadsafe(self, loop, results: asyncio.Queue, item) -> bool:
+        """从收集线程向asyncio队列放入数据，队列满时等待，关闭时放弃"""
+        future = asyncio.run_coroutine_threadsafe(results.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=0.1)
+                return True
+            except FutureTimeoutError:
+                if self._closing:
+                    future.cancel()
+                    return False
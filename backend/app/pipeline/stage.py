@@ -0,0 +1,99 @@
+"""流水线阶段定义与阶段指标"""
+
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.exceptions import ConfigurationException
+
+
+class StageMetrics:
+    """单个阶段的运行指标"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.dropped = 0             # 处理函数返回None被过滤的条数
+        self.errors = 0
+        self.batches = 0
+        self.busy_seconds = 0.0      # 所有worker处理耗时之和
+        self.backpressure_waits = 0  # 下游队列已满需要等待的次数
+        self.max_queue_depth = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def observe_queue(self, depth: int):
+        """记录输入队列深度"""
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def to_dict(self, queue_depth: int = 0) -> Dict[str, Any]:
+        """导出为字典，附带吞吐率（条/秒）"""
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.perf_counter()) - self.started_at
+        return {
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'batches': self.batches,
+            'busy_seconds': round(self.busy_seconds, 6),
+            'backpressure_waits': self.backpressure_waits,
+            'queue_depth': queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'throughput': self.items_out / elapsed if elapsed > 0 else 0.0,
+            'finished': self.finished_at is not None
+        }
+
+
+class Stage:
+    """流水线阶段
+
+    executor决定处理函数的执行方式：
+    - "async": 在事件循环中逐条调用，func(item)，可以是普通函数或协程函数，适合I/O
+    - "thread": 线程池中按批调用，func(items) -> List
+    - "process": 进程池中按批调用，func(items) -> List，适合CPU密集的检测；
+      func、initializer及数据必须可pickle，批处理用于摊薄进程间通信开销
+
+    处理结果为None的条目会被过滤，不传给下游。
+    """
+
+    EXECUTORS = ("async", "thread", "process")
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable,
+        workers: int = 1,
+        executor: str = "async",
+        queue_size: int = 1000,
+        batch_size: int = 1,
+        initializer: Optional[Callable] = None,
+        initargs: Tuple = ()
+    ):
+        """初始化阶段
+
+        Args:
+            name: 阶段名称，用于指标
+            func: 处理函数
+            workers: 并发worker数（async为协程数，thread/process为池大小）
+            executor: 执行方式，"async" / "thread" / "process"
+            queue_size: 本阶段输入队列容量，满时上游等待（背压）
+            batch_size: 每次从输入队列最多取出的条数
+            initializer: 线程/进程池的初始化函数
+            initargs: 初始化函数参数
+        """
+        if executor not in self.EXECUTORS:
+            raise ConfigurationException(f"不支持的执行方式: {executor}，可选: {', '.join(self.EXECUTORS)}")
+        if workers < 1 or queue_size < 1 or batch_size < 1:
+            raise ConfigurationException("workers、queue_size和batch_size必须大于0")
+
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.executor = executor
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.initializer = initializer
+        self.initargs = initargs
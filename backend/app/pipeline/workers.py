@@ -0,0 +1,46 @@
+"""流水线进程池中运行的解析和检测函数
+
+函数需定义在模块顶层，才能被进程池pickle调用。每个工作进程在初始化时
+创建自己的检测引擎，之后按批处理请求，避免逐条进程间通信。
+"""
+
+from typing import List, Optional, Tuple
+
+from app.capture.formats import get_format
+from app.core.models import HTTPRequest, DetectionResult
+
+# 每个工作进程独有的检测引擎
+_engine = None
+
+
+def parse_batch(lines: List[str], log_format: str = "combined") -> List[Optional[HTTPRequest]]:
+    """批量解析日志行，格式错误的行结果为None"""
+    parser = get_format(log_format)
+    return [parser(line) for line in lines]
+
+
+def init_detection_worker(engine=None):
+    """进程池初始化：创建本进程的检测引擎
+
+    Args:
+        engine: 可选的检测引擎实例（会被复制到工作进程），None表示使用默认DetectionEngine
+    """
+    global _engine
+    if engine is None:
+        from app.detector import DetectionEngine
+        engine = DetectionEngine()
+    _engine = engine
+
+
+def detect_batch(requests: List[HTTPRequest]) -> List[Tuple[HTTPRequest, Optional[DetectionResult]]]:
+    """批量检测请求，检测失败的请求结果为None"""
+    if _engine is None:
+        init_detection_worker()
+
+    results = []
+    for request in requests:
+        try:
+            results.append((request, _engine.detect_all(request)))
+        except Exception:
+            results.append((request, None))
+    return results
@@ -1,7 +1,27 @@
 """数据存储模块"""
 
-from .base import BaseStorage
+from .base import BaseStorage, StorageFactory
+from .memory import MemoryStorage
+from .sqlite import SQLiteStorage
+from .sql import SQLAlchemyStorage
+from .write_behind import WriteBehindStorage
+from .rollup import RollupStorage
+from .partitioned import PartitionedStorage
+from .tiered import TieredStorage
+
+# 注册存储后端
+StorageFactory.register_storage("memory", MemoryStorage)
+StorageFactory.register_storage("sqlite", SQLiteStorage)
+StorageFactory.register_storage("sqlalchemy", SQLAlchemyStorage)
 
 __all__ = [
-    "BaseStorage"
-] 
\ No newline at end of file
+    "BaseStorage",
+    "StorageFactory",
+    "MemoryStorage",
+    "SQLiteStorage",
+    "SQLAlchemyStorage",
+    "WriteBehindStorage",
+    "RollupStorage",
+    "PartitionedStorage",
+    "TieredStorage"
+]
@@ -1,21 +1,41 @@
 """数据存储基类"""
 
+import uuid
 from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import datetime
 from typing import List, Optional, Dict, Any
+from urllib.parse import urlsplit
+from .pagination import event_timestamp
 from app.core.models import SecurityEvent
 from app.core.exceptions import StorageException
 
 class BaseStorage(ABC):
     """存储服务基类"""
+
+    # 多个进程（API worker）读写同一份数据时为True，进程内维护的派生数据（如预聚合统计）在这类存储上不完整
+    shared = False
     
     def __init__(self, config: dict = None):
         self.config = config or {}
     
     @abstractmethod
-    async def save_event(self, event: SecurityEvent) -> str:
-        """保存安全事件，返回事件ID"""
+    async def save_event(self, event: SecurityEvent, durable: bool = False) -> str:
+        """保存安全事件，返回事件ID
+
+        durable为True时在事件写入持久存储后才返回，写入失败时抛出StorageException；
+        写入即落盘的存储忽略该参数
+        """
         pass
     
+    def new_event_id(self, event: SecurityEvent) -> str:
+        """为还没有ID的事件生成ID；包装其他存储的存储应交给底层存储生成（底层存储可能在ID中编码事件所在位置）"""
+        return f"event_{uuid.uuid4().hex}"
+
+    async def save_events(self, events: List[SecurityEvent]) -> List[str]:
+        """批量保存安全事件，返回事件ID列表；支持批量写入的存储应重写"""
+        return [await self.save_event(event) for event in events]
+    
     @abstractmethod
     async def get_event(self, event_id: str) -> Optional[SecurityEvent]:
         """获取单个安全事件"""
@@ -44,4 +64,84 @@ class BaseStorage(ABC):
     @abstractmethod
     async def get_statistics(self, **filters) -> Dict[str, Any]:
         """获取统计数据"""
-        pass 
\ No newline at end of file
+        pass
+    
+    async def get_cardinality(
+        self, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None, limit: int = 10
+    ) -> Dict[str, Any]:
+        """攻击事件的不同来源IP数、不同被攻击路径数和高频来源/路径
+
+        默认按游标逐页遍历时间范围内的攻击事件精确统计（误差为0），代价与事件数成正比；
+        维护了预聚合草图的存储应重写
+        """
+        filters = {name: value for name, value in (('start_time', start_time), ('end_time', end_time))
+                   if value is not None}
+        sources, paths = Counter(), Counter()
+        after = None
+        while True:
+            page = await self.query_events(is_attack=True, page_size=5000, after=after, **filters)
+            for event in page:
+                sources[event.request.source_ip] += 1
+                paths[urlsplit(event.request.url).path or '/'] += 1
+            if len(page) < 5000:
+                break
+            after = (event_timestamp(page[-1]).timestamp(), page[-1].event_id)
+        return {
+            "attack_events": sum(sources.values()),
+            "distinct_sources": {"estimate": len(sources), "relative_error": 0.0},
+            "distinct_paths": {"estimate": len(paths), "relative_error": 0.0},
+            "top_sources": [
+                {"source_ip": source_ip, "attack_count": count, "max_error": 0}
+                for source_ip, count in sources.most_common(limit)
+            ],
+            "top_paths": [
+                {"path": path, "attack_count": count, "max_error": 0}
+                for path, count in paths.most_common(limit)
+            ],
+            "count_error_bound": 0
+        }
+
+    async def retired_statistics(self) -> List[Dict[str, Any]]:
+        """已按保留期删除的事件留下的计数，供重建预聚合统计时计入，默认没有
+
+        每项包含start（时间戳）、high_risk_events、attack_distribution
+        和trend（[小时起始时间戳, 总事件数, 攻击数] 列表）
+        """
+        return []
+
+    async def strip_raw_requests(self) -> int:
+        """去掉全部事件的请求头、请求体和原始日志，只保留摘要字段、检测结果和LLM分析，
+        返回处理的事件数；默认不支持，返回0
+        """
+        return 0
+
+    async def initialize(self):
+        """建立连接、创建表结构等准备工作，默认无需准备"""
+        pass
+    
+    async def flush(self):
+        """把缓冲中的写入落盘，默认写入即落盘"""
+        pass
+    
+    async def close(self):
+        """释放连接等资源，默认无需释放"""
+        pass
+
+
+class StorageFactory:
+    """存储工厂"""
+
+    _storages = {}
+
+    @classmethod
+    def register_storage(cls, name: str, storage_class: type):
+        """注册存储后端"""
+        cls._storages[name] = storage_class
+
+    @classmethod
+    def create_storage(cls, name: str, config: dict = None) -> BaseStorage:
+        """创建存储实例"""
+        if name not in cls._storages:
+            raise StorageException(f"未找到存储后端: {name}")
+
+        return cls._storages[name](config)
@@ -0,0 +1,375 @@
+"""带索引的内存事件存储
+
+每个事件分配一个递增的行号，索引都建立在行号上：
+- 时间索引：按 (时间, 行号) 排序的行号数组，时间范围用二分查找定位；
+  新写入的行先进入待合并列表，查询前一次性归并，避免每次写入都移动整个数组
+- 低基数字段（is_attack、攻击类型、严重程度）：每个取值一个位图，按位与求交集，
+  按位计数直接得到数量
+- 高基数字段（source_ip）：每个取值一个行号列表
+
+组合过滤时从最小的候选集出发：有IP过滤时从该IP的行号列表出发；
+否则在时间范围和位图交集中选数量较小的一个展开，再用另一个过滤。
+"""
+
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .base import BaseStorage
+from .serialization import enum_value, stripped_request
+from app.core.models import AttackType, SecurityEvent, Severity
+from app.core.exceptions import StorageException
+
+# 每个字节中置位的个数
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# 趋势统计的周期（秒）
+PERIOD_SECONDS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+
+
+def event_time(event: SecurityEvent) -> float:
+    """事件时间（请求时间，缺失时为创建时间）的时间戳，不带时区的按本地时间处理"""
+    timestamp = event.request.timestamp if event.request and event.request.timestamp else event.created_at
+    return timestamp.timestamp()
+
+
+def _timestamp(value) -> float:
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+
+class MemoryStorage(BaseStorage):
+    """带索引的内存事件存储"""
+
+    def __init__(self, config: dict = None):
+        super().__init__(config)
+        self.event_counter = 0
+        self._events: List[Optional[SecurityEvent]] = []
+        self._rows: Dict[str, int] = {}
+        self._capacity = 0
+        self._times = np.zeros(0, dtype=np.float64)
+        self._alive = np.zeros(0, dtype=np.bool_)
+
+        # 时间索引：按(时间, 行号)排序的行号及对应时间
+        self._index_rows = np.zeros(0, dtype=np.int64)
+        self._index_times = np.zeros(0, dtype=np.float64)
+        self._pending: List[int] = []
+        self._index_dirty = False
+
+        # (字段, 取值) -> 位图；source_ip -> 行号列表
+        self._bitmaps: Dict[Tuple[str, Any], bytearray] = {}
+        self._ip_rows: Dict[str, List[int]] = {}
+        # 每行建索引时使用的(位图键, IP)，事件对象被原地修改后也能准确撤销索引
+        self._row_keys: List[Optional[Tuple[List[Tuple[str, Any]], str]]] = []
+
+    async def save_event(self, event: SecurityEvent, durable: bool = False) -> str:
+        """保存事件；事件已有ID时沿用，否则生成"""
+        if not event.event_id:
+            self.event_counter += 1
+            event.event_id = f"event_{self.event_counter}"
+        if event.event_id in self._rows:
+            raise StorageException(f"事件ID已存在: {event.event_id}")
+        self._insert(event)
+        return event.event_id
+
+    async def get_event(self, event_id: str) -> Optional[SecurityEvent]:
+        row = self._rows.get(event_id)
+        return self._events[row] if row is not None else None
+
+    async def query_events(self, **filters) -> List[SecurityEvent]:
+        """查询事件，按时间排序后分页
+
+        Args:
+            page, page_size: 分页，默认第1页、每页20条
+            order: "desc"（默认，最新的在前）或 "asc"
+            is_attack, attack_type, severity, source_ip: 等值过滤
+            start_time, end_time: 时间范围（包含两端）
+            after: (时间, event_id)，键集分页：从该事件之后（按order方向）开始取，忽略page
+        """
+        page = filters.get("page", 1)
+        page_size = filters.get("page_size", 20)
+        descending = filters.get("order", "desc") == "desc"
+        rows = self._select(filters)
+        start = (page - 1) * page_size
+        if filters.get("after") is not None:
+            rows = self._skip_ties(rows, filters["after"], descending)
+            start = 0
+        if descending:
+            rows = rows[::-1]
+        return [self._events[row] for row in rows[start:start + page_size].tolist()]
+
+    async def delete_event(self, event_id: str) -> bool:
+        row = self._rows.pop(event_id, None)
+        if row is None:
+            return False
+        self._unindex(row)
+        self._events[row] = None
+        self._alive[row] = False
+        self._index_dirty = True
+        return True
+
+    async def update_event(self, event_id: str, event: SecurityEvent) -> bool:
+        """更新事件；时间不变时原地重建二级索引，时间变化时作为新行写入"""
+        row = self._rows.get(event_id)
+        if row is None:
+            return False
+        event.event_id = event_id
+        if event_time(event) == self._times[row]:
+            self._unindex(row)
+            self._events[row] = event
+            self._index(row, event)
+        else:
+            await self.delete_event(event_id)
+            self._insert(event)
+        return True
+
+    async def strip_raw_requests(self) -> int:
+        """请求不参与索引，直接替换为去掉原始内容的副本"""
+        stripped = 0
+        for event in self._events:
+            if event is not None:
+                event.request = stripped_request(event.request)
+                stripped += 1
+        return stripped
+
+    async def count_events(self, **filters) -> int:
+        """统计符合过滤条件的事件数（参数同query_events，忽略分页）"""
+        has_time = filters.get("start_time") is not None or filters.get("end_time") is not None
+        if filters.get("source_ip") is None and not has_time:
+            mask = self._filter_mask(filters)
+            if mask is None:
+                return len(self._rows)
+            if isinstance(mask, bool):
+                return 0
+            return int(_POPCOUNT[mask].sum(dtype=np.int64))
+        return len(self._select(filters))
+
+    async def get_statistics(self, **filters) -> Dict[str, Any]:
+        """按时间范围统计总数、攻击数、攻击类型分布、趋势和攻击来源
+
+        Args:
+            start_time, end_time: 时间范围
+            period: 趋势周期，hour / day / week
+            limit: 攻击来源返回数量
+        """
+        rows = self._select({'start_time': filters.get('start_time'), 'end_time': filters.get('end_time')})
+        attack_mask = self._test(('is_attack', True), rows)
+        attack_rows = rows[attack_mask]
+
+        distribution = {}
+        for attack_type in AttackType:
+            count = int(self._test(('attack_type', attack_type.value), attack_rows).sum())
+            if count:
+                distribution[attack_type.value] = count
+
+        return {
+            "total_events": len(rows),
+            "attack_events": len(attack_rows),
+            "high_risk_events": int(self._test(('severity', Severity.HIGH.value), rows).sum()),
+            "attack_distribution": distribution,
+            "trend_data": self._trend(rows, attack_mask, filters.get('period', 'hour')),
+            "top_attack_sources": self._top_sources(attack_rows, filters.get('limit', 10))
+        }
+
+    def _insert(self, event: SecurityEvent):
+        row = len(self._events)
+        if row >= self._capacity:
+            self._grow()
+        self._events.append(event)
+        self._row_keys.append(None)
+        self._rows[event.event_id] = row
+        self._times[row] = event_time(event)
+        self._alive[row] = True
+        self._pending.append(row)
+        self._index(row, event)
+
+    def _grow(self):
+        """容量翻倍；位图换成新的bytearray，不在可能被numpy引用的缓冲区上原地扩容"""
+        capacity = max(1024, self._capacity * 2)
+        times = np.zeros(capacity, dtype=np.float64)
+        times[:self._capacity] = self._times
+        alive = np.zeros(capacity, dtype=np.bool_)
+        alive[:self._capacity] = self._alive
+        self._times, self._alive = times, alive
+        extra = bytes((capacity - self._capacity) // 8)
+        for key, bitmap in self._bitmaps.items():
+            self._bitmaps[key] = bitmap + extra
+        self._capacity = capacity
+
+    @staticmethod
+    def _keys(event: SecurityEvent) -> List[Tuple[str, Any]]:
+        """事件在位图索引中的 (字段, 取值)"""
+        keys = [('is_attack', bool(event.detection.is_attack))]
+        keys.extend(('attack_type', attack_type.value) for attack_type in set(event.detection.attack_types))
+        if event.llm_analysis is not None:
+            keys.append(('severity', event.llm_analysis.severity.value))
+        return keys
+
+    def _index(self, row: int, event: SecurityEvent):
+        keys = self._keys(event)
+        source_ip = event.request.source_ip
+        byte, bit = row >> 3, 1 << (row & 7)
+        for key in keys:
+            bitmap = self._bitmaps.get(key)
+            if bitmap is None:
+                bitmap = self._bitmaps[key] = bytearray(self._capacity // 8)
+            bitmap[byte] |= bit
+        insort(self._ip_rows.setdefault(source_ip, []), row)
+        self._row_keys[row] = (keys, source_ip)
+
+    def _unindex(self, row: int):
+        keys, source_ip = self._row_keys[row]
+        byte, bit = row >> 3, ~(1 << (row & 7)) & 0xFF
+        for key in keys:
+            self._bitmaps[key][byte] &= bit
+        rows = self._ip_rows[source_ip]
+        rows.pop(bisect_left(rows, row))
+        if not rows:
+            del self._ip_rows[source_ip]
+        self._row_keys[row] = None
+
+    def _refresh_index(self):
+        """去掉已删除的行，把待合并的行归并进时间索引"""
+        if self._index_dirty:
+            keep = self._alive[self._index_rows]
+            self._index_rows = self._index_rows[keep]
+            self._index_times = self._index_times[keep]
+            self._index_dirty = False
+        if self._pending:
+            rows = np.array(self._pending, dtype=np.int64)
+            self._pending = []
+            rows = rows[self._alive[rows]]
+            times = self._times[rows]
+            order = np.lexsort((rows, times))
+            rows, times = rows[order], times[order]
+            # 新行的行号大于已有的所有行，时间相同时排在后面
+            positions = np.searchsorted(self._index_times, times, side='right')
+            self._index_rows = np.insert(self._index_rows, positions, rows)
+            self._index_times = np.insert(self._index_times, positions, times)
+
+    def _bitmap(self, key: Tuple[str, Any]) -> Optional[np.ndarray]:
+        bitmap = self._bitmaps.get(key)
+        return np.frombuffer(bitmap, dtype=np.uint8) if bitmap is not None else None
+
+    def _test(self, key: Tuple[str, Any], rows: np.ndarray) -> np.ndarray:
+        """rows中的每一行在key的位图中是否置位"""
+        bitmap = self._bitmap(key)
+        if bitmap is None:
+            return np.zeros(len(rows), dtype=np.bool_)
+        return ((bitmap[rows >> 3] >> (rows & 7).astype(np.uint8)) & 1).astype(np.bool_)
+
+    def _filter_mask(self, filters: Dict[str, Any]):
+        """等值过滤条件的位图交集；没有条件时返回None，某个条件没有任何匹配时返回False"""
+        keys = []
+        if filters.get("is_attack") is not None:
+            keys.append(('is_attack', bool(filters["is_attack"])))
+        if filters.get("attack_type") is not None:
+            keys.append(('attack_type', enum_value(filters["attack_type"], AttackType)))
+        if filters.get("severity") is not None:
+            keys.append(('severity', enum_value(filters["severity"], Severity)))
+        mask = None
+        for key in keys:
+            bitmap = self._bitmap(key)
+            if bitmap is None:
+                return False
+            mask = bitmap if mask is None else np.bitwise_and(mask, bitmap)
+        return mask
+
+    def _select(self, filters: Dict[str, Any]) -> np.ndarray:
+        """符合过滤条件的行号，按(时间, 行号)升序"""
+        mask = self._filter_mask(filters)
+        if mask is False:
+            return np.zeros(0, dtype=np.int64)
+        start = filters.get("start_time")
+        end = filters.get("end_time")
+        low = start.timestamp() if start is not None else -np.inf
+        high = end.timestamp() if end is not None else np.inf
+
+        if filters.get("after") is not None:
+            # 键集分页：时间范围收窄到游标一侧，同一时间的事件由_skip_ties处理
+            after_time = _timestamp(filters["after"][0])
+            if filters.get("order", "desc") == "desc":
+                high = min(high, after_time)
+            else:
+                low = max(low, after_time)
+
+        source_ip = filters.get("source_ip")
+        if source_ip is not None:
+            rows = np.array(self._ip_rows.get(source_ip, ()), dtype=np.int64)
+            return self._narrow(rows, mask, low, high)
+
+        self._refresh_index()
+        lo = int(np.searchsorted(self._index_times, low, side='left'))
+        hi = int(np.searchsorted(self._index_times, high, side='right'))
+        if mask is None:
+            return self._index_rows[lo:hi]
+        # 位图交集比时间范围小得多时，从位图展开再按时间过滤排序
+        matched = int(_POPCOUNT[mask].sum(dtype=np.int64))
+        if matched * 8 < hi - lo:
+            rows = np.flatnonzero(np.unpackbits(mask, bitorder='little')).astype(np.int64)
+            return self._narrow(rows, None, low, high)
+        rows = self._index_rows[lo:hi]
+        return rows[((mask[rows >> 3] >> (rows & 7).astype(np.uint8)) & 1).astype(np.bool_)]
+
+    def _skip_ties(self, rows: np.ndarray, after, descending: bool) -> np.ndarray:
+        """去掉与游标时间相同、按(时间, 行号)排在游标事件之前（含游标事件）的行
+
+        游标事件已被删除时，与它时间相同的事件都视为已返回
+        """
+        after_time = _timestamp(after[0])
+        anchor = self._rows.get(after[1])
+        if descending:
+            end = len(rows)
+            while end and self._times[rows[end - 1]] == after_time and (anchor is None or rows[end - 1] >= anchor):
+                end -= 1
+            return rows[:end]
+        begin = 0
+        while begin < len(rows) and self._times[rows[begin]] == after_time and (anchor is None or rows[begin] <= anchor):
+            begin += 1
+        return rows[begin:]
+
+    def _narrow(self, rows: np.ndarray, mask, low: float, high: float) -> np.ndarray:
+        """按位图和时间范围过滤行号，并按(时间, 行号)排序"""
+        if mask is not None and len(rows):
+            rows = rows[((mask[rows >> 3] >> (rows & 7).astype(np.uint8)) & 1).astype(np.bool_)]
+        times = self._times[rows]
+        keep = (times >= low) & (times <= high)
+        rows, times = rows[keep], times[keep]
+        return rows[np.lexsort((rows, times))]
+
+    def _trend(self, rows: np.ndarray, attack_mask: np.ndarray, period: str) -> List[Dict[str, Any]]:
+        """按周期分桶统计事件数和攻击数（按本地时间对齐）"""
+        if not len(rows):
+            return []
+        seconds = PERIOD_SECONDS.get(period, PERIOD_SECONDS['hour'])
+        offset = datetime.now().astimezone().utcoffset().total_seconds()
+        buckets = np.floor((self._times[rows] + offset) / seconds).astype(np.int64)
+        keys, totals = np.unique(buckets, return_counts=True)
+        attacks = np.bincount(np.searchsorted(keys, buckets[attack_mask]), minlength=len(keys))
+        return [
+            {
+                "timestamp": datetime.fromtimestamp(int(key) * seconds - offset),
+                "total_events": int(total),
+                "attack_events": int(attack)
+            }
+            for key, total, attack in zip(keys, totals, attacks)
+        ]
+
+    def _top_sources(self, attack_rows: np.ndarray, limit: int) -> List[Dict[str, Any]]:
+        """攻击次数最多的来源IP及其最近一次攻击时间"""
+        counts: Dict[str, int] = {}
+        last: Dict[str, int] = {}
+        for row in attack_rows.tolist():
+            ip = self._events[row].request.source_ip
+            counts[ip] = counts.get(ip, 0) + 1
+            last[ip] = row  # 行号按时间升序，最后一次即最近
+        top = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [
+            {
+                "source_ip": ip,
+                "attack_count": count,
+                "last_attack": self._events[last[ip]].request.timestamp
+            }
+            for ip, count in top
+        ]
@@ -0,0 +1,164 @@
+"""事件列表的游标分页与总数缓存
+
+- 游标：上一页最后一个事件的 (事件时间, event_id)，编码为不透明的URL安全字符串，
+  传给各存储query_events的after过滤条件，深翻页不需要OFFSET
+- 总数缓存：按过滤条件缓存count_events的结果；新保存的事件逐个匹配已缓存的过滤条件并累加，
+  缓存过期（ttl）后重新精确计数。其他进程写入、删除和深度分析更新带来的偏差最多持续一个ttl
+"""
+
+import base64
+import binascii
+import heapq
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .serialization import attack_type_values, enum_value
+from app.core.models import AttackType, SecurityEvent, Severity
+from app.core.exceptions import StorageException
+
+# 参与计数的过滤条件
+COUNT_FILTERS = ('is_attack', 'attack_type', 'severity', 'source_ip', 'start_time', 'end_time')
+
+# 分页参数
+PAGE_FILTERS = ('page', 'page_size', 'order', 'after')
+
+
+def event_timestamp(event: SecurityEvent) -> datetime:
+    """存储排序用的事件时间（请求时间，缺失时为创建时间）"""
+    return event.request.timestamp if event.request and event.request.timestamp else event.created_at
+
+
+def encode_cursor(event: SecurityEvent) -> str:
+    """把一页的最后一个事件编码为下一页的游标"""
+    payload = json.dumps([event_timestamp(event).timestamp(), event.event_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """解码游标为query_events的after参数 (时间戳, event_id)，格式不正确时抛出StorageException"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, event_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return float(timestamp), str(event_id)
+    except (ValueError, TypeError, binascii.Error, UnicodeError):
+        raise StorageException(f"无效的分页游标: {cursor}")
+
+
+def event_matches(event: SecurityEvent, filters: Dict[str, Any]) -> bool:
+    """事件是否符合count_events的过滤条件"""
+    if filters.get('is_attack') is not None and bool(event.detection.is_attack) != bool(filters['is_attack']):
+        return False
+    if filters.get('attack_type') is not None and \
+            enum_value(filters['attack_type'], AttackType) not in attack_type_values(event):
+        return False
+    if filters.get('severity') is not None:
+        severity = event.llm_analysis.severity.value if event.llm_analysis else None
+        if severity != enum_value(filters['severity'], Severity):
+            return False
+    if filters.get('source_ip') is not None and event.request.source_ip != filters['source_ip']:
+        return False
+    timestamp = event_timestamp(event).timestamp()
+    if filters.get('start_time') is not None and timestamp < filters['start_time'].timestamp():
+        return False
+    if filters.get('end_time') is not None and timestamp > filters['end_time'].timestamp():
+        return False
+    return True
+
+
+def merge_ranked(pages: List[List[SecurityEvent]], descending: bool) -> List[SecurityEvent]:
+    """归并多个来源各自按时间排好序的事件，同一时间的事件按来源顺序排列"""
+    ranked = [[(event, rank) for event in page] for rank, page in enumerate(pages)]
+    merged = heapq.merge(*ranked, key=lambda item: (event_timestamp(item[0]).timestamp(), item[1]), reverse=descending)
+    return [event for event, _ in merged]
+
+
+def resume_filters(
+    filters: Dict[str, Any], after: Tuple[Any, str], anchor: Optional[int], rank: int, descending: bool
+) -> Dict[str, Any]:
+    """按merge_ranked合并的第rank个来源从游标after之后继续的过滤条件
+
+    anchor为游标事件所在来源的顺序：游标所在来源和排在它前面的来源用after跳过同一时间已返回的事件，
+    排在它后面的来源还没有返回过与游标同一时间的事件，改为包含游标时间的时间范围；
+    游标事件已不存在（anchor为None）时各来源都跳过同一时间的事件
+    """
+    filters = dict(filters)
+    if anchor is None or rank == anchor or (rank > anchor if descending else rank < anchor):
+        filters['after'] = after
+        return filters
+    moment = after[0] if isinstance(after[0], datetime) else datetime.fromtimestamp(float(after[0]))
+    if descending:
+        end = filters.get('end_time')
+        filters['end_time'] = moment if end is None else min(end, moment)
+    else:
+        start = filters.get('start_time')
+        filters['start_time'] = moment if start is None else max(start, moment)
+    return filters
+
+
+class TotalsCache:
+    """按过滤条件缓存的事件总数，写入时增量更新"""
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 256):
+        """初始化缓存
+
+        Args:
+            ttl: 缓存的总数多少秒后重新精确计数
+            max_entries: 最多缓存多少组过滤条件，超出时淘汰最久未使用的
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # 过滤条件键 -> [过滤条件, 总数, 精确计数的时间]
+        self._entries: "OrderedDict[tuple, list]" = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'incremented': 0}
+
+    @staticmethod
+    def _key(filters: Dict[str, Any]) -> tuple:
+        key = []
+        for name in COUNT_FILTERS:
+            value = filters.get(name)
+            if isinstance(value, datetime):
+                value = value.timestamp()
+            elif name == 'attack_type':
+                value = enum_value(value, AttackType)
+            elif name == 'severity':
+                value = enum_value(value, Severity)
+            key.append(value)
+        return tuple(key)
+
+    async def get(self, storage, filters: Dict[str, Any]) -> Tuple[int, bool]:
+        """返回 (总数, 是否为刚刚精确计数的结果)"""
+        key = self._key(filters)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry[2] < self.ttl:
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[1], False
+
+        self.stats['misses'] += 1
+        count_filters = {name: filters[name] for name in COUNT_FILTERS if filters.get(name) is not None}
+        total = await storage.count_events(**count_filters)
+        self._entries[key] = [count_filters, total, now]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return total, True
+
+    def observe_saved(self, event: SecurityEvent):
+        """新保存的事件计入所有匹配的缓存总数"""
+        for entry in self._entries.values():
+            if event_matches(event, entry[0]):
+                entry[1] += 1
+                self.stats['incremented'] += 1
+
+    def invalidate(self):
+        """删除事件等无法增量更新的变化之后，清空缓存"""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats['entries'] = len(self._entries)
+        return stats
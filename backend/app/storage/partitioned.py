@@ -0,0 +1,506 @@
+"""按时间分区的事件存储
+
+事件按 (类别, 时间段) 分区，每个分区是一个独立的底层存储（memory，或sqlite的一个数据库文件）：
+- 类别：attack（检测为攻击）/ benign（其他）
+- 时间段：按本地时间对齐的天或小时（granularity）
+
+每个类别有自己的保留期（默认攻击180天、良性7天）。过期时整个分区关闭并删除文件，
+不逐行删除，代价与分区中的事件数无关；写入时已超过保留期的事件不保存明细。
+删除分区之前先取出它按小时的计数保存为退役统计（retired_statistics），
+RollupStorage重建预聚合数据时计入，过期的良性流量仍保留在统计趋势中（只保留计数）。
+原始请求（请求头、请求体和原始日志）另有更短的保留期（默认7天）：分区整段超过后一次性去掉其中所有事件的原始请求，
+只保留URL、方法、来源等摘要字段和检测结果，之后写入该时间段的事件也不保存原始请求。
+
+查询只访问时间范围和is_attack相关的分区。不同时间段的分区时间不重叠，
+按时间顺序逐段读取，同一时间段的两个类别按 (时间, 类别) 归并，键集分页的游标跨分区有效。
+
+生成的event_id中编码了保存时所在的分区（event_a2024010100_<uuid>），按ID读取、更新、删除直接访问该分区；
+更新时移到其他分区的事件先查同一时间段的另一个类别，都没有时才逐个分区查找。
+每个分区的事件数第一次用到时计数一次，之后随写入、删除增量维护，
+覆盖整个分区的计数和分页跳过不再访问分区。
+"""
+
+import json
+import math
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import replace
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .base import BaseStorage, StorageFactory
+from .memory import MemoryStorage
+from .pagination import PAGE_FILTERS, event_timestamp, merge_ranked, resume_filters
+from .serialization import stripped_request
+from app.core.models import AttackType, SecurityEvent
+from app.core.exceptions import ConfigurationException
+
+# 类别顺序也是同一时间的事件在分区之间的先后顺序
+CLASSES = ('attack', 'benign')
+GRANULARITY_SECONDS = {'hour': 3600, 'day': 86400}
+PARTITION_BACKENDS = ('memory', 'sqlite')
+PARTITION_FILE = re.compile(r'^(attack|benign)-(\d{10})\.db$')
+PARTITION_ID = re.compile(r'^event_([ab])(\d{10})_')
+RETIRED_FILE = '_retired.json'
+STRIPPED_FILE = '_stripped.json'
+
+PartitionKey = Tuple[str, int]  # (类别, 分区起始时间戳)
+
+
+def event_class(event: SecurityEvent) -> str:
+    return 'attack' if event.detection.is_attack else 'benign'
+
+
+def _seconds(value) -> float:
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+
+class PartitionedStorage(BaseStorage):
+    """按时间分区、分类别保留的事件存储"""
+
+    def __init__(self, config: dict = None, clock: Callable[[], float] = time.time):
+        """初始化存储
+
+        Args:
+            config: backend（分区的存储后端，memory或sqlite），
+                directory（sqlite分区文件所在目录，默认partitions），
+                granularity（分区粒度，day或hour，默认day），
+                attack_retention_days / benign_retention_days（各类别保留天数，默认180 / 7），
+                raw_retention_days（原始请求的保留天数，默认7，超过后只保留摘要字段和检测结果），
+                expire_interval（写入时检查过期分区的最短间隔秒数，默认60），
+                max_open（最多同时打开的sqlite分区数，默认为保留期内两个类别的分区总数，即不关闭空闲连接；
+                    超出时空闲的按最久未使用关闭，按小时分区且保留期很长时应按文件描述符上限调小），
+                recent_ids（记住最近写入的事件所在分区的数量，默认100000）
+            clock: 当前时间（秒），决定分区何时过期
+        """
+        super().__init__(config)
+        self.backend = self.config.get('backend', 'memory')
+        if self.backend not in PARTITION_BACKENDS:
+            raise ConfigurationException(f"分区存储不支持的后端: {self.backend}，可选: {', '.join(PARTITION_BACKENDS)}")
+        granularity = self.config.get('granularity', 'day')
+        if granularity not in GRANULARITY_SECONDS:
+            raise ConfigurationException(f"不支持的分区粒度: {granularity}，可选: {', '.join(GRANULARITY_SECONDS)}")
+        self.granularity = granularity
+        self.size = GRANULARITY_SECONDS[granularity]
+        self.directory = self.config.get('directory', 'partitions')
+        self.retention = {
+            'attack': self.config.get('attack_retention_days', 180) * 86400,
+            'benign': self.config.get('benign_retention_days', 7) * 86400,
+        }
+        self.raw_retention = self.config.get('raw_retention_days', 7) * 86400
+        self.expire_interval = self.config.get('expire_interval', 60)
+        self.max_open = self.config.get('max_open') or sum(
+            math.ceil(retention / self.size) + 1 for retention in self.retention.values()
+        )
+        self.recent_limit = self.config.get('recent_ids', 100000)
+        self.clock = clock
+        self.offset = datetime.now().astimezone().utcoffset().total_seconds()
+
+        self._partitions: Dict[PartitionKey, BaseStorage] = {}
+        # 打开的sqlite分区（最近使用的在后）和正在使用的次数
+        self._open: "OrderedDict[PartitionKey, None]" = OrderedDict()
+        self._busy: Dict[PartitionKey, int] = {}
+        # 最近写入的event_id -> 分区
+        self._recent: "OrderedDict[str, PartitionKey]" = OrderedDict()
+        # 分区 -> 事件数，第一次用到时计数
+        self._counts: Dict[PartitionKey, int] = {}
+        self._retired: List[Dict[str, Any]] = []
+        # 已去掉原始请求的分区
+        self._stripped: Set[PartitionKey] = set()
+        self._next_expire = -float('inf')
+        self.stats = {'dropped_partitions': 0, 'expired_on_write': 0, 'stripped_events': 0}
+
+    async def initialize(self):
+        """sqlite后端登记目录中已有的分区文件（用到时才打开）并删除过期分区"""
+        if self.backend == 'sqlite':
+            os.makedirs(self.directory, exist_ok=True)
+            for name in sorted(os.listdir(self.directory)):
+                match = PARTITION_FILE.match(name)
+                if match:
+                    start = int(datetime.strptime(match.group(2), '%Y%m%d%H').timestamp())
+                    self._partitions.setdefault((match.group(1), start), self._create((match.group(1), start)))
+            retired_path = os.path.join(self.directory, RETIRED_FILE)
+            if os.path.exists(retired_path):
+                with open(retired_path, encoding='utf-8') as f:
+                    self._retired = json.load(f)
+            stripped_path = os.path.join(self.directory, STRIPPED_FILE)
+            if os.path.exists(stripped_path):
+                with open(stripped_path, encoding='utf-8') as f:
+                    self._stripped = {(name, start) for name, start in json.load(f)} & set(self._partitions)
+        await self.expire()
+
+    async def close(self):
+        for storage in self._partitions.values():
+            await storage.close()
+        self._open.clear()
+
+    # 分区管理
+
+    def _start(self, timestamp: float) -> int:
+        """时间戳所在分区的起始时间戳（按本地时间对齐）"""
+        return int((timestamp + self.offset) // self.size * self.size - self.offset)
+
+    def _key(self, event: SecurityEvent) -> PartitionKey:
+        return event_class(event), self._start(event_timestamp(event).timestamp())
+
+    def _expired(self, key: PartitionKey, now: float) -> bool:
+        return key[1] + self.size <= now - self.retention[key[0]]
+
+    def _raw_expired(self, key: PartitionKey, now: float) -> bool:
+        return key[1] + self.size <= now - self.raw_retention
+
+    def _path(self, key: PartitionKey) -> str:
+        return os.path.join(self.directory, f"{key[0]}-{datetime.fromtimestamp(key[1]):%Y%m%d%H}.db")
+
+    def _create(self, key: PartitionKey) -> BaseStorage:
+        if self.backend == 'sqlite':
+            config = {name: self.config[name] for name in ('synchronous', 'cache_size_kb') if name in self.config}
+            return StorageFactory.create_storage('sqlite', {**config, 'path': self._path(key)})
+        return StorageFactory.create_storage('memory')
+
+    def _partition(self, key: PartitionKey) -> BaseStorage:
+        storage = self._partitions.get(key)
+        if storage is None:
+            if self.backend == 'memory' or not os.path.exists(self._path(key)):
+                self._counts[key] = 0
+            storage = self._partitions[key] = self._create(key)
+        return storage
+
+    def _id_key(self, event_id: str) -> Optional[PartitionKey]:
+        """event_id中编码的分区，其他格式的ID返回None"""
+        match = PARTITION_ID.match(event_id)
+        if not match:
+            return None
+        name = 'attack' if match.group(1) == 'a' else 'benign'
+        return name, int(datetime.strptime(match.group(2), '%Y%m%d%H').timestamp())
+
+    def _counted(self, key: PartitionKey, delta: int):
+        if key in self._counts:
+            self._counts[key] += delta
+
+    async def _count(self, key: PartitionKey, filters: Dict[str, Any]) -> int:
+        """分区中符合条件的事件数；条件覆盖整个分区时使用记录的事件数"""
+        start, end = filters.get('start_time'), filters.get('end_time')
+        names = {name for name, value in filters.items() if value is not None} - {'page', 'page_size', 'order'}
+        if names <= {'start_time', 'end_time', 'is_attack'} \
+                and (start is None or start.timestamp() <= key[1]) \
+                and (end is None or key[1] + self.size <= end.timestamp()):
+            if key not in self._counts:
+                self._counts[key] = await self._call(key, 'count_events')
+            return self._counts[key]
+        return await self._call(key, 'count_events', **filters)
+
+    async def _call(self, key: PartitionKey, method: str, *args, **kwargs):
+        """调用分区存储的方法；sqlite分区用完后按最久未使用关闭多余的连接"""
+        storage = self._partition(key)
+        self._busy[key] = self._busy.get(key, 0) + 1
+        try:
+            return await getattr(storage, method)(*args, **kwargs)
+        finally:
+            self._busy[key] -= 1
+            if not self._busy[key]:
+                del self._busy[key]
+            if self.backend == 'sqlite':
+                self._open[key] = None
+                self._open.move_to_end(key)
+                await self._close_idle()
+
+    async def _close_idle(self):
+        for key in list(self._open):
+            if len(self._open) <= self.max_open:
+                break
+            if key in self._busy:
+                continue
+            del self._open[key]
+            if key in self._partitions:
+                # 关闭后再次访问时sqlite存储会自动重新连接
+                await self._partitions[key].close()
+
+    def _select(self, filters: Dict[str, Any]) -> List[PartitionKey]:
+        """与时间范围和is_attack相关的分区"""
+        start, end = filters.get('start_time'), filters.get('end_time')
+        low = start.timestamp() if start is not None else -float('inf')
+        high = end.timestamp() if end is not None else float('inf')
+        classes = CLASSES
+        if filters.get('is_attack') is not None:
+            classes = ('attack',) if filters['is_attack'] else ('benign',)
+        elif filters.get('attack_type') is not None:
+            classes = ('attack',)
+        return [
+            key for key in self._partitions
+            if key[0] in classes and key[1] <= high and key[1] + self.size > low
+        ]
+
+    async def expire(self, now: Optional[float] = None) -> int:
+        """删除超过保留期的分区，去掉超过原始请求保留期的分区中的原始请求，返回删除的分区数"""
+        now = self.clock() if now is None else now
+        self._next_expire = now + self.expire_interval
+        expired = [key for key in self._partitions if self._expired(key, now) and key not in self._busy]
+        for key in sorted(expired, key=lambda k: k[1]):
+            await self._drop(key)
+        stale = [
+            key for key in self._partitions
+            if self._raw_expired(key, now) and key not in self._stripped and key not in self._busy
+        ]
+        for key in sorted(stale, key=lambda k: k[1]):
+            self.stats['stripped_events'] += await self._call(key, 'strip_raw_requests')
+            self._stripped.add(key)
+        if (expired or stale) and self.backend == 'sqlite':
+            self._write_json(STRIPPED_FILE, sorted(self._stripped))
+        return len(expired)
+
+    async def _drop(self, key: PartitionKey):
+        """保存分区按小时的计数后关闭并删除整个分区"""
+        self._retire(key, await self._call(key, 'get_statistics', period='hour', limit=0))
+        storage = self._partitions.pop(key)
+        self._open.pop(key, None)
+        self._counts.pop(key, None)
+        self._stripped.discard(key)
+        await storage.close()
+        if self.backend == 'sqlite':
+            path = self._path(key)
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        self.stats['dropped_partitions'] += 1
+
+    def _retire(self, key: PartitionKey, statistics: Dict[str, Any]):
+        """记录不再保存明细的事件按小时的计数"""
+        if not statistics['total_events']:
+            return
+        self._retired.append({
+            'class': key[0],
+            'start': key[1],
+            'high_risk_events': statistics['high_risk_events'],
+            'attack_distribution': statistics['attack_distribution'],
+            'trend': [
+                [point['timestamp'].timestamp(), point['total_events'], point['attack_events']]
+                for point in statistics['trend_data']
+            ]
+        })
+        if self.backend == 'sqlite':
+            self._write_json(RETIRED_FILE, self._retired)
+
+    def _write_json(self, name: str, data):
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    async def retired_statistics(self) -> List[Dict[str, Any]]:
+        return list(self._retired)
+
+    def _remember(self, event_id: str, key: PartitionKey):
+        self._recent[event_id] = key
+        self._recent.move_to_end(event_id)
+        while len(self._recent) > self.recent_limit:
+            self._recent.popitem(last=False)
+
+    async def _locate(self, event_id: str) -> Optional[PartitionKey]:
+        """事件所在的分区：先查最近写入的记录和ID中编码的分区及同一时间段的另一个类别，
+        都没有时从最新的分区开始查找"""
+        candidates = []
+        for key in (self._recent.get(event_id), self._id_key(event_id)):
+            if key is not None:
+                candidates.extend((name, key[1]) for name in (key[0], *CLASSES))
+        candidates.extend(sorted(self._partitions, key=lambda k: k[1], reverse=True))
+        checked = set()
+        for key in candidates:
+            if key in checked or key not in self._partitions:
+                continue
+            checked.add(key)
+            if await self._call(key, 'get_event', event_id) is not None:
+                return key
+        return None
+
+    # 存储接口
+
+    async def save_event(self, event: SecurityEvent, durable: bool = False) -> str:
+        return (await self.save_events([event]))[0]
+
+    def new_event_id(self, event: SecurityEvent) -> str:
+        """ID中编码事件所在的分区"""
+        name, start = self._key(event)
+        return f"event_{name[0]}{datetime.fromtimestamp(start):%Y%m%d%H}_{uuid.uuid4().hex}"
+
+    def _without_raw(self, event: SecurityEvent, key: PartitionKey, now: float) -> SecurityEvent:
+        """超过原始请求保留期的时间段只保存去掉原始请求的副本"""
+        if self._raw_expired(key, now):
+            return replace(event, request=stripped_request(event.request))
+        return event
+
+    async def save_events(self, events: List[SecurityEvent]) -> List[str]:
+        """按分区分组写入；已超过所属类别保留期的事件只记录计数，超过原始请求保留期的不保存原始请求"""
+        now = self.clock()
+        if now >= self._next_expire:
+            await self.expire(now)
+        groups: Dict[PartitionKey, List[SecurityEvent]] = {}
+        expired: Dict[PartitionKey, List[SecurityEvent]] = {}
+        for event in events:
+            if not event.event_id:
+                # 各分区各自生成的ID可能重复，统一在这里生成
+                event.event_id = self.new_event_id(event)
+            key = self._key(event)
+            if self._expired(key, now):
+                expired.setdefault(key, []).append(event)
+            else:
+                groups.setdefault(key, []).append(self._without_raw(event, key, now))
+        for key, group in expired.items():
+            # 补录的过期事件和删除的分区一样只留下计数
+            scratch = MemoryStorage()
+            await scratch.save_events(group)
+            self._retire(key, await scratch.get_statistics(period='hour', limit=0))
+            self.stats['expired_on_write'] += len(group)
+        for key, group in groups.items():
+            await self._call(key, 'save_events', group)
+            self._counted(key, len(group))
+            for event in group:
+                self._remember(event.event_id, key)
+        return [event.event_id for event in events]
+
+    async def get_event(self, event_id: str) -> Optional[SecurityEvent]:
+        key = await self._locate(event_id)
+        return await self._call(key, 'get_event', event_id) if key is not None else None
+
+    async def delete_event(self, event_id: str) -> bool:
+        key = await self._locate(event_id)
+        if key is None:
+            return False
+        self._recent.pop(event_id, None)
+        deleted = await self._call(key, 'delete_event', event_id)
+        if deleted:
+            self._counted(key, -1)
+        return deleted
+
+    async def update_event(self, event_id: str, event: SecurityEvent) -> bool:
+        """更新事件；类别或时间段变化时从原分区移到新分区"""
+        key = await self._locate(event_id)
+        if key is None:
+            return False
+        event.event_id = event_id
+        now = self.clock()
+        new_key = self._key(event)
+        event = self._without_raw(event, new_key, now)
+        if new_key == key:
+            return await self._call(key, 'update_event', event_id, event)
+        await self._call(key, 'delete_event', event_id)
+        self._counted(key, -1)
+        if self._expired(new_key, now):
+            self._recent.pop(event_id, None)
+        else:
+            await self._call(new_key, 'save_event', event)
+            self._counted(new_key, 1)
+            self._remember(event_id, new_key)
+        return True
+
+    async def count_events(self, **filters) -> int:
+        filters = {name: value for name, value in filters.items() if name not in PAGE_FILTERS}
+        return sum([await self._count(key, filters) for key in self._select(filters)])
+
+    async def query_events(self, **filters) -> List[SecurityEvent]:
+        """查询事件，过滤条件与MemoryStorage相同
+
+        按时间顺序逐个时间段读取：page分页时用各时间段的计数跳过整段，
+        after游标所在的时间段中，与游标同一时间、按类别顺序已经返回过的事件被跳过
+        """
+        page = filters.get('page', 1)
+        page_size = filters.get('page_size', 20)
+        order = filters.get('order', 'desc')
+        descending = order == 'desc'
+        after = filters.get('after')
+        base = {name: value for name, value in filters.items() if name not in PAGE_FILTERS}
+        after_time = _seconds(after[0]) if after is not None else None
+        skip = 0 if after is not None else (page - 1) * page_size
+
+        slots: Dict[int, List[PartitionKey]] = {}
+        for key in self._select(base):
+            slots.setdefault(key[1], []).append(key)
+
+        result: List[SecurityEvent] = []
+        for start in sorted(slots, reverse=descending):
+            if after_time is not None and (start > after_time if descending else start + self.size <= after_time):
+                continue
+            keys = sorted(slots[start], key=lambda k: CLASSES.index(k[0]))
+            part_filters = [dict(base, order=order) for _ in keys]
+            if after_time is not None and start <= after_time < start + self.size:
+                # 游标所在的时间段
+                anchor = await self._anchor(keys, after[1])
+                part_filters = [resume_filters(f, after, anchor, rank, descending)
+                                for rank, f in enumerate(part_filters)]
+            if skip:
+                count = sum([await self._count(key, f) for key, f in zip(keys, part_filters)])
+                if count <= skip:
+                    skip -= count
+                    continue
+            need = page_size - len(result)
+            pages = [await self._call(key, 'query_events', page=1, page_size=skip + need, **f)
+                     for key, f in zip(keys, part_filters)]
+            result.extend(merge_ranked(pages, descending)[skip:skip + need])
+            skip = 0
+            if len(result) >= page_size:
+                break
+        return result
+
+    async def _anchor(self, keys: List[PartitionKey], event_id: str) -> Optional[int]:
+        """游标事件在同一时间段的哪个分区中"""
+        for rank, key in enumerate(keys):
+            if await self._call(key, 'get_event', event_id) is not None:
+                return rank
+        return None
+
+    async def get_statistics(self, **filters) -> Dict[str, Any]:
+        """合并各相关分区的统计；攻击来源按各分区的前limit名合并"""
+        limit = filters.get('limit', 10)
+        total = attacks = high_risk = 0
+        distribution: Dict[str, int] = {}
+        trend: Dict[datetime, List[int]] = {}
+        sources: Dict[str, list] = {}
+        for key in self._select(filters):
+            statistics = await self._call(key, 'get_statistics', **filters)
+            total += statistics['total_events']
+            attacks += statistics['attack_events']
+            high_risk += statistics['high_risk_events']
+            for attack_type, count in statistics['attack_distribution'].items():
+                distribution[attack_type] = distribution.get(attack_type, 0) + count
+            for point in statistics['trend_data']:
+                counts = trend.setdefault(point['timestamp'], [0, 0])
+                counts[0] += point['total_events']
+                counts[1] += point['attack_events']
+            for source in statistics['top_attack_sources']:
+                entry = sources.setdefault(source['source_ip'], [0, source['last_attack']])
+                entry[0] += source['attack_count']
+                entry[1] = max(entry[1], source['last_attack'])
+        top = sorted(sources.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return {
+            "total_events": total,
+            "attack_events": attacks,
+            "high_risk_events": high_risk,
+            "attack_distribution": {
+                attack_type.value: distribution[attack_type.value]
+                for attack_type in AttackType if distribution.get(attack_type.value)
+            },
+            "trend_data": [
+                {"timestamp": timestamp, "total_events": counts[0], "attack_events": counts[1]}
+                for timestamp, counts in sorted(trend.items())
+            ],
+            "top_attack_sources": [
+                {"source_ip": source_ip, "attack_count": count, "last_attack": last}
+                for source_ip, (count, last) in top
+            ]
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各类别的分区数和最早分区"""
+        stats = dict(self.stats)
+        for name in CLASSES:
+            starts = [key[1] for key in self._partitions if key[0] == name]
+            stats[f'{name}_partitions'] = len(starts)
+            stats[f'oldest_{name}_partition'] = datetime.fromtimestamp(min(starts)) if starts else None
+        stats['open_partitions'] = len(self._open)
+        stats['retired_partitions'] = len(self._retired)
+        stats['stripped_partitions'] = len(self._stripped)
+        return stats
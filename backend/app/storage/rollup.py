@@ -0,0 +1,143 @@
+"""预聚合统计存储
+
+包装任意BaseStorage，保存、更新、删除事件时同步维护TimeRollups，
+只按时间范围统计的get_statistics（仪表板、趋势、攻击类型、来源接口的查询）和get_cardinality直接由预聚合桶回答，
+代价与桶数量成正比，不再扫描事件。其余读写原样交给底层存储。
+
+初始化时按时间顺序遍历一次底层存储中已有的事件，并计入底层存储按保留期删除事件后留下的计数，重建预聚合数据，
+启动代价与已有事件数成正比。
+
+预聚合数据只保存在本进程内存中，只计入经过本实例保存、更新、删除的事件。多个进程共享同一个底层存储
+（BaseStorage.shared，如多个API worker使用同一个数据库）时，每个进程的统计都缺少其他进程写入的事件，不应使用。
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .base import BaseStorage
+from app.analytics.rollups import HOUR, DAY, TimeRollups, event_facts
+from app.core.models import SecurityEvent
+
+# 可以由预聚合数据回答的统计参数
+ROLLUP_FILTERS = {'start_time', 'end_time', 'period', 'limit'}
+
+
+class RollupStorage(BaseStorage):
+    """预聚合统计存储"""
+
+    def __init__(self, storage: BaseStorage, config: dict = None):
+        """初始化存储
+
+        Args:
+            storage: 底层存储
+            config: minute_retention_hours（分钟桶保留小时数，默认2），
+                hour_retention_days（小时桶保留天数，默认8，覆盖仪表板最长168小时的范围），
+                source_capacity（每个桶的来源IP、路径草图跟踪的候选项数量，默认64），
+                hll_precision（不同来源IP、路径数量的HyperLogLog精度，默认10，相对标准误差约3.3%），
+                cms_width / cms_depth（来源IP、路径计数的Count-Min大小，默认272 x 4），
+                rebuild_batch_size（初始化时遍历已有事件的每页大小，默认5000）
+        """
+        super().__init__(config)
+        self.storage = storage
+        self.rebuild_batch_size = self.config.get('rebuild_batch_size', 5000)
+        self.rollups = self._new_rollups()
+
+    def _new_rollups(self) -> TimeRollups:
+        return TimeRollups(
+            minute_retention=self.config.get('minute_retention_hours', 2) * HOUR,
+            hour_retention=self.config.get('hour_retention_days', 8) * DAY,
+            source_capacity=self.config.get('source_capacity', 64),
+            hll_precision=self.config.get('hll_precision', 10),
+            cms_width=self.config.get('cms_width', 272),
+            cms_depth=self.config.get('cms_depth', 4)
+        )
+
+    async def initialize(self):
+        await self.storage.initialize()
+        await self.rebuild()
+
+    async def rebuild(self):
+        """按时间顺序遍历底层存储的全部事件，重建预聚合数据"""
+        rollups = self._new_rollups()
+        after = None
+        while True:
+            page = await self.storage.query_events(page_size=self.rebuild_batch_size, order="asc", after=after)
+            for event in page:
+                rollups.add(event)
+            if len(page) < self.rebuild_batch_size:
+                break
+            facts = event_facts(page[-1])
+            after = (facts.ts, page[-1].event_id)
+        # 底层存储按保留期删除的事件只剩计数
+        for retired in await self.storage.retired_statistics():
+            for timestamp, total, attacks in retired['trend']:
+                rollups.add_counts(timestamp, total, attacks)
+            rollups.add_counts(retired['start'], 0, 0, retired['high_risk_events'], retired['attack_distribution'])
+        self.rollups = rollups
+
+    async def flush(self):
+        await self.storage.flush()
+
+    async def close(self):
+        await self.storage.close()
+
+    def new_event_id(self, event: SecurityEvent) -> str:
+        return self.storage.new_event_id(event)
+
+    async def save_event(self, event: SecurityEvent, durable: bool = False) -> str:
+        event_id = await self.storage.save_event(event, durable=durable)
+        self.rollups.add(event)
+        return event_id
+
+    async def save_events(self, events: List[SecurityEvent]) -> List[str]:
+        event_ids = await self.storage.save_events(events)
+        for event in events:
+            self.rollups.add(event)
+        return event_ids
+
+    async def get_event(self, event_id: str) -> Optional[SecurityEvent]:
+        return await self.storage.get_event(event_id)
+
+    async def query_events(self, **filters) -> List[SecurityEvent]:
+        return await self.storage.query_events(**filters)
+
+    async def delete_event(self, event_id: str) -> bool:
+        previous = await self.storage.get_event(event_id)
+        # 事件对象可能被底层存储复用，先取出统计字段
+        facts = event_facts(previous) if previous is not None else None
+        deleted = await self.storage.delete_event(event_id)
+        if deleted and facts is not None:
+            self.rollups.apply(facts, -1)
+        return deleted
+
+    async def update_event(self, event_id: str, event: SecurityEvent) -> bool:
+        previous = await self.storage.get_event(event_id)
+        facts = event_facts(previous) if previous is not None else None
+        updated = await self.storage.update_event(event_id, event)
+        if updated and facts is not None:
+            self.rollups.apply(facts, -1)
+            self.rollups.add(event)
+        return updated
+
+    async def count_events(self, **filters) -> int:
+        return await self.storage.count_events(**filters)
+
+    async def get_statistics(self, **filters) -> Dict[str, Any]:
+        """只有时间范围、周期和数量参数时由预聚合数据回答，其他过滤条件交给底层存储"""
+        if not set(filters) <= ROLLUP_FILTERS:
+            return await self.storage.get_statistics(**filters)
+        return self.rollups.statistics(
+            start_time=filters.get('start_time'),
+            end_time=filters.get('end_time'),
+            period=filters.get('period', 'hour'),
+            limit=filters.get('limit', 10)
+        )
+
+    async def retired_statistics(self) -> List[Dict[str, Any]]:
+        return await self.storage.retired_statistics()
+
+    async def get_cardinality(
+        self, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None, limit: int = 10
+    ) -> Dict[str, Any]:
+        """由窗口内各桶的攻击草图合并得到，代价与桶数量成正比"""
+        return self.rollups.cardinality(start_time, end_time, limit)
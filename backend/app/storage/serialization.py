@@ -0,0 +1,155 @@
+"""安全事件的序列化
+
+持久化存储把事件拆成两部分：
+- 摘要：过滤、排序和统计用到的标量字段（时间、IP、是否攻击、攻击类型、严重程度等）
+- 详情：请求、检测结果和LLM分析的完整内容，序列化为JSON，只在取出事件时读取
+"""
+
+import json
+from dataclasses import replace
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from app.core.models import AttackType, DetectionResult, HTTPRequest, LLMAnalysis, SecurityEvent, Severity
+
+
+def _default(value):
+    """JSON无法直接表示的值：枚举取value，时间转ISO格式，集合转列表"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+def to_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=_default)
+
+
+def enum_value(value, enum_cls) -> Optional[str]:
+    """过滤值统一为枚举的value，也接受枚举名（如"HIGH"）"""
+    if value is None:
+        return None
+    if isinstance(value, enum_cls):
+        return value.value
+    if isinstance(value, str) and value.upper() in enum_cls.__members__:
+        return enum_cls[value.upper()].value
+    return value
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def request_to_dict(request: HTTPRequest) -> Dict[str, Any]:
+    return {
+        'url': request.url,
+        'method': request.method,
+        'headers': request.headers,
+        'params': request.params,
+        'body': request.body,
+        'source_ip': request.source_ip,
+        'timestamp': request.timestamp.isoformat(),
+        'raw_data': request.raw_data,
+        'user_agent': request.user_agent,
+        'source': request.source
+    }
+
+
+def request_from_dict(data: Dict[str, Any]) -> HTTPRequest:
+    return HTTPRequest(**{**data, 'timestamp': _parse_time(data['timestamp'])})
+
+
+def stripped_request(request: HTTPRequest) -> HTTPRequest:
+    """去掉请求头、请求体和原始日志后的请求副本，URL、方法、来源等摘要字段保留"""
+    return replace(request, headers={}, body=None, raw_data='')
+
+
+def detection_to_dict(detection: DetectionResult) -> Dict[str, Any]:
+    return {
+        'is_attack': detection.is_attack,
+        'attack_types': [attack_type.value for attack_type in detection.attack_types],
+        'confidence': detection.confidence,
+        'details': detection.details,
+        'payload': detection.payload,
+        'matched_rules': detection.matched_rules,
+        'incomplete': detection.incomplete
+    }
+
+
+def detection_from_dict(data: Dict[str, Any]) -> DetectionResult:
+    return DetectionResult(**{**data, 'attack_types': [AttackType(value) for value in data['attack_types']]})
+
+
+def llm_to_dict(analysis: Optional[LLMAnalysis]) -> Optional[Dict[str, Any]]:
+    if analysis is None:
+        return None
+    return {
+        'severity': analysis.severity.value,
+        'attack_intent': analysis.attack_intent,
+        'potential_impact': analysis.potential_impact,
+        'recommendations': analysis.recommendations,
+        'confidence': analysis.confidence,
+        'analysis_time': analysis.analysis_time.isoformat()
+    }
+
+
+def llm_from_dict(data: Optional[Dict[str, Any]]) -> Optional[LLMAnalysis]:
+    if data is None:
+        return None
+    return LLMAnalysis(**{
+        **data,
+        'severity': Severity(data['severity']),
+        'analysis_time': _parse_time(data['analysis_time'])
+    })
+
+
+def attack_type_values(event: SecurityEvent) -> List[str]:
+    """攻击事件的攻击类型（去重，保持顺序）；非攻击事件为空"""
+    if not event.detection.is_attack:
+        return []
+    return list(dict.fromkeys(attack_type.value for attack_type in event.detection.attack_types))
+
+
+def event_summary(event: SecurityEvent) -> Dict[str, Any]:
+    """事件摘要：过滤和统计用到的标量字段，时间为时间戳（不带时区的按本地时间）"""
+    return {
+        'event_id': event.event_id,
+        'ts': event.request.timestamp.timestamp(),
+        'source_ip': event.request.source_ip,
+        'method': event.request.method,
+        'url': event.request.url,
+        'is_attack': bool(event.detection.is_attack),
+        'attack_types': ','.join(attack_type_values(event)),
+        'confidence': event.detection.confidence,
+        'severity': event.llm_analysis.severity.value if event.llm_analysis else None,
+        'created_at': event.created_at.timestamp(),
+        'updated_at': event.updated_at.timestamp() if event.updated_at else None
+    }
+
+
+def event_details(event: SecurityEvent) -> Dict[str, str]:
+    """事件详情：请求、检测结果、LLM分析各自的JSON，以及原始时间"""
+    return {
+        'request': to_json(request_to_dict(event.request)),
+        'detection': to_json(detection_to_dict(event.detection)),
+        'llm_analysis': to_json(llm_to_dict(event.llm_analysis)) if event.llm_analysis else None,
+        'created_at': event.created_at.isoformat(),
+        'updated_at': event.updated_at.isoformat() if event.updated_at else None
+    }
+
+
+def event_from_details(event_id: str, request: str, detection: str, llm_analysis: Optional[str],
+                       created_at: str, updated_at: Optional[str]) -> SecurityEvent:
+    """从event_details()的各列还原事件"""
+    return SecurityEvent(
+        event_id=event_id,
+        request=request_from_dict(json.loads(request)),
+        detection=detection_from_dict(json.loads(detection)),
+        llm_analysis=llm_from_dict(json.loads(llm_analysis)) if llm_analysis else None,
+        created_at=_parse_time(created_at),
+        updated_at=_parse_time(updated_at)
+    )
@@ -0,0 +1,425 @@
+"""SQLAlchemy异步事件存储（PostgreSQL / MySQL / SQLite）
+
+表结构与SQLiteStorage相同（摘要表events、详情表event_details、攻击类型表event_attack_types），
+用SQLAlchemy Core描述，由各方言生成DDL。面向多个API worker共享一个数据库：
+- 连接池大小、溢出、超时和回收时间来自DatabaseSettings，每个进程最多占用 pool_size + max_overflow 个连接
+- 批量写入拼成多行 INSERT … VALUES，每条语句的参数个数不超过各方言的上限；
+  PostgreSQL上大批量写入改用asyncpg的COPY
+- 列表查询按 (时间, event_id) 排序，除页码外支持键集分页（after），深翻页不需要OFFSET
+- 统计在数据库端用 COUNT / GROUP BY 完成，只取回聚合结果
+"""
+
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    BigInteger, Boolean, Column, Double, Index, Integer, MetaData, PrimaryKeyConstraint, String, Table, Text,
+    cast, delete, event as sa_event, func, insert, or_, select, update
+)
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+
+from .base import BaseStorage
+from .serialization import attack_type_values, enum_value, event_details, event_from_details, event_summary
+from app.core.models import AttackType, SecurityEvent, Severity
+from app.core.exceptions import StorageException
+
+metadata = MetaData()
+
+events_table = Table(
+    "events", metadata,
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+    Column("event_id", String(64), nullable=False, unique=True),
+    Column("ts", Double, nullable=False),
+    Column("source_ip", String(45), nullable=False),
+    Column("method", String(16)),
+    Column("url", Text),
+    Column("is_attack", Boolean, nullable=False),
+    Column("attack_types", String(255), nullable=False, default=""),
+    Column("confidence", Double),
+    Column("severity", String(16)),
+    Column("created_at", Double),
+    Column("updated_at", Double),
+    # 排序键 (ts, event_id) 放在每个过滤索引的末尾，过滤后仍按索引顺序分页
+    Index("idx_events_ts", "ts", "event_id"),
+    Index("idx_events_ip_ts", "source_ip", "ts", "event_id"),
+    Index("idx_events_attack_ts", "is_attack", "ts", "event_id"),
+    Index("idx_events_severity_ts", "severity", "ts", "event_id"),
+    Index("idx_events_attack_sources", "is_attack", "ts", "source_ip"),
+)
+
+details_table = Table(
+    "event_details", metadata,
+    Column("event_id", String(64), primary_key=True),
+    Column("request", Text, nullable=False),
+    Column("detection", Text, nullable=False),
+    Column("llm_analysis", Text),
+    Column("created_at", String(40), nullable=False),
+    Column("updated_at", String(40)),
+)
+
+attack_types_table = Table(
+    "event_attack_types", metadata,
+    Column("attack_type", String(32), nullable=False),
+    Column("ts", Double, nullable=False),
+    Column("event_id", String(64), nullable=False),
+    PrimaryKeyConstraint("attack_type", "ts", "event_id"),
+    Index("idx_attack_types_event", "event_id"),
+)
+
+_SUMMARY_COLUMNS = tuple(c.name for c in events_table.columns if c.name != "id")
+_DETAIL_COLUMNS = ('request', 'detection', 'llm_analysis', 'created_at', 'updated_at')
+
+# 异步驱动
+ASYNC_DRIVERS = {
+    'postgresql': 'asyncpg',
+    'postgres': 'asyncpg',
+    'mysql': 'aiomysql',
+    'sqlite': 'aiosqlite',
+}
+
+# 单条语句的绑定参数上限（SQLite 3.32+ 为32766，PostgreSQL协议为32767，MySQL为65535），留出余量
+MAX_BIND_PARAMS = {'postgresql': 32000, 'mysql': 60000, 'sqlite': 32000}
+
+# 趋势统计的周期（秒）
+PERIOD_SECONDS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+
+
+def async_url(url: str) -> str:
+    """把配置中的同步URL（postgresql://、mysql://、sqlite:///）换成对应的异步驱动"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == 'postgres':
+        parsed = parsed.set(drivername='postgresql')
+        backend = 'postgresql'
+    if '+' not in parsed.drivername:
+        if backend not in ASYNC_DRIVERS:
+            raise StorageException(f"不支持的数据库类型: {backend}")
+        parsed = parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    return parsed.render_as_string(hide_password=False)
+
+
+class SQLAlchemyStorage(BaseStorage):
+    """SQLAlchemy异步事件存储"""
+
+    shared = True
+
+    def __init__(self, config: dict = None):
+        """初始化存储
+
+        Args:
+            config: DatabaseSettings的字段：url、echo、pool_size、max_overflow、pool_timeout、pool_recycle；
+                另可设置 insert_batch_size（多行INSERT每条语句的最大行数，默认1000）、
+                copy_threshold（PostgreSQL上批量写入达到多少行时改用COPY，默认500，0表示不用COPY）
+        """
+        super().__init__(config)
+        self.url = async_url(self.config.get('url', 'sqlite:///security_events.db'))
+        self.insert_batch_size = self.config.get('insert_batch_size', 1000)
+        self.copy_threshold = self.config.get('copy_threshold', 500)
+        self.engine: Optional[AsyncEngine] = None
+        self.dialect = make_url(self.url).get_backend_name()
+
+    def _create_engine(self) -> AsyncEngine:
+        url = make_url(self.url)
+        options = {'echo': self.config.get('echo', False)}
+        if self.dialect == 'sqlite' and url.database in (None, '', ':memory:'):
+            # 内存数据库只存在于单个连接中
+            options.update(poolclass=StaticPool, connect_args={'check_same_thread': False})
+        else:
+            options.update(
+                pool_size=self.config.get('pool_size', 10),
+                max_overflow=self.config.get('max_overflow', 20),
+                pool_timeout=self.config.get('pool_timeout', 30),
+                pool_recycle=self.config.get('pool_recycle', 1800),
+                pool_pre_ping=True
+            )
+            if self.dialect == 'sqlite':
+                # aiosqlite默认不使用连接池
+                options['poolclass'] = AsyncAdaptedQueuePool
+        engine = create_async_engine(self.url, **options)
+        if self.dialect == 'sqlite':
+            sa_event.listen(engine.sync_engine, "connect", _sqlite_pragmas)
+        return engine
+
+    async def initialize(self):
+        """创建引擎和表结构（已存在的表不变）"""
+        if self.engine is not None:
+            return
+        engine = self._create_engine()
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(metadata.create_all)
+        except Exception as e:
+            await engine.dispose()
+            raise StorageException(f"初始化数据库存储失败: {e}")
+        self.engine = engine
+
+    async def close(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+
+    async def save_event(self, event: SecurityEvent, durable: bool = False) -> str:
+        return (await self.save_events([event]))[0]
+
+    async def save_events(self, events: List[SecurityEvent]) -> List[str]:
+        """在一个事务中批量写入事件，任一事件失败时整批回滚"""
+        engine = await self._engine()
+        for event in events:
+            if not event.event_id:
+                event.event_id = f"event_{uuid.uuid4().hex}"
+        summaries, details, attack_types = self._rows(events)
+        try:
+            if self.dialect == 'postgresql' and self.copy_threshold and len(events) >= self.copy_threshold:
+                await self._copy_rows(engine, summaries, details, attack_types)
+            else:
+                async with engine.begin() as conn:
+                    for table, rows in ((events_table, summaries), (details_table, details),
+                                        (attack_types_table, attack_types)):
+                        for batch in self._batches(table, rows):
+                            await conn.execute(insert(table).values(batch))
+        except Exception as e:
+            raise StorageException(f"保存事件失败: {e}")
+        return [event.event_id for event in events]
+
+    async def get_event(self, event_id: str) -> Optional[SecurityEvent]:
+        engine = await self._engine()
+        async with engine.connect() as conn:
+            row = (await conn.execute(
+                self._select_details().where(details_table.c.event_id == event_id)
+            )).first()
+        return event_from_details(*row) if row else None
+
+    async def query_events(self, **filters) -> List[SecurityEvent]:
+        """查询事件，过滤条件与MemoryStorage相同，按 (时间, event_id) 排序（默认最新的在前）
+
+        除page/page_size外，after=(时间, event_id) 表示从该事件之后（按当前排序方向）开始取，
+        即键集分页：把上一页最后一个事件的 (request.timestamp, event_id) 传入，取下一页
+        """
+        engine = await self._engine()
+        async with engine.connect() as conn:
+            rows = (await conn.execute(self._page_query(filters))).all()
+        return [event_from_details(*row) for row in rows]
+
+    async def delete_event(self, event_id: str) -> bool:
+        engine = await self._engine()
+        try:
+            async with engine.begin() as conn:
+                result = await conn.execute(delete(events_table).where(events_table.c.event_id == event_id))
+                await conn.execute(delete(details_table).where(details_table.c.event_id == event_id))
+                await conn.execute(delete(attack_types_table).where(attack_types_table.c.event_id == event_id))
+        except Exception as e:
+            raise StorageException(f"删除事件失败: {e}")
+        return result.rowcount > 0
+
+    async def update_event(self, event_id: str, event: SecurityEvent) -> bool:
+        engine = await self._engine()
+        event.event_id = event_id
+        summaries, details, attack_types = self._rows([event])
+        values = {name: value for name, value in summaries[0].items() if name != 'event_id'}
+        try:
+            async with engine.begin() as conn:
+                result = await conn.execute(
+                    update(events_table).where(events_table.c.event_id == event_id).values(**values)
+                )
+                if result.rowcount == 0:
+                    return False
+                await conn.execute(delete(details_table).where(details_table.c.event_id == event_id))
+                await conn.execute(insert(details_table).values(details))
+                await conn.execute(delete(attack_types_table).where(attack_types_table.c.event_id == event_id))
+                if attack_types:
+                    await conn.execute(insert(attack_types_table).values(attack_types))
+        except Exception as e:
+            raise StorageException(f"更新事件失败: {e}")
+        return True
+
+    async def count_events(self, **filters) -> int:
+        engine = await self._engine()
+        query = select(func.count()).select_from(events_table).where(*self._conditions(filters))
+        async with engine.connect() as conn:
+            return (await conn.execute(query)).scalar_one()
+
+    async def get_statistics(self, **filters) -> Dict[str, Any]:
+        """统计结果与MemoryStorage相同，计数和分组都在数据库端完成"""
+        engine = await self._engine()
+        e, t = events_table.c, attack_types_table.c
+        in_range = self._time_conditions(e.ts, filters)
+        seconds = PERIOD_SECONDS.get(filters.get('period', 'hour'), PERIOD_SECONDS['hour'])
+        offset = datetime.now().astimezone().utcoffset().total_seconds()
+        bucket = self._bucket(e.ts, offset, seconds).label("bucket")
+        limit = filters.get('limit', 10)
+
+        async with engine.connect() as conn:
+            async def scalar(*conditions):
+                return (await conn.execute(
+                    select(func.count()).select_from(events_table).where(*in_range, *conditions)
+                )).scalar_one()
+
+            total = await scalar()
+            attacks = await scalar(e.is_attack.is_(True))
+            high_risk = await scalar(e.severity == Severity.HIGH.value)
+            distribution = dict((await conn.execute(
+                select(t.attack_type, func.count())
+                .where(*self._time_conditions(t.ts, filters))
+                .group_by(t.attack_type)
+            )).all())
+            trend = (await conn.execute(
+                select(
+                    bucket,
+                    func.count(),
+                    func.sum(cast(e.is_attack, Integer))
+                ).where(*in_range).group_by(bucket).order_by(bucket)
+            )).all()
+            attack_count = func.count().label("attack_count")
+            sources = (await conn.execute(
+                select(e.source_ip, attack_count, func.max(e.ts))
+                .where(*in_range, e.is_attack.is_(True))
+                .group_by(e.source_ip)
+                .order_by(attack_count.desc())
+                .limit(limit)
+            )).all()
+
+        return {
+            "total_events": total,
+            "attack_events": attacks,
+            "high_risk_events": high_risk,
+            "attack_distribution": {
+                attack_type.value: distribution[attack_type.value]
+                for attack_type in AttackType if distribution.get(attack_type.value)
+            },
+            "trend_data": [
+                {
+                    "timestamp": datetime.fromtimestamp(int(key) * seconds - offset),
+                    "total_events": count,
+                    "attack_events": int(attack_events or 0)
+                }
+                for key, count, attack_events in trend
+            ],
+            "top_attack_sources": [
+                {"source_ip": ip, "attack_count": count, "last_attack": datetime.fromtimestamp(last)}
+                for ip, count, last in sources
+            ]
+        }
+
+    async def _engine(self) -> AsyncEngine:
+        if self.engine is None:
+            await self.initialize()
+        return self.engine
+
+    @staticmethod
+    def _rows(events: List[SecurityEvent]) -> Tuple[List[dict], List[dict], List[dict]]:
+        """事件拆成摘要行、详情行和攻击类型行"""
+        summaries, details, attack_types = [], [], []
+        for event in events:
+            summary = event_summary(event)
+            summaries.append(summary)
+            details.append({'event_id': event.event_id, **event_details(event)})
+            attack_types.extend(
+                {'attack_type': value, 'ts': summary['ts'], 'event_id': event.event_id}
+                for value in attack_type_values(event)
+            )
+        return summaries, details, attack_types
+
+    def _batches(self, table: Table, rows: List[dict]):
+        """按行数和方言的绑定参数上限切分多行INSERT"""
+        per_statement = MAX_BIND_PARAMS.get(self.dialect, 30000) // len(rows[0]) if rows else 1
+        size = max(1, min(self.insert_batch_size, per_statement))
+        for start in range(0, len(rows), size):
+            yield rows[start:start + size]
+
+    @staticmethod
+    async def _copy_rows(engine: AsyncEngine, summaries, details, attack_types):
+        """PostgreSQL：在一个事务中用COPY写入三张表"""
+        async with engine.connect() as conn:
+            raw = await conn.get_raw_connection()
+            driver = raw.driver_connection
+            async with driver.transaction():
+                for table, rows in ((events_table, summaries), (details_table, details),
+                                    (attack_types_table, attack_types)):
+                    if not rows:
+                        continue
+                    columns = list(rows[0])
+                    await driver.copy_records_to_table(
+                        table.name, records=[tuple(row[c] for c in columns) for row in rows], columns=columns
+                    )
+
+    def _bucket(self, ts, offset: float, seconds: int):
+        """时间所在的本地对齐周期编号；PostgreSQL/MySQL的CAST会四舍五入，用FLOOR"""
+        value = (ts + offset) / seconds
+        if self.dialect == 'sqlite':
+            return cast(value, Integer)
+        return func.floor(value)
+
+    @staticmethod
+    def _time_conditions(column, filters: Dict[str, Any]) -> list:
+        conditions = []
+        if filters.get("start_time") is not None:
+            conditions.append(column >= filters["start_time"].timestamp())
+        if filters.get("end_time") is not None:
+            conditions.append(column <= filters["end_time"].timestamp())
+        return conditions
+
+    def _conditions(self, filters: Dict[str, Any]) -> list:
+        """过滤条件"""
+        e, t = events_table.c, attack_types_table.c
+        conditions = self._time_conditions(e.ts, filters)
+        if filters.get("is_attack") is not None:
+            conditions.append(e.is_attack.is_(bool(filters["is_attack"])))
+        if filters.get("source_ip") is not None:
+            conditions.append(e.source_ip == filters["source_ip"])
+        if filters.get("severity") is not None:
+            conditions.append(e.severity == enum_value(filters["severity"], Severity))
+        if filters.get("attack_type") is not None:
+            # 时间范围同时下推到攻击类型表的主键上
+            conditions.append(e.event_id.in_(
+                select(t.event_id).where(
+                    t.attack_type == enum_value(filters["attack_type"], AttackType),
+                    *self._time_conditions(t.ts, filters)
+                )
+            ))
+        return conditions
+
+    @staticmethod
+    def _select_details():
+        return select(details_table.c.event_id, *(details_table.c[name] for name in _DETAIL_COLUMNS))
+
+    def _page_query(self, filters: Dict[str, Any]):
+        """先在摘要表上按索引顺序取出一页event_id，再读取这一页的详情"""
+        e = events_table.c
+        descending = filters.get("order", "desc") == "desc"
+        page_size = filters.get("page_size", 20)
+        conditions = self._conditions(filters)
+        after = filters.get("after")
+        if after is not None:
+            after_ts, after_id = after
+            after_ts = after_ts.timestamp() if isinstance(after_ts, datetime) else after_ts
+            # 不用行值比较：ts上的范围条件在各方言上都能走索引，同一时间的再比较event_id
+            if descending:
+                conditions += [e.ts <= after_ts, or_(e.ts < after_ts, e.event_id < after_id)]
+            else:
+                conditions += [e.ts >= after_ts, or_(e.ts > after_ts, e.event_id > after_id)]
+
+        order = (e.ts.desc(), e.event_id.desc()) if descending else (e.ts.asc(), e.event_id.asc())
+        page = (
+            select(e.event_id, e.ts).where(*conditions).order_by(*order).limit(page_size)
+        )
+        if after is None:
+            page = page.offset((filters.get("page", 1) - 1) * page_size)
+        page = page.subquery("p")
+        return (
+            self._select_details()
+            .join(page, page.c.event_id == details_table.c.event_id)
+            .order_by(*((page.c.ts.desc(), page.c.event_id.desc()) if descending
+                        else (page.c.ts.asc(), page.c.event_id.asc())))
+        )
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    """SQLite连接：WAL模式允许多个进程同时读，写等待锁而不是立即报错"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
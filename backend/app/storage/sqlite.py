@@ -0,0 +1,383 @@
+"""SQLite事件存储（aiosqlite）
+
+表结构：
+- events：热点摘要行，只含过滤、排序、统计用到的标量字段
+- event_details：请求、检测详情、LLM分析的JSON，只在取出事件时按event_id读取
+- event_attack_types：攻击事件的 (攻击类型, 时间, event_id)，无rowid表，攻击类型过滤和分布统计直接在主键上完成
+
+索引按 /events 的过滤条件和统计查询设计，列表查询都能按 (时间, rowid) 顺序走索引分页，
+统计查询都是覆盖索引扫描。写入使用WAL + synchronous=NORMAL，批量写入在一个事务中用executemany完成；
+SQL都是固定文本加参数，由连接的语句缓存复用预编译语句。
+"""
+
+import asyncio
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .base import BaseStorage
+from .serialization import attack_type_values, enum_value, event_details, event_from_details, event_summary
+from app.core.models import AttackType, SecurityEvent, Severity
+from app.core.exceptions import StorageException
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    event_id TEXT NOT NULL UNIQUE,
+    ts REAL NOT NULL,
+    source_ip TEXT NOT NULL,
+    method TEXT,
+    url TEXT,
+    is_attack INTEGER NOT NULL,
+    attack_types TEXT NOT NULL DEFAULT '',
+    confidence REAL,
+    severity TEXT,
+    created_at REAL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS idx_events_ip_ts ON events (source_ip, ts);
+CREATE INDEX IF NOT EXISTS idx_events_attack_ts ON events (is_attack, ts);
+CREATE INDEX IF NOT EXISTS idx_events_attack_sources ON events (is_attack, ts, source_ip);
+CREATE INDEX IF NOT EXISTS idx_events_severity_ts ON events (severity, ts) WHERE severity IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS event_details (
+    event_id TEXT PRIMARY KEY,
+    request TEXT NOT NULL,
+    detection TEXT NOT NULL,
+    llm_analysis TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS event_attack_types (
+    attack_type TEXT NOT NULL,
+    ts REAL NOT NULL,
+    event_id TEXT NOT NULL,
+    PRIMARY KEY (attack_type, ts, event_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_attack_types_event ON event_attack_types (event_id);
+"""
+
+_SUMMARY_COLUMNS = (
+    'event_id', 'ts', 'source_ip', 'method', 'url', 'is_attack', 'attack_types',
+    'confidence', 'severity', 'created_at', 'updated_at'
+)
+_DETAIL_COLUMNS = ('request', 'detection', 'llm_analysis', 'created_at', 'updated_at')
+
+INSERT_EVENT = f"INSERT INTO events ({', '.join(_SUMMARY_COLUMNS)}) VALUES ({', '.join('?' * len(_SUMMARY_COLUMNS))})"
+INSERT_DETAILS = (
+    f"INSERT OR REPLACE INTO event_details (event_id, {', '.join(_DETAIL_COLUMNS)}) "
+    f"VALUES (?, {', '.join('?' * len(_DETAIL_COLUMNS))})"
+)
+INSERT_ATTACK_TYPE = "INSERT OR IGNORE INTO event_attack_types (attack_type, ts, event_id) VALUES (?, ?, ?)"
+UPDATE_EVENT = f"UPDATE events SET {', '.join(f'{c} = ?' for c in _SUMMARY_COLUMNS[1:])} WHERE event_id = ?"
+SELECT_DETAILS = f"SELECT event_id, {', '.join(_DETAIL_COLUMNS)} FROM event_details"
+# 与serialization.stripped_request相同：去掉请求头、请求体和原始日志
+STRIP_REQUESTS = (
+    "UPDATE event_details SET request = json_set(request, '$.headers', json('{}'), '$.body', NULL, '$.raw_data', '')"
+)
+
+# 趋势统计的周期（秒）
+PERIOD_SECONDS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+
+
+def sqlite_path(url: str) -> str:
+    """从数据库URL（sqlite:///path、sqlite+aiosqlite:///path、sqlite:///:memory:）取出文件路径"""
+    if '://' not in url:
+        return url
+    scheme, path = url.split('://', 1)
+    if not scheme.startswith('sqlite'):
+        raise StorageException(f"不是SQLite数据库URL: {url}")
+    return path[1:] if path.startswith('/') else path
+
+
+class SQLiteStorage(BaseStorage):
+    """SQLite事件存储"""
+
+    def __init__(self, config: dict = None):
+        """初始化存储
+
+        Args:
+            config: url（数据库URL）或path（文件路径），
+                synchronous（默认NORMAL，WAL模式下掉电最多丢失最后的事务，不会损坏数据库），
+                cache_size_kb（页缓存大小，默认65536）
+        """
+        super().__init__(config)
+        self.path = self.config.get('path') or sqlite_path(self.config.get('url', 'sqlite:///security_events.db'))
+        self.synchronous = self.config.get('synchronous', 'NORMAL')
+        self.cache_size_kb = self.config.get('cache_size_kb', 65536)
+        self._db = None
+        self._write_lock = asyncio.Lock()
+        self._init_lock = asyncio.Lock()
+
+    async def initialize(self):
+        """打开连接，设置WAL等参数并创建表结构"""
+        async with self._init_lock:
+            if self._db is not None:
+                return
+            try:
+                import aiosqlite
+            except ImportError:
+                raise StorageException("请安装aiosqlite包: pip install aiosqlite")
+            try:
+                # isolation_level=None: 由本类显式控制事务
+                db = await aiosqlite.connect(self.path, isolation_level=None, cached_statements=256)
+                await db.execute("PRAGMA journal_mode=WAL")
+                await db.execute(f"PRAGMA synchronous={self.synchronous}")
+                await db.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+                await db.execute("PRAGMA temp_store=MEMORY")
+                await db.execute("PRAGMA busy_timeout=5000")
+                await db.executescript(SCHEMA)
+            except Exception as e:
+                raise StorageException(f"初始化SQLite存储失败: {e}")
+            self._db = db
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def save_event(self, event: SecurityEvent, durable: bool = False) -> str:
+        return (await self.save_events([event]))[0]
+
+    async def save_events(self, events: List[SecurityEvent]) -> List[str]:
+        """在一个事务中批量写入事件，任一事件失败时整批回滚"""
+        db = await self._connection()
+        for event in events:
+            if not event.event_id:
+                event.event_id = f"event_{uuid.uuid4().hex}"
+        summaries, details, attack_types = [], [], []
+        for event in events:
+            summary = event_summary(event)
+            summaries.append(tuple(summary[c] for c in _SUMMARY_COLUMNS))
+            detail = event_details(event)
+            details.append((event.event_id, *(detail[c] for c in _DETAIL_COLUMNS)))
+            attack_types.extend((value, summary['ts'], event.event_id) for value in attack_type_values(event))
+
+        async with self._transaction(db, "保存事件"):
+            await db.executemany(INSERT_EVENT, summaries)
+            await db.executemany(INSERT_DETAILS, details)
+            if attack_types:
+                await db.executemany(INSERT_ATTACK_TYPE, attack_types)
+        return [event.event_id for event in events]
+
+    async def get_event(self, event_id: str) -> Optional[SecurityEvent]:
+        db = await self._connection()
+        async with db.execute(f"{SELECT_DETAILS} WHERE event_id = ?", (event_id,)) as cursor:
+            row = await cursor.fetchone()
+        return event_from_details(*row) if row else None
+
+    async def query_events(self, **filters) -> List[SecurityEvent]:
+        """查询事件，过滤条件与MemoryStorage相同，按时间排序分页（默认最新的在前）"""
+        db = await self._connection()
+        sql, params = self._page_query(filters)
+        async with db.execute(sql, params) as cursor:
+            rows = await cursor.fetchall()
+        return [event_from_details(*row) for row in rows]
+
+    async def delete_event(self, event_id: str) -> bool:
+        db = await self._connection()
+        async with self._transaction(db, "删除事件"):
+            cursor = await db.execute("DELETE FROM events WHERE event_id = ?", (event_id,))
+            deleted = cursor.rowcount > 0
+            await db.execute("DELETE FROM event_details WHERE event_id = ?", (event_id,))
+            await db.execute("DELETE FROM event_attack_types WHERE event_id = ?", (event_id,))
+        return deleted
+
+    async def update_event(self, event_id: str, event: SecurityEvent) -> bool:
+        db = await self._connection()
+        event.event_id = event_id
+        summary = event_summary(event)
+        detail = event_details(event)
+        async with self._transaction(db, "更新事件"):
+            cursor = await db.execute(UPDATE_EVENT, (*(summary[c] for c in _SUMMARY_COLUMNS[1:]), event_id))
+            if cursor.rowcount == 0:
+                return False
+            await db.execute(INSERT_DETAILS, (event_id, *(detail[c] for c in _DETAIL_COLUMNS)))
+            await db.execute("DELETE FROM event_attack_types WHERE event_id = ?", (event_id,))
+            await db.executemany(
+                INSERT_ATTACK_TYPE, [(value, summary['ts'], event_id) for value in attack_type_values(event)]
+            )
+        return True
+
+    async def strip_raw_requests(self) -> int:
+        """一条UPDATE改写详情中的请求JSON，之后VACUUM归还空间"""
+        db = await self._connection()
+        async with self._transaction(db, "清除原始请求"):
+            cursor = await db.execute(STRIP_REQUESTS)
+            stripped = cursor.rowcount
+        async with self._write_lock:
+            await db.execute("VACUUM")
+        return stripped
+
+    async def count_events(self, **filters) -> int:
+        db = await self._connection()
+        where, params = self._where(filters)
+        async with db.execute(f"SELECT COUNT(*) FROM events e{where}", params) as cursor:
+            return (await cursor.fetchone())[0]
+
+    async def get_statistics(self, **filters) -> Dict[str, Any]:
+        """统计结果与MemoryStorage相同，每一项都是一次覆盖索引扫描"""
+        db = await self._connection()
+        low, high = self._time_range(filters)
+        seconds = PERIOD_SECONDS.get(filters.get('period', 'hour'), PERIOD_SECONDS['hour'])
+        offset = datetime.now().astimezone().utcoffset().total_seconds()
+        limit = filters.get('limit', 10)
+
+        async def fetch(sql, params):
+            async with db.execute(sql, params) as cursor:
+                return await cursor.fetchall()
+
+        total = (await fetch("SELECT COUNT(*) FROM events WHERE ts BETWEEN ? AND ?", (low, high)))[0][0]
+        attacks = (await fetch(
+            "SELECT COUNT(*) FROM events WHERE is_attack = 1 AND ts BETWEEN ? AND ?", (low, high)
+        ))[0][0]
+        high_risk = (await fetch(
+            "SELECT COUNT(*) FROM events WHERE severity = ? AND ts BETWEEN ? AND ?", (Severity.HIGH.value, low, high)
+        ))[0][0]
+        distribution = {}
+        for attack_type in AttackType:
+            count = (await fetch(
+                "SELECT COUNT(*) FROM event_attack_types WHERE attack_type = ? AND ts BETWEEN ? AND ?",
+                (attack_type.value, low, high)
+            ))[0][0]
+            if count:
+                distribution[attack_type.value] = count
+
+        bucket = "CAST((ts + ?) / ? AS INTEGER)"
+        totals = await fetch(
+            f"SELECT {bucket} AS b, COUNT(*) FROM events WHERE ts BETWEEN ? AND ? GROUP BY b ORDER BY b",
+            (offset, seconds, low, high)
+        )
+        attack_buckets = dict(await fetch(
+            f"SELECT {bucket} AS b, COUNT(*) FROM events WHERE is_attack = 1 AND ts BETWEEN ? AND ? GROUP BY b",
+            (offset, seconds, low, high)
+        ))
+        sources = await fetch(
+            "SELECT source_ip, COUNT(*) AS n, MAX(ts) FROM events "
+            "WHERE is_attack = 1 AND ts BETWEEN ? AND ? GROUP BY source_ip ORDER BY n DESC LIMIT ?",
+            (low, high, limit)
+        )
+        return {
+            "total_events": total,
+            "attack_events": attacks,
+            "high_risk_events": high_risk,
+            "attack_distribution": distribution,
+            "trend_data": [
+                {
+                    "timestamp": datetime.fromtimestamp(key * seconds - offset),
+                    "total_events": count,
+                    "attack_events": attack_buckets.get(key, 0)
+                }
+                for key, count in totals
+            ],
+            "top_attack_sources": [
+                {"source_ip": ip, "attack_count": count, "last_attack": datetime.fromtimestamp(last)}
+                for ip, count, last in sources
+            ]
+        }
+
+    async def _connection(self):
+        if self._db is None:
+            await self.initialize()
+        return self._db
+
+    def _transaction(self, db, action: str):
+        return _Transaction(db, self._write_lock, action)
+
+    @staticmethod
+    def _time_range(filters: Dict[str, Any]) -> Tuple[float, float]:
+        start = filters.get("start_time")
+        end = filters.get("end_time")
+        return (
+            start.timestamp() if start is not None else float('-inf'),
+            end.timestamp() if end is not None else float('inf')
+        )
+
+    def _where(self, filters: Dict[str, Any]) -> Tuple[str, list]:
+        """过滤条件对应的WHERE子句（表别名e）"""
+        clauses, params = [], []
+        if filters.get("is_attack") is not None:
+            clauses.append("e.is_attack = ?")
+            params.append(int(bool(filters["is_attack"])))
+        if filters.get("source_ip") is not None:
+            clauses.append("e.source_ip = ?")
+            params.append(filters["source_ip"])
+        if filters.get("severity") is not None:
+            clauses.append("e.severity = ?")
+            params.append(enum_value(filters["severity"], Severity))
+        has_time = filters.get("start_time") is not None or filters.get("end_time") is not None
+        if has_time:
+            clauses.append("e.ts BETWEEN ? AND ?")
+            params.extend(self._time_range(filters))
+        if filters.get("attack_type") is not None:
+            # 时间范围同时下推到攻击类型表的主键上
+            sub = "SELECT t.event_id FROM event_attack_types t WHERE t.attack_type = ?"
+            params.append(enum_value(filters["attack_type"], AttackType))
+            if has_time:
+                sub += " AND t.ts BETWEEN ? AND ?"
+                params.extend(self._time_range(filters))
+            clauses.append(f"e.event_id IN ({sub})")
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def _page_query(self, filters: Dict[str, Any]) -> Tuple[str, list]:
+        """先在摘要表上按索引顺序取出一页event_id，再读取这一页的详情"""
+        page = filters.get("page", 1)
+        page_size = filters.get("page_size", 20)
+        direction = "DESC" if filters.get("order", "desc") == "desc" else "ASC"
+        where, params = self._where(filters)
+        offset = (page - 1) * page_size
+        if filters.get("after") is not None:
+            # 键集分页：ts上是索引范围，同一时间的按rowid比较；游标事件已删除时同一时间的都视为已返回
+            after_time, after_id = filters["after"]
+            after_time = after_time.timestamp() if isinstance(after_time, datetime) else after_time
+            if direction == "DESC":
+                clause = "e.ts <= ? AND (e.ts < ? OR e.id < COALESCE((SELECT id FROM events WHERE event_id = ?), -1))"
+            else:
+                clause = "e.ts >= ? AND (e.ts > ? OR e.id > COALESCE((SELECT id FROM events WHERE event_id = ?), 1 << 62))"
+            where = f"{where} AND {clause}" if where else f" WHERE {clause}"
+            params = [*params, after_time, after_time, after_id]
+            offset = 0
+        sql = (
+            f"SELECT d.event_id, {', '.join(f'd.{c}' for c in _DETAIL_COLUMNS)} FROM "
+            f"(SELECT e.event_id, e.ts, e.id FROM events e{where} "
+            f"ORDER BY e.ts {direction}, e.id {direction} LIMIT ? OFFSET ?) p "
+            f"JOIN event_details d ON d.event_id = p.event_id "
+            f"ORDER BY p.ts {direction}, p.id {direction}"
+        )
+        return sql, [*params, page_size, offset]
+
+
+class _Transaction:
+    """写事务：持有写锁，BEGIN IMMEDIATE开始，异常时回滚并转换为StorageException"""
+
+    def __init__(self, db, lock: asyncio.Lock, action: str):
+        self.db = db
+        self.lock = lock
+        self.action = action
+
+    async def __aenter__(self):
+        await self.lock.acquire()
+        try:
+            await self.db.execute("BEGIN IMMEDIATE")
+        except Exception as e:
+            self.lock.release()
+            raise StorageException(f"{self.action}失败: {e}")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                try:
+                    await self.db.execute("COMMIT")
+                except Exception as e:
+                    await self.db.execute("ROLLBACK")
+                    raise StorageException(f"{self.action}失败: {e}")
+            else:
+                await self.db.execute("ROLLBACK")
+        finally:
+            self.lock.release()
+        if exc is not None and not isinstance(exc, StorageException):
+            raise StorageException(f"{self.action}失败: {exc}") from exc
+        return False
@@ -0,0 +1,260 @@
+"""分级保存事件的存储
+
+包装任意BaseStorage，按事件决定保存多少：
+- 完整记录：攻击、检测不完整或被检测器标记可疑的事件（深度分析会更新它们）、已有LLM分析的事件，
+  以及按benign_sample_rate抽样的良性请求，写入底层存储
+- 只计数：其余良性请求不写入底层存储，只计入外层RollupStorage的预聚合统计；
+  同时按小时累计数量，作为retired_statistics在重建预聚合数据时计入
+- 环形缓冲（可选）：只计数的良性请求在buffer_seconds内、最多buffer_size条保留在内存中，
+  按ID读取、列表查询和计数时与底层存储的结果合并，最近的请求仍可查看
+
+底层存储的写入量和索引大小只与攻击和抽样的良性请求成正比。
+按来源IP等其他条件过滤的统计只包含完整记录的事件。
+"""
+
+import json
+import os
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .base import BaseStorage
+from .pagination import PAGE_FILTERS, event_matches, event_timestamp, merge_ranked, resume_filters
+from app.core.models import SecurityEvent
+
+
+def needs_full_record(event: SecurityEvent) -> bool:
+    """事件是否必须完整保存：与DetectionEngine.needs_deep_analysis的条件一致，另加已有LLM分析的事件"""
+    detection = event.detection
+    if detection.is_attack or detection.incomplete or event.llm_analysis is not None:
+        return True
+    return any(isinstance(details, dict) and details.get('suspicious') for details in detection.details.values())
+
+
+class TieredStorage(BaseStorage):
+    """分级保存事件的存储"""
+
+    def __init__(self, storage: BaseStorage, config: dict = None, clock: Callable[[], float] = time.time):
+        """初始化存储
+
+        Args:
+            storage: 底层存储
+            config: benign_sample_rate（完整保存的良性请求比例，默认0.01），
+                buffer_size（环形缓冲保留的只计数请求数，默认10000，0为不缓冲），
+                buffer_seconds（环形缓冲中的请求保留秒数，默认900），
+                counters_path（只计数请求的按小时计数文件，默认不保存，重启后这部分计数丢失），
+                seed（抽样的随机种子）
+            clock: 当前时间（秒），决定环形缓冲中的请求何时过期
+        """
+        super().__init__(config)
+        self.storage = storage
+        self.sample_rate = self.config.get('benign_sample_rate', 0.01)
+        self.buffer_size = self.config.get('buffer_size', 10000)
+        self.buffer_seconds = self.config.get('buffer_seconds', 900)
+        self.counters_path = self.config.get('counters_path')
+        self.clock = clock
+        self.offset = datetime.now().astimezone().utcoffset().total_seconds()
+        self._random = random.Random(self.config.get('seed'))
+        # event_id -> (写入时间, 事件)，按写入顺序
+        self._buffer: "OrderedDict[str, Tuple[float, SecurityEvent]]" = OrderedDict()
+        # 本地时间对齐的小时起始时间戳 -> 只计数的请求数
+        self._counts: Dict[int, int] = {}
+        self._counts_dirty = False
+        self.stats = {'full_records': 0, 'sampled': 0, 'counted_only': 0, 'promoted': 0}
+
+    async def initialize(self):
+        await self.storage.initialize()
+        if self.counters_path and os.path.exists(self.counters_path):
+            with open(self.counters_path, encoding='utf-8') as f:
+                self._counts = {int(hour): count for hour, count in json.load(f).items()}
+
+    async def flush(self):
+        await self.storage.flush()
+        self._write_counts()
+
+    async def close(self):
+        self._write_counts()
+        await self.storage.close()
+
+    def _write_counts(self):
+        if not self.counters_path or not self._counts_dirty:
+            return
+        tmp_path = f"{self.counters_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({str(hour): count for hour, count in self._counts.items()}, f)
+        os.replace(tmp_path, self.counters_path)
+        self._counts_dirty = False
+
+    # 保存策略
+
+    def _full(self, event: SecurityEvent) -> bool:
+        if needs_full_record(event):
+            return True
+        if self._random.random() < self.sample_rate:
+            self.stats['sampled'] += 1
+            return True
+        return False
+
+    def _count(self, event: SecurityEvent, sign: int):
+        local = event_timestamp(event).timestamp() + self.offset
+        hour = int(local // 3600 * 3600 - self.offset)
+        count = self._counts.get(hour, 0) + sign
+        if count:
+            self._counts[hour] = count
+        else:
+            self._counts.pop(hour, None)
+        self._counts_dirty = True
+
+    def _keep_counted(self, events: List[SecurityEvent]):
+        """只计数的请求：生成ID、计数并放入环形缓冲"""
+        now = self.clock()
+        for event in events:
+            if not event.event_id:
+                event.event_id = self.storage.new_event_id(event)
+            self._count(event, 1)
+            if self.buffer_size:
+                self._buffer[event.event_id] = (now, event)
+        self.stats['counted_only'] += len(events)
+        self._evict(now)
+
+    def _evict(self, now: float):
+        while self._buffer:
+            event_id, (saved_at, _) = next(iter(self._buffer.items()))
+            if len(self._buffer) <= self.buffer_size and saved_at > now - self.buffer_seconds:
+                break
+            del self._buffer[event_id]
+
+    async def retired_statistics(self) -> List[Dict[str, Any]]:
+        retired = await self.storage.retired_statistics()
+        if self._counts:
+            retired.append({
+                'class': 'benign',
+                'start': min(self._counts),
+                'high_risk_events': 0,
+                'attack_distribution': {},
+                'trend': [[hour, count, 0] for hour, count in sorted(self._counts.items())]
+            })
+        return retired
+
+    # 存储接口
+
+    def new_event_id(self, event: SecurityEvent) -> str:
+        return self.storage.new_event_id(event)
+
+    async def save_event(self, event: SecurityEvent, durable: bool = False) -> str:
+        if self._full(event):
+            self.stats['full_records'] += 1
+            return await self.storage.save_event(event, durable=durable)
+        self._keep_counted([event])
+        return event.event_id
+
+    async def save_events(self, events: List[SecurityEvent]) -> List[str]:
+        full, counted = [], []
+        for event in events:
+            (full if self._full(event) else counted).append(event)
+        if full:
+            for event, event_id in zip(full, await self.storage.save_events(full)):
+                event.event_id = event_id
+            self.stats['full_records'] += len(full)
+        self._keep_counted(counted)
+        return [event.event_id for event in events]
+
+    async def get_event(self, event_id: str) -> Optional[SecurityEvent]:
+        self._evict(self.clock())
+        entry = self._buffer.get(event_id)
+        if entry is not None:
+            return entry[1]
+        return await self.storage.get_event(event_id)
+
+    async def delete_event(self, event_id: str) -> bool:
+        entry = self._buffer.pop(event_id, None)
+        if entry is not None:
+            self._count(entry[1], -1)
+            return True
+        return await self.storage.delete_event(event_id)
+
+    async def update_event(self, event_id: str, event: SecurityEvent) -> bool:
+        """更新事件；环形缓冲中的请求更新后需要完整记录时写入底层存储，不再只计数"""
+        entry = self._buffer.get(event_id)
+        if entry is None:
+            return await self.storage.update_event(event_id, event)
+        event.event_id = event_id
+        self._count(entry[1], -1)
+        if needs_full_record(event):
+            del self._buffer[event_id]
+            await self.storage.save_event(event)
+            self.stats['promoted'] += 1
+        else:
+            self._count(event, 1)
+            self._buffer[event_id] = (entry[0], event)
+        return True
+
+    def _buffered(self, filters: Dict[str, Any]) -> List[SecurityEvent]:
+        """环形缓冲中符合过滤条件的请求，按 (时间, 写入顺序) 排序"""
+        self._evict(self.clock())
+        if not self._buffer or filters.get('is_attack') or filters.get('attack_type') is not None \
+                or filters.get('severity') is not None:
+            return []
+        events = [event for _, event in self._buffer.values() if event_matches(event, filters)]
+        events.sort(key=lambda event: event_timestamp(event).timestamp())
+        return events
+
+    async def count_events(self, **filters) -> int:
+        return await self.storage.count_events(**filters) + len(self._buffered(filters))
+
+    async def query_events(self, **filters) -> List[SecurityEvent]:
+        """环形缓冲中有符合条件的请求时，与底层存储的结果按时间合并后分页"""
+        base = {name: value for name, value in filters.items() if name not in PAGE_FILTERS}
+        if not self._buffered(base):
+            return await self.storage.query_events(**filters)
+        page_size = filters.get('page_size', 20)
+        order = filters.get('order', 'desc')
+        descending = order == 'desc'
+        after = filters.get('after')
+        skip = 0 if after is not None else (filters.get('page', 1) - 1) * page_size
+
+        # 同一时间的事件底层存储在前、环形缓冲在后
+        stored_filters, buffered_filters = base, base
+        if after is not None:
+            if after[1] in self._buffer:
+                anchor = 1
+            else:
+                anchor = 0 if await self.storage.get_event(after[1]) is not None else None
+            stored_filters = resume_filters(base, after, anchor, 0, descending)
+            buffered_filters = resume_filters(base, after, anchor, 1, descending)
+        stored = await self.storage.query_events(page=1, page_size=skip + page_size, order=order, **stored_filters)
+        buffered = self._buffered(buffered_filters)
+        if descending:
+            buffered.reverse()
+        if 'after' in buffered_filters:
+            buffered = self._skip_after(buffered, after, descending)
+        return merge_ranked([stored, buffered], descending)[skip:skip + page_size]
+
+    @staticmethod
+    def _skip_after(events: List[SecurityEvent], after, descending: bool) -> List[SecurityEvent]:
+        """去掉游标及之前的请求；游标不在其中时跳过与游标同一时间的全部请求"""
+        moment = after[0].timestamp() if isinstance(after[0], datetime) else float(after[0])
+        ids = [event.event_id for event in events]
+        anchor = ids.index(after[1]) if after[1] in ids else None
+        result = []
+        for position, event in enumerate(events):
+            timestamp = event_timestamp(event).timestamp()
+            if (timestamp < moment if descending else timestamp > moment) or \
+                    (timestamp == moment and anchor is not None and position > anchor):
+                result.append(event)
+        return result
+
+    async def get_statistics(self, **filters) -> Dict[str, Any]:
+        return await self.storage.get_statistics(**filters)
+
+    async def get_cardinality(self, **filters) -> Dict[str, Any]:
+        return await self.storage.get_cardinality(**filters)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各级保存的事件数"""
+        stats = dict(self.stats)
+        stats['buffered'] = len(self._buffer)
+        stats['counted_hours'] = len(self._counts)
+        return stats
@@ -0,0 +1,234 @@
+"""写后缓冲存储
+
+包装任意BaseStorage：save_event立即分配事件ID并放入缓冲后返回，
+后台按批量大小或时间间隔把缓冲中的事件用一次save_events写入（组提交），
+接口延迟不再包含存储写入延迟。
+
+- durable=True 的写入等待包含它的那一批落盘后才返回，写入失败时抛出StorageException；
+  外层包装存储的save_event原样传递durable
+- 一批写入失败时拆成两半分别重试，一个事件的问题不会连累同一批中其他请求的事件；
+  单独写入仍失败的事件才被放弃，记录日志和失败计数
+- 缓冲中的事件达到上限时，新的写入等待一次刷新完成（背压），缓冲占用有上限
+- get_event能读到仍在缓冲中的事件；更新、删除前先刷新缓冲，保证与保存的顺序一致；
+  列表、计数和统计直接读底层存储，最多滞后一个刷新间隔
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from .base import BaseStorage
+from app.core.models import SecurityEvent
+from app.core.exceptions import StorageException
+
+logger = logging.getLogger(__name__)
+
+
+class _Batch:
+    """一批待写入的事件，刷新完成后设置flushed"""
+
+    def __init__(self):
+        self.events: List[SecurityEvent] = []
+        self.flushed = asyncio.Event()
+        self.failed: Dict[str, Exception] = {}  # 写入失败而放弃的event_id -> 异常
+
+
+class WriteBehindStorage(BaseStorage):
+    """写后缓冲存储"""
+
+    def __init__(self, storage: BaseStorage, config: dict = None):
+        """初始化存储
+
+        Args:
+            storage: 底层存储
+            config: batch_size（每次save_events的最大事件数，默认500），
+                flush_interval_ms（缓冲中最早的事件最多等待多久被写入，默认20），
+                max_pending（缓冲上限，默认10000）
+        """
+        super().__init__(config)
+        self.storage = storage
+        self.batch_size = self.config.get('batch_size', 500)
+        self.flush_interval = self.config.get('flush_interval_ms', 20) / 1000
+        self.max_pending = self.config.get('max_pending', 10000)
+
+        self._batch: Optional[_Batch] = None
+        self._pending: Dict[str, SecurityEvent] = {}  # 尚未写入底层存储的事件（含正在写入的）
+        self._has_data: Optional[asyncio.Event] = None
+        self._flush_now: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.is_running = False
+        self.stats = {
+            'saved': 0,
+            'flushes': 0,
+            'flushed': 0,
+            'failed': 0,
+            'split_retries': 0,
+            'max_batch': 0,
+            'backpressure_waits': 0
+        }
+
+    async def initialize(self):
+        await self.storage.initialize()
+        await self.start()
+
+    async def start(self):
+        """启动后台刷新任务"""
+        if self.is_running:
+            return
+        if self._batch is None:
+            self._batch = _Batch()
+            self._has_data = asyncio.Event()
+            self._flush_now = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+        self.is_running = True
+        self._task = asyncio.create_task(self._flusher())
+
+    async def stop(self):
+        """停止后台刷新任务，并写入缓冲中剩余的事件"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
+    async def close(self):
+        await self.stop()
+        await self.storage.close()
+
+    async def save_event(self, event: SecurityEvent, durable: bool = False) -> str:
+        """缓冲事件并返回分配的事件ID
+
+        Args:
+            event: 安全事件
+            durable: 是否等待事件写入底层存储后再返回
+        """
+        if not self.is_running:
+            await self.start()
+        if len(self._pending) >= self.max_pending:
+            self.stats['backpressure_waits'] += 1
+            await self.flush()
+        if not event.event_id:
+            event.event_id = self.storage.new_event_id(event)
+        if event.event_id in self._pending:
+            raise StorageException(f"事件ID已存在: {event.event_id}")
+
+        batch = self._batch
+        batch.events.append(event)
+        self._pending[event.event_id] = event
+        self.stats['saved'] += 1
+        self._has_data.set()
+        if durable or len(batch.events) >= self.batch_size:
+            self._flush_now.set()
+        if durable:
+            await batch.flushed.wait()
+            error = batch.failed.get(event.event_id)
+            if error is not None:
+                raise StorageException(f"保存事件失败: {error}")
+        return event.event_id
+
+    async def save_events(self, events: List[SecurityEvent]) -> List[str]:
+        return [await self.save_event(event) for event in events]
+
+    async def flush(self):
+        """把缓冲中的事件全部写入底层存储
+
+        同一时间只有一次写入；写入期间到达的事件进入下一批，由等待锁的调用方一起写入（组提交）。
+        调用方被取消时写入继续完成，不会出现写了一半的批次
+        """
+        if self._batch is None:
+            return
+        await asyncio.shield(self._flush_all())
+
+    async def _flush_all(self):
+        async with self._flush_lock:
+            while self._batch.events:
+                batch, self._batch = self._batch, _Batch()
+                self._has_data.clear()
+                self._flush_now.clear()
+                try:
+                    for start in range(0, len(batch.events), self.batch_size):
+                        await self._write(batch, batch.events[start:start + self.batch_size])
+                finally:
+                    self.stats['flushes'] += 1
+                    self.stats['max_batch'] = max(self.stats['max_batch'], len(batch.events))
+                    for event in batch.events:
+                        self._pending.pop(event.event_id, None)
+                    batch.flushed.set()
+
+    def new_event_id(self, event: SecurityEvent) -> str:
+        return self.storage.new_event_id(event)
+
+    async def _write(self, batch: _Batch, events: List[SecurityEvent]):
+        """写入一组事件；失败时拆成两半分别重试，单独写入仍失败的事件记入batch.failed"""
+        try:
+            await self.storage.save_events(events)
+            self.stats['flushed'] += len(events)
+            return
+        except Exception as e:
+            error = e
+        if len(events) > 1:
+            self.stats['split_retries'] += 1
+            middle = len(events) // 2
+            await self._write(batch, events[:middle])
+            await self._write(batch, events[middle:])
+            return
+        event = events[0]
+        # 不支持事务的存储可能在批量写入失败前已经写入了这个事件
+        try:
+            stored = await self.storage.get_event(event.event_id) is not None
+        except Exception:
+            stored = False
+        if stored:
+            self.stats['flushed'] += 1
+            return
+        batch.failed[event.event_id] = error
+        self.stats['failed'] += 1
+        logger.error("写后缓冲写入事件%s失败，已放弃: %s", event.event_id, error)
+
+    async def get_event(self, event_id: str) -> Optional[SecurityEvent]:
+        event = self._pending.get(event_id)
+        if event is not None:
+            return event
+        return await self.storage.get_event(event_id)
+
+    async def query_events(self, **filters) -> List[SecurityEvent]:
+        return await self.storage.query_events(**filters)
+
+    async def delete_event(self, event_id: str) -> bool:
+        await self.flush()
+        return await self.storage.delete_event(event_id)
+
+    async def update_event(self, event_id: str, event: SecurityEvent) -> bool:
+        await self.flush()
+        return await self.storage.update_event(event_id, event)
+
+    async def count_events(self, **filters) -> int:
+        return await self.storage.count_events(**filters)
+
+    async def get_statistics(self, **filters) -> Dict[str, Any]:
+        return await self.storage.get_statistics(**filters)
+
+    async def get_cardinality(self, **filters) -> Dict[str, Any]:
+        return await self.storage.get_cardinality(**filters)
+
+    async def retired_statistics(self) -> List[Dict[str, Any]]:
+        return await self.storage.retired_statistics()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓冲统计"""
+        stats = dict(self.stats)
+        stats['pending'] = len(self._pending)
+        return stats
+
+    async def _flusher(self):
+        """缓冲非空后等待批量写满或刷新间隔到期，再写入"""
+        while True:
+            await self._has_data.wait()
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
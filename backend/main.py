@@ -8,6 +8,7 @@ from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from app.config.settings import settings
 from app.api import events_router, stats_router
+from app.api.events import get_storage, stop_deep_analysis
 from app.core.exceptions import SecurityManagerException
 
 # 配置日志
@@ -26,7 +27,8 @@ async def lifespan(app: FastAPI):
     
     # 初始化数据库
     try:
-        # TODO: 实现数据库初始化
+        storage = await get_storage()
+        await storage.initialize()
         logger.info("📊 数据库连接成功")
     except Exception as e:
         logger.error(f"❌ 数据库连接失败: {e}")
@@ -55,7 +57,10 @@ async def lifespan(app: FastAPI):
     
     # 清理资源
     try:
-        # TODO: 实现资源清理
+        # 等待已安排的深度分析完成
+        await stop_deep_analysis()
+        # 写入缓冲中的事件，关闭数据库连接池
+        await (await get_storage()).close()
         logger.info("🧹 资源清理完成")
     except Exception as e:
         logger.error(f"❌ 资源清理失败: {e}")
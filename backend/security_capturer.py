@@ -4,12 +4,18 @@
 """
 
 import asyncio
-from typing import AsyncGenerator, Optional, Dict, Any
-from datetime import datetime
+import inspect
+import time
+from functools import partial
+from typing import AsyncGenerator, Callable, Optional, Dict, Any
+from datetime import datetime, timedelta
 from dataclasses import dataclass
 
+from app.capture.base import BaseCapturer
 from app.capture.log_capturer import LogFileCapturer
-from app.detector import DetectionEngine
+from app.detector import DetectionEngine, AdaptiveSampler
+from app.pipeline import Pipeline, Stage, ShardedAnalyzer, init_detection_worker, detect_batch, parse_batch
+from app.analytics import StreamingReport, EventCoalescer, MetricsRegistry
 from app.core.models import HTTPRequest, DetectionResult
 from app.core.exceptions import CaptureException, DetectionException
 
@@ -21,10 +27,12 @@ class SecurityEvent:
     timestamp: datetime
     event_id: str
     risk_level: str
+    ip_context: Optional[Dict[str, Any]] = None  # 分片模式下该IP的累计状态
+    aggregate: Optional[Dict[str, Any]] = None   # 合并模式下该事件代表的一组攻击：次数、首末时间、载荷样本
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
-        return {
+        data = {
             'event_id': self.event_id,
             'timestamp': self.timestamp.isoformat(),
             'risk_level': self.risk_level,
@@ -44,6 +52,14 @@ class SecurityEvent:
                 'matched_rules': self.detection_result.matched_rules
             }
         }
+        for name in ('ip_context', 'aggregate'):
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = {
+                    key: item.isoformat() if isinstance(item, datetime) else item
+                    for key, item in value.items()
+                }
+        return data
 
 class SecurityCapturer:
     """
@@ -56,22 +72,71 @@ class SecurityCapturer:
     4. 支持实时监控和批量分析
     """
     
-    def __init__(self, log_file_path: str, follow: bool = False):
+    def __init__(
+        self,
+        log_file_path: str = None,
+        follow: bool = False,
+        capturer: BaseCapturer = None,
+        detect_workers: int = 0,
+        batch_size: int = 64,
+        queue_size: int = 1000,
+        shards: int = 0,
+        sampler: Optional[AdaptiveSampler] = None,
+        coalesce_window: float = 0,
+        parse_workers: int = 0,
+        sink: Optional[Callable[[SecurityEvent], Any]] = None
+    ):
         """
         初始化安全采集器
         
         Args:
             log_file_path: 日志文件路径
             follow: 是否实时跟踪日志文件
+            capturer: 自定义捕获器（如MultiFileCapturer），提供时忽略log_file_path
+            detect_workers: 检测进程数，0表示在当前进程内顺序检测，
+                大于0时使用 采集 -> 检测(进程池) -> 事件 的分阶段流水线
+            batch_size: 流水线模式下每批发送给检测进程的请求数
+            queue_size: 流水线模式下各阶段队列容量
+            shards: 按来源IP分片的检测进程数，大于0时同一IP始终由同一进程处理，
+                事件附带该IP的累计状态（ip_context），优先于detect_workers
+            sampler: 自适应采样器，过载时按比例跳过无触发特征的良性路径请求；
+                未设置queue_depth回调时使用捕获器和流水线的积压数
+            coalesce_window: 攻击事件合并窗口（秒），大于0时同一IP、URL模板和命中规则的攻击
+                在窗口内合并为一个带aggregate信息的事件；0表示不合并
+            parse_workers: 流水线模式下解析日志行的进程数，大于0且捕获器为LogFileCapturer时
+                捕获器只读取原文，由 parse(进程池，按批) 阶段解析；0表示在捕获器中解析
+            sink: 每个输出的事件调用的函数（可以是协程函数），如写入存储；开启合并时收到的是合并后的事件，
+                流水线模式且不合并时作为流水线最后的sink阶段；调用失败计为处理错误，事件照常输出
         """
-        self.log_capturer = LogFileCapturer(log_file_path, follow)
+        if capturer is None:
+            if not log_file_path:
+                raise CaptureException("必须提供log_file_path或capturer")
+            capturer = LogFileCapturer(log_file_path, follow)
+        self.log_capturer = capturer
         self.detection_engine = DetectionEngine()
+        self.detect_workers = detect_workers
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.shards = shards
+        self.parse_workers = parse_workers
+        self.sink = sink
+        self.pipeline: Optional[Pipeline] = None
+        self.sharded: Optional[ShardedAnalyzer] = None
+        self.sampler = sampler
+        if sampler is not None and sampler.queue_depth is None:
+            sampler.queue_depth = self._backlog
+        self.coalescer = EventCoalescer(coalesce_window) if coalesce_window > 0 else None
+        # 请求/攻击/错误的滑动窗口速率，以及parse/decode/detect/store各阶段的延迟分布
+        self.metrics = MetricsRegistry()
+        # 解析耗时由捕获器在解析时报告，不含等待新日志的时间；流水线parse阶段的耗时见阶段指标
+        capturer.parse_observer = partial(self.metrics.record, 'parse')
         self.event_counter = 0
         self.stats = {
             'total_requests': 0,
             'attack_requests': 0,
             'normal_requests': 0,
             'processing_errors': 0,
+            'sampled_out_requests': 0,
             'start_time': None,
             'last_event_time': None
         }
@@ -84,8 +149,10 @@ class SecurityCapturer:
             SecurityEvent: 安全事件对象，如果没有数据则返回None
         """
         try:
-            # 1. 采集HTTP请求
+            # 1. 采集HTTP请求（采样跳过的请求不检测，继续读取下一个）
             request = await self.log_capturer.capture_single()
+            while request and not self._should_analyze(request):
+                request = await self.log_capturer.capture_single()
             if not request:
                 return None
             
@@ -101,7 +168,7 @@ class SecurityCapturer:
             return event
             
         except Exception as e:
-            self.stats['processing_errors'] += 1
+            self._record_error()
             raise CaptureException(f"安全采集失败: {e}")
     
     async def capture_and_analyze_stream(self) -> AsyncGenerator[SecurityEvent, None]:
@@ -116,8 +183,31 @@ class SecurityCapturer:
             await self.log_capturer.start_capture()
             self.stats['start_time'] = datetime.now()
             
-            # 持续处理请求流
-            async for request in self.log_capturer.capture_stream():
+            if self.shards > 0:
+                events = self._sharded_stream()
+            elif self.detect_workers > 0:
+                events = self._pipeline_stream()
+            else:
+                events = self._sequential_stream()
+            if self.coalescer is not None:
+                events = self._coalesced_stream(events)
+            if self.sink is not None and not self._sink_in_pipeline():
+                # sink收到的是合并后的事件，写入量随合并减少
+                events = self._sink_stream(events)
+            try:
+                async for event in events:
+                    yield event
+            finally:
+                await events.aclose()
+                    
+        except Exception as e:
+            raise CaptureException(f"安全采集流失败: {e}")
+    
+    async def _sequential_stream(self) -> AsyncGenerator[SecurityEvent, None]:
+        """在当前进程内逐个检测"""
+        requests = self._request_stream()
+        try:
+            async for request in requests:
                 try:
                     # 安全检测
                     detection_result = self.detection_engine.detect_all(request)
@@ -132,12 +222,179 @@ class SecurityCapturer:
                     
                 except DetectionException as e:
                     # 检测失败，记录错误但继续处理
-                    self.stats['processing_errors'] += 1
+                    self._record_error()
                     print(f"检测失败: {e}")
                     continue
-                    
+        finally:
+            await requests.aclose()
+    
+    def _sink_in_pipeline(self) -> bool:
+        """sink是否作为流水线的最后一个阶段：只在流水线模式且不合并事件时，合并在流水线之后进行"""
+        return self.sink is not None and self.shards <= 0 and self.detect_workers > 0 and self.coalescer is None
+    
+    async def _sink_stream(self, events: AsyncGenerator[SecurityEvent, None]) -> AsyncGenerator[SecurityEvent, None]:
+        """每个事件交给sink后输出"""
+        try:
+            async for event in events:
+                yield await self._sink_event(event)
+        finally:
+            await events.aclose()
+    
+    async def _sink_event(self, event: SecurityEvent) -> SecurityEvent:
+        """调用sink，耗时计入store阶段；失败时记录错误，事件照常返回"""
+        store_start = time.perf_counter_ns()
+        try:
+            result = self.sink(event)
+            if inspect.isawaitable(result):
+                await result
         except Exception as e:
-            raise CaptureException(f"安全采集流失败: {e}")
+            self._record_error()
+            print(f"事件输出失败: {e}")
+        self.metrics.record('store', time.perf_counter_ns() - store_start)
+        return event
+    
+    async def _coalesced_stream(self, events: AsyncGenerator[SecurityEvent, None]) -> AsyncGenerator[SecurityEvent, None]:
+        """攻击事件按窗口合并后输出，流结束时输出所有未关闭的分组
+
+        事件源超过一个窗口没有新事件时（如follow模式下攻击停止），以最新事件的时间加上空闲时长
+        作为当前时间输出到期的分组，不必等到下一个事件
+        """
+        window = self.coalescer.window.total_seconds()
+        pending: Optional[asyncio.Future] = None
+        latest: Optional[datetime] = None
+        received = 0.0
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(events.__anext__())
+                # 等待超时不取消读取，下一轮继续等待同一个事件
+                done, _ = await asyncio.wait({pending}, timeout=window)
+                if not done:
+                    if latest is not None:
+                        now = latest + timedelta(seconds=time.monotonic() - received)
+                        for output in self.coalescer.expire(now):
+                            yield output
+                    continue
+                task, pending = pending, None
+                try:
+                    event = task.result()
+                except StopAsyncIteration:
+                    break
+                latest = event.request.timestamp if latest is None else max(latest, event.request.timestamp)
+                received = time.monotonic()
+                for output in self.coalescer.add(event):
+                    yield output
+            for output in self.coalescer.flush():
+                yield output
+        finally:
+            if pending is not None:
+                pending.cancel()
+                await asyncio.gather(pending, return_exceptions=True)
+            await events.aclose()
+    
+    async def _request_stream(self) -> AsyncGenerator[HTTPRequest, None]:
+        """捕获器的请求流，配置了采样器时过滤掉采样跳过的请求"""
+        requests = self.log_capturer.capture_stream()
+        try:
+            async for request in requests:
+                if self._should_analyze(request):
+                    yield request
+        finally:
+            await requests.aclose()
+    
+    def _should_analyze(self, request: HTTPRequest) -> bool:
+        """采样决定：未配置采样器时全部分析"""
+        if self.sampler is None or self.sampler.decide(request).analyze:
+            return True
+        self.stats['sampled_out_requests'] += 1
+        return False
+    
+    def _backlog(self) -> int:
+        """捕获器和流水线中尚未处理的请求数，作为采样器的队列深度"""
+        backlog = self.log_capturer.backlog()
+        if self.pipeline is not None:
+            backlog += self.pipeline.backlog()
+        return backlog
+    
+    async def _pipeline_stream(self) -> AsyncGenerator[SecurityEvent, None]:
+        """分阶段流水线：采集(异步) -> [解析(进程池，按批) -> 采样(异步)] -> 检测(进程池，按批)
+        -> 生成事件和统计(异步) -> [sink(异步)]
+
+        配置parse_workers且捕获器为LogFileCapturer时，捕获器只读取日志原文，解析与检测并行；
+        否则捕获器读取并解析，采样在进入流水线之前完成
+        """
+        stages = []
+        if self.parse_workers > 0 and isinstance(self.log_capturer, LogFileCapturer):
+            source = self.log_capturer.capture_lines()
+            stages.append(Stage(
+                "parse",
+                partial(parse_batch, log_format=self.log_capturer.log_format),
+                workers=self.parse_workers,
+                executor="process",
+                queue_size=self.queue_size,
+                batch_size=self.batch_size
+            ))
+            if self.sampler is not None:
+                stages.append(Stage("sample", self._sample_pipeline_request, queue_size=self.queue_size))
+        else:
+            source = self._request_stream()
+        stages.extend([
+            Stage(
+                "detect",
+                detect_batch,
+                workers=self.detect_workers,
+                executor="process",
+                queue_size=self.queue_size,
+                batch_size=self.batch_size,
+                initializer=init_detection_worker,
+                initargs=(self.detection_engine,)
+            ),
+            # 事件编号和统计需要顺序更新，只用一个worker
+            Stage("event", self._build_pipeline_event, queue_size=self.queue_size)
+        ])
+        if self._sink_in_pipeline():
+            stages.append(Stage("sink", self._sink_event, queue_size=self.queue_size))
+        self.pipeline = Pipeline(source, stages, output_queue_size=self.queue_size)
+        events = self.pipeline.run()
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+    
+    async def _sharded_stream(self) -> AsyncGenerator[SecurityEvent, None]:
+        """按来源IP分片的多进程检测，各分片结果合并为一个事件流"""
+        self.sharded = ShardedAnalyzer(
+            shards=self.shards,
+            batch_size=self.batch_size,
+            engine=self.detection_engine,
+            max_pending_batches=max(1, self.queue_size // self.batch_size)
+        )
+        results = self.sharded.run(self._request_stream())
+        try:
+            async for request, detection_result, ip_context in results:
+                if detection_result is None:
+                    self._record_error()
+                    continue
+                event = self._create_security_event(request, detection_result, ip_context)
+                self._update_stats(event)
+                yield event
+        finally:
+            await results.aclose()
+    
+    def _sample_pipeline_request(self, request: HTTPRequest) -> Optional[HTTPRequest]:
+        """流水线采样阶段：采样跳过的请求被过滤"""
+        return request if self._should_analyze(request) else None
+    
+    def _build_pipeline_event(self, item) -> Optional[SecurityEvent]:
+        """流水线事件阶段：检测结果转换为安全事件"""
+        request, detection_result = item
+        if detection_result is None:
+            self._record_error()
+            return None
+        event = self._create_security_event(request, detection_result)
+        self._update_stats(event)
+        return event
     
     async def analyze_attack_only_stream(self) -> AsyncGenerator[SecurityEvent, None]:
         """
@@ -150,38 +407,48 @@ class SecurityCapturer:
             if event.detection_result.is_attack:
                 yield event
     
-    async def batch_analyze_log(self, max_requests: int = None) -> Dict[str, Any]:
+    async def batch_analyze_log(self, max_requests: int = None, sample_size: int = 0) -> Dict[str, Any]:
         """
         批量分析日志文件
         
+        报告增量计算，事件处理后即丢弃，内存占用不随日志大小增长
+        
         Args:
             max_requests: 最大处理请求数，None表示处理全部
+            sample_size: 报告中保留的攻击事件样本数（蓄水池抽样），0表示不保留
             
         Returns:
             分析报告字典
         """
-        events = []
-        attacks = []
+        report = StreamingReport(sample_size=sample_size)
         processed_count = 0
         
+        stream = self.capture_and_analyze_stream()
         try:
-            async for event in self.capture_and_analyze_stream():
-                events.append(event)
-                if event.detection_result.is_attack:
-                    attacks.append(event)
+            async for event in stream:
+                report.add(event)
                 
                 processed_count += 1
                 if max_requests and processed_count >= max_requests:
                     break
+            # 提前结束时立即关闭流，释放流水线的检测进程
+            await stream.aclose()
             
             # 生成分析报告
-            report = self._generate_analysis_report(events, attacks)
-            return report
+            result = report.build(self.stats)
+            if self.sampler is not None:
+                result['sampling'] = self.sampler.get_stats()
+            return result
             
         except Exception as e:
             raise CaptureException(f"批量分析失败: {e}")
     
-    def _create_security_event(self, request: HTTPRequest, detection_result: DetectionResult) -> SecurityEvent:
+    def _create_security_event(
+        self,
+        request: HTTPRequest,
+        detection_result: DetectionResult,
+        ip_context: Optional[Dict[str, Any]] = None
+    ) -> SecurityEvent:
         """创建安全事件"""
         self.event_counter += 1
         
@@ -196,7 +463,8 @@ class SecurityCapturer:
             detection_result=detection_result,
             timestamp=datetime.now(),
             event_id=event_id,
-            risk_level=risk_level
+            risk_level=risk_level,
+            ip_context=ip_context
         )
     
     def _determine_risk_level(self, detection_result: DetectionResult) -> str:
@@ -215,66 +483,35 @@ class SecurityCapturer:
         """更新统计信息"""
         self.stats['total_requests'] += 1
         self.stats['last_event_time'] = event.timestamp
+        self.metrics.mark('requests')
+        # 检测耗时由检测引擎写入结果，流水线和分片模式下同样可用
+        self.metrics.record_timings(event.detection_result.details.get('timings'))
         
         if event.detection_result.is_attack:
             self.stats['attack_requests'] += 1
+            self.metrics.mark('attacks')
         else:
             self.stats['normal_requests'] += 1
     
-    def _generate_analysis_report(self, events: list, attacks: list) -> Dict[str, Any]:
-        """生成分析报告"""
-        if not events:
-            return {
-                'summary': '没有处理任何请求',
-                'total_events': 0,
-                'attack_events': 0,
-                'attack_rate': 0.0,
-                'top_attack_types': [],
-                'top_attack_ips': [],
-                'risk_distribution': {}
-            }
-        
-        # 攻击类型统计
-        attack_types = {}
-        attack_ips = {}
-        risk_distribution = {'HIGH': 0, 'MEDIUM': 0, 'LOW': 0, 'SAFE': 0}
-        
-        for event in events:
-            # 风险级别分布
-            risk_distribution[event.risk_level] += 1
-            
-            if event.detection_result.is_attack:
-                # 攻击类型统计
-                for attack_type in event.detection_result.attack_types:
-                    attack_types[attack_type.value] = attack_types.get(attack_type.value, 0) + 1
-                
-                # 攻击IP统计
-                ip = event.request.source_ip
-                attack_ips[ip] = attack_ips.get(ip, 0) + 1
-        
-        # 排序统计
-        top_attack_types = sorted(attack_types.items(), key=lambda x: x[1], reverse=True)[:10]
-        top_attack_ips = sorted(attack_ips.items(), key=lambda x: x[1], reverse=True)[:10]
-        
-        return {
-            'summary': f'分析了{len(events)}个请求，发现{len(attacks)}个攻击',
-            'total_events': len(events),
-            'attack_events': len(attacks),
-            'attack_rate': len(attacks) / len(events) * 100,
-            'top_attack_types': top_attack_types,
-            'top_attack_ips': top_attack_ips,
-            'risk_distribution': risk_distribution,
-            'processing_stats': self.stats
-        }
+    def _record_error(self):
+        """记录一次处理错误"""
+        self.stats['processing_errors'] += 1
+        self.metrics.mark('errors')
     
     async def start_monitoring(self):
         """启动监控模式"""
         await self.log_capturer.start_capture()
         self.stats['start_time'] = datetime.now()
-        print(f"🚀 安全监控已启动，监控文件: {self.log_capturer.log_file_path}")
+        source = getattr(self.log_capturer, 'log_file_path', None) or getattr(self.log_capturer, 'glob_pattern', '')
+        print(f"🚀 安全监控已启动，监控文件: {source}")
     
     async def stop_monitoring(self):
         """停止监控模式"""
+        if self.pipeline is not None:
+            # 停止读取新数据，流水线中在途的请求会处理完
+            self.pipeline.stop()
+        if self.sharded is not None:
+            self.sharded.stop()
         await self.log_capturer.stop_capture()
         print("🛑 安全监控已停止")
     
@@ -289,6 +526,16 @@ class SecurityCapturer:
                 stats['requests_per_second'] = stats['total_requests'] / stats['runtime_seconds']
                 stats['attack_rate'] = (stats['attack_requests'] / stats['total_requests']) * 100
         
+        if self.pipeline is not None:
+            stats['pipeline'] = self.pipeline.get_metrics()
+        if self.sharded is not None:
+            stats['sharding'] = self.sharded.get_metrics()
+        if self.sampler is not None:
+            stats['sampling'] = self.sampler.get_stats()
+        if self.coalescer is not None:
+            stats['coalescing'] = self.coalescer.get_stats()
+        stats['metrics'] = self.metrics.to_dict()
+        
         return stats
     
     def get_detector_info(self) -> Dict[str, Any]:
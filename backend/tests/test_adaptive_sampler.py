@@ -0,0 +1,209 @@
+"""
+AdaptiveSampler 功能测试
+测试预过滤、良性路径分类、按队列深度调整采样率以及与SecurityCapturer/ASGI中间件的集成
+"""
+
+import base64
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.capture.asgi_capturer import ASGICaptureMiddleware
+from app.detector import AdaptiveSampler, DetectionEngine
+from app.core.models import HTTPRequest
+from security_capturer import SecurityCapturer
+
+
+def make_request(url: str, params: dict = None) -> HTTPRequest:
+    return HTTPRequest(
+        url=url,
+        method="GET",
+        headers={},
+        params=params or {},
+        body=None,
+        source_ip="192.0.2.20",
+        timestamp=datetime.now(),
+        raw_data=f"GET {url}",
+        user_agent="Mozilla/5.0"
+    )
+
+
+class TestAdaptiveSampler:
+    """AdaptiveSampler测试类"""
+
+    def setup_method(self):
+        self.engine = DetectionEngine()
+
+    def test_prefilter(self):
+        """测试预过滤发现任意严重级别的触发特征和深层编码"""
+        assert not self.engine.prefilter(make_request("/static/app.js"))
+        assert self.engine.prefilter(make_request("/static/app.js?q=<script>", {"q": "<script>"}))
+        # medium级别规则同样触发
+        assert self.engine.prefilter(make_request("/img/a.png?p=2", {"p": "a -- b"}))
+        assert self.engine.prefilter(make_request("/img/a.png?p=%253Cscript%253E", {"p": "%253Cscript%253E"}))
+
+    def test_prefilter_covers_full_decoding(self):
+        """测试请求头中的Base64载荷、路径解码后命中的规则同样触发，与完整检测一致"""
+        header = make_request("/static/app.js")
+        header.headers = {"X-Data": base64.b64encode(b"<script>alert(1)</script>").decode()}
+        for request in (header, make_request("/health")):
+            assert self.engine.detect_all(request).is_attack, request.url
+            assert self.engine.prefilter(request), request.url
+
+        sampler = AdaptiveSampler(engine=self.engine, seed=2)
+        sampler.rate = 0.01
+        assert all(sampler.decide(header).analyze for _ in range(10))
+
+    def test_prefilter_skips_deep_preprocessing(self):
+        """测试预过滤不对请求做完整的深层解码，深层编码痕迹在解码之前检查"""
+        from app.detector.coraza_detector import CorazaDetector
+        coraza = next(d for d in self.engine.detectors if isinstance(d, CorazaDetector))
+        calls = []
+        preprocess = coraza._preprocess_request
+
+        def recording_preprocess(request, deep=True):
+            calls.append(deep)
+            return preprocess(request, deep)
+
+        coraza._preprocess_request = recording_preprocess
+        assert not self.engine.prefilter(make_request("/static/logo.png"))
+        assert calls == [False]
+        calls.clear()
+        assert self.engine.prefilter(make_request("/img/a.png?p=%253Cscript%253E", {"p": "%253Cscript%253E"}))
+        assert calls == []
+
+    def test_decisions(self):
+        """测试触发、非良性路径和良性路径请求的采样决定"""
+        sampler = AdaptiveSampler(engine=self.engine, seed=1)
+        sampler.rate = 0.0001
+
+        attack = sampler.decide(make_request("/css/site.css?x=1 UNION SELECT 1", {"x": "1 UNION SELECT 1"}))
+        assert attack.analyze and attack.reason == 'triggered'
+
+        api = sampler.decide(make_request("/api/orders?page=2", {"page": "2"}))
+        assert api.analyze and api.reason == 'not_benign_path'
+
+        static = sampler.decide(make_request("/static/logo.png"))
+        assert not static.analyze and static.path_class == 'static'
+        assert sampler.decide(make_request("/assets/bundle")).path_class == 'assets'
+        assert sampler.decide(make_request("/readyz")).path_class == 'probe'
+
+    def test_rate_adjusts_to_queue_depth(self):
+        """测试积压超过目标时采样率乘性下降，回落后加性恢复"""
+        depth = {'value': 0}
+        sampler = AdaptiveSampler(
+            engine=self.engine,
+            target_queue_depth=10,
+            min_rate=0.05,
+            increase_step=0.25,
+            adjust_interval=0,
+            queue_depth=lambda: depth['value']
+        )
+
+        depth['value'] = 100
+        for _ in range(10):
+            sampler.decide(make_request("/favicon.ico"))
+        assert sampler.rate == 0.05
+
+        depth['value'] = 0
+        for _ in range(2):
+            sampler.decide(make_request("/favicon.ico"))
+        assert sampler.rate == pytest.approx(0.55)
+        assert sampler.get_stats()['last_queue_depth'] == 0
+
+    def test_effective_rate_scales_back(self):
+        """测试实际采样率和权重和可以还原请求总量"""
+        sampler = AdaptiveSampler(engine=self.engine, seed=7)
+        sampler.rate = 0.25
+        for n in range(4000):
+            sampler.decide(make_request(f"/assets/chunk-{n}.js"))
+        for n in range(100):
+            sampler.decide(make_request(f"/api/items?page={n}", {"page": str(n)}))
+
+        stats = sampler.get_stats()
+        assert stats['requests'] == 4100
+        assert stats['not_benign_path'] == 100
+        assert stats['effective_rate'] == pytest.approx(0.25, abs=0.03)
+        assert stats['estimated_requests'] == pytest.approx(4100, rel=0.1)
+        static = stats['by_class']['static']
+        assert static['seen'] == 4000
+        assert static['sampled'] * static['scale_factor'] == pytest.approx(4000)
+
+
+class TestSamplerIntegration:
+    """采样器集成测试类"""
+
+    @pytest.mark.asyncio
+    async def test_security_capturer_sampling(self):
+        """测试SecurityCapturer跳过良性请求但保留全部攻击"""
+        lines = []
+        for n in range(60):
+            if n % 10 == 0:
+                url = "/q?x=1%27%20UNION%20SELECT%20pass%20FROM%20users--"
+            else:
+                url = f"/static/img/{n}.png"
+            lines.append(f'10.0.0.{n % 4} - - [25/Dec/2023:10:00:{n:02d} +0800] "GET {url} HTTP/1.1" 200 10 "-" "Mozilla/5.0"')
+        fd, path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+        engine = DetectionEngine()
+        sampler = AdaptiveSampler(engine=engine, seed=3)
+        sampler.rate = 0.1
+        # 手动设置的采样率保持不变
+        sampler.adjust_interval = float('inf')
+        try:
+            capturer = SecurityCapturer(path, sampler=sampler)
+            report = await capturer.batch_analyze_log()
+        finally:
+            os.unlink(path)
+
+        assert report['attack_events'] == 6
+        stats = capturer.get_stats()
+        assert stats['sampled_out_requests'] > 0
+        assert report['total_events'] + stats['sampled_out_requests'] == 60
+        assert report['sampling']['triggered'] == 6
+        assert report['sampling']['by_class']['static']['seen'] == 54
+
+    @pytest.mark.asyncio
+    async def test_asgi_middleware_sampling(self):
+        """测试中间件放过未抽中的请求，不进入后台队列"""
+        async def app(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b'ok'})
+
+        sampler = AdaptiveSampler(seed=5)
+        sampler.rate = 0.0001
+        sampler.adjust_interval = float('inf')
+        middleware = ASGICaptureMiddleware(app, fast_engine=DetectionEngine(), sampler=sampler)
+        assert sampler.queue_depth == middleware.backlog
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        for path, query in [('/static/app.css', b''), ('/search', b'q=<script>alert(1)</script>')]:
+            scope = {
+                'type': 'http', 'method': 'GET', 'path': path, 'raw_path': path.encode(),
+                'query_string': query, 'headers': [], 'client': ('203.0.113.5', 5000)
+            }
+            await middleware(scope, receive, send)
+
+        stats = middleware.get_stats()
+        assert stats['sampled_out'] == 1
+        assert stats['inspected'] == 1
+        assert stats['inline_attacks'] == 1
+        assert stats['overhead_total_ns'] + stats['sampled_out_overhead_ns'] > stats['overhead_total_ns'] > 0
+        assert stats['overhead_avg_us'] == stats['overhead_total_ns'] / 1000
+        assert middleware.backlog() == 1
+        assert len([m for m in sent if m['type'] == 'http.response.start']) == 2
+        await middleware.stop_capture()
@@ -0,0 +1,176 @@
+"""
+ASGICaptureMiddleware 功能测试
+直接以ASGI协议调用中间件，验证请求体回放、内联检测、后台存储与直通
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.capture.asgi_capturer import ASGICaptureMiddleware
+from app.core.models import DetectionResult
+from app.detector import DetectionEngine
+from app.storage import MemoryStorage
+
+
+class EchoApp:
+    """把收到的请求体原样返回的ASGI应用"""
+
+    def __init__(self):
+        self.seen_state = None
+
+    async def __call__(self, scope, receive, send):
+        self.seen_state = scope.get('state')
+        body = b''
+        more = True
+        while more:
+            message = await receive()
+            body += message.get('body', b'')
+            more = message.get('more_body', False)
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+class PidEngine:
+    """检测结果中记录执行检测的进程"""
+
+    def detect_all(self, request):
+        return DetectionResult(
+            is_attack=False, attack_types=[], confidence=0.0,
+            details={'pid': os.getpid()}, payload=None, matched_rules=[]
+        )
+
+
+def http_scope(path='/login', query=b'', method='POST'):
+    headers = [(b'user-agent', b'pytest')]
+    if method == 'POST':
+        headers.append((b'content-type', b'application/x-www-form-urlencoded'))
+    return {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query,
+        'headers': headers,
+        'client': ('203.0.113.9', 51000),
+    }
+
+
+async def call(middleware, scope, body_parts):
+    messages = [
+        {'type': 'http.request', 'body': part, 'more_body': i < len(body_parts) - 1}
+        for i, part in enumerate(body_parts)
+    ]
+
+    async def receive():
+        return messages.pop(0)
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(scope, receive, send)
+    return sent
+
+
+class TestASGICaptureMiddleware:
+    """ASGICaptureMiddleware测试类"""
+
+    @pytest.mark.asyncio
+    async def test_body_replay_and_inline_verdict(self):
+        """测试请求体被完整转发，内联检测结果写入scope state"""
+        app = EchoApp()
+        middleware = ASGICaptureMiddleware(app, fast_engine=DetectionEngine(), budget_us=10_000_000)
+
+        sent = await call(middleware, http_scope(), [b"user=admin' UNION ", b"SELECT password--"])
+
+        assert sent[-1]['body'] == b"user=admin' UNION SELECT password--"
+        assert app.seen_state['security_verdict'].is_attack
+        stats = middleware.get_stats()
+        assert stats['inline_attacks'] == 1
+        assert stats['overhead_avg_us'] > 0
+
+        request = await middleware.capture_single()
+        assert request.body == "user=admin' UNION SELECT password--"
+        assert request.source_ip == '203.0.113.9'
+        assert request.user_agent == 'pytest'
+
+    @pytest.mark.asyncio
+    async def test_large_body_forwarded_beyond_inspection_limit(self):
+        """测试超过检查上限的请求体仍然完整转发"""
+        middleware = ASGICaptureMiddleware(EchoApp(), max_body_size=4)
+        sent = await call(middleware, http_scope(), [b'abc', b'def', b'ghi'])
+
+        assert sent[-1]['body'] == b'abcdefghi'
+        request = await middleware.capture_single()
+        assert len(request.body) <= 4
+
+    @pytest.mark.asyncio
+    async def test_background_storage(self):
+        """测试后台worker完成检测并保存事件"""
+        storage = MemoryStorage()
+        middleware = ASGICaptureMiddleware(EchoApp(), storage=storage)
+
+        await call(middleware, http_scope(path='/search', query=b"q=<script>alert(1)</script>", method='GET'), [b''])
+        await call(middleware, http_scope(path='/home', method='GET'), [b''])
+        await middleware.stop_capture()
+
+        assert middleware.get_stats()['analyzed'] == 2
+        events = await storage.query_events()
+        assert sum(1 for e in events if e.detection.is_attack) == 1
+
+    @pytest.mark.asyncio
+    async def test_background_detection_in_worker_process(self):
+        """测试后台完整检测在独立进程中按批执行，不占用被保护服务的进程"""
+        storage = MemoryStorage()
+        middleware = ASGICaptureMiddleware(EchoApp(), analysis_engine=PidEngine(), storage=storage, batch_size=8)
+
+        for i in range(5):
+            await call(middleware, http_scope(path=f'/item/{i}', method='GET'), [b''])
+        await middleware.stop_capture()
+
+        events = await storage.query_events()
+        assert len(events) == 5
+        assert all(e.detection.details['pid'] != os.getpid() for e in events)
+
+    @pytest.mark.asyncio
+    async def test_passthrough_when_queue_saturated(self):
+        """测试队列饱和时直通"""
+        app = EchoApp()
+        middleware = ASGICaptureMiddleware(app, fast_engine=DetectionEngine(), max_queue_size=1)
+
+        await call(middleware, http_scope(), [b'a=1'])
+        sent = await call(middleware, http_scope(), [b'a=2'])
+
+        assert sent[-1]['body'] == b'a=2'
+        assert app.seen_state is None
+        assert middleware.get_stats()['passthrough'] == 1
+
+    @pytest.mark.asyncio
+    async def test_inline_skipped_when_over_budget(self):
+        """测试内联检测平均耗时超出预算后跳过内联检测"""
+        middleware = ASGICaptureMiddleware(EchoApp(), fast_engine=DetectionEngine(), budget_us=0)
+        for _ in range(3):
+            await call(middleware, http_scope(), [b'a=1'])
+
+        stats = middleware.get_stats()
+        assert stats['over_budget'] >= 1
+        assert stats['inline_skipped'] >= 1
+
+    @pytest.mark.asyncio
+    async def test_non_http_scope_passthrough(self):
+        """测试非HTTP请求（如lifespan）直接透传"""
+        called = []
+
+        async def app(scope, receive, send):
+            called.append(scope['type'])
+
+        middleware = ASGICaptureMiddleware(app)
+        await middleware({'type': 'lifespan'}, None, None)
+        assert called == ['lifespan']
+        assert middleware.stats['requests'] == 0
@@ -0,0 +1,198 @@
+"""
+AuditLogCapturer 功能测试
+测试serial/concurrent审计日志的流式解析以及请求体检测
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.capture.audit_log_capturer import AuditLogCapturer, AuditLogParser
+from app.detector import DetectionEngine
+
+
+def audit_entry(boundary: str, ip: str, body: str, uid: str = "XYZ") -> str:
+    """构造一个serial格式的审计日志事务"""
+    return (
+        f"--{boundary}-A--\n"
+        f"[25/Dec/2023:10:00:00 +0800] {uid} {ip} 54321 10.0.0.1 80\n"
+        f"\n--{boundary}-B--\n"
+        "POST /login.php?next=/home HTTP/1.1\n"
+        "Host: example.com\n"
+        "User-Agent: Mozilla/5.0\n"
+        "Content-Type: application/x-www-form-urlencoded\n"
+        "Cookie: a=1\n"
+        "Cookie: b=2\n"
+        "\n"
+        f"\n--{boundary}-C--\n"
+        f"{body}\n"
+        f"--{boundary}-F--\n"
+        "HTTP/1.1 403 Forbidden\n"
+        "Content-Length: 0\n"
+        f"\n--{boundary}-H--\n"
+        "Message: Access denied with code 403 (phase 2). [id \"942100\"]\n"
+        "Stopwatch: 1703469600000000 1000 (- - -)\n"
+        f"\n--{boundary}-Z--\n\n"
+    )
+
+
+# ModSecurity 3.x serial格式的一个事务
+V3_ENTRY = (
+    "---Tq7Kd2Xa---A--\n"
+    "[25/Dec/2023:10:00:00 +0800] 170346960012.345678 192.168.1.7 54321 10.0.0.1 80\n"
+    "---Tq7Kd2Xa---B--\n"
+    "POST /login.php HTTP/1.1\n"
+    "Host: example.com\n"
+    "User-Agent: curl/8.0\n"
+    "Content-Type: application/x-www-form-urlencoded\n"
+    "\n"
+    "---Tq7Kd2Xa---C--\n"
+    "id=1 UNION SELECT password FROM users\n"
+    "\n"
+    "---Tq7Kd2Xa---F--\n"
+    "HTTP/1.1 403\n"
+    "Server: nginx\n"
+    "\n"
+    "---Tq7Kd2Xa---H--\n"
+    "ModSecurity: Access denied with code 403 (phase 2). [id \"942100\"] [msg \"SQL Injection\"]\n"
+    "\n"
+    "---Tq7Kd2Xa---Z--\n"
+    "\n"
+)
+
+
+class TestAuditLogCapturer:
+    """AuditLogCapturer测试类"""
+
+    @pytest.fixture
+    def temp_dir(self):
+        path = tempfile.mkdtemp()
+        yield path
+        shutil.rmtree(path, ignore_errors=True)
+
+    def test_parser_sections(self):
+        """测试解析各个分段"""
+        parser = AuditLogParser()
+        entry = None
+        for line in audit_entry("a1b2c3d4", "192.168.1.5", "username=admin'--&password=x").splitlines(True):
+            entry = parser.feed_line(line) or entry
+
+        assert entry is not None
+        assert entry.transaction_id == "XYZ"
+        assert entry.source_ip == "192.168.1.5"
+        assert entry.dest_port == 80
+        assert entry.method == "POST"
+        assert entry.url == "/login.php?next=/home"
+        assert entry.headers["Cookie"] == "a=1, b=2"
+        assert entry.body == "username=admin'--&password=x"
+        assert entry.response_status == 403
+        assert entry.messages and "942100" in entry.messages[0]
+
+        request = entry.to_http_request()
+        assert request.params == {"next": "/home"}
+        assert request.user_agent == "Mozilla/5.0"
+
+    def test_parser_bounded_body(self):
+        """测试请求体超出上限时被截断"""
+        parser = AuditLogParser(max_body_size=16)
+        entry = None
+        for line in audit_entry("b1", "10.0.0.9", "x" * 1000).splitlines(True):
+            entry = parser.feed_line(line) or entry
+
+        assert entry.truncated
+        assert len(entry.body) <= 16
+        assert parser.entries_truncated == 1
+
+    @pytest.mark.asyncio
+    async def test_serial_stream(self, temp_dir):
+        """测试serial格式流式读取并检测POST请求体"""
+        path = os.path.join(temp_dir, "modsec_audit.log")
+        with open(path, 'w') as f:
+            f.write(audit_entry("aaaa1111", "192.168.1.5", "id=1 UNION SELECT password FROM users"))
+            f.write(audit_entry("bbbb2222", "192.168.1.6", "name=alice&age=30", uid="ABC"))
+            # 没有Z段的损坏事务不应产出请求
+            f.write("--cccc3333-A--\n[25/Dec/2023:10:00:00 +0800] BAD 1.1.1.1 1 2.2.2.2 80\n")
+
+        capturer = AuditLogCapturer(path)
+        await capturer.start_capture()
+        requests = [r async for r in capturer.capture_stream()]
+
+        assert len(requests) == 2
+        assert requests[0].body.startswith("id=1 UNION SELECT")
+        assert requests[1].source_ip == "192.168.1.6"
+
+        result = DetectionEngine().detect_all(requests[0])
+        assert result.is_attack
+        assert "CRS-942100" in result.matched_rules
+
+    @pytest.mark.asyncio
+    async def test_modsecurity_v3_serial(self, temp_dir):
+        """测试ModSecurity 3.x的 ---<id>---A-- 分段边界"""
+        path = os.path.join(temp_dir, "modsec_audit.log")
+        with open(path, 'w') as f:
+            f.write(V3_ENTRY)
+            f.write(audit_entry("aaaa1111", "192.168.1.5", "a=1"))
+
+        capturer = AuditLogCapturer(path)
+        await capturer.start_capture()
+        requests = [r async for r in capturer.capture_stream()]
+
+        assert [r.source_ip for r in requests] == ["192.168.1.7", "192.168.1.5"]
+        assert requests[0].method == "POST"
+        assert requests[0].user_agent == "curl/8.0"
+        assert requests[0].body.startswith("id=1 UNION SELECT")
+
+        parser = AuditLogParser()
+        entry = None
+        for line in V3_ENTRY.splitlines(True):
+            entry = parser.feed_line(line) or entry
+        assert entry.transaction_id == "170346960012.345678"
+        assert entry.response_status == 403
+        assert entry.messages and "942100" in entry.messages[0]
+
+    @pytest.mark.asyncio
+    async def test_serial_capture_single(self, temp_dir):
+        """测试逐个捕获事务"""
+        path = os.path.join(temp_dir, "modsec_audit.log")
+        with open(path, 'w') as f:
+            f.write(audit_entry("aaaa1111", "192.168.1.5", "a=1"))
+            f.write(audit_entry("bbbb2222", "192.168.1.6", "b=2"))
+
+        capturer = AuditLogCapturer(path)
+        first = await capturer.capture_single()
+        second = await capturer.capture_single()
+        assert (first.body, second.body) == ("a=1", "b=2")
+        assert await capturer.capture_single() is None
+
+    @pytest.mark.asyncio
+    async def test_concurrent_format(self, temp_dir):
+        """测试concurrent格式：索引文件 + 每事务一个文件"""
+        relative = "/20231225/20231225-1000/20231225-100000-XYZ"
+        transaction_file = os.path.join(temp_dir, relative.lstrip('/'))
+        os.makedirs(os.path.dirname(transaction_file))
+        with open(transaction_file, 'w') as f:
+            f.write(audit_entry("dddd4444", "203.0.113.7", "cmd=;cat /etc/passwd"))
+
+        index_path = os.path.join(temp_dir, "modsec_audit.index")
+        with open(index_path, 'w') as f:
+            f.write(
+                'example.com 203.0.113.7 - - [25/Dec/2023:10:00:00 +0800] "POST /login.php HTTP/1.1" '
+                f'403 0 "-" "-" XYZ "-" {relative} 0 1234 md5:0123456789abcdef\n'
+            )
+            f.write(
+                'example.com 203.0.113.8 - - [25/Dec/2023:10:00:01 +0800] "GET / HTTP/1.1" '
+                '200 0 "-" "-" MISSING "-" /20231225/none 0 10 md5:00\n'
+            )
+
+        capturer = AuditLogCapturer(index_path, log_type="concurrent")
+        await capturer.start_capture()
+        requests = [r async for r in capturer.capture_stream()]
+
+        assert len(requests) == 1
+        assert requests[0].body == "cmd=;cat /etc/passwd"
+        assert capturer.get_stats()['missing_files'] == 1
@@ -0,0 +1,177 @@
+"""
+基数与高频项草图测试
+测试HyperLogLog、Count-Min、HeavyHitters的误差保证和合并，时间桶窗口合并后的基数统计以及统计接口
+"""
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.analytics import CountMinSketch, HeavyHitters, HyperLogLog, TimeRollups
+from app.api.statistics import get_attack_cardinality
+from app.storage import MemoryStorage, RollupStorage
+from tests.test_memory_storage import BASE_TIME, TYPES, make_event
+from tests.test_rollups import FakeClock
+
+
+def attack_events(count, seed):
+    """攻击事件：来源IP和路径都是少数高频、大量低频"""
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        if rng.random() < 0.4:
+            source_ip = f"10.0.0.{rng.randrange(5)}"
+        else:
+            source_ip = f"172.16.{rng.randrange(8)}.{rng.randrange(250)}"
+        event = make_event(i % 2000, source_ip, [rng.choice(TYPES)])
+        event.request.url = f"/api/item/{rng.randrange(300)}?q=1" if rng.random() < 0.7 else "/login"
+        events.append(event)
+    return events
+
+
+class TestHyperLogLog:
+    """HyperLogLog测试类"""
+
+    def test_accuracy_and_merge(self):
+        """测试估计值在3倍标准误差以内，分别统计后合并与一起统计完全相同"""
+        a, b, both = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+        for n in range(60000):
+            (a if n % 2 else b).add(f"ip-{n % 40000}")
+            both.add(f"ip-{n % 40000}")
+        assert abs(both.count() - 40000) <= 3 * both.relative_error * 40000
+        assert (a.merge(b).registers == both.registers).all()
+        assert both.nbytes == 4096
+
+    def test_small_cardinality(self):
+        """测试小基数时线性计数接近精确"""
+        sketch = HyperLogLog(10)
+        for n in range(50):
+            sketch.add(n)
+            sketch.add(n)
+        assert abs(sketch.count() - 50) <= 1
+        with pytest.raises(ValueError):
+            sketch.merge(HyperLogLog(11))
+
+
+class TestCountMin:
+    """CountMinSketch与HeavyHitters测试类"""
+
+    def test_bounds(self):
+        """测试估计值不低于真实计数，且在概率误差界以内"""
+        rng = random.Random(3)
+        sketch = CountMinSketch(272, 4)
+        truth = {}
+        for _ in range(20000):
+            item = rng.randrange(50) if rng.random() < 0.5 else rng.randrange(100000)
+            truth[item] = truth.get(item, 0) + 1
+            sketch.add(item)
+        bound = sketch.error_bound()
+        within = sum(truth[item] <= sketch.estimate(item) <= truth[item] + bound for item in truth)
+        assert all(sketch.estimate(item) >= truth[item] for item in truth)
+        assert within >= 0.98 * len(truth)
+
+    def test_heavy_hitters_merge(self):
+        """测试合并多个小草图后，高频项计数比单独Space-Saving更准且满足误差保证"""
+        rng = random.Random(4)
+        parts, truth = [], {}
+        for _ in range(48):
+            part = HeavyHitters(16)
+            for _ in range(500):
+                item = f"hot-{rng.randrange(4)}" if rng.random() < 0.3 else f"cold-{rng.randrange(5000)}"
+                truth[item] = truth.get(item, 0) + 1
+                part.add(item)
+            parts.append(part)
+        merged = HeavyHitters(16)
+        for part in parts:
+            merged.merge(part)
+
+        top = merged.top(4)
+        assert {item for item, _, _ in top} == {f"hot-{n}" for n in range(4)}
+        for item, count, error in top:
+            assert count - error <= truth[item] <= count
+            assert count <= merged.candidates.estimate(item)
+        assert sum(count - truth[item] for item, count, _ in top) < \
+            sum(merged.candidates.estimate(item) - truth[item] for item, _, _ in top)
+
+
+class TestRollupCardinality:
+    """时间桶基数统计测试类"""
+
+    @staticmethod
+    def exact(events, start, end):
+        sources, paths = {}, {}
+        for event in events:
+            if start <= event.request.timestamp <= end:
+                sources[event.request.source_ip] = sources.get(event.request.source_ip, 0) + 1
+                path = event.request.url.split('?')[0]
+                paths[path] = paths.get(path, 0) + 1
+        return sources, paths
+
+    @pytest.mark.asyncio
+    async def test_window_matches_exact(self):
+        """测试小时对齐窗口的不同数量在误差以内，高频来源/路径与精确结果一致，并与存储的精确实现比较"""
+        events = attack_events(6000, 9)
+        clock = FakeClock(BASE_TIME + timedelta(minutes=2000))
+        rollups = TimeRollups(clock=clock)
+        for event in events:
+            rollups.add(event)
+        start, end = BASE_TIME + timedelta(hours=2), BASE_TIME + timedelta(minutes=1999)
+        result = rollups.cardinality(start, end, limit=5)
+        sources, paths = self.exact(events, start, end)
+
+        assert result['attack_events'] == sum(sources.values())
+        for key, truth in (('distinct_sources', sources), ('distinct_paths', paths)):
+            estimate = result[key]['estimate']
+            assert abs(estimate - len(truth)) <= 3 * result[key]['relative_error'] * len(truth), key
+        top_sources = sorted(sources.items(), key=lambda x: x[1], reverse=True)[:5]
+        assert {s['source_ip'] for s in result['top_sources']} == {ip for ip, _ in top_sources}
+        for source in result['top_sources']:
+            true_count = sources[source['source_ip']]
+            assert source['attack_count'] - source['max_error'] <= true_count <= source['attack_count']
+            assert source['attack_count'] - true_count <= result['count_error_bound']
+        assert result['top_paths'][0] == {'path': '/login', 'attack_count': paths['/login'],
+                                          'max_error': result['top_paths'][0]['max_error']}
+
+        memory = MemoryStorage()
+        await memory.save_events(events)
+        exact = await memory.get_cardinality(start_time=start, end_time=end, limit=5)
+        assert exact['distinct_sources']['estimate'] == len(sources)
+        assert exact['distinct_paths']['estimate'] == len(paths)
+        assert exact['top_paths'][0] == {'path': '/login', 'attack_count': paths['/login'], 'max_error': 0}
+
+    def test_fixed_memory_per_bucket(self):
+        """测试良性桶不分配攻击草图，攻击草图大小与事件数无关"""
+        rollups = TimeRollups(clock=FakeClock(BASE_TIME + timedelta(minutes=30)))
+        rollups.add(make_event(0, "10.0.0.1"))
+        for event in attack_events(500, 1):
+            event.request.timestamp = BASE_TIME + timedelta(minutes=1)
+            rollups.add(event)
+        buckets = [bucket for _, _, bucket in rollups.buckets()]
+        assert buckets[0].sketches is None
+        sketches = buckets[1].sketches
+        assert len(sketches.sources.candidates) <= 64 and len(sketches.paths.candidates) <= 64
+        assert rollups.sketch_bytes() == 2 * 1024 + 2 * 272 * 4 * 4
+
+
+class TestCardinalityAPI:
+    """基数统计接口测试类"""
+
+    @pytest.mark.asyncio
+    async def test_endpoint(self):
+        """测试接口在预聚合存储和普通存储上返回相同结构"""
+        events = attack_events(300, 2)
+        now = datetime.now()
+        for n, event in enumerate(events):
+            event.request.timestamp = now - timedelta(minutes=n)
+        for storage in (MemoryStorage(), RollupStorage(MemoryStorage())):
+            await storage.save_events(events)
+            response = await get_attack_cardinality(hours=24, limit=3, storage=storage)
+            assert response['attack_events'] == 300
+            assert response['time_range']['hours'] == 24
+            assert len(response['top_sources']) == 3 and len(response['top_paths']) == 3
+            assert response['top_paths'][0]['path'] == '/login'
@@ -0,0 +1,116 @@
+"""
+检测截止时间测试
+测试DetectionEngine和CorazaDetector在超过截止时间时返回部分结果
+"""
+
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.detector import DetectionEngine, CorazaDetector, BaseDetector
+from app.core.models import HTTPRequest, DetectionResult
+
+
+def make_request(query: str) -> HTTPRequest:
+    return HTTPRequest(
+        url=f"/search?q={query}",
+        method="GET",
+        headers={},
+        params={"q": query},
+        body=None,
+        source_ip="192.0.2.10",
+        timestamp=datetime.now(),
+        raw_data=f"GET /search?q={query}"
+    )
+
+
+def slow_coraza(delay: float) -> CorazaDetector:
+    """XSS规则类别人为变慢的Coraza检测器"""
+    detector = CorazaDetector()
+    original = detector._detect_xss
+
+    def slow_xss(data_items):
+        time.sleep(delay)
+        return original(data_items)
+
+    detector._detect_xss = slow_xss
+    return detector
+
+
+class PlainDetector(BaseDetector):
+    """不支持截止时间的检测器"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def detect(self, request: HTTPRequest) -> DetectionResult:
+        self.calls += 1
+        return self._create_result(is_attack=False, confidence=0.0)
+
+
+class TestDetectionDeadline:
+    """检测截止时间测试类"""
+
+    def test_no_deadline_is_complete(self):
+        """测试不设置截止时间时结果完整"""
+        result = DetectionEngine().detect_all(make_request("1 UNION SELECT 1"))
+        assert result.is_attack
+        assert not result.incomplete
+        assert 'incomplete' not in result.details
+
+    def test_expired_deadline_skips_detectors(self):
+        """测试截止时间已过时跳过所有检测器"""
+        engine = DetectionEngine()
+        result = engine.detect_all(make_request("1 UNION SELECT 1"), deadline=time.monotonic() - 1)
+
+        assert result.incomplete
+        assert not result.is_attack
+        assert result.details['incomplete']['skipped_detectors'] == ['CorazaDetector']
+        assert engine.needs_deep_analysis(result)
+
+    def test_partial_categories(self):
+        """测试在规则类别之间截止并保留已完成类别的结果"""
+        detector = slow_coraza(0.05)
+        request = make_request("1 UNION SELECT password")
+
+        result = detector.detect(request, deadline=time.monotonic() + 0.01)
+        assert result.incomplete
+        assert result.details['completed_categories'] == ['sql_injection', 'xss']
+        assert 'command_injection' in result.details['skipped_categories']
+        assert result.is_attack
+        assert 'CRS-942100' in result.matched_rules
+
+    def test_engine_reports_completed_categories(self):
+        """测试引擎汇总不完整检测器的已完成类别"""
+        plain = PlainDetector()
+        engine = DetectionEngine(custom_detectors=[slow_coraza(0.05), plain])
+
+        result = engine.detect_all(make_request("hello"), deadline=time.monotonic() + 0.01)
+        assert result.incomplete
+        info = result.details['incomplete']
+        assert info['completed_categories'] == ['CorazaDetector.sql_injection', 'CorazaDetector.xss']
+        assert info['skipped_detectors'] == ['PlainDetector']
+        assert plain.calls == 0
+
+    def test_detector_without_deadline_support(self):
+        """测试不支持截止时间的检测器照常调用"""
+        plain = PlainDetector()
+        engine = DetectionEngine(custom_detectors=[plain])
+        result = engine.detect_all(make_request("hello"), deadline=time.monotonic() + 10)
+
+        assert plain.calls == 1
+        assert not result.incomplete
+
+    def test_fast_tier_deadline(self):
+        """测试快速检测同样遵守截止时间"""
+        engine = DetectionEngine()
+        request = make_request("<script>alert(1)</script>")
+
+        assert engine.detect_fast(request, deadline=time.monotonic() + 10).is_attack
+        partial = engine.detect_fast(request, deadline=time.monotonic() - 1)
+        assert partial.incomplete
+        assert engine.needs_deep_analysis(partial)
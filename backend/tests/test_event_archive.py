@@ -0,0 +1,164 @@
+"""
+列式事件归档测试
+测试字典编码和位掩码的段写入、重新打开、分组计数和分位数与逐行计算一致、按时间跳过段、
+从ForensicJob输出导入、统计接口以及waf_query命令行
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+from collections import Counter
+from datetime import timedelta
+
+import numpy as np
+import pytest
+from click.testing import CliRunner
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.api.statistics import get_archive_groups, get_archive_percentiles
+from app.core.exceptions import StorageException
+from app.forensics import EventArchive, ForensicJob, ua_family
+from app.forensics.archive import path_prefix
+from tests.test_forensic_job import log_files  # noqa: F401
+from tests.test_memory_storage import BASE_TIME, IPS, TYPES, make_event
+
+AGENTS = ["Mozilla/5.0 Chrome/120.0", "sqlmap/1.7", "curl/8.0", "", "Mozilla/5.0 Firefox/121.0"]
+PATHS = ["/api/v1/items", "/api/v2/login", "/static/app.js", "/admin/panel", "/"]
+RULES = ["942100", "941100", "930100", "913100"]
+
+
+@pytest.fixture
+def directory():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def archive_events(count=3000, seed=3):
+    """带路径、User-Agent、命中规则的事件，部分事件有两种攻击类型"""
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        attack_types = rng.sample(TYPES, rng.choice((1, 1, 2))) if rng.random() < 0.35 else []
+        event = make_event(i, rng.choice(IPS), attack_types)
+        event.request.url = f"{rng.choice(PATHS)}?id={i}"
+        event.request.user_agent = rng.choice(AGENTS)
+        event.detection.confidence = round(rng.random(), 3) if attack_types else 0.0
+        event.detection.matched_rules = rng.sample(RULES, rng.randrange(3)) if attack_types else []
+        events.append(event)
+    return events
+
+
+def build_archive(directory, events, segment_size=700):
+    archive = EventArchive(directory, segment_size=segment_size)
+    archive.append_events(events)
+    archive.flush()
+    return archive
+
+
+class TestEventArchive:
+    """EventArchive测试类"""
+
+    def test_group_count_matches_rows(self, directory):
+        """测试重新打开后的分组计数与逐行计算一致"""
+        events = archive_events()
+        build_archive(directory, events)
+        archive = EventArchive(directory)
+        assert archive.get_stats()['segments'] == 5 and archive.rows == 3000
+
+        expected = Counter(
+            (t.value, (BASE_TIME + timedelta(minutes=i)).replace(minute=0), path_prefix(e.request.url.split('?')[0]))
+            for i, e in enumerate(events) for t in e.detection.attack_types
+        )
+        groups = archive.query(is_attack=True).group_count('attack_type', 'hour', 'path_prefix')
+        assert {(g['attack_type'], g['hour'], g['path_prefix']): g['count'] for g in groups} == dict(expected)
+        assert [g['count'] for g in groups] == sorted(expected.values(), reverse=True)
+
+        families = archive.query().group_count('ua_family')
+        assert {g['ua_family']: g['count'] for g in families} == \
+            dict(Counter(ua_family(e.request.user_agent) for e in events))
+
+        assert archive.query().count() == 3000
+        assert archive.query(attack_type='xss', path_prefix='/api').count() == len([
+            e for e in events if 'xss' in [t.value for t in e.detection.attack_types]
+            and e.request.url.startswith('/api/')
+        ])
+        assert archive.query(rule=RULES[0], ua_family='sqlmap').count() == len([
+            e for e in events if RULES[0] in e.detection.matched_rules and e.request.user_agent == 'sqlmap/1.7'
+        ])
+        assert archive.query(source_ip='192.0.2.1').count() == 0
+
+    def test_percentiles_by_rule(self, directory):
+        """测试按规则分组的置信度分位数与numpy逐组计算一致"""
+        events = archive_events()
+        archive = build_archive(directory, events)
+        result = archive.query(is_attack=True).percentiles(by=['rule'], q=(50, 90))
+        for row in result:
+            values = [e.detection.confidence for e in events if row['rule'] in e.detection.matched_rules]
+            assert row['count'] == len(values)
+            assert row['p50'] == pytest.approx(np.percentile(np.float32(values), 50), abs=1e-6)
+            assert row['p90'] == pytest.approx(np.percentile(np.float32(values), 90), abs=1e-6)
+        assert {row['rule'] for row in result} == set(RULES)
+        assert archive.query(is_attack=True).percentiles()[0]['count'] == \
+            len([e for e in events if e.detection.is_attack])
+
+    def test_time_pruning_and_invalid_keys(self, directory):
+        """测试按时间范围只读取相交的段，不支持的键抛出StorageException"""
+        archive = build_archive(directory, archive_events())
+        start, end = BASE_TIME + timedelta(minutes=750), BASE_TIME + timedelta(minutes=1300)
+        assert len(archive.segments(start, end)) == 1
+        assert archive.query(start_time=start, end_time=end).count() == 551
+        with pytest.raises(StorageException):
+            archive.query().group_count('payload')
+        with pytest.raises(StorageException):
+            archive.query(country='cn')
+
+    @pytest.mark.asyncio
+    async def test_import_forensic_output(self, log_files):  # noqa: F811
+        """测试导入ForensicJob的段文件，重复导入不产生重复事件"""
+        directory, paths = log_files
+        out = os.path.join(directory, 'out')
+        summary = await ForensicJob(paths, out, chunk_lines=150, segment_size=80).run()
+        archive = EventArchive(os.path.join(directory, 'archive'), segment_size=250)
+        assert archive.import_columnar(out) == 600
+        assert archive.import_columnar(out) == 0
+        reopened = EventArchive(os.path.join(directory, 'archive'))
+        assert reopened.rows == 600
+        assert reopened.query(is_attack=True).count() == summary['attack_events']
+        assert reopened.query(is_attack=True).group_count('attack_type') == \
+            [{'attack_type': 'sql_injection', 'count': summary['attack_events']}]
+
+
+class TestArchiveInterfaces:
+    """归档统计接口与命令行测试类"""
+
+    @pytest.mark.asyncio
+    async def test_statistics_endpoints(self, directory):
+        """测试分组和分位数接口"""
+        archive = build_archive(directory, archive_events())
+        groups = await get_archive_groups(
+            group_by="attack_type,day", start_time=None, end_time=None, is_attack=True, attack_type=None,
+            path_prefix="/api", limit=3, archive=archive
+        )
+        assert len(groups['groups']) == 3 and groups['group_by'] == ['attack_type', 'day']
+        percentiles = await get_archive_percentiles(
+            by="ua_family", q="50,99", start_time=None, end_time=None, is_attack=True, attack_type=None,
+            path_prefix=None, archive=archive
+        )
+        assert {row['ua_family'] for row in percentiles['groups']} <= {'chrome', 'sqlmap', 'curl', 'none', 'firefox'}
+        assert set(percentiles['groups'][0]) == {'ua_family', 'count', 'p50', 'p99'}
+
+    def test_cli(self, directory):
+        """测试waf_query命令行输出分组计数"""
+        from waf_query import main
+
+        build_archive(directory, archive_events(500))
+        result = CliRunner().invoke(main, [directory, '--group-by', 'attack_type', '--where', 'is_attack=true'])
+        assert result.exit_code == 0, result.output
+        assert 'sql_injection' in result.output
+        result = CliRunner().invoke(main, [directory, '--percentiles', '--by', 'rule'])
+        assert result.exit_code == 0, result.output
+        assert 'p99' in result.output
@@ -0,0 +1,202 @@
+"""
+EventCoalescer 功能测试
+测试URL模板归一化、窗口内合并、窗口到期与容量淘汰，以及SecurityCapturer合并模式和空闲时按定时输出
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.analytics import EventCoalescer, StreamingReport, url_template
+from app.core.models import HTTPRequest, DetectionResult, AttackType
+from security_capturer import SecurityCapturer, SecurityEvent
+
+BASE_TIME = datetime(2023, 12, 25, 10, 0, 0)
+
+
+def make_event(ip: str, url: str, seconds: float, rules=("CRS-942100",), payload="1 UNION SELECT 1") -> SecurityEvent:
+    request = HTTPRequest(
+        url=url,
+        method="GET",
+        headers={},
+        params={},
+        body=None,
+        source_ip=ip,
+        timestamp=BASE_TIME + timedelta(seconds=seconds),
+        raw_data=f"GET {url}"
+    )
+    detection = DetectionResult(
+        is_attack=bool(rules),
+        attack_types=[AttackType.SQL_INJECTION] if rules else [],
+        confidence=0.9 if rules else 0.0,
+        details={},
+        payload=payload if rules else None,
+        matched_rules=list(rules)
+    )
+    return SecurityEvent(
+        request=request,
+        detection_result=detection,
+        timestamp=request.timestamp,
+        event_id=f"E-{seconds}",
+        risk_level="HIGH" if rules else "SAFE"
+    )
+
+
+class TestEventCoalescer:
+    """EventCoalescer测试类"""
+
+    def test_url_template(self):
+        """测试URL模板去掉参数值和ID类路径段"""
+        assert url_template("/users/42/orders?sort=asc&id=1' OR 1=1--") == "/users/{n}/orders?id&sort"
+        assert url_template("/f/3f2504e0-4f89-11d3-9a0c-0305e82c3301") == "/f/{id}"
+        assert url_template("/search") == "/search"
+
+    def test_coalesce_within_window(self):
+        """测试窗口内相同键的攻击合并为一个聚合事件"""
+        coalescer = EventCoalescer(window_seconds=60, max_samples=2)
+        output = []
+        for n in range(100):
+            output += coalescer.add(make_event("10.0.0.1", f"/item?id={n}", n * 0.5, payload=f"p{n % 3}"))
+        output += coalescer.add(make_event("10.0.0.1", "/item?id=1", 1, rules=()))
+        assert [e.risk_level for e in output] == ["SAFE"]
+
+        output = coalescer.flush()
+        assert len(output) == 1
+        aggregate = output[0].aggregate
+        assert aggregate['count'] == 100
+        assert aggregate['first_seen'] == BASE_TIME
+        assert aggregate['last_seen'] == BASE_TIME + timedelta(seconds=49.5)
+        assert aggregate['url_template'] == "/item?id"
+        assert aggregate['sample_payloads'] == ["p0", "p1"]
+        assert output[0].to_dict()['aggregate']['count'] == 100
+        assert coalescer.get_stats()['coalesced'] == 99
+
+    def test_distinct_keys(self):
+        """测试来源IP或命中规则不同的攻击分别合并"""
+        coalescer = EventCoalescer()
+        coalescer.add(make_event("10.0.0.1", "/a?x=1", 0))
+        coalescer.add(make_event("10.0.0.2", "/a?x=1", 1))
+        coalescer.add(make_event("10.0.0.1", "/a?x=2", 2, rules=("CRS-941100",)))
+        coalescer.add(make_event("10.0.0.1", "/a?x=3", 3))
+
+        output = coalescer.flush()
+        assert len(output) == 3
+        assert output[0].aggregate['count'] == 2
+        assert output[1].aggregate is None
+
+    def test_window_expiry(self):
+        """测试窗口到期后输出分组，之后的事件开启新分组"""
+        coalescer = EventCoalescer(window_seconds=10)
+        assert coalescer.add(make_event("10.0.0.1", "/a?x=1", 0)) == []
+        assert coalescer.add(make_event("10.0.0.1", "/a?x=1", 5)) == []
+
+        expired = coalescer.add(make_event("10.0.0.1", "/a?x=1", 12))
+        assert len(expired) == 1 and expired[0].aggregate['count'] == 2
+        assert coalescer.flush()[0].aggregate is None
+        assert coalescer.get_stats()['groups_expired'] == 1
+
+    def test_max_groups_eviction(self):
+        """测试分组数超过上限时提前输出最旧的分组"""
+        coalescer = EventCoalescer(max_groups=5)
+        output = []
+        for n in range(20):
+            output += coalescer.add(make_event(f"10.0.1.{n}", "/a?x=1", n))
+
+        stats = coalescer.get_stats()
+        assert len(output) == 15
+        assert stats['open_groups'] == 5
+        assert stats['groups_evicted'] == 15
+
+    def test_report_counts_aggregate(self):
+        """测试增量报告按聚合事件代表的次数计数"""
+        coalescer = EventCoalescer()
+        for n in range(30):
+            coalescer.add(make_event("10.0.0.9", "/a?x=1", n))
+        report = StreamingReport()
+        for event in coalescer.flush():
+            report.add(event)
+
+        result = report.build()
+        assert result['total_events'] == result['attack_events'] == 30
+        assert result['top_attack_ips'] == [("10.0.0.9", 30)]
+        assert result['top_attack_types'] == [("sql_injection", 30)]
+
+    @pytest.mark.asyncio
+    async def test_security_capturer_coalescing(self):
+        """测试SecurityCapturer合并模式减少输出事件但报告总数不变"""
+        lines = []
+        for n in range(40):
+            if n % 2 == 0:
+                url = f"/q?x={n}%27%20UNION%20SELECT%20pass%20FROM%20users--"
+            else:
+                url = f"/page?p={n}"
+            lines.append(f'10.0.0.7 - - [25/Dec/2023:10:00:{n:02d} +0800] "GET {url} HTTP/1.1" 200 10 "-" "Mozilla/5.0"')
+        fd, path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+        try:
+            capturer = SecurityCapturer(path, coalesce_window=60)
+            events = [event async for event in capturer.capture_and_analyze_stream()]
+            report = await SecurityCapturer(path, coalesce_window=60).batch_analyze_log()
+        finally:
+            os.unlink(path)
+
+        attacks = [event for event in events if event.detection_result.is_attack]
+        assert len(events) == 21
+        assert len(attacks) == 1 and attacks[0].aggregate['count'] == 20
+        assert report['total_events'] == 40
+        assert report['attack_events'] == 20
+        assert capturer.get_stats()['coalescing']['coalesced'] == 19
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("detect_workers", [0, 2])
+    async def test_sink_receives_coalesced_events(self, detect_workers):
+        """测试合并模式下sink只收到合并后的事件，调用次数与输出的事件数相同"""
+        lines = [
+            f'10.0.0.8 - - [25/Dec/2023:10:00:{n % 60:02d} +0800] '
+            f'"GET /q?id={n}%27%20UNION%20SELECT%20pass%20FROM%20users-- HTTP/1.1" 200 10 "-" "sqlmap/1.7.2"'
+            for n in range(50)
+        ]
+        fd, path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        sunk = []
+        try:
+            capturer = SecurityCapturer(path, coalesce_window=60, detect_workers=detect_workers, sink=sunk.append)
+            events = [event async for event in capturer.capture_and_analyze_stream()]
+        finally:
+            os.unlink(path)
+
+        assert len(events) == 1 and events[0].aggregate['count'] == 50
+        assert sunk == events
+
+    @pytest.mark.asyncio
+    async def test_idle_source_flushes_expired_groups(self):
+        """测试事件源空闲超过窗口时，不等新事件和流结束就输出到期的聚合事件"""
+        capturer = SecurityCapturer("unused.log", coalesce_window=0.05)
+        done = asyncio.Event()
+
+        async def source():
+            for n in range(5):
+                yield make_event("10.0.0.1", f"/q?id={n}", n * 0.001)
+            await done.wait()
+            yield make_event("10.0.0.2", "/page", 1, rules=())
+
+        stream = capturer._coalesced_stream(source())
+        try:
+            aggregate = await asyncio.wait_for(stream.__anext__(), timeout=1)
+            assert aggregate.aggregate['count'] == 5
+            assert capturer.coalescer.get_stats()['groups_expired'] == 1
+            done.set()
+            assert (await stream.__anext__()).request.source_ip == "10.0.0.2"
+            with pytest.raises(StopAsyncIteration):
+                await stream.__anext__()
+        finally:
+            await stream.aclose()
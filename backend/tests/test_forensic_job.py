@@ -0,0 +1,167 @@
+"""
+离线取证分析测试
+测试归档日志捕获器、列式段文件读写、检查点恢复以及waf_analyze命令行
+"""
+
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.capture import ArchiveLogCapturer
+from app.forensics import ColumnarEventWriter, ForensicJob, read_segment, segment_files
+from app.forensics.job import CHECKPOINT_FILE
+
+
+def log_line(n: int) -> str:
+    url = "/q?x=1%27%20UNION%20SELECT%20pass%20FROM%20users--" if n % 25 == 0 else f"/page?p={n}"
+    return f'10.0.{n % 3}.{n % 7} - - [25/Dec/2023:10:{n // 60 % 60:02d}:{n % 60:02d} +0800] "GET {url} HTTP/1.1" 200 10 "-" "Mozilla/5.0"'
+
+
+@pytest.fixture
+def log_files():
+    """一个gzip日志（含一行无法解析的内容）和一个普通日志，共600行有效请求"""
+    directory = tempfile.mkdtemp()
+    gz_path = os.path.join(directory, 'a.log.gz')
+    with gzip.open(gz_path, 'wt') as f:
+        f.write('\n'.join(log_line(n) for n in range(400)) + '\nnot a log line\n')
+    plain_path = os.path.join(directory, 'b.log')
+    with open(plain_path, 'w') as f:
+        f.write('\n'.join(log_line(n) for n in range(400, 600)) + '\n')
+    yield directory, [gz_path, plain_path]
+    shutil.rmtree(directory)
+
+
+class Interrupt(Exception):
+    """模拟任务被杀掉"""
+
+
+class TestArchiveLogCapturer:
+    """ArchiveLogCapturer测试类"""
+
+    @pytest.mark.asyncio
+    async def test_chunks_and_seek(self, log_files):
+        """测试分块读取、记录来源位置以及从位置继续"""
+        _, paths = log_files
+        capturer = ArchiveLogCapturer(paths, chunk_lines=250)
+        await capturer.start_capture()
+
+        first = [r async for r in capturer.capture_stream()]
+        assert len(first) == 250
+        assert capturer.position == (0, 250)
+        assert first[0].source == f"{paths[0]}:1"
+
+        rest = []
+        while not capturer.exhausted:
+            rest += [r async for r in capturer.capture_stream()]
+        assert len(rest) == 350
+        assert capturer.stats['parse_errors'] == 1
+        assert rest[-1].source == f"{paths[1]}:200"
+
+        resumed = ArchiveLogCapturer(paths)
+        resumed.seek(0, 398)
+        await resumed.start_capture()
+        requests = [r async for r in resumed.capture_stream()]
+        assert len(requests) == 202
+        assert requests[0].source == f"{paths[0]}:399"
+
+
+class TestColumnarWriter:
+    """ColumnarEventWriter测试类"""
+
+    @pytest.mark.asyncio
+    async def test_npz_roundtrip(self, log_files):
+        """测试npz段文件按列读回"""
+        directory, paths = log_files
+        from security_capturer import SecurityCapturer
+
+        out = os.path.join(directory, 'out')
+        writer = ColumnarEventWriter(out, segment_size=100)
+        analyzer = SecurityCapturer(capturer=ArchiveLogCapturer(paths[1:]))
+        async for event in analyzer.capture_and_analyze_stream():
+            writer.add(event)
+        writer.flush()
+
+        files = segment_files(out)
+        assert len(files) == 2
+        segment = read_segment(files[0])
+        assert len(segment['url']) == 100
+        assert segment['url'][0].startswith("/q?x=1")
+        assert bool(segment['is_attack'][0])
+        assert segment['attack_types'][0] == 'sql_injection'
+        # 带时区的日志时间转换为UTC保存
+        assert segment['timestamp'][0] == datetime(2023, 12, 25, 2, 6, 40)
+        assert segment['source'][1] == f"{paths[1]}:2"
+
+        partial = read_segment(files[1], ['is_attack'])
+        assert list(partial) == ['is_attack']
+
+
+class TestForensicJob:
+    """ForensicJob测试类"""
+
+    @pytest.mark.asyncio
+    async def test_resume_after_interrupt(self, log_files):
+        """测试任务中断后从检查点继续，结果与一次跑完一致"""
+        directory, paths = log_files
+        full = await ForensicJob(paths, os.path.join(directory, 'full'), chunk_lines=150, segment_size=80).run()
+
+        out = os.path.join(directory, 'resumed')
+
+        def interrupt(progress):
+            if progress['events'] >= 320:
+                raise Interrupt()
+
+        job = ForensicJob(paths, out, chunk_lines=150, segment_size=80, progress=interrupt, progress_interval=0)
+        with pytest.raises(Interrupt):
+            await job.run()
+        with open(os.path.join(out, CHECKPOINT_FILE)) as f:
+            checkpoint = json.load(f)
+        assert checkpoint['line'] == 300 and not checkpoint['done']
+
+        resumed = ForensicJob(paths, out, chunk_lines=150, segment_size=80)
+        summary = await resumed.run()
+        assert resumed.resumed_from['line'] == 300
+
+        for key in ('total_events', 'attack_events', 'risk_distribution', 'top_attack_ips', 'lines_read', 'parse_errors'):
+            assert summary[key] == full[key]
+        assert summary['total_events'] == 600
+        assert summary['attack_events'] == 24
+        assert summary['parse_errors'] == 1
+        event_ids = [i for path in segment_files(out) for i in read_segment(path, ['event_id'])['event_id']]
+        assert len(set(event_ids)) == 600
+
+        # 已完成的任务再次运行直接返回汇总
+        again = await ForensicJob(paths, out).run()
+        assert again['total_events'] == 600
+
+    @pytest.mark.asyncio
+    async def test_parallel_workers(self, log_files):
+        """测试使用检测进程池时结果完整"""
+        directory, paths = log_files
+        summary = await ForensicJob(paths, os.path.join(directory, 'parallel'), workers=2, chunk_lines=200).run()
+        assert summary['total_events'] == 600
+        assert summary['attack_events'] == 24
+
+    def test_cli(self, log_files):
+        """测试命令行入口"""
+        from click.testing import CliRunner
+        from waf_analyze import main
+
+        directory, _ = log_files
+        out = os.path.join(directory, 'cli')
+        result = CliRunner().invoke(main, [os.path.join(directory, '*.log*'), '--out', out, '--workers', '0', '-q'])
+        assert result.exit_code == 0, result.output
+        assert '600个事件' in result.output
+        with open(os.path.join(out, '_summary.json')) as f:
+            assert json.load(f)['attack_events'] == 24
+
+        missing = CliRunner().invoke(main, [os.path.join(directory, 'nope.log'), '--out', out])
+        assert missing.exit_code != 0
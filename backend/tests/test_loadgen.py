@@ -0,0 +1,126 @@
+"""
+合成日志生成器测试
+测试确定性、各日志格式可解析、攻击比例、攻击载荷可被检测以及waf_loadgen命令行
+"""
+
+import gzip
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.capture.formats import parse_line
+from app.core.exceptions import ConfigurationException
+from app.detector.coraza_detector import CorazaDetector
+from app.loadgen import ATTACK_CATEGORIES, SyntheticLogGenerator, parse_size
+
+ALL_ATTACKS = {category: 0.1 for category in ATTACK_CATEGORIES}
+
+
+@pytest.fixture
+def directory():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def generate(count, **kwargs):
+    stream = io.StringIO()
+    generator = SyntheticLogGenerator(**kwargs)
+    generator.write_to(stream, lines=count)
+    return stream.getvalue(), generator
+
+
+class TestSyntheticLogGenerator:
+    """SyntheticLogGenerator测试类"""
+
+    def test_deterministic(self):
+        """测试相同种子生成相同日志，不同种子生成不同日志"""
+        first, _ = generate(2000, seed=42)
+        second, _ = generate(2000, seed=42)
+        other, _ = generate(2000, seed=43)
+        assert first == second
+        assert first != other
+
+    @pytest.mark.parametrize('fmt,bodies', [('apache', False), ('nginx', False), ('json', False), ('json', True)])
+    def test_formats_parse(self, fmt, bodies):
+        """测试生成的每一行都能被对应格式解析"""
+        text, _ = generate(1000, fmt=fmt, bodies=bodies, attack_ratios=ALL_ATTACKS)
+        parser = 'json' if fmt == 'json' else 'combined'
+        requests = [parse_line(line, parser) for line in text.splitlines()]
+        assert all(request is not None for request in requests)
+        if bodies:
+            assert any(request.method == 'POST' and request.body for request in requests)
+
+    def test_attack_ratios(self):
+        """测试各类别的攻击比例"""
+        ratios = {'sql_injection': 0.05, 'xss': 0.02}
+        _, generator = generate(20000, attack_ratios=ratios)
+        stats = generator.get_stats()
+        assert set(stats['by_category']) == {'benign', 'sql_injection', 'xss'}
+        assert stats['by_category']['sql_injection'] / 20000 == pytest.approx(0.05, abs=0.01)
+        assert stats['by_category']['xss'] / 20000 == pytest.approx(0.02, abs=0.005)
+        assert stats['attack_ratio'] == pytest.approx(0.07, abs=0.01)
+
+    @pytest.mark.parametrize('fmt,bodies', [('apache', False), ('json', True)])
+    def test_attacks_detected(self, fmt, bodies):
+        """测试攻击行能被CorazaDetector检测为对应的攻击类型"""
+        detector = CorazaDetector()
+        generator = SyntheticLogGenerator(fmt=fmt, bodies=bodies, attack_ratios=ALL_ATTACKS, seed=5)
+        lines = generator.generate()
+        checked = 0
+        for _ in range(1500):
+            line, category = next(lines)
+            if category == 'benign':
+                continue
+            result = detector.detect(parse_line(line))
+            expected = 'unknown' if category == 'scanner' else category
+            assert expected in {t.value for t in result.attack_types}, line
+            checked += 1
+        assert checked > 500
+
+    def test_write_size_gzip_and_labels(self, directory):
+        """测试按大小写出gzip文件以及攻击标注"""
+        path = os.path.join(directory, 'access.log.gz')
+        labels_path = os.path.join(directory, 'labels.csv')
+        stats = SyntheticLogGenerator(seed=1).write(path, size=parse_size('256K'), labels_path=labels_path)
+
+        with gzip.open(path, 'rt') as f:
+            lines = f.read().splitlines()
+        assert len(lines) == stats['lines']
+        assert 256 * 1024 <= stats['bytes'] < 256 * 1024 + 1000
+        with open(labels_path) as f:
+            labels = f.read().splitlines()
+        assert len(labels) - 1 == stats['lines'] - stats['by_category']['benign']
+
+    def test_invalid_config(self):
+        """测试非法配置"""
+        with pytest.raises(ConfigurationException):
+            SyntheticLogGenerator(fmt='apache', bodies=True)
+        with pytest.raises(ConfigurationException):
+            SyntheticLogGenerator(attack_ratios={'ssrf': 0.1})
+        with pytest.raises(ConfigurationException):
+            SyntheticLogGenerator(attack_ratios={'xss': 0.8, 'scanner': 0.3})
+        with pytest.raises(ConfigurationException):
+            parse_size('lots')
+        assert parse_size('1.5GiB') == int(1.5 * 1024 ** 3)
+
+    def test_cli(self, directory):
+        """测试命令行入口"""
+        from click.testing import CliRunner
+        from waf_loadgen import main
+
+        path = os.path.join(directory, 'access.json')
+        result = CliRunner().invoke(main, [path, '-n', '500', '--format', 'json', '--attack', 'xss=0.2', '--seed', '3'])
+        assert result.exit_code == 0, result.output
+        with open(path) as f:
+            assert len(f.read().splitlines()) == 500
+        assert 'xss=' in result.output
+
+        bad = CliRunner().invoke(main, [path, '-n', '10', '--attack', 'ssrf=0.1'])
+        assert bad.exit_code != 0
@@ -0,0 +1,167 @@
+"""
+内存事件存储测试
+测试时间排序分页、二级索引组合过滤、计数、更新删除后的索引以及统计
+"""
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.models import (
+    AttackType, DetectionResult, HTTPRequest, LLMAnalysis, SecurityEvent, Severity
+)
+from app.core.exceptions import StorageException
+from app.storage import MemoryStorage
+
+BASE_TIME = datetime(2023, 12, 25, 10, 0, 0)
+IPS = [f"10.0.0.{n}" for n in range(1, 21)]
+TYPES = [AttackType.SQL_INJECTION, AttackType.XSS, AttackType.PATH_TRAVERSAL]
+
+
+def make_event(minute: int, source_ip: str, attack_types=(), severity: Severity = None, event_id: str = ""):
+    return SecurityEvent(
+        event_id=event_id,
+        request=HTTPRequest(
+            url="/page", method="GET", headers={}, params={}, body=None,
+            source_ip=source_ip, timestamp=BASE_TIME + timedelta(minutes=minute), raw_data=""
+        ),
+        detection=DetectionResult(
+            is_attack=bool(attack_types), attack_types=list(attack_types),
+            confidence=0.9 if attack_types else 0.0, details={}, payload=None, matched_rules=[]
+        ),
+        llm_analysis=LLMAnalysis(
+            severity=severity, attack_intent="", potential_impact="", recommendations=[],
+            confidence=0.9, analysis_time=BASE_TIME
+        ) if severity else None,
+        created_at=BASE_TIME
+    )
+
+
+def matches(event, filters):
+    """不使用索引的参考实现"""
+    if 'is_attack' in filters and event.detection.is_attack != filters['is_attack']:
+        return False
+    if 'attack_type' in filters and filters['attack_type'] not in [t.value for t in event.detection.attack_types]:
+        return False
+    if 'source_ip' in filters and event.request.source_ip != filters['source_ip']:
+        return False
+    if 'start_time' in filters and event.request.timestamp < filters['start_time']:
+        return False
+    if 'end_time' in filters and event.request.timestamp > filters['end_time']:
+        return False
+    return True
+
+
+async def build_storage():
+    """乱序写入的2000个事件"""
+    rng = random.Random(7)
+    storage = MemoryStorage()
+    minutes = list(range(2000))
+    rng.shuffle(minutes)
+    for minute in minutes:
+        types = [rng.choice(TYPES)] if rng.random() < 0.3 else []
+        await storage.save_event(make_event(minute, rng.choice(IPS), types))
+    return storage
+
+
+class TestMemoryStorage:
+    """MemoryStorage测试类"""
+
+    @pytest.mark.asyncio
+    async def test_time_ordered_pages(self):
+        """测试按时间排序分页，默认最新的在前"""
+        storage = await build_storage()
+        first = await storage.query_events(page=1, page_size=50)
+        second = await storage.query_events(page=2, page_size=50)
+        times = [e.request.timestamp for e in first + second]
+        assert times == sorted(times, reverse=True)
+        assert times[0] == BASE_TIME + timedelta(minutes=1999)
+
+        ascending = await storage.query_events(page=1, page_size=10, order="asc")
+        assert ascending[0].request.timestamp == BASE_TIME
+
+    @pytest.mark.asyncio
+    async def test_combined_filters_match_scan(self):
+        """测试各种过滤组合的结果与全量扫描一致"""
+        storage = await build_storage()
+        all_events = await storage.query_events(page_size=10000, order="asc")
+        cases = [
+            {'is_attack': True},
+            {'is_attack': False, 'source_ip': IPS[3]},
+            {'attack_type': 'xss'},
+            {'attack_type': 'sql_injection', 'is_attack': True, 'start_time': BASE_TIME + timedelta(minutes=500)},
+            {'source_ip': IPS[0], 'start_time': BASE_TIME + timedelta(minutes=100),
+             'end_time': BASE_TIME + timedelta(minutes=900)},
+            {'start_time': BASE_TIME + timedelta(minutes=1990)},
+            {'is_attack': True, 'end_time': BASE_TIME + timedelta(minutes=30)},
+            {'attack_type': 'command_injection'},
+        ]
+        for filters in cases:
+            expected = [e.event_id for e in all_events if matches(e, filters)]
+            result = await storage.query_events(page_size=10000, order="asc", **filters)
+            assert [e.event_id for e in result] == expected, filters
+            assert await storage.count_events(**filters) == len(expected), filters
+
+    @pytest.mark.asyncio
+    async def test_update_and_delete_reindex(self):
+        """测试更新和删除后索引同步"""
+        storage = MemoryStorage()
+        event_id = await storage.save_event(make_event(1, IPS[0]))
+        other = await storage.save_event(make_event(2, IPS[0], [AttackType.XSS]))
+
+        upgraded = make_event(1, IPS[0], [AttackType.SQL_INJECTION], severity=Severity.HIGH)
+        assert await storage.update_event(event_id, upgraded)
+        assert await storage.count_events(is_attack=True) == 2
+        assert await storage.count_events(severity=Severity.HIGH) == 1
+        assert await storage.count_events(severity="HIGH", attack_type="sql_injection") == 1
+
+        # 时间变化的更新
+        moved = make_event(10, IPS[1], [AttackType.SQL_INJECTION])
+        assert await storage.update_event(event_id, moved)
+        newest = await storage.query_events(page_size=1)
+        assert newest[0].event_id == event_id
+        assert await storage.count_events(source_ip=IPS[0]) == 1
+
+        assert await storage.delete_event(other)
+        assert not await storage.delete_event(other)
+        assert await storage.count_events(attack_type="xss") == 0
+        assert [e.event_id for e in await storage.query_events()] == [event_id]
+
+    @pytest.mark.asyncio
+    async def test_event_ids(self):
+        """测试沿用已有事件ID，重复ID报错"""
+        storage = MemoryStorage()
+        assert await storage.save_event(make_event(1, IPS[0], event_id="evt_1")) == "evt_1"
+        assert (await storage.save_event(make_event(2, IPS[0]))).startswith("event_")
+        with pytest.raises(StorageException):
+            await storage.save_event(make_event(3, IPS[0], event_id="evt_1"))
+        assert (await storage.get_event("evt_1")).request.timestamp == BASE_TIME + timedelta(minutes=1)
+
+    @pytest.mark.asyncio
+    async def test_statistics(self):
+        """测试统计与全量扫描一致"""
+        storage = await build_storage()
+        start, end = BASE_TIME, BASE_TIME + timedelta(minutes=599)
+        stats = await storage.get_statistics(start_time=start, end_time=end, limit=3)
+        events = [e for e in await storage.query_events(page_size=10000) if start <= e.request.timestamp <= end]
+        attacks = [e for e in events if e.detection.is_attack]
+
+        assert stats['total_events'] == 600
+        assert stats['attack_events'] == len(attacks)
+        assert sum(stats['attack_distribution'].values()) == len(attacks)
+        assert len(stats['trend_data']) == 10
+        assert sum(item['total_events'] for item in stats['trend_data']) == 600
+        assert sum(item['attack_events'] for item in stats['trend_data']) == len(attacks)
+
+        top = stats['top_attack_sources']
+        assert len(top) == 3
+        counts = {}
+        for e in attacks:
+            counts[e.request.source_ip] = counts.get(e.request.source_ip, 0) + 1
+        assert top[0]['attack_count'] == max(counts.values())
+        assert top[0]['last_attack'] == max(e.request.timestamp for e in attacks if e.request.source_ip == top[0]['source_ip'])
@@ -0,0 +1,199 @@
+"""
+滑动窗口速率与延迟直方图测试
+测试EWMAMeter、LatencyHistogram、MetricsRegistry以及SecurityCapturer和检测接口的指标
+"""
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.analytics import EWMAMeter, LatencyHistogram, MetricsRegistry
+from app.api.events import DetectRequest, detect_request
+from app.storage import MemoryStorage
+from app.api.statistics import get_runtime_metrics
+from app.detector import DetectionEngine, DeepAnalysisScheduler
+from security_capturer import SecurityCapturer
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestEWMAMeter:
+    """EWMAMeter测试类"""
+
+    def test_steady_rate(self):
+        """测试稳定速率下各窗口收敛到实际速率"""
+        clock = FakeClock()
+        meter = EWMAMeter(clock=clock)
+        for _ in range(600):
+            meter.mark(50)
+            clock.now += 1
+        rates = meter.rates()
+
+        assert rates['1s'] == pytest.approx(50, rel=0.01)
+        assert rates['1m'] == pytest.approx(50, rel=0.01)
+        assert rates['5m'] == pytest.approx(50 * (1 - 0.135), rel=0.02)
+        assert rates['mean'] == pytest.approx(50)
+        assert rates['count'] == 30000
+
+    def test_burst_visible_in_short_window(self):
+        """测试突发流量在短窗口中可见，空闲后衰减"""
+        clock = FakeClock()
+        meter = EWMAMeter(clock=clock)
+        for _ in range(120):
+            meter.mark(1)
+            clock.now += 1
+        meter.mark(1000)
+        clock.now += 1
+        burst = meter.rates()
+        assert burst['1s'] > 500
+        assert burst['1m'] < 20
+
+        clock.now += 30
+        idle = meter.rates()
+        assert idle['1s'] < 0.01
+        assert 0 < idle['1m'] < burst['1m']
+
+
+class TestLatencyHistogram:
+    """LatencyHistogram测试类"""
+
+    def test_bucket_bounds(self):
+        """测试每个值都落在上界不小于它的桶中，且相对误差有界"""
+        previous = -1
+        for value in list(range(200)) + [10 ** k + d for k in range(3, 16) for d in (-1, 0, 1)]:
+            index = LatencyHistogram.bucket_index(value)
+            upper = LatencyHistogram.bucket_upper(index)
+            assert index >= 0
+            assert value <= upper <= value + max(1, value / 16)
+            assert index >= previous or value < previous
+            previous = index
+        assert LatencyHistogram.bucket_index(2 ** 64 - 1) < len(LatencyHistogram().counts)
+
+    def test_percentiles(self):
+        """测试百分位数在桶精度内接近真实值"""
+        rng = random.Random(42)
+        values = [int(rng.expovariate(1 / 50000)) for _ in range(20000)]
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+
+        values.sort()
+        for percent in (50, 90, 99):
+            exact = values[int(len(values) * percent / 100) - 1]
+            assert histogram.percentile(percent) == pytest.approx(exact, rel=0.07)
+        assert histogram.percentile(100) == values[-1]
+
+        summary = histogram.to_dict()
+        assert summary['count'] == 20000
+        assert summary['min_us'] == values[0] / 1000
+        assert summary['mean_us'] == pytest.approx(sum(values) / len(values) / 1000)
+
+    def test_merge(self):
+        """测试合并直方图"""
+        a, b = LatencyHistogram(), LatencyHistogram()
+        for value in range(1000):
+            (a if value % 2 else b).record(value * 100)
+        a.merge(b)
+        assert a.total == 1000
+        assert a.min_ns == 0
+        assert a.max_ns == 99900
+        assert a.percentile(50) == pytest.approx(50000, rel=0.07)
+
+
+class TestMetricsIntegration:
+    """指标集成测试类"""
+
+    def test_registry(self):
+        """测试按名称创建速率计和直方图"""
+        registry = MetricsRegistry()
+        registry.mark('requests', 3)
+        registry.record_timings({'decode_ns': 1000, 'detect_ns': 5000})
+        registry.record('store', 2000)
+
+        data = registry.to_dict()
+        assert data['rates']['requests']['count'] == 3
+        assert set(data['latency']) == {'decode', 'detect', 'store'}
+        assert data['latency']['detect']['max_us'] == 5.0
+
+    @pytest.mark.asyncio
+    async def test_security_capturer_metrics(self):
+        """测试SecurityCapturer统计中包含各阶段延迟和滑动速率"""
+        lines = []
+        for n in range(20):
+            url = "/q?x=<script>alert(1)</script>" if n % 5 == 0 else f"/page?p={n}"
+            lines.append(f'10.0.0.{n % 3} - - [25/Dec/2023:10:00:{n:02d} +0800] "GET {url} HTTP/1.1" 200 10 "-" "Mozilla/5.0"')
+        fd, path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+        try:
+            capturer = SecurityCapturer(path)
+            await capturer.batch_analyze_log()
+        finally:
+            os.unlink(path)
+
+        metrics = capturer.get_stats()['metrics']
+        assert metrics['rates']['requests']['count'] == 20
+        assert metrics['rates']['attacks']['count'] == 4
+        for stage in ('parse', 'decode', 'detect'):
+            assert metrics['latency'][stage]['count'] == 20
+        assert metrics['latency']['detect']['p50_us'] >= metrics['latency']['decode']['p50_us']
+
+    @pytest.mark.asyncio
+    async def test_parse_excludes_idle_wait_and_sink_records_store(self):
+        """测试follow模式下parse延迟不含等待新日志的时间，sink的耗时计入store"""
+        fd, path = tempfile.mkstemp(suffix='.log')
+        os.close(fd)
+        sunk = []
+        capturer = SecurityCapturer(path, follow=True, sink=sunk.append)
+        stream = capturer.capture_and_analyze_stream()
+        try:
+            consumer = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0.35)
+            with open(path, 'a') as f:
+                f.write('10.0.0.1 - - [25/Dec/2023:10:00:00 +0800] "GET /page HTTP/1.1" 200 10 "-" "Mozilla/5.0"\n')
+            await asyncio.wait_for(consumer, timeout=2)
+        finally:
+            await capturer.stop_monitoring()
+            await stream.aclose()
+            os.unlink(path)
+
+        latency = capturer.get_stats()['metrics']['latency']
+        assert latency['parse']['count'] == 1 and latency['parse']['max_us'] < 100_000
+        assert latency['store']['count'] == len(sunk) == 1
+
+    @pytest.mark.asyncio
+    async def test_detect_endpoint_metrics(self):
+        """测试检测接口记录decode/detect/store延迟并通过统计接口返回"""
+        storage = MemoryStorage()
+        engine = DetectionEngine()
+        scheduler = DeepAnalysisScheduler(storage, engine=engine)
+        metrics = MetricsRegistry()
+
+        await detect_request(
+            DetectRequest(url="/search?q=1 UNION SELECT 1", params={"q": "1 UNION SELECT 1"}),
+            detection_engine=engine, storage=storage, deep_scheduler=scheduler, metrics=metrics
+        )
+        await detect_request(
+            DetectRequest(url="/page?p=2", params={"p": "2"}),
+            detection_engine=engine, storage=storage, deep_scheduler=scheduler, metrics=metrics
+        )
+
+        data = await get_runtime_metrics(metrics)
+        assert data['rates']['requests']['count'] == 2
+        assert data['rates']['attacks']['count'] == 1
+        assert {'decode', 'detect', 'store'} <= set(data['latency'])
@@ -0,0 +1,107 @@
+"""
+MultiFileCapturer 功能测试
+测试多文件汇聚、来源标记与背压
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import shutil
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.capture.multi_file_capturer import MultiFileCapturer
+from security_capturer import SecurityCapturer
+
+
+LOG_LINE = '192.168.1.{ip} - - [25/Dec/2023:10:00:00 +0800] "GET /page.php?id={n} HTTP/1.1" 200 512 "-" "Mozilla/5.0"'
+
+
+class TestMultiFileCapturer:
+    """MultiFileCapturer测试类"""
+
+    @pytest.fixture
+    def log_dir(self):
+        """创建包含多个日志文件的临时目录"""
+        temp_dir = tempfile.mkdtemp()
+        for i in range(3):
+            with open(os.path.join(temp_dir, f"vhost{i}.log"), 'w') as f:
+                for n in range(4):
+                    f.write(LOG_LINE.format(ip=i + 1, n=n) + '\n')
+        # 不匹配模式的文件应被忽略
+        with open(os.path.join(temp_dir, "notes.txt"), 'w') as f:
+            f.write(LOG_LINE.format(ip=99, n=0) + '\n')
+
+        yield temp_dir
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    @pytest.mark.asyncio
+    async def test_capture_stream_all_files(self, log_dir):
+        """测试汇聚所有文件并标记来源"""
+        capturer = MultiFileCapturer(log_dir)
+        await capturer.start_capture()
+
+        requests = [r async for r in capturer.capture_stream()]
+        await capturer.stop_capture()
+
+        assert len(requests) == 12
+        sources = {os.path.basename(r.source) for r in requests}
+        assert sources == {"vhost0.log", "vhost1.log", "vhost2.log"}
+        for request in requests:
+            expected_ip = f"192.168.1.{int(os.path.basename(request.source)[5]) + 1}"
+            assert request.source_ip == expected_ip
+
+    @pytest.mark.asyncio
+    async def test_glob_pattern(self, log_dir):
+        """测试直接使用glob模式"""
+        capturer = MultiFileCapturer(os.path.join(log_dir, "vhost1*.log"))
+        await capturer.start_capture()
+        requests = [r async for r in capturer.capture_stream()]
+        await capturer.stop_capture()
+
+        assert len(requests) == 4
+        assert capturer.get_stats()['files_watched'] == 1
+
+    @pytest.mark.asyncio
+    async def test_backpressure_with_small_queue(self, log_dir):
+        """测试队列容量很小时读取协程等待而不丢数据"""
+        capturer = MultiFileCapturer(log_dir, max_queue_size=1)
+        await capturer.start_capture()
+
+        requests = []
+        async for request in capturer.capture_stream():
+            requests.append(request)
+            await asyncio.sleep(0)
+
+        stats = capturer.get_stats()
+        await capturer.stop_capture()
+
+        assert len(requests) == 12
+        assert stats['backpressure_waits'] > 0
+        assert sum(stats['per_file'].values()) == 12
+
+    @pytest.mark.asyncio
+    async def test_shared_consumers(self, log_dir):
+        """测试多个消费者共享同一队列，每个请求只处理一次"""
+        capturer = MultiFileCapturer(log_dir, max_queue_size=2)
+        await capturer.start_capture()
+
+        async def consume():
+            return [r async for r in capturer.capture_stream()]
+
+        results = await asyncio.gather(consume(), consume(), consume())
+        await capturer.stop_capture()
+
+        assert sum(len(r) for r in results) == 12
+
+    @pytest.mark.asyncio
+    async def test_security_capturer_integration(self, log_dir):
+        """测试作为SecurityCapturer的数据源"""
+        security_capturer = SecurityCapturer(capturer=MultiFileCapturer(log_dir))
+        report = await security_capturer.batch_analyze_log()
+        await security_capturer.stop_monitoring()
+
+        assert report['total_events'] == 12
@@ -0,0 +1,162 @@
+"""
+游标分页与总数缓存测试
+测试游标编解码、各存储的键集分页（含时间相同的事件和已删除的游标事件）、总数缓存的增量更新以及事件列表接口
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.models import AttackType
+from app.core.exceptions import StorageException
+from app.api.events import query_events
+from app.storage import MemoryStorage, SQLAlchemyStorage, SQLiteStorage
+from app.storage.pagination import TotalsCache, decode_cursor, encode_cursor
+from tests.test_memory_storage import IPS, TYPES, make_event, matches
+
+
+@pytest.fixture
+def storages(event_loop):
+    """三种存储各一个，测试结束时关闭"""
+    directory = tempfile.mkdtemp()
+    opened = [
+        MemoryStorage(),
+        SQLiteStorage({'path': os.path.join(directory, 'sqlite.db')}),
+        SQLAlchemyStorage({'url': f"sqlite:///{os.path.join(directory, 'sqlalchemy.db')}"}),
+    ]
+    yield opened
+    for storage in opened:
+        event_loop.run_until_complete(storage.close())
+    shutil.rmtree(directory)
+
+
+def tied_events(count=300):
+    """每个时间有1~3个事件的乱序事件"""
+    rng = random.Random(5)
+    events = []
+    for i in range(count):
+        minute = i // rng.choice((1, 2, 3))
+        events.append(make_event(minute, rng.choice(IPS[:4]), [rng.choice(TYPES)] if rng.random() < 0.4 else []))
+    rng.shuffle(events)
+    return events
+
+
+async def walk(storage, page_size, **filters):
+    """按游标逐页取完，返回event_id列表"""
+    walked, after = [], None
+    while True:
+        page = await storage.query_events(page_size=page_size, after=after, **filters)
+        walked.extend(e.event_id for e in page)
+        if len(page) < page_size:
+            return walked
+        after = decode_cursor(encode_cursor(page[-1]))
+
+
+class TestCursor:
+    """游标编解码测试类"""
+
+    def test_roundtrip(self):
+        """测试游标编码后可还原，且不含URL特殊字符"""
+        event = make_event(3, IPS[0], event_id="evt/+=1")
+        cursor = encode_cursor(event)
+        assert decode_cursor(cursor) == (event.request.timestamp.timestamp(), "evt/+=1")
+        assert not set(cursor) & set('/+=&?')
+
+    def test_invalid(self):
+        """测试无效游标抛出StorageException"""
+        for cursor in ("not-a-cursor", "W10", encode_cursor(make_event(1, IPS[0]))[:-3] + "!!!"):
+            with pytest.raises(StorageException):
+                decode_cursor(cursor)
+
+
+class TestKeysetPagination:
+    """各存储键集分页测试类"""
+
+    @pytest.mark.asyncio
+    async def test_walk_matches_offset_pages(self, storages):
+        """测试游标逐页结果与一次取完的结果相同，时间相同的事件不重复不遗漏"""
+        events = tied_events()
+        for storage in storages:
+            await storage.save_events(events)
+            for filters in ({}, {'order': 'asc'}, {'is_attack': True}, {'source_ip': IPS[1], 'order': 'asc'},
+                            {'attack_type': 'xss'}):
+                everything = [e.event_id for e in await storage.query_events(page_size=10000, **filters)]
+                assert await walk(storage, 7, **filters) == everything, (type(storage).__name__, filters)
+                assert len(everything) == len([e for e in events if matches(e, filters)])
+
+    @pytest.mark.asyncio
+    async def test_deleted_anchor(self, storages):
+        """测试游标事件被删除后从它的时间之后继续，不重复返回"""
+        events = [make_event(minute, IPS[0]) for minute in range(10)]
+        for storage in storages:
+            await storage.save_events(events)
+            first = await storage.query_events(page_size=3)
+            await storage.delete_event(first[-1].event_id)
+            rest = await storage.query_events(page_size=100, after=decode_cursor(encode_cursor(first[-1])))
+            assert [e.request.timestamp for e in rest] == [e.request.timestamp for e in events[6::-1]]
+
+
+class TestTotalsCache:
+    """TotalsCache测试类"""
+
+    @pytest.mark.asyncio
+    async def test_incremental_and_ttl(self):
+        """测试命中缓存、写入时增量更新、过期后精确计数"""
+        storage = MemoryStorage()
+        await storage.save_events([make_event(i, IPS[i % 2], [AttackType.XSS] if i % 3 == 0 else []) for i in range(30)])
+        cache = TotalsCache(ttl=60)
+
+        assert await cache.get(storage, {'is_attack': True}) == (10, True)
+        assert await cache.get(storage, {'source_ip': IPS[0], 'page': 3}) == (15, True)
+        assert await cache.get(storage, {'is_attack': True}) == (10, False)
+
+        for event in (make_event(40, IPS[0], [AttackType.XSS]), make_event(41, IPS[1])):
+            await storage.save_event(event)
+            cache.observe_saved(event)
+        assert await cache.get(storage, {'is_attack': True}) == (11, False)
+        assert await cache.get(storage, {'source_ip': IPS[0]}) == (16, False)
+
+        await storage.save_event(make_event(42, IPS[0], [AttackType.XSS]))
+        assert (await cache.get(storage, {'is_attack': True}))[0] == 11
+        cache.ttl = 0
+        assert await cache.get(storage, {'is_attack': True}) == (12, True)
+
+
+class TestEventListAPI:
+    """事件列表接口测试类"""
+
+    @staticmethod
+    async def list_events(storage, **params):
+        arguments = dict(page=1, page_size=20, is_attack=None, attack_type=None, source_ip=None,
+                         start_time=None, end_time=None, cursor=None, total_mode="exact")
+        arguments.update(params)
+        return await query_events(storage=storage, **arguments)
+
+    @pytest.mark.asyncio
+    async def test_cursor_pages(self):
+        """测试接口返回next_cursor，按游标翻页取完所有事件"""
+        storage = MemoryStorage()
+        await storage.save_events(tied_events(95))
+        seen, cursor = [], None
+        while True:
+            response = await self.list_events(storage, page_size=20, cursor=cursor, total_mode="cached")
+            seen.extend(e.event_id for e in response.events)
+            assert response.total == 95
+            cursor = response.next_cursor
+            if cursor is None:
+                break
+        assert len(seen) == 95 == len(set(seen))
+
+        response = await self.list_events(storage, total_mode="none")
+        assert response.total is None and not response.total_exact
+
+        with pytest.raises(HTTPException) as error:
+            await self.list_events(storage, cursor="bogus")
+        assert error.value.status_code == 400
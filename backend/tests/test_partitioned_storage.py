@@ -0,0 +1,321 @@
+"""
+时间分区存储测试
+测试跨分区查询、分页和游标与单一存储一致、按时间和类别只访问相关分区、按ID直接访问所在分区、
+分区事件数增量维护、更新时在分区间移动、过期分区整段删除以及退役计数计入预聚合统计
+"""
+
+import copy
+import os
+import shutil
+import sys
+import tempfile
+from datetime import timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.exceptions import ConfigurationException
+from app.core.models import AttackType
+from app.storage import MemoryStorage, PartitionedStorage, RollupStorage
+from tests.test_memory_storage import BASE_TIME, IPS, make_event
+from tests.test_rollups import FakeClock
+from tests.test_sqlite_storage import sample_events
+
+
+@pytest.fixture
+def open_partitioned(event_loop):
+    """临时目录中的sqlite分区存储，测试结束时关闭所有连接"""
+    directory = tempfile.mkdtemp()
+    opened = []
+
+    def open_partitioned(clock, **config):
+        storage = PartitionedStorage({'backend': 'sqlite', 'directory': directory, **config}, clock=clock)
+        opened.append(storage)
+        return storage
+
+    open_partitioned.directory = directory
+    yield open_partitioned
+    for storage in opened:
+        event_loop.run_until_complete(storage.close())
+    shutil.rmtree(directory)
+
+
+async def build(config=None, clock=None):
+    """同样的事件分别写入分区存储和单一内存存储"""
+    events = sample_events()
+    storage = PartitionedStorage(
+        {'granularity': 'hour', **(config or {})}, clock=clock or FakeClock(BASE_TIME + timedelta(days=3))
+    )
+    await storage.save_events(events)
+    reference = MemoryStorage()
+    await reference.save_events(events)
+    return storage, reference
+
+
+def ids(events):
+    return [event.event_id for event in events]
+
+
+def record_calls(storage):
+    """记录访问过的分区"""
+    visited = []
+    call = storage._call
+
+    async def recording_call(key, method, *args, **kwargs):
+        visited.append(key)
+        return await call(key, method, *args, **kwargs)
+
+    storage._call = recording_call
+    return visited
+
+
+class TestPartitionedQueries:
+    """跨分区查询测试类"""
+
+    @pytest.mark.asyncio
+    async def test_matches_single_storage(self):
+        """测试各种过滤、排序和分页的结果与单一存储相同"""
+        storage, reference = await build()
+        assert storage.get_stats()['attack_partitions'] + storage.get_stats()['benign_partitions'] == 68
+
+        for filters in (
+            {},
+            {'order': 'asc', 'page': 7, 'page_size': 50},
+            {'is_attack': True, 'page': 3},
+            {'attack_type': 'xss', 'order': 'asc'},
+            {'source_ip': IPS[3], 'page_size': 15, 'page': 2},
+            {'start_time': BASE_TIME + timedelta(minutes=95), 'end_time': BASE_TIME + timedelta(minutes=700),
+             'page': 4, 'page_size': 33},
+        ):
+            assert ids(await storage.query_events(**filters)) == ids(await reference.query_events(**filters)), filters
+            assert await storage.count_events(**filters) == await reference.count_events(**filters), filters
+
+        for order in ('desc', 'asc'):
+            walked, after = [], None
+            while True:
+                page = await storage.query_events(page_size=70, order=order, after=after)
+                walked.extend(page)
+                if len(page) < 70:
+                    break
+                after = (page[-1].request.timestamp.timestamp(), page[-1].event_id)
+            assert ids(walked) == ids(await reference.query_events(page_size=5000, order=order))
+
+        stats, expected = await storage.get_statistics(period='day'), await reference.get_statistics(period='day')
+        for key in ('total_events', 'attack_events', 'attack_distribution', 'trend_data'):
+            assert stats[key] == expected[key], key
+
+    @pytest.mark.asyncio
+    async def test_cursor_across_classes_with_ties(self):
+        """测试同一时间的攻击和良性事件在两个分区中，游标逐页遍历不重复不遗漏"""
+        storage = PartitionedStorage(clock=FakeClock(BASE_TIME))
+        events = [make_event(n // 6, IPS[n % 3], [AttackType.XSS] if n % 2 else []) for n in range(60)]
+        await storage.save_events(events)
+        for order in ('desc', 'asc'):
+            walked, after = [], None
+            while True:
+                page = await storage.query_events(page_size=4, order=order, after=after)
+                walked.extend(page)
+                if len(page) < 4:
+                    break
+                after = (page[-1].request.timestamp, page[-1].event_id)
+            assert sorted(ids(walked)) == sorted(ids(events))
+            times = [event.request.timestamp for event in walked]
+            assert times == sorted(times, reverse=order == 'desc')
+
+    @pytest.mark.asyncio
+    async def test_pruning(self):
+        """测试查询只访问时间范围和类别相关的分区"""
+        storage, _ = await build()
+        visited = record_calls(storage)
+        await storage.count_events(
+            is_attack=True, source_ip=IPS[1],
+            start_time=BASE_TIME + timedelta(hours=5), end_time=BASE_TIME + timedelta(hours=7, minutes=30)
+        )
+        assert [key[0] for key in visited] == ['attack'] * 3
+        assert sorted(key[1] for key in visited) == [
+            (BASE_TIME + timedelta(hours=hours)).timestamp() for hours in (5, 6, 7)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_event_id_locates_partition(self):
+        """测试ID中编码的分区让按ID读取只访问一个分区，改变类别的更新后最多访问两个"""
+        storage, _ = await build()
+        event = copy.deepcopy((await storage.query_events(order='asc', is_attack=False))[0])
+        storage._recent.clear()
+        visited = record_calls(storage)
+        assert (await storage.get_event(event.event_id)).event_id == event.event_id
+        assert len(visited) == 2 and visited[0] == visited[1] == ('benign', storage._start(event.request.timestamp.timestamp()))
+
+        event.detection.is_attack = True
+        event.detection.attack_types = [AttackType.XSS]
+        assert await storage.update_event(event.event_id, event)
+        storage._recent.clear()
+        visited.clear()
+        assert (await storage.get_event(event.event_id)).detection.is_attack
+        assert [key[0] for key in visited] == ['benign', 'attack', 'attack']
+
+    @pytest.mark.asyncio
+    async def test_partition_counts(self):
+        """测试覆盖整个分区的计数使用增量维护的分区事件数，不访问分区，写入、删除、移动后仍与单一存储一致"""
+        storage, reference = await build()
+        visited = record_calls(storage)
+        aligned = {'start_time': BASE_TIME + timedelta(hours=3), 'end_time': BASE_TIME + timedelta(hours=20)}
+        for filters in ({}, {'is_attack': False}, aligned, {'page': 30, 'page_size': 20}):
+            await storage.query_events(**filters)
+            assert await storage.count_events(**filters) == await reference.count_events(**filters), filters
+        visited.clear()
+        await storage.count_events()
+        await storage.count_events(**aligned)
+        # 只有end_time当时开始的分区没有被整个覆盖
+        assert {key[1] for key in visited} == {aligned['end_time'].timestamp()}
+
+        events = await storage.query_events(order='asc', page_size=3)
+        await storage.delete_event(events[0].event_id)
+        await reference.delete_event(events[0].event_id)
+        moved = copy.deepcopy(events[1])
+        moved.detection.is_attack = not moved.detection.is_attack
+        moved.detection.attack_types = [AttackType.XSS] if moved.detection.is_attack else []
+        await storage.update_event(moved.event_id, moved)
+        await reference.update_event(moved.event_id, moved)
+        await storage.save_event(make_event(7, IPS[2], [AttackType.SQL_INJECTION]))
+        await reference.save_event(make_event(7, IPS[2], [AttackType.SQL_INJECTION]))
+        for filters in ({}, {'is_attack': True}, {'is_attack': False}, aligned):
+            assert await storage.count_events(**filters) == await reference.count_events(**filters), filters
+
+    @pytest.mark.asyncio
+    async def test_update_moves_partition(self):
+        """测试更新改变类别或时间时事件移到新分区，按ID读取、删除跨分区有效"""
+        storage = PartitionedStorage(clock=FakeClock(BASE_TIME))
+        event_id = await storage.save_event(make_event(0, IPS[0]))
+        other_id = await storage.save_event(make_event(5, IPS[1]))
+        assert event_id != other_id
+
+        upgraded = make_event(3 * 1440, IPS[0], [AttackType.SQL_INJECTION])
+        assert await storage.update_event(event_id, upgraded)
+        assert await storage.count_events(is_attack=False) == 1
+        assert (await storage.get_event(event_id)).detection.is_attack
+        assert storage.get_stats()['attack_partitions'] == 1
+
+        storage._recent.clear()
+        assert (await storage.get_event(other_id)).request.source_ip == IPS[1]
+        assert await storage.delete_event(event_id)
+        assert not await storage.delete_event(event_id)
+        assert await storage.get_event(event_id) is None
+
+    def test_invalid_config(self):
+        """测试不支持的后端和粒度抛出ConfigurationException"""
+        with pytest.raises(ConfigurationException):
+            PartitionedStorage({'backend': 'sqlalchemy'})
+        with pytest.raises(ConfigurationException):
+            PartitionedStorage({'granularity': 'week'})
+
+
+class TestRetention:
+    """分区保留期测试类"""
+
+    @pytest.mark.asyncio
+    async def test_expired_partitions_dropped(self, open_partitioned):
+        """测试过期分区整段删除文件，重新打开后计数只剩未过期分区，过期事件不写入"""
+        clock = FakeClock(BASE_TIME + timedelta(hours=34))
+        config = {'granularity': 'day', 'attack_retention_days': 5, 'benign_retention_days': 1, 'max_open': 2}
+        storage = open_partitioned(clock, **config)
+        await storage.initialize()
+        events = sample_events()
+        await storage.save_events(events)
+        files = sorted(name for name in os.listdir(open_partitioned.directory) if name.endswith('.db'))
+        assert files == ['attack-2023122500.db', 'attack-2023122600.db', 'benign-2023122500.db', 'benign-2023122600.db']
+        assert storage.get_stats()['open_partitions'] <= 2
+
+        clock.now = (BASE_TIME + timedelta(hours=50)).timestamp()
+        assert await storage.expire() == 1
+        files = sorted(name for name in os.listdir(open_partitioned.directory) if name.endswith('.db'))
+        assert files == ['attack-2023122500.db', 'attack-2023122600.db', 'benign-2023122600.db']
+        assert await storage.save_event(make_event(10, IPS[0])) and storage.stats['expired_on_write'] == 1
+
+        reopened = open_partitioned(clock, **config)
+        await reopened.initialize()
+        benign = [e for e in events if not e.detection.is_attack]
+        assert await reopened.count_events() == \
+            len([e for e in events if e.detection.is_attack]) + len([e for e in benign if e.request.timestamp.day == 26])
+        assert len(await reopened.retired_statistics()) == 2
+
+    @pytest.mark.asyncio
+    async def test_connections_sized_to_retention(self, open_partitioned):
+        """测试默认的max_open覆盖保留期内的全部分区，重新打开后计数和按ID读取不反复关闭连接"""
+        clock = FakeClock(BASE_TIME + timedelta(days=2))
+        config = {'granularity': 'hour', 'attack_retention_days': 30, 'benign_retention_days': 7}
+        storage = open_partitioned(clock, **config)
+        assert storage.max_open == 30 * 24 + 7 * 24 + 2
+        await storage.initialize()
+        events = sample_events()
+        await storage.save_events(events)
+        await storage.close()
+
+        reopened = open_partitioned(clock, **config)
+        await reopened.initialize()
+        partitions = len(reopened._partitions)
+        assert await reopened.count_events() == len(events)
+        assert reopened.get_stats()['open_partitions'] == partitions
+        visited = record_calls(reopened)
+        assert await reopened.count_events() == len(events)
+        assert (await reopened.get_event(events[-1].event_id)).event_id == events[-1].event_id
+        assert len(set(visited)) == 1
+
+    @pytest.mark.asyncio
+    async def test_retired_counts_in_rollups(self, open_partitioned):
+        """测试重建的预聚合统计包含已删除分区和写入时已过期的事件留下的计数"""
+        clock = FakeClock(BASE_TIME + timedelta(days=2))
+        config = {'granularity': 'hour', 'attack_retention_days': 30, 'benign_retention_days': 1}
+        events = sample_events()
+        storage = RollupStorage(open_partitioned(clock, **config))
+        await storage.initialize()
+        await storage.save_events(events)
+        before = await storage.get_statistics(period='day')
+
+        clock.now += 12 * 3600
+        await storage.storage.expire()
+        assert storage.storage.get_stats()['benign_partitions'] < 34
+        rebuilt = RollupStorage(open_partitioned(clock, **config))
+        await rebuilt.initialize()
+        after = await rebuilt.get_statistics(period='day')
+        for key in ('total_events', 'attack_events', 'attack_distribution', 'trend_data'):
+            assert after[key] == before[key], key
+        assert await rebuilt.count_events() < len(events)
+
+    @pytest.mark.asyncio
+    async def test_raw_requests_stripped(self, open_partitioned):
+        """测试超过原始请求保留期的分区只保留摘要字段和检测结果，之后写入的事件同样处理，重新打开后不重复处理"""
+        clock = FakeClock(BASE_TIME + timedelta(hours=34))
+        config = {'granularity': 'day', 'attack_retention_days': 30, 'raw_retention_days': 1}
+        storage = open_partitioned(clock, **config)
+        await storage.initialize()
+        events = sample_events()
+        for event in events:
+            event.request.headers = {'Cookie': 'session=1'}
+            event.request.body = 'password=secret'
+            event.request.raw_data = 'raw log line'
+        await storage.save_events(events)
+        old = [e for e in events if e.request.timestamp.day == 25]
+        new = [e for e in events if e.request.timestamp.day == 26]
+
+        clock.now = (BASE_TIME + timedelta(hours=50)).timestamp()
+        await storage.expire()
+        assert storage.stats['stripped_events'] == len(old)
+        stripped = await storage.get_event(old[0].event_id)
+        assert (stripped.request.headers, stripped.request.body, stripped.request.raw_data) == ({}, None, '')
+        assert stripped.request.url == old[0].request.url
+        assert stripped.detection.attack_types == old[0].detection.attack_types
+        assert (await storage.get_event(new[0].event_id)).request.body == 'password=secret'
+        assert await storage.count_events() == len(events)
+
+        late = make_event(10, IPS[0])
+        late.request.body = 'password=secret'
+        await storage.save_event(late)
+        assert (await storage.get_event(late.event_id)).request.body is None
+        assert late.request.body == 'password=secret'
+
+        reopened = open_partitioned(clock, **config)
+        await reopened.initialize()
+        assert reopened.stats['stripped_events'] == 0
+        assert reopened.get_stats()['stripped_partitions'] == 2
@@ -0,0 +1,179 @@
+"""
+PcapCapturer 功能测试
+构造pcap/pcapng文件，验证TCP重组与HTTP请求解析
+"""
+
+import asyncio
+import os
+import struct
+import sys
+import tempfile
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.capture.pcap_capturer import PcapCapturer, HTTPStreamParser
+from app.core.exceptions import CaptureException
+from security_capturer import SecurityCapturer
+
+CLIENT = (bytes([192, 168, 1, 50]), 40000)
+SERVER = (bytes([10, 0, 0, 1]), 80)
+
+
+def tcp_packet(src, dst, seq, payload=b'', flags=0x18):
+    """构造 以太网 + IPv4 + TCP 数据包"""
+    tcp = struct.pack('!HHIIBBHHH', src[1], dst[1], seq, 0, 5 << 4, flags, 65535, 0, 0) + payload
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(tcp), 0, 0, 64, 6, 0, src[0], dst[0]) + tcp
+    return b'\x00' * 12 + b'\x08\x00' + ip
+
+
+def write_pcap(path, packets):
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for ts, data in packets:
+            f.write(struct.pack('<IIII', int(ts), int((ts % 1) * 1e6), len(data), len(data)))
+            f.write(data)
+
+
+def write_pcapng(path, packets):
+    def block(block_type, body):
+        body += b'\x00' * ((4 - len(body) % 4) % 4)
+        length = len(body) + 12
+        return struct.pack('<II', block_type, length) + body + struct.pack('<I', length)
+
+    with open(path, 'wb') as f:
+        f.write(block(0x0A0D0D0A, struct.pack('<IHHq', 0x1A2B3C4D, 1, 0, -1)))
+        f.write(block(1, struct.pack('<HHI', 1, 0, 65535)))
+        for ts, data in packets:
+            micros = int(ts * 1e6)
+            f.write(block(6, struct.pack('<IIIII', 0, micros >> 32, micros & 0xFFFFFFFF, len(data), len(data)) + data))
+
+
+class TestPcapCapturer:
+    """PcapCapturer测试类"""
+
+    @pytest.fixture
+    def temp_path(self):
+        fd, path = tempfile.mkstemp(suffix='.pcap')
+        os.close(fd)
+        yield path
+        os.unlink(path)
+
+    def conversation(self):
+        """一个包含乱序、重传、流水线和chunked请求体的会话"""
+        req1 = b'GET /search?q=1%27%20OR%201=1-- HTTP/1.1\r\nHost: a\r\nUser-Agent: sqlmap/1.7\r\n\r\n'
+        req2 = (b'POST /upload HTTP/1.1\r\nHost: a\r\nTransfer-Encoding: chunked\r\n\r\n'
+                b'5\r\ncmd=;\r\n9\r\ncat /etc/\r\n6;ext=1\r\npasswd\r\n0\r\n\r\n')
+        stream = req1 + req2
+        isn = 1000
+        seg_a, seg_b, seg_c = stream[:30], stream[30:100], stream[100:]
+        base = isn + 1
+        return [
+            (1.0, tcp_packet(CLIENT, SERVER, isn, flags=0x02)),
+            (1.1, tcp_packet(CLIENT, SERVER, base, seg_a)),
+            # 乱序：先到第三段
+            (1.2, tcp_packet(CLIENT, SERVER, base + 100, seg_c)),
+            (1.3, tcp_packet(CLIENT, SERVER, base + 30, seg_b)),
+            # 重传第一段
+            (1.4, tcp_packet(CLIENT, SERVER, base, seg_a)),
+            # 响应方向不是HTTP请求，应被忽略
+            (1.5, tcp_packet(SERVER, CLIENT, 5000, b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n')),
+            (1.6, tcp_packet(CLIENT, SERVER, base + len(stream), flags=0x11)),
+        ]
+
+    def test_stream_parser_content_length(self):
+        """测试Content-Length请求体和请求体上限"""
+        parser = HTTPStreamParser(max_header_size=1024, max_body_size=4)
+        data = b'POST /a HTTP/1.1\r\nContent-Length: 10\r\n\r\n0123456789GET /b HTTP/1.1\r\n\r\n'
+        items = parser.feed(data[:45], 1.0) + parser.feed(data[45:], 2.0)
+        assert [i['target'] for i in items] == ['/a', '/b']
+        assert bytes(items[0]['body']) == b'0123'
+        assert items[0]['truncated']
+
+    @pytest.mark.asyncio
+    async def test_pcap_reassembly(self, temp_path):
+        """测试pcap格式下的乱序重组、重传和chunked解析"""
+        write_pcap(temp_path, self.conversation())
+
+        capturer = PcapCapturer(temp_path)
+        await capturer.start_capture()
+        requests = [r async for r in capturer.capture_stream()]
+
+        assert [r.method for r in requests] == ['GET', 'POST']
+        assert requests[0].params == {'q': '1%27%20OR%201=1--'}
+        assert requests[0].user_agent == 'sqlmap/1.7'
+        assert requests[0].source_ip == '192.168.1.50'
+        assert requests[1].body == 'cmd=;cat /etc/passwd'
+        assert capturer.get_stats()['active_flows'] == 0
+
+    @pytest.mark.asyncio
+    async def test_pcapng_and_capture_single(self, temp_path):
+        """测试pcapng格式和逐个读取"""
+        write_pcapng(temp_path, self.conversation())
+
+        capturer = PcapCapturer(temp_path, server_ports={80})
+        first = await capturer.capture_single()
+        second = await capturer.capture_single()
+        assert first.url.startswith('/search')
+        assert second.body == 'cmd=;cat /etc/passwd'
+        assert await capturer.capture_single() is None
+
+    @pytest.mark.asyncio
+    async def test_flow_timeout_flushes_incomplete(self, temp_path):
+        """测试流超时淘汰时输出请求头已完整的请求"""
+        partial = b'POST /login HTTP/1.1\r\nContent-Length: 100\r\n\r\nuser=admin'
+        other = (bytes([192, 168, 1, 51]), 40001)
+        write_pcap(temp_path, [
+            (1.0, tcp_packet(CLIENT, SERVER, 1, partial)),
+            (500.0, tcp_packet(other, SERVER, 1, b'GET / HTTP/1.1\r\n\r\n')),
+        ])
+
+        capturer = PcapCapturer(temp_path, flow_timeout=60)
+        await capturer.start_capture()
+        requests = [r async for r in capturer.capture_stream()]
+
+        assert sorted(r.url for r in requests) == ['/', '/login']
+        assert capturer.get_stats()['flows_timed_out'] == 1
+        login = next(r for r in requests if r.url == '/login')
+        assert login.body == 'user=admin'
+
+    @pytest.mark.asyncio
+    async def test_yields_during_non_http_traffic(self, temp_path):
+        """测试没有HTTP请求的大量数据包也按处理的数据包数让出事件循环"""
+        write_pcap(temp_path, [
+            (1.0 + i / 1000, tcp_packet(SERVER, CLIENT, 5000 + i, b'\x00' * 16)) for i in range(3000)
+        ])
+        capturer = PcapCapturer(temp_path)
+        await capturer.start_capture()
+        seen = []
+
+        async def ticker():
+            while True:
+                seen.append(capturer.stats['packets'])
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        requests = [r async for r in capturer.capture_stream()]
+        task.cancel()
+
+        assert requests == []
+        assert len({count for count in seen if 0 < count < 3000}) >= 2
+
+    @pytest.mark.asyncio
+    async def test_invalid_file(self, temp_path):
+        """测试非pcap文件"""
+        with open(temp_path, 'wb') as f:
+            f.write(b'not a capture file')
+        with pytest.raises(CaptureException):
+            await PcapCapturer(temp_path).capture_single()
+
+    @pytest.mark.asyncio
+    async def test_security_capturer_batch(self, temp_path):
+        """测试接入SecurityCapturer批量分析"""
+        write_pcap(temp_path, self.conversation())
+
+        report = await SecurityCapturer(capturer=PcapCapturer(temp_path)).batch_analyze_log()
+        assert report['total_events'] == 2
+        assert report['attack_events'] == 2
@@ -0,0 +1,172 @@
+"""
+Pipeline 功能测试
+测试分阶段流水线的背压、排空关闭、指标以及SecurityCapturer的流水线模式（含解析和sink阶段）
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.pipeline import Pipeline, Stage
+from app.core.exceptions import ConfigurationException
+from security_capturer import SecurityCapturer
+
+
+async def numbers(count, delay=0.0):
+    for n in range(count):
+        if delay:
+            await asyncio.sleep(delay)
+        yield n
+
+
+def square_batch(items):
+    return [n * n for n in items]
+
+
+class TestPipeline:
+    """Pipeline测试类"""
+
+    @pytest.mark.asyncio
+    async def test_stages_and_metrics(self):
+        """测试多阶段处理、过滤以及阶段指标"""
+        async def keep_even(n):
+            return n if n % 2 == 0 else None
+
+        pipeline = Pipeline(numbers(100), [
+            Stage("even", keep_even, workers=3, queue_size=4),
+            Stage("square", square_batch, workers=2, executor="thread", batch_size=8, queue_size=4),
+        ])
+        results = [r async for r in pipeline.run()]
+
+        assert sorted(results) == [n * n for n in range(0, 100, 2)]
+        metrics = pipeline.get_metrics()
+        assert metrics['source']['items_out'] == 100
+        assert metrics['even']['items_in'] == 100
+        assert metrics['even']['dropped'] == 50
+        assert metrics['square']['items_out'] == 50
+        assert metrics['square']['max_queue_depth'] <= 4
+        assert metrics['square']['finished']
+
+    @pytest.mark.asyncio
+    async def test_backpressure_bounds_queues(self):
+        """测试慢速下游使上游在有界队列处等待"""
+        async def slow(n):
+            await asyncio.sleep(0.001)
+            return n
+
+        pipeline = Pipeline(numbers(50), [Stage("slow", slow, queue_size=2)], output_queue_size=2)
+        results = [r async for r in pipeline.run()]
+
+        assert results == list(range(50))
+        metrics = pipeline.get_metrics()
+        assert metrics['source']['backpressure_waits'] > 0
+        assert metrics['slow']['max_queue_depth'] <= 2
+
+    @pytest.mark.asyncio
+    async def test_stop_drains_in_flight(self):
+        """测试stop()后在途数据被处理完"""
+        pipeline = Pipeline(numbers(10_000, delay=0.001), [Stage("identity", lambda n: n)])
+        results = []
+        async for item in pipeline.run():
+            results.append(item)
+            if len(results) == 5:
+                pipeline.stop()
+
+        emitted = pipeline.get_metrics()['source']['items_out']
+        assert len(results) == emitted
+        assert emitted < 10_000
+
+    @pytest.mark.asyncio
+    async def test_errors_counted(self):
+        """测试处理异常被计数且不影响其他数据"""
+        def fragile(n):
+            if n == 3:
+                raise ValueError("bad item")
+            return n
+
+        pipeline = Pipeline(numbers(6), [Stage("fragile", fragile)])
+        results = [r async for r in pipeline.run()]
+        assert results == [0, 1, 2, 4, 5]
+        assert pipeline.get_metrics()['fragile']['errors'] == 1
+
+    def test_invalid_configuration(self):
+        """测试非法配置"""
+        with pytest.raises(ConfigurationException):
+            Stage("x", square_batch, executor="gpu")
+        with pytest.raises(ConfigurationException):
+            Pipeline(numbers(1), [])
+
+
+class TestSecurityCapturerPipeline:
+    """SecurityCapturer流水线模式测试类"""
+
+    @pytest.fixture
+    def log_file(self):
+        lines = []
+        for n in range(40):
+            url = f"/item.php?page={n}"
+            if n % 4 == 0:
+                url = "/search.php?q=1%27%20UNION%20SELECT%20password%20FROM%20users--"
+            lines.append(
+                f'10.0.0.{n % 5} - - [25/Dec/2023:10:00:00 +0800] "GET {url} HTTP/1.1" 200 100 "-" "Mozilla/5.0"'
+            )
+        fd, path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        yield path
+        os.unlink(path)
+
+    @pytest.mark.asyncio
+    async def test_pipeline_matches_sequential(self, log_file):
+        """测试流水线模式与顺序模式结果一致"""
+        sequential = await SecurityCapturer(log_file).batch_analyze_log()
+
+        capturer = SecurityCapturer(log_file, detect_workers=2, batch_size=8)
+        report = await capturer.batch_analyze_log()
+
+        assert report['total_events'] == sequential['total_events'] == 40
+        assert report['attack_events'] == sequential['attack_events'] == 10
+        assert report['risk_distribution'] == sequential['risk_distribution']
+
+        pipeline_stats = capturer.get_stats()['pipeline']
+        assert pipeline_stats['detect']['items_in'] == 40
+        assert pipeline_stats['detect']['executor'] == 'process'
+        assert pipeline_stats['event']['items_out'] == 40
+
+    @pytest.mark.asyncio
+    async def test_parse_and_sink_stages(self, log_file):
+        """测试解析在进程池中进行、事件经过sink阶段，结果与顺序模式一致，sink失败不丢失事件"""
+        sequential = await SecurityCapturer(log_file).batch_analyze_log()
+        with open(log_file, 'a') as f:
+            f.write("not a log line\n")
+        saved = []
+
+        async def sink(event):
+            if event.request.url.endswith("page=13"):
+                raise RuntimeError("存储不可用")
+            saved.append(event.event_id)
+
+        capturer = SecurityCapturer(log_file, detect_workers=2, parse_workers=2, batch_size=8, sink=sink)
+        report = await capturer.batch_analyze_log()
+
+        assert report['total_events'] == 40
+        assert report['attack_events'] == sequential['attack_events'] == 10
+        assert len(saved) == 39 and capturer.get_stats()['processing_errors'] == 1
+        pipeline_stats = capturer.get_stats()['pipeline']
+        assert pipeline_stats['parse']['executor'] == 'process'
+        assert pipeline_stats['parse']['items_in'] == 41 and pipeline_stats['parse']['dropped'] == 1
+        assert pipeline_stats['sink']['items_out'] == 40
+
+    @pytest.mark.asyncio
+    async def test_pipeline_max_requests(self, log_file):
+        """测试提前结束时流水线被关闭"""
+        capturer = SecurityCapturer(log_file, detect_workers=1, batch_size=4)
+        report = await capturer.batch_analyze_log(max_requests=5)
+
+        assert report['total_events'] == 5
+        assert not capturer.pipeline.is_running
@@ -0,0 +1,184 @@
+"""
+预聚合时间桶统计测试
+测试Space-Saving合并、分钟/小时/天分层、合并后统计不变、与全量统计一致以及RollupStorage的增量维护和重建
+"""
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.analytics import SpaceSaving, TimeRollups
+from app.core.models import AttackType, Severity
+from app.storage import MemoryStorage, RollupStorage
+from tests.test_memory_storage import BASE_TIME, IPS, make_event
+from tests.test_sqlite_storage import sample_events
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now):
+        self.now = now.timestamp()
+
+    def __call__(self):
+        return self.now
+
+    @property
+    def now_dt(self):
+        return datetime.fromtimestamp(self.now)
+
+
+def skewed_stream(count, seed):
+    """少数IP占大部分的来源流"""
+    rng = random.Random(seed)
+    return [f"10.{rng.randrange(3)}.0.1" if rng.random() < 0.5 else f"172.16.{rng.randrange(500)}.{rng.randrange(50)}"
+            for _ in range(count)]
+
+
+class TestSpaceSavingMerge:
+    """SpaceSaving合并测试类"""
+
+    def test_merge_bounds(self):
+        """测试合并后的估计值满足误差保证，高频项保留"""
+        left, right = skewed_stream(5000, 1), skewed_stream(5000, 2)
+        a, b = SpaceSaving(32), SpaceSaving(32)
+        for item in left:
+            a.add(item)
+        for item in right:
+            b.add(item)
+        merged = a.merge(b)
+
+        truth = {}
+        for item in left + right:
+            truth[item] = truth.get(item, 0) + 1
+        assert merged.total == 10000
+        assert len(merged) <= 32
+        for item, count in merged.counts.items():
+            assert count - merged.error(item) <= truth[item] <= count
+        assert {item for item, _ in merged.top(3)} == {"10.0.0.1", "10.1.0.1", "10.2.0.1"}
+
+
+class TestTimeRollups:
+    """TimeRollups测试类"""
+
+    @staticmethod
+    def build(events, clock):
+        rollups = TimeRollups(minute_retention=2 * 3600, hour_retention=86400, clock=clock)
+        for event in events:
+            rollups.add(event)
+        return rollups
+
+    @pytest.mark.asyncio
+    async def test_matches_exact_statistics(self):
+        """测试按小时对齐的窗口统计与全量统计一致"""
+        events = sample_events()
+        memory = MemoryStorage()
+        await memory.save_events(events)
+        clock = FakeClock(BASE_TIME + timedelta(minutes=2000))
+        rollups = self.build(events, clock)
+        tiers = rollups.get_stats()
+        # 分钟层从 (当前时间 - 2小时) 所在的整点开始；小时层保留一天，按天对齐后仍覆盖第一天
+        assert 120 <= tiers['minute_buckets'] < 180 and tiers['hour_buckets'] > 0
+
+        for filters in (
+            {'start_time': BASE_TIME + timedelta(hours=12), 'end_time': BASE_TIME + timedelta(minutes=1999), 'limit': 5},
+            {'start_time': BASE_TIME + timedelta(minutes=1900), 'end_time': BASE_TIME + timedelta(minutes=1959)},
+            {'period': 'day'},
+        ):
+            expected = await memory.get_statistics(**filters)
+            stats = rollups.statistics(**filters)
+            for key in ('total_events', 'attack_events', 'high_risk_events', 'attack_distribution', 'trend_data'):
+                assert stats[key] == expected[key], (key, filters)
+            assert [s['attack_count'] for s in stats['top_attack_sources']] == \
+                [s['attack_count'] for s in expected['top_attack_sources']]
+            for source in stats['top_attack_sources']:
+                assert source['last_attack'] == max(
+                    e.request.timestamp for e in events
+                    if e.request.source_ip == source['source_ip'] and e.detection.is_attack
+                    and filters.get('start_time', BASE_TIME) <= e.request.timestamp
+                    <= filters.get('end_time', clock.now_dt)
+                )
+
+    def test_compaction_preserves_totals(self):
+        """测试时间推进后分钟桶、小时桶合并进更粗的层，总数和分布不变"""
+        events = sample_events()
+        clock = FakeClock(BASE_TIME + timedelta(minutes=2000))
+        rollups = self.build(events, clock)
+        before = rollups.statistics()
+
+        clock.now += 30 * 86400
+        rollups.compact()
+        assert rollups.get_stats() == {'minute_buckets': 0, 'hour_buckets': 0, 'day_buckets': 2}
+        after = rollups.statistics()
+        for key in ('total_events', 'attack_events', 'attack_distribution'):
+            assert after[key] == before[key], key
+        assert [s['attack_count'] for s in after['top_attack_sources']] == \
+            [s['attack_count'] for s in before['top_attack_sources']]
+
+    def test_window_cost_is_bucket_count(self):
+        """测试168小时窗口只访问与窗口相交的桶"""
+        clock = FakeClock(BASE_TIME + timedelta(days=10))
+        rollups = TimeRollups(clock=clock)
+        for minute in range(0, 10 * 1440, 7):
+            rollups.add(make_event(minute, IPS[minute % 20]))
+        end = BASE_TIME + timedelta(days=10)
+        visited = list(rollups.buckets(end - timedelta(hours=168), end))
+        assert len(visited) <= 120 + 168 + 1
+        assert sum(bucket.total for _, _, bucket in visited) == \
+            len([m for m in range(0, 10 * 1440, 7) if m >= (10 * 1440 - 168 * 60)])
+
+
+class TestRollupStorage:
+    """RollupStorage测试类"""
+
+    @pytest.mark.asyncio
+    async def test_incremental_maintenance_and_rebuild(self):
+        """测试保存、更新、删除后的统计与底层存储一致，重建结果与增量维护相同"""
+        inner = MemoryStorage()
+        storage = RollupStorage(inner)
+        events = [make_event(i, IPS[i % 4], [AttackType.XSS] if i % 5 == 0 else []) for i in range(60)]
+        await storage.save_events(events)
+
+        upgraded = make_event(1, IPS[1], [AttackType.SQL_INJECTION], severity=Severity.HIGH)
+        assert await storage.update_event(events[1].event_id, upgraded)
+        assert await storage.delete_event(events[0].event_id)
+        assert not await storage.delete_event(events[0].event_id)
+
+        stats = await storage.get_statistics()
+        expected = await inner.get_statistics()
+        for key in ('total_events', 'attack_events', 'high_risk_events', 'attack_distribution'):
+            assert stats[key] == expected[key], key
+        # 2023年的事件早已合并进天桶，趋势只有一个点
+        assert [(p['total_events'], p['attack_events']) for p in stats['trend_data']] == [(59, 12)]
+        assert stats['attack_distribution'] == {'sql_injection': 1, 'xss': 11}
+
+        incremental = stats
+        await storage.initialize()
+        rebuilt = await storage.get_statistics()
+        for key in ('total_events', 'attack_events', 'high_risk_events', 'attack_distribution', 'trend_data'):
+            assert rebuilt[key] == incremental[key], key
+
+        # 其他过滤条件交给底层存储
+        assert (await storage.get_statistics(source_ip=IPS[0]))['total_events'] == \
+            (await inner.get_statistics(source_ip=IPS[0]))['total_events']
+
+    def test_disabled_by_default_on_shared_backend(self, monkeypatch):
+        """测试未配置statistics_rollups时，多个worker共享的sqlalchemy后端不包装预聚合统计，memory后端包装"""
+        from app.api import events
+        from app.config.settings import DatabaseSettings
+
+        monkeypatch.setattr(events.settings, 'database', DatabaseSettings(
+            backend='sqlalchemy', url='sqlite+aiosqlite:///:memory:', statistics_rollups=None, partition_by=None
+        ))
+        storage = events._create_storage()
+        assert storage.shared and not isinstance(storage, RollupStorage)
+
+        monkeypatch.setattr(events.settings, 'database', DatabaseSettings(
+            backend='memory', statistics_rollups=None, partition_by=None
+        ))
+        assert isinstance(events._create_storage(), RollupStorage)
@@ -0,0 +1,118 @@
+"""
+ShardedAnalyzer 功能测试
+测试按来源IP分片、分片内顺序、IP状态以及SecurityCapturer分片模式
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.pipeline import ShardedAnalyzer, shard_for
+from app.core.models import HTTPRequest
+from security_capturer import SecurityCapturer
+
+BASE_TIME = datetime(2023, 12, 25, 10, 0, 0)
+
+
+def make_request(ip: str, n: int, attack: bool = False) -> HTTPRequest:
+    url = "/search?q=<script>alert(1)</script>" if attack else f"/page?p={n}"
+    return HTTPRequest(
+        url=url,
+        method="GET",
+        headers={},
+        params={},
+        body=None,
+        source_ip=ip,
+        timestamp=BASE_TIME + timedelta(seconds=n),
+        raw_data=f"GET {url}",
+        user_agent="Mozilla/5.0"
+    )
+
+
+async def request_source(requests):
+    for request in requests:
+        yield request
+
+
+class TestShardedAnalyzer:
+    """ShardedAnalyzer测试类"""
+
+    def test_shard_for_stable(self):
+        """测试分片函数稳定且在范围内"""
+        assert shard_for("10.0.0.1", 4) == shard_for("10.0.0.1", 4)
+        assert all(0 <= shard_for(f"10.0.0.{i}", 4) < 4 for i in range(100))
+        assert len({shard_for(f"10.0.0.{i}", 4) for i in range(100)}) == 4
+
+    @pytest.mark.asyncio
+    async def test_ip_affinity_and_state(self):
+        """测试同一IP落在同一分片、保持顺序并累计状态"""
+        ips = [f"192.168.0.{i}" for i in range(8)]
+        requests = [make_request(ips[n % 8], n, attack=(n % 8 == 0)) for n in range(200)]
+
+        analyzer = ShardedAnalyzer(shards=3, batch_size=7)
+        results = [item async for item in analyzer.run(request_source(requests))]
+
+        assert len(results) == 200
+        seen = {}
+        for request, result, context in results:
+            assert context['shard'] == shard_for(request.source_ip, 3)
+            previous = seen.get(request.source_ip, 0)
+            assert context['ip_requests'] == previous + 1
+            seen[request.source_ip] = context['ip_requests']
+
+        attacker_contexts = [c for r, _, c in results if r.source_ip == ips[0]]
+        assert attacker_contexts[-1]['ip_attacks'] == 25
+        assert attacker_contexts[-1]['ip_attack_types'] == ['xss']
+        assert attacker_contexts[-1]['ip_request_rate'] == pytest.approx(25 / 192)
+
+        metrics = analyzer.get_metrics()
+        assert sum(metrics['dispatched_per_shard']) == 200
+        assert sum(s['processed'] for s in metrics['shard_summaries']) == 200
+        top = [s['top_attackers'] for s in metrics['shard_summaries'] if s['attacks']]
+        assert top == [[(ips[0], 25, 25)]]
+
+    @pytest.mark.asyncio
+    async def test_early_close_stops_workers(self):
+        """测试提前结束时工作进程被回收"""
+        requests = [make_request(f"10.1.0.{n % 20}", n) for n in range(500)]
+        analyzer = ShardedAnalyzer(shards=2, batch_size=10)
+
+        results = analyzer.run(request_source(requests))
+        count = 0
+        async for _ in results:
+            count += 1
+            if count == 15:
+                break
+        await results.aclose()
+
+        assert not analyzer.is_running
+        assert analyzer._processes == []
+
+    @pytest.mark.asyncio
+    async def test_security_capturer_sharded(self):
+        """测试SecurityCapturer分片模式与顺序模式结果一致"""
+        lines = []
+        for n in range(30):
+            url = "/q?x=1%27%20UNION%20SELECT%20pass%20FROM%20users--" if n % 6 == 0 else f"/page?p={n}"
+            lines.append(f'10.0.0.{n % 6} - - [25/Dec/2023:10:00:{n:02d} +0800] "GET {url} HTTP/1.1" 200 10 "-" "Mozilla/5.0"')
+        fd, path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+        try:
+            sequential = await SecurityCapturer(path).batch_analyze_log()
+            capturer = SecurityCapturer(path, shards=2, batch_size=4)
+            report = await capturer.batch_analyze_log(sample_size=2)
+        finally:
+            os.unlink(path)
+
+        assert report['total_events'] == sequential['total_events'] == 30
+        assert report['attack_events'] == sequential['attack_events'] == 5
+        assert report['top_attack_ips'] == [('10.0.0.0', 5)]
+        assert 'ip_context' in report['sample_attacks'][0]
+        assert capturer.get_stats()['sharding']['shards'] == 2
@@ -0,0 +1,151 @@
+"""
+SQLAlchemy事件存储测试
+在本地SQLite上测试连接池配置、多行INSERT批量写入、键集分页、过滤计数以及数据库端统计
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import event
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.models import AttackType, Severity
+from app.core.exceptions import StorageException
+from app.storage import MemoryStorage, SQLAlchemyStorage, StorageFactory
+from app.storage.sql import async_url
+from tests.test_memory_storage import BASE_TIME, IPS, make_event, matches
+from tests.test_sqlite_storage import sample_events
+
+
+@pytest.fixture
+def open_storage(event_loop):
+    """打开临时目录中的数据库，测试结束（包括失败）时释放连接池"""
+    directory = tempfile.mkdtemp()
+    opened = []
+
+    def open_storage(**config):
+        storage = SQLAlchemyStorage({'url': f"sqlite:///{os.path.join(directory, 'events.db')}", **config})
+        opened.append(storage)
+        return storage
+
+    yield open_storage
+    for storage in opened:
+        event_loop.run_until_complete(storage.close())
+    shutil.rmtree(directory)
+
+
+class TestSQLAlchemyStorage:
+    """SQLAlchemyStorage测试类"""
+
+    def test_async_url(self):
+        """测试配置中的同步URL换成异步驱动"""
+        assert async_url("postgresql://u:p@db:5432/waf") == "postgresql+asyncpg://u:p@db:5432/waf"
+        assert async_url("mysql://u:p@db/waf") == "mysql+aiomysql://u:p@db/waf"
+        assert async_url("sqlite:///events.db") == "sqlite+aiosqlite:///events.db"
+        assert async_url("postgresql+asyncpg://db/waf") == "postgresql+asyncpg://db/waf"
+        with pytest.raises(StorageException):
+            async_url("oracle://db/waf")
+
+    @pytest.mark.asyncio
+    async def test_pool_settings_and_batched_insert(self, open_storage):
+        """测试连接池大小来自配置，批量写入按批拼成多行INSERT"""
+        storage = open_storage(pool_size=3, max_overflow=2, insert_batch_size=100)
+        await storage.initialize()
+        assert storage.engine.pool.size() == 3
+
+        inserts = []
+        event.listen(
+            storage.engine.sync_engine, "before_cursor_execute",
+            lambda conn, cursor, statement, *args: inserts.append(statement)
+            if statement.startswith("INSERT INTO events ") else None
+        )
+        events = sample_events(250)
+        ids = await storage.save_events(events)
+        assert len(inserts) == 3
+        assert await storage.count_events() == 250
+        assert (await storage.get_event(ids[0])).request.timestamp == events[0].request.timestamp
+
+        with pytest.raises(StorageException):
+            await storage.save_events([make_event(9000, IPS[0]), make_event(9001, IPS[0], event_id=ids[0])])
+        assert await storage.count_events() == 250
+
+    @pytest.mark.asyncio
+    async def test_filters_and_keyset_pages(self, open_storage):
+        """测试过滤结果与全量扫描一致，键集分页与页码分页结果相同"""
+        storage = open_storage()
+        events = sample_events()
+        await storage.save_events(events)
+        ordered = sorted(events, key=lambda e: e.request.timestamp)
+
+        cases = [
+            {},
+            {'is_attack': True},
+            {'is_attack': False, 'source_ip': IPS[3]},
+            {'attack_type': 'xss'},
+            {'attack_type': 'sql_injection', 'start_time': BASE_TIME + timedelta(minutes=500)},
+            {'source_ip': IPS[0], 'start_time': BASE_TIME + timedelta(minutes=100),
+             'end_time': BASE_TIME + timedelta(minutes=900)},
+        ]
+        for filters in cases:
+            expected = [e.event_id for e in ordered if matches(e, filters)]
+            result = await storage.query_events(page_size=10000, order="asc", **filters)
+            assert [e.event_id for e in result] == expected, filters
+            assert await storage.count_events(**filters) == len(expected), filters
+
+        filters = {'is_attack': True}
+        walked, after = [], None
+        while True:
+            page = await storage.query_events(page_size=37, after=after, **filters)
+            if not page:
+                break
+            walked.extend(e.event_id for e in page)
+            after = (page[-1].request.timestamp, page[-1].event_id)
+        assert walked == [e.event_id for e in reversed(ordered) if matches(e, filters)]
+        second = await storage.query_events(page=2, page_size=37, **filters)
+        assert [e.event_id for e in second] == walked[37:74]
+
+    @pytest.mark.asyncio
+    async def test_update_and_delete(self, open_storage):
+        """测试更新后攻击类型和严重程度过滤生效，删除后计数归零"""
+        storage = open_storage()
+        event_id = await storage.save_event(make_event(1, IPS[0]))
+        upgraded = make_event(1, IPS[0], [AttackType.SQL_INJECTION], severity=Severity.HIGH)
+        assert await storage.update_event(event_id, upgraded)
+        assert await storage.count_events(attack_type=AttackType.SQL_INJECTION, severity="HIGH") == 1
+        assert (await storage.get_event(event_id)).llm_analysis.severity == Severity.HIGH
+        assert not await storage.update_event("missing", upgraded)
+
+        assert await storage.delete_event(event_id)
+        assert not await storage.delete_event(event_id)
+        assert await storage.count_events(attack_type="sql_injection") == 0
+
+    @pytest.mark.asyncio
+    async def test_statistics_match_memory(self, open_storage):
+        """测试数据库端统计与MemoryStorage一致"""
+        events = sample_events()
+        storage = open_storage()
+        memory_storage = MemoryStorage()
+        await storage.save_events(events)
+        await memory_storage.save_events(events)
+
+        for filters in ({'start_time': BASE_TIME, 'end_time': BASE_TIME + timedelta(minutes=599), 'limit': 5},
+                        {'period': 'day'}):
+            expected = await memory_storage.get_statistics(**filters)
+            stats = await storage.get_statistics(**filters)
+            for key in ('total_events', 'attack_events', 'high_risk_events', 'attack_distribution', 'trend_data'):
+                assert stats[key] == expected[key], key
+            assert [s['attack_count'] for s in stats['top_attack_sources']] == \
+                [s['attack_count'] for s in expected['top_attack_sources']]
+
+    def test_factory(self):
+        """测试按名称创建存储"""
+        assert isinstance(StorageFactory.create_storage("memory"), MemoryStorage)
+        storage = StorageFactory.create_storage("sqlalchemy", {'url': "sqlite:///:memory:"})
+        assert isinstance(storage, SQLAlchemyStorage)
+        with pytest.raises(StorageException):
+            StorageFactory.create_storage("redis")
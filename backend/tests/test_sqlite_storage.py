@@ -0,0 +1,164 @@
+"""
+SQLite事件存储测试
+测试事件往返、批量写入、过滤与计数、更新删除、统计与MemoryStorage一致以及查询计划走索引
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.models import AttackType, Severity
+from app.core.exceptions import StorageException
+from app.storage import MemoryStorage, SQLiteStorage
+from tests.test_memory_storage import BASE_TIME, IPS, TYPES, make_event, matches
+
+
+@pytest.fixture
+def open_storage(event_loop):
+    """打开临时目录中的数据库，测试结束（包括失败）时关闭所有连接"""
+    directory = tempfile.mkdtemp()
+    opened = []
+
+    def open_storage(**config):
+        storage = SQLiteStorage({'path': os.path.join(directory, 'events.db'), **config})
+        opened.append(storage)
+        return storage
+
+    yield open_storage
+    for storage in opened:
+        event_loop.run_until_complete(storage.close())
+    shutil.rmtree(directory)
+
+
+def sample_events(count=2000):
+    """乱序的事件，约30%为攻击"""
+    rng = random.Random(11)
+    minutes = list(range(count))
+    rng.shuffle(minutes)
+    return [
+        make_event(minute, rng.choice(IPS), [rng.choice(TYPES)] if rng.random() < 0.3 else [])
+        for minute in minutes
+    ]
+
+
+class TestSQLiteStorage:
+    """SQLiteStorage测试类"""
+
+    @pytest.mark.asyncio
+    async def test_roundtrip(self, open_storage):
+        """测试事件完整写入和读出，持久化后重新打开仍可读取"""
+        storage = open_storage()
+        event = make_event(5, IPS[0], [AttackType.XSS, AttackType.SQL_INJECTION], severity=Severity.HIGH)
+        event.request.timestamp = datetime(2023, 12, 25, 10, 0, tzinfo=timezone(timedelta(hours=8)))
+        event.request.params = {'q': '<script>'}
+        event.detection.details = {'detected_attacks': [AttackType.XSS], 'tier': 'fast'}
+        event_id = await storage.save_event(event)
+
+        storage = open_storage()
+        loaded = await storage.get_event(event_id)
+        assert loaded.request.timestamp == event.request.timestamp
+        assert loaded.request.params == {'q': '<script>'}
+        assert loaded.detection.attack_types == [AttackType.XSS, AttackType.SQL_INJECTION]
+        assert loaded.detection.details == {'detected_attacks': ['xss'], 'tier': 'fast'}
+        assert loaded.llm_analysis.severity == Severity.HIGH
+        assert await storage.get_event("missing") is None
+        async with storage._db.execute("PRAGMA journal_mode") as cursor:
+            assert (await cursor.fetchone())[0] == 'wal'
+
+    @pytest.mark.asyncio
+    async def test_filters_match_scan(self, open_storage):
+        """测试批量写入后各种过滤组合的结果与全量扫描一致"""
+        storage = open_storage()
+        events = sample_events()
+        await storage.save_events(events)
+        ordered = sorted(events, key=lambda e: e.request.timestamp)
+
+        cases = [
+            {},
+            {'is_attack': True},
+            {'is_attack': False, 'source_ip': IPS[3]},
+            {'attack_type': 'xss'},
+            {'attack_type': 'sql_injection', 'start_time': BASE_TIME + timedelta(minutes=500)},
+            {'source_ip': IPS[0], 'start_time': BASE_TIME + timedelta(minutes=100),
+             'end_time': BASE_TIME + timedelta(minutes=900)},
+            {'is_attack': True, 'end_time': BASE_TIME + timedelta(minutes=30)},
+        ]
+        for filters in cases:
+            expected = [e.event_id for e in ordered if matches(e, filters)]
+            result = await storage.query_events(page_size=10000, order="asc", **filters)
+            assert [e.event_id for e in result] == expected, filters
+            assert await storage.count_events(**filters) == len(expected), filters
+
+        second_page = await storage.query_events(page=2, page_size=5)
+        assert [e.event_id for e in second_page] == [e.event_id for e in ordered[::-1][5:10]]
+
+    @pytest.mark.asyncio
+    async def test_update_delete_and_rollback(self, open_storage):
+        """测试更新、删除，以及批量写入失败时整批回滚"""
+        storage = open_storage()
+        event_id = await storage.save_event(make_event(1, IPS[0]))
+
+        upgraded = make_event(1, IPS[0], [AttackType.SQL_INJECTION], severity=Severity.HIGH)
+        assert await storage.update_event(event_id, upgraded)
+        assert await storage.count_events(attack_type="sql_injection", severity="HIGH") == 1
+        assert not await storage.update_event("missing", upgraded)
+
+        with pytest.raises(StorageException):
+            await storage.save_events([make_event(2, IPS[1]), make_event(3, IPS[1], event_id=event_id)])
+        assert await storage.count_events() == 1
+
+        assert await storage.delete_event(event_id)
+        assert not await storage.delete_event(event_id)
+        assert await storage.count_events(attack_type="sql_injection") == 0
+
+    @pytest.mark.asyncio
+    async def test_statistics_match_memory(self, open_storage):
+        """测试统计结果与MemoryStorage一致"""
+        events = sample_events()
+        sqlite_storage = open_storage()
+        memory_storage = MemoryStorage()
+        await sqlite_storage.save_events(events)
+        await memory_storage.save_events(events)
+
+        filters = {'start_time': BASE_TIME, 'end_time': BASE_TIME + timedelta(minutes=599), 'limit': 5}
+        expected = await memory_storage.get_statistics(**filters)
+        stats = await sqlite_storage.get_statistics(**filters)
+        for key in ('total_events', 'attack_events', 'high_risk_events', 'attack_distribution', 'trend_data'):
+            assert stats[key] == expected[key], key
+        assert [s['attack_count'] for s in stats['top_attack_sources']] == \
+            [s['attack_count'] for s in expected['top_attack_sources']]
+
+    @pytest.mark.asyncio
+    async def test_query_plans_use_indexes(self, open_storage):
+        """测试列表查询按索引顺序分页（无临时排序），统计查询为覆盖索引扫描"""
+        storage = open_storage()
+        await storage.save_events(sample_events(200))
+        window = {'start_time': BASE_TIME, 'end_time': BASE_TIME + timedelta(hours=1)}
+
+        async def plan(sql, params):
+            async with storage._db.execute(f"EXPLAIN QUERY PLAN {sql}", params) as cursor:
+                return ' | '.join(row[-1] for row in await cursor.fetchall())
+
+        for filters in ({}, {'is_attack': True, **window}, {'source_ip': IPS[0]}, window):
+            # 外层只对取出的一页重新排序，这里只检查取页的子查询
+            detail = (await plan(*storage._page_query(filters))).split(' | SCAN p')[0]
+            assert 'TEMP B-TREE' not in detail, (filters, detail)
+            assert 'INDEX' in detail, (filters, detail)
+
+        detail = await plan(*storage._page_query({'attack_type': 'xss', **window}))
+        assert 'SEARCH t USING PRIMARY KEY' in detail, detail
+
+        low, high = window['start_time'].timestamp(), window['end_time'].timestamp()
+        for sql, params in (
+            ("SELECT COUNT(*) FROM events WHERE is_attack = 1 AND ts BETWEEN ? AND ?", (low, high)),
+            ("SELECT source_ip, COUNT(*) AS n, MAX(ts) FROM events WHERE is_attack = 1 AND ts BETWEEN ? AND ? "
+             "GROUP BY source_ip ORDER BY n DESC LIMIT 10", (low, high)),
+        ):
+            assert 'COVERING INDEX' in await plan(sql, params)
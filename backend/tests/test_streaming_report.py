@@ -0,0 +1,102 @@
+"""
+流式统计与增量报告测试
+测试Space-Saving、蓄水池抽样以及batch_analyze_log的增量报告
+"""
+
+import os
+import random
+import sys
+import tempfile
+from collections import Counter
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.analytics import SpaceSaving, ReservoirSample, StreamingReport
+from security_capturer import SecurityCapturer
+
+
+class TestSketches:
+    """流式草图测试类"""
+
+    def test_space_saving_heavy_hitters(self):
+        """测试高频项被找出且误差在保证范围内"""
+        rng = random.Random(7)
+        stream = ['10.0.0.1'] * 500 + ['10.0.0.2'] * 300 + [f'172.16.{i // 256}.{i % 256}' for i in range(2000)]
+        rng.shuffle(stream)
+
+        sketch = SpaceSaving(capacity=50)
+        for ip in stream:
+            sketch.add(ip)
+
+        truth = Counter(stream)
+        assert len(sketch) == 50
+        assert [ip for ip, _ in sketch.top(2)] == ['10.0.0.1', '10.0.0.2']
+        for ip, estimate in sketch.top(50):
+            assert estimate - sketch.error(ip) <= truth[ip] <= estimate
+        assert sketch.total == len(stream)
+
+    def test_reservoir_sample(self):
+        """测试蓄水池抽样大小固定且样本来自流"""
+        sample = ReservoirSample(10, seed=1)
+        for n in range(10_000):
+            sample.add(n)
+
+        assert len(sample) == 10
+        assert sample.seen == 10_000
+        assert len(set(sample.items)) == 10
+        # 样本不应只停留在流的开头
+        assert max(sample.items) >= 10
+
+        empty = ReservoirSample(0)
+        empty.add(1)
+        assert empty.items == []
+
+
+class TestStreamingReport:
+    """增量报告测试类"""
+
+    @pytest.fixture
+    def log_file(self):
+        lines = []
+        for n in range(60):
+            ip = '203.0.113.5' if n % 3 == 0 else f'10.0.0.{n % 7}'
+            url = f"/page.php?p={n}"
+            if n % 3 == 0:
+                url = "/search.php?q=%3Cscript%3Ealert(1)%3C/script%3E"
+            lines.append(
+                f'{ip} - - [25/Dec/2023:10:00:00 +0800] "GET {url} HTTP/1.1" 200 100 "-" "Mozilla/5.0"'
+            )
+        fd, path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        yield path
+        os.unlink(path)
+
+    @pytest.mark.asyncio
+    async def test_batch_report(self, log_file):
+        """测试批量分析报告字段与抽样"""
+        report = await SecurityCapturer(log_file).batch_analyze_log(sample_size=5)
+
+        assert report['total_events'] == 60
+        assert report['attack_events'] == 20
+        assert report['top_attack_ips'][0] == ('203.0.113.5', 20)
+        assert report['top_attack_types'][0][0] == 'xss'
+        assert sum(report['risk_distribution'].values()) == 60
+        assert report['risk_distribution']['SAFE'] == 40
+        assert len(report['sample_attacks']) == 5
+        assert all(s['detection']['is_attack'] for s in report['sample_attacks'])
+
+    @pytest.mark.asyncio
+    async def test_no_samples_by_default(self, log_file):
+        """测试默认不保留样本"""
+        report = await SecurityCapturer(log_file).batch_analyze_log(max_requests=10)
+        assert report['total_events'] == 10
+        assert 'sample_attacks' not in report
+
+    def test_empty_report(self):
+        """测试空报告"""
+        report = StreamingReport().build()
+        assert report['total_events'] == 0
+        assert report['risk_distribution'] == {}
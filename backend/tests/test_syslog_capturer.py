@@ -0,0 +1,150 @@
+"""
+SyslogCapturer 与日志格式注册表测试
+使用本地socket客户端验证TCP/UDP接收、分帧和溢出计数
+"""
+
+import asyncio
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.capture.formats import parse_line, get_format, list_formats, register_format
+from app.capture.syslog_capturer import SyslogCapturer, strip_syslog_header
+from app.core.exceptions import ParseException
+
+
+ACCESS_LINE = '192.168.1.{n} - - [25/Dec/2023:10:00:00 +0800] "GET /item.php?id={n} HTTP/1.1" 200 64 "-" "curl/8.0"'
+
+
+class TestLogFormats:
+    """格式注册表测试类"""
+
+    def test_builtin_formats(self):
+        """测试内置格式解析"""
+        assert {"combined", "common", "json", "auto"} <= set(list_formats())
+
+        request = parse_line(ACCESS_LINE.format(n=1), "combined")
+        assert request.source_ip == "192.168.1.1"
+        assert request.params == {"id": "1"}
+
+        request = parse_line('10.0.0.2 - - [25/Dec/2023:10:00:00 +0800] "GET /a HTTP/1.0" 404 -', "common")
+        assert request.url == "/a"
+        assert request.user_agent is None
+
+        request = parse_line(
+            '{"remote_addr": "10.0.0.3", "time_iso8601": "2023-12-25T10:00:00+08:00", '
+            '"request_method": "POST", "request_uri": "/login?next=/", "request_body": "u=admin"}',
+            "auto"
+        )
+        assert request.method == "POST"
+        assert request.body == "u=admin"
+        assert request.params == {"next": "/"}
+
+    def test_register_custom_format(self):
+        """测试注册自定义格式"""
+        @register_format("test_pipe")
+        def parse_pipe(line):
+            ip, method, url = line.split("|")
+            return parse_line(
+                f'{ip} - - [25/Dec/2023:10:00:00 +0800] "{method} {url} HTTP/1.1" 200 0 "-" "-"',
+                "combined"
+            )
+
+        assert get_format("test_pipe")("1.2.3.4|GET|/x").url == "/x"
+        with pytest.raises(ParseException):
+            get_format("no_such_format")
+
+
+class TestSyslogCapturer:
+    """SyslogCapturer测试类"""
+
+    def test_strip_syslog_header(self):
+        """测试RFC 5424 / RFC 3164头部剥离"""
+        body, host = strip_syslog_header(
+            '<134>1 2023-12-25T10:00:00Z edge1 nginx 123 - [meta x="a\\]b"] hello'
+        )
+        assert (body, host) == ("hello", "edge1")
+
+        body, host = strip_syslog_header('<13>Dec 25 10:00:00 edge2 nginx[42]: hello')
+        assert (body, host) == ("hello", "edge2")
+
+        assert strip_syslog_header("hello") == ("hello", None)
+
+    @pytest.mark.asyncio
+    async def test_tcp_line_and_octet_framing(self):
+        """测试TCP换行分帧与八位组计数分帧"""
+        capturer = SyslogCapturer(host="127.0.0.1", port=0, protocol="tcp")
+        await capturer.start_capture()
+
+        framed = f'<134>1 2023-12-25T10:00:00Z edge1 nginx - - - {ACCESS_LINE.format(n=2)}'.encode()
+        payload = (
+            ACCESS_LINE.format(n=1).encode() + b'\n'
+            + str(len(framed)).encode() + b' ' + framed
+            + f'<13>Dec 25 10:00:00 edge2 nginx: {ACCESS_LINE.format(n=3)}\r\n'.encode()
+            + b'not an access log\n'
+        )
+        _, writer = await asyncio.open_connection("127.0.0.1", capturer.tcp_port)
+        # 拆成两段发送，验证跨块分帧
+        writer.write(payload[:50])
+        await writer.drain()
+        writer.write(payload[50:])
+        await writer.drain()
+        writer.close()
+
+        requests = []
+        async for request in capturer.capture_stream():
+            requests.append(request)
+            if len(requests) == 3:
+                break
+        await asyncio.sleep(0.05)
+        stats = capturer.get_stats()
+        await capturer.stop_capture()
+
+        assert [r.source_ip for r in requests] == ["192.168.1.1", "192.168.1.2", "192.168.1.3"]
+        assert requests[1].source == "syslog://edge1"
+        assert requests[2].source == "syslog://edge2"
+        assert stats['messages_received'] == 4
+
+    @pytest.mark.asyncio
+    async def test_udp_datagrams(self):
+        """测试UDP数据报接收"""
+        capturer = SyslogCapturer(host="127.0.0.1", port=0, protocol="udp")
+        await capturer.start_capture()
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for n in range(3):
+            message = f'<134>1 - edge3 nginx - - - {ACCESS_LINE.format(n=n)}'
+            sock.sendto(message.encode(), ("127.0.0.1", capturer.udp_port))
+        sock.close()
+
+        requests = []
+        for _ in range(3):
+            requests.append(await asyncio.wait_for(capturer.capture_single(), timeout=2.0))
+        await capturer.stop_capture()
+
+        assert {r.params["id"] for r in requests} == {"0", "1", "2"}
+        assert all(r.source == "syslog://edge3" for r in requests)
+
+    @pytest.mark.asyncio
+    async def test_buffer_overflow_drops(self):
+        """测试缓冲区溢出时丢弃并计数"""
+        capturer = SyslogCapturer(host="127.0.0.1", port=0, max_buffer_size=2)
+        await capturer.start_capture()
+
+        _, writer = await asyncio.open_connection("127.0.0.1", capturer.tcp_port)
+        writer.write(''.join(ACCESS_LINE.format(n=n) + '\n' for n in range(5)).encode())
+        await writer.drain()
+        writer.close()
+        await asyncio.sleep(0.1)
+        await capturer.stop_capture()
+
+        stats = capturer.get_stats()
+        assert stats['dropped_overflow'] == 3
+
+        # 停止后仍会把缓冲区剩余消息处理完
+        remaining = [r async for r in capturer.capture_stream()]
+        assert len(remaining) == 2
@@ -0,0 +1,156 @@
+"""
+分级保存存储测试
+测试攻击和可疑请求完整保存、良性请求抽样、环形缓冲的过期和与底层存储合并的查询、
+深度分析更新后转入底层存储以及只计数请求在预聚合统计重建中保留
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from datetime import timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.models import AttackType
+from app.storage import MemoryStorage, RollupStorage, TieredStorage
+from tests.test_memory_storage import BASE_TIME, IPS, make_event
+from tests.test_rollups import FakeClock
+from tests.test_sqlite_storage import sample_events
+
+
+@pytest.fixture
+def directory():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def ids(events):
+    return [event.event_id for event in events]
+
+
+class TestTieredPolicy:
+    """分级保存策略测试类"""
+
+    @pytest.mark.asyncio
+    async def test_only_attacks_and_suspicious_written(self):
+        """测试攻击、可疑和抽样的请求写入底层存储，其余只计数，统计仍包含全部请求"""
+        inner = MemoryStorage()
+        tiered = TieredStorage(inner, {'benign_sample_rate': 0, 'buffer_size': 0})
+        storage = RollupStorage(tiered)
+        events = sample_events()
+        suspicious = [e for e in events if not e.detection.is_attack][:5]
+        for event in suspicious:
+            event.detection.details = {'xss': {'suspicious': True}}
+        await storage.save_events(events)
+
+        attacks = [e for e in events if e.detection.is_attack]
+        assert await inner.count_events() == len(attacks) + 5
+        assert tiered.get_stats()['counted_only'] == len(events) - len(attacks) - 5
+        assert (await storage.get_statistics())['total_events'] == len(events)
+        assert len(set(ids(events))) == len(events)
+        assert await storage.get_event(events[0].event_id) == (events[0] if events[0] in attacks + suspicious else None)
+
+        sampled = TieredStorage(MemoryStorage(), {'benign_sample_rate': 0.25, 'seed': 1, 'buffer_size': 0})
+        await sampled.save_events(sample_events())
+        assert 0.2 < sampled.get_stats()['sampled'] / (len(events) - len(attacks)) < 0.3
+
+    @pytest.mark.asyncio
+    async def test_counts_survive_rebuild(self, directory):
+        """测试只计数请求的按小时计数写入文件，重建的预聚合统计与写入时相同"""
+        inner = MemoryStorage()
+        path = os.path.join(directory, 'counters.json')
+        config = {'benign_sample_rate': 0.1, 'seed': 2, 'counters_path': path}
+        storage = RollupStorage(TieredStorage(inner, config))
+        await storage.initialize()
+        await storage.save_events(sample_events())
+        await storage.flush()
+        before = await storage.get_statistics(period='day')
+
+        rebuilt = RollupStorage(TieredStorage(inner, config))
+        await rebuilt.initialize()
+        after = await rebuilt.get_statistics(period='day')
+        for key in ('total_events', 'attack_events', 'attack_distribution', 'trend_data'):
+            assert after[key] == before[key], key
+
+
+class TestBenignBuffer:
+    """环形缓冲测试类"""
+
+    @pytest.mark.asyncio
+    async def test_queries_merge_buffer(self):
+        """测试缓冲中的请求与底层存储合并后，分页、游标和计数与全部保存相同"""
+        events = sample_events()
+        storage = TieredStorage(MemoryStorage(), {'benign_sample_rate': 0.2, 'seed': 3, 'buffer_size': 5000},
+                                clock=FakeClock(BASE_TIME))
+        await storage.save_events(events)
+        reference = MemoryStorage()
+        await reference.save_events(events)
+        assert storage.get_stats()['buffered'] > 1000
+
+        for filters in (
+            {},
+            {'order': 'asc', 'page': 9, 'page_size': 40},
+            {'is_attack': False, 'page': 3},
+            {'is_attack': True},
+            {'source_ip': IPS[5], 'page': 2, 'page_size': 10},
+            {'start_time': BASE_TIME + timedelta(minutes=300), 'end_time': BASE_TIME + timedelta(minutes=420),
+             'order': 'asc', 'page': 2},
+        ):
+            assert ids(await storage.query_events(**filters)) == ids(await reference.query_events(**filters)), filters
+            assert await storage.count_events(**filters) == await reference.count_events(**filters), filters
+
+        for order in ('desc', 'asc'):
+            walked, after = [], None
+            while True:
+                page = await storage.query_events(page_size=90, order=order, after=after)
+                walked.extend(page)
+                if len(page) < 90:
+                    break
+                after = (page[-1].request.timestamp.timestamp(), page[-1].event_id)
+            assert ids(walked) == ids(await reference.query_events(page_size=5000, order=order))
+
+    @pytest.mark.asyncio
+    async def test_cursor_with_ties(self):
+        """测试同一时间的请求分别在底层存储和缓冲中时，游标逐页遍历不重复不遗漏"""
+        storage = TieredStorage(MemoryStorage(), {'benign_sample_rate': 0}, clock=FakeClock(BASE_TIME))
+        events = [make_event(n // 5, IPS[n % 4], [AttackType.XSS] if n % 3 == 0 else []) for n in range(50)]
+        await storage.save_events(events)
+        for order in ('desc', 'asc'):
+            walked, after = [], None
+            while True:
+                page = await storage.query_events(page_size=3, order=order, after=after)
+                walked.extend(page)
+                if len(page) < 3:
+                    break
+                after = (page[-1].request.timestamp, page[-1].event_id)
+            assert sorted(ids(walked)) == sorted(ids(events))
+            times = [event.request.timestamp for event in walked]
+            assert times == sorted(times, reverse=order == 'desc')
+
+    @pytest.mark.asyncio
+    async def test_eviction_update_and_delete(self):
+        """测试缓冲按数量和时间过期，更新为攻击后转入底层存储，删除缓冲中的请求回退计数"""
+        clock = FakeClock(BASE_TIME)
+        inner = MemoryStorage()
+        storage = TieredStorage(inner, {'benign_sample_rate': 0, 'buffer_size': 3, 'buffer_seconds': 60},
+                                clock=clock)
+        first = await storage.save_event(make_event(0, IPS[0]))
+        kept = [await storage.save_event(make_event(n, IPS[n])) for n in range(1, 4)]
+        assert await storage.get_event(first) is None
+        assert [e.event_id for e in await storage.query_events(order='asc')] == kept
+
+        upgraded = make_event(1, IPS[1], [AttackType.SQL_INJECTION])
+        assert await storage.update_event(kept[0], upgraded)
+        assert (await inner.get_event(kept[0])).detection.is_attack
+        assert storage.get_stats()['promoted'] == 1
+        assert await storage.delete_event(kept[1])
+        assert await storage.count_events() == 2
+        assert (await storage.retired_statistics())[0]['trend'] == [[BASE_TIME.timestamp(), 2, 0]]
+
+        clock.now += 61
+        assert await storage.get_event(kept[2]) is None
+        assert await storage.count_events() == 1
@@ -0,0 +1,205 @@
+"""
+两级检测测试
+测试快速检测、深度分析判定以及DeepAnalysisScheduler的事件更新
+"""
+
+import base64
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.capture.formats import parse_line
+from app.detector import DetectionEngine, DeepAnalysisScheduler
+from app.core.models import HTTPRequest, SecurityEvent, LLMAnalysis, Severity
+from app.llm.base import BaseLLMProvider
+from app.storage import MemoryStorage
+
+
+def make_request(url: str, params: dict = None, body: str = None, headers: dict = None) -> HTTPRequest:
+    return HTTPRequest(
+        url=url,
+        method="GET",
+        headers=headers or {},
+        params=params or {},
+        body=body,
+        source_ip="198.51.100.7",
+        timestamp=datetime.now(),
+        raw_data=f"GET {url}"
+    )
+
+
+class FakeLLMProvider(BaseLLMProvider):
+    """返回固定分析结果的LLM提供者"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    async def analyze_security_event(self, event: SecurityEvent) -> LLMAnalysis:
+        self.calls += 1
+        return LLMAnalysis(
+            severity=Severity.HIGH,
+            attack_intent="窃取数据",
+            potential_impact="数据泄露",
+            recommendations=["参数化查询"],
+            confidence=0.9,
+            analysis_time=datetime.now()
+        )
+
+    async def generate_summary(self, prompt: str) -> str:
+        return ""
+
+    async def check_availability(self) -> bool:
+        return True
+
+
+class TestFastTier:
+    """快速检测测试类"""
+
+    def setup_method(self):
+        self.engine = DetectionEngine()
+
+    def test_fast_detects_critical_attack(self):
+        """测试快速检测发现关键攻击"""
+        request = make_request("/search?q=1 UNION SELECT password FROM users", {"q": "1 UNION SELECT password FROM users"})
+        result = self.engine.detect_fast(request)
+
+        assert result.is_attack
+        assert "CRS-942100" in result.matched_rules
+        assert result.details['tier'] == 'fast'
+        assert self.engine.needs_deep_analysis(result)
+
+    def test_fast_skips_medium_rules(self):
+        """测试快速检测不运行medium级别规则"""
+        request = make_request("/page?p=2", {"p": "a -- b"})
+        assert "CRS-942140" in self.engine.detect_all(request).matched_rules
+        assert "CRS-942140" not in self.engine.detect_fast(request).matched_rules
+
+    def test_benign_request_needs_no_deep(self):
+        """测试正常请求无需深度分析"""
+        result = self.engine.detect_fast(make_request("/api/v1/articles/page", {"page": "2"}))
+        assert not result.is_attack
+        assert not self.engine.needs_deep_analysis(result)
+
+    def test_lower_severity_triggers_are_suspicious(self):
+        """测试只命中medium/low规则、或请求头中带Base64载荷的请求在快速检测中标记为可疑"""
+        sqli = base64.b64encode(b"1 UNION SELECT password FROM users").decode()
+        requests = [
+            make_request("/", headers={"User-Agent": "sqlmap/1.7.2#stable"}),
+            make_request("/p?x=<iframe src=//evil>", {"x": "<iframe src=//evil>"}),
+            make_request("/img", {"src": "data:text/html,hello"}),
+            make_request("/api/items", headers={"X-Custom": sqli}),
+        ]
+        for request in requests:
+            assert self.engine.detect_all(request).is_attack, request.url
+            assert self.engine.needs_deep_analysis(self.engine.detect_fast(request)), request.url
+
+    def test_fast_tier_never_deep_decodes(self):
+        """测试快速检测不做双重URL解码和Base64解码，包括没有命中快速规则的请求"""
+        from app.detector.coraza_detector import CorazaDetector
+        coraza = next(d for d in self.engine.detectors if isinstance(d, CorazaDetector))
+        calls = []
+        preprocess = coraza._preprocess_request
+
+        def recording_preprocess(request, deep=True):
+            calls.append(deep)
+            return preprocess(request, deep)
+
+        coraza._preprocess_request = recording_preprocess
+        for request in (
+            make_request("/api/v1/articles"),
+            make_request("/p?x=<iframe src=//evil>", {"x": "<iframe src=//evil>"}),
+            make_request("/search?q=%253Cscript%253E", {"q": "%253Cscript%253E"}),
+        ):
+            self.engine.detect_fast(request)
+        assert calls and not any(calls)
+
+    def test_sample_log_flagged_requests_get_deep_analysis(self):
+        """测试示例日志中完整检测会标记的请求，快速检测后都安排了完整检测"""
+        path = os.path.join(os.path.dirname(__file__), 'sample_logs', 'access.log')
+        with open(path, encoding='utf-8') as f:
+            requests = [request for request in map(parse_line, f) if request is not None]
+        flagged = [request for request in requests if self.engine.detect_all(request).is_attack]
+        assert flagged
+        for request in flagged:
+            assert self.engine.needs_deep_analysis(self.engine.detect_fast(request)), request.url
+
+    def test_double_encoding_is_suspicious(self):
+        """测试双重编码载荷在快速检测中被标记为可疑，由完整检测确认"""
+        payload = "%253Cscript%253Ealert(1)%253C%252Fscript%253E"
+        request = make_request(f"/search?q={payload}", {"q": payload})
+
+        fast = self.engine.detect_fast(request)
+        assert not fast.is_attack
+        assert fast.details['CorazaDetector']['suspicious']
+        assert self.engine.needs_deep_analysis(fast)
+        assert self.engine.detect_all(request).is_attack
+
+    def test_base64_param_is_suspicious(self):
+        """测试Base64参数被标记为可疑"""
+        token = base64.b64encode(b"<script>alert(document.cookie)</script>").decode()
+        result = self.engine.detect_fast(make_request("/cb", {"data": token}))
+        assert self.engine.needs_deep_analysis(result)
+
+
+class TestDeepAnalysisScheduler:
+    """深度分析调度器测试类"""
+
+    async def save_fast_event(self, storage, engine, request):
+        event = SecurityEvent(
+            event_id="",
+            request=request,
+            detection=engine.detect_fast(request),
+            llm_analysis=None,
+            created_at=datetime.now()
+        )
+        await storage.save_event(event)
+        return event
+
+    @pytest.mark.asyncio
+    async def test_deep_updates_stored_event(self):
+        """测试深度分析完成后更新存储中的事件并调用LLM"""
+        storage = MemoryStorage()
+        engine = DetectionEngine()
+        llm = FakeLLMProvider()
+        scheduler = DeepAnalysisScheduler(storage, engine=engine, llm_provider=llm)
+        await scheduler.start()
+
+        payload = "%253Cscript%253Ealert(1)%253C%252Fscript%253E"
+        suspicious = await self.save_fast_event(storage, engine, make_request(f"/s?q={payload}", {"q": payload}))
+        attack = await self.save_fast_event(storage, engine, make_request("/s", {"q": "1 UNION SELECT 1"}))
+        assert scheduler.schedule(suspicious)
+        assert scheduler.schedule(attack)
+        await scheduler.stop()
+
+        updated = await storage.get_event(suspicious.event_id)
+        assert updated.detection.is_attack
+        assert updated.detection.details['tier'] == 'deep'
+        assert updated.updated_at is not None
+        assert updated.llm_analysis.severity == Severity.HIGH
+
+        stats = scheduler.get_stats()
+        assert stats['completed'] == 2
+        assert stats['upgraded'] == 1
+        assert stats['llm_analyzed'] == 2 == llm.calls
+
+    @pytest.mark.asyncio
+    async def test_queue_full_drops(self):
+        """测试队列已满时丢弃调度请求"""
+        storage = MemoryStorage()
+        engine = DetectionEngine()
+        scheduler = DeepAnalysisScheduler(storage, engine=engine, workers=1, max_queue_size=1)
+
+        event = await self.save_fast_event(storage, engine, make_request("/s", {"q": "1 UNION SELECT 1"}))
+        assert not scheduler.schedule(event)  # 未启动
+
+        await scheduler.start()
+        results = [scheduler.schedule(event) for _ in range(3)]
+        await scheduler.stop()
+
+        assert results[0]
+        assert scheduler.get_stats()['dropped'] >= 1
@@ -0,0 +1,155 @@
+"""
+写后缓冲存储测试
+测试立即返回事件ID、按批量和时间组提交、持久化等待、失败处理和拆分重试、关闭时刷新以及背压
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.models import AttackType
+from app.core.exceptions import StorageException
+from app.storage import MemoryStorage, RollupStorage, WriteBehindStorage
+from tests.test_memory_storage import IPS, make_event
+
+
+class SlowStorage(MemoryStorage):
+    """每次批量写入耗时固定、记录批次大小的内存存储"""
+
+    def __init__(self, delay: float = 0.05, fail: bool = False, bad_ip: str = None):
+        super().__init__()
+        self.delay = delay
+        self.fail = fail
+        self.bad_ip = bad_ip  # 包含该来源IP事件的批次整批写入失败
+        self.batches = []
+
+    async def save_events(self, events):
+        await asyncio.sleep(self.delay)
+        if self.fail or any(event.request.source_ip == self.bad_ip for event in events):
+            raise StorageException("磁盘已满")
+        self.batches.append(len(events))
+        return await super().save_events(events)
+
+
+class TestWriteBehindStorage:
+    """WriteBehindStorage测试类"""
+
+    @pytest.mark.asyncio
+    async def test_returns_before_write_and_groups_batches(self):
+        """测试写入不等待底层存储，缓冲中的事件可读，多个事件合并为少数几批"""
+        inner = SlowStorage(delay=0.05)
+        storage = WriteBehindStorage(inner, {'batch_size': 100, 'flush_interval_ms': 10})
+        try:
+            started = time.perf_counter()
+            ids = [await storage.save_event(make_event(i, IPS[i % 5])) for i in range(250)]
+            assert time.perf_counter() - started < 0.05
+            assert len(set(ids)) == 250 and all(event_id.startswith("event_") for event_id in ids)
+            assert (await storage.get_event(ids[-1])).event_id == ids[-1]
+
+            await storage.flush()
+            assert sum(inner.batches) == 250
+            assert len(inner.batches) <= 4
+            assert await storage.count_events() == 250
+            assert storage.get_stats()['pending'] == 0
+        finally:
+            await storage.close()
+
+    @pytest.mark.asyncio
+    async def test_flush_by_interval(self):
+        """测试未达到批量大小时按刷新间隔写入"""
+        inner = SlowStorage(delay=0)
+        storage = WriteBehindStorage(inner, {'batch_size': 100, 'flush_interval_ms': 20})
+        try:
+            await storage.save_event(make_event(1, IPS[0]))
+            assert await inner.count_events() == 0
+            await asyncio.sleep(0.1)
+            assert await inner.count_events() == 1
+        finally:
+            await storage.close()
+
+    @pytest.mark.asyncio
+    async def test_durable_writes(self):
+        """测试durable写入在落盘后返回，并与并发写入合并为一批"""
+        inner = SlowStorage(delay=0.02)
+        storage = WriteBehindStorage(inner, {'flush_interval_ms': 1000})
+        try:
+            ids = await asyncio.gather(*(
+                storage.save_event(make_event(i, IPS[0]), durable=True) for i in range(20)
+            ))
+            assert all([await inner.get_event(event_id) for event_id in ids])
+            assert len(inner.batches) <= 2
+        finally:
+            await storage.close()
+
+    @pytest.mark.asyncio
+    async def test_failed_batch(self):
+        """测试写入失败时durable写入抛出异常，失败计数"""
+        storage = WriteBehindStorage(SlowStorage(delay=0, fail=True))
+        try:
+            with pytest.raises(StorageException):
+                await storage.save_event(make_event(1, IPS[0]), durable=True)
+            assert storage.get_stats()['failed'] == 1
+            assert storage.get_stats()['pending'] == 0
+        finally:
+            await storage.close()
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_split(self):
+        """测试一批中个别事件写入失败时拆分重试，同批其他事件照常写入，只有失败的durable写入抛出异常"""
+        inner = SlowStorage(delay=0, bad_ip=IPS[3])
+        storage = WriteBehindStorage(inner, {'flush_interval_ms': 1000})
+        try:
+            results = await asyncio.gather(*(
+                storage.save_event(make_event(i, IPS[i % 5]), durable=True) for i in range(20)
+            ), return_exceptions=True)
+            failed = [result for result in results if isinstance(result, Exception)]
+            assert len(failed) == 4 and all(isinstance(error, StorageException) for error in failed)
+            assert await inner.count_events() == 16
+            assert await inner.count_events(source_ip=IPS[3]) == 0
+            stats = storage.get_stats()
+            assert stats['failed'] == 4 and stats['flushed'] == 16 and stats['split_retries'] > 0
+        finally:
+            await storage.close()
+
+    @pytest.mark.asyncio
+    async def test_durable_through_rollups(self):
+        """测试经过预聚合包装的durable写入在写入失败时抛出异常，不计入统计"""
+        storage = RollupStorage(WriteBehindStorage(SlowStorage(delay=0, fail=True)))
+        try:
+            with pytest.raises(StorageException):
+                await storage.save_event(make_event(1, IPS[0]), durable=True)
+            assert (await storage.get_statistics())['total_events'] == 0
+        finally:
+            await storage.close()
+
+    @pytest.mark.asyncio
+    async def test_update_after_save_and_close_flushes(self):
+        """测试更新缓冲中的事件先写入再更新，关闭时写入剩余事件"""
+        inner = SlowStorage(delay=0.01)
+        storage = WriteBehindStorage(inner, {'flush_interval_ms': 1000})
+        event_id = await storage.save_event(make_event(1, IPS[0]))
+        assert await storage.update_event(event_id, make_event(1, IPS[0], [AttackType.XSS]))
+        assert await inner.count_events(attack_type="xss") == 1
+
+        await storage.save_event(make_event(2, IPS[0]))
+        await storage.close()
+        assert await inner.count_events() == 2
+
+    @pytest.mark.asyncio
+    async def test_backpressure(self):
+        """测试缓冲达到上限时写入等待刷新"""
+        inner = SlowStorage(delay=0.01)
+        storage = WriteBehindStorage(inner, {'max_pending': 10, 'flush_interval_ms': 1000})
+        try:
+            for i in range(25):
+                await storage.save_event(make_event(i, IPS[0]))
+                assert storage.get_stats()['pending'] <= 10
+            assert storage.get_stats()['backpressure_waits'] >= 2
+        finally:
+            await storage.close()
+        assert await inner.count_events() == 25
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+离线取证分析命令行工具
+
+对多天的日志归档（支持.gz）做并行检测，结果写成列式段文件和JSON汇总，
+任务被中断后用相同参数重新运行即可从检查点继续。
+
+示例：
+    python waf_analyze.py logs/*.gz --workers 16 --out events.parquet
+    python waf_analyze.py "logs/2023-12-*.log.gz" --shards 8 --out events --format npz
+    python waf_analyze.py logs/*.gz --out events --archive archive   # 结果追加到列式归档，用waf_query.py查询
+"""
+
+import asyncio
+import glob
+import os
+import sys
+
+import click
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.capture import list_formats
+from app.core.exceptions import SecurityManagerException
+from app.forensics import EventArchive, ForensicJob, pyarrow_available
+
+
+def expand_inputs(patterns):
+    """展开未被shell展开的通配符，保持参数顺序，同一模式内按文件名排序"""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        paths.extend(path for path in matches if path not in paths)
+    return paths
+
+
+def resolve_format(fmt: str, out: str) -> str:
+    """auto: 输出目录名以.parquet结尾且安装了pyarrow时用parquet，否则用npz"""
+    if fmt != 'auto':
+        return fmt
+    if out.endswith('.parquet') and pyarrow_available():
+        return 'parquet'
+    return 'npz'
+
+
+def print_progress(progress):
+    click.echo(
+        f"\r[{min(progress['file_index'] + 1, progress['files_total'])}/{progress['files_total']}] "
+        f"{progress['lines_read']:,} 行  {progress['lines_per_second']:,.0f} 行/秒  "
+        f"事件 {progress['events']:,}  攻击 {progress['attacks']:,}",
+        nl=False,
+        err=True
+    )
+
+
+@click.command(context_settings={'help_option_names': ['-h', '--help']})
+@click.argument('inputs', nargs=-1, required=True)
+@click.option('--out', '-o', required=True, help='输出目录（段文件、_checkpoint.json、_summary.json）')
+@click.option('--workers', '-w', default=os.cpu_count() or 1, show_default=True, help='检测进程数，0表示单进程')
+@click.option('--shards', default=0, show_default=True, help='按来源IP分片的进程数，大于0时优先于--workers')
+@click.option('--format', 'fmt', type=click.Choice(['auto', 'npz', 'parquet']), default='auto', show_default=True,
+              help='段文件格式，auto在输出目录以.parquet结尾且安装了pyarrow时使用parquet')
+@click.option('--log-format', default='auto', show_default=True, type=click.Choice(list_formats()), help='日志格式')
+@click.option('--chunk-lines', default=200000, show_default=True, help='每个检查点之间处理的行数')
+@click.option('--segment-size', default=50000, show_default=True, help='每个段文件最多包含的事件数')
+@click.option('--batch-size', default=256, show_default=True, help='发送给检测进程的批大小')
+@click.option('--restart', is_flag=True, help='忽略已有检查点，删除旧输出后从头开始')
+@click.option('--archive', default=None, help='完成后把事件追加到该列式归档目录（已导入的段不会重复导入）')
+@click.option('--quiet', '-q', is_flag=True, help='不显示进度')
+def main(inputs, out, workers, shards, fmt, log_format, chunk_lines, segment_size, batch_size, restart, archive,
+         quiet):
+    """分析INPUTS中的访问日志（可以是.gz和通配符），事件写入--out目录"""
+    paths = expand_inputs(inputs)
+    missing = [path for path in paths if not os.path.isfile(path)]
+    if not paths or missing:
+        raise click.BadParameter(f"找不到输入文件: {', '.join(missing) or ' '.join(inputs)}", param_hint='INPUTS')
+
+    job = ForensicJob(
+        paths,
+        out,
+        fmt=resolve_format(fmt, out),
+        workers=workers,
+        shards=shards,
+        log_format=log_format,
+        chunk_lines=chunk_lines,
+        segment_size=segment_size,
+        batch_size=batch_size,
+        restart=restart,
+        progress=None if quiet else print_progress
+    )
+    try:
+        summary = asyncio.run(job.run())
+    except SecurityManagerException as e:
+        raise click.ClickException(str(e))
+    except KeyboardInterrupt:
+        click.echo("\n已中断，使用相同参数重新运行即可从检查点继续", err=True)
+        sys.exit(130)
+
+    if not quiet:
+        click.echo(err=True)
+        if job.resumed_from:
+            click.echo(f"从检查点继续（第{job.resumed_from['file_index'] + 1}个文件第{job.resumed_from['line']}行）", err=True)
+    click.echo(
+        f"分析了{summary['lines_read']:,}行，{summary['total_events']:,}个事件，"
+        f"其中攻击{summary['attack_events']:,}个（{summary['attack_rate']:.2f}%），"
+        f"{summary['segments']}个{job.fmt}段文件，汇总: {job.summary_path}"
+    )
+    if archive:
+        imported = EventArchive(archive).import_columnar(out)
+        click.echo(f"向归档{archive}追加了{imported:,}个事件")
+
+
+if __name__ == "__main__":
+    main()
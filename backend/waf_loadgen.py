@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""合成访问日志生成命令行工具
+
+生成可复现的大规模访问日志，作为性能测试和waf_analyze.py的输入。
+相同的--seed和参数生成逐字节相同的日志。
+
+示例：
+    python waf_loadgen.py access.log.gz --size 2GB
+    python waf_loadgen.py access.json --format json --bodies --lines 1000000 --seed 7
+    python waf_loadgen.py access.log -n 100000 --attack sql_injection=0.05 --attack xss=0.01 --labels labels.csv
+"""
+
+import os
+import sys
+import time
+
+import click
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.exceptions import SecurityManagerException
+from app.loadgen import ATTACK_CATEGORIES, SyntheticLogGenerator, parse_size
+from app.loadgen.generator import FORMATS
+
+
+def parse_attacks(values):
+    """--attack 类别=比例，可重复；给出任意一个时未给出的类别比例为0"""
+    if not values:
+        return None
+    ratios = {}
+    for value in values:
+        category, sep, ratio = value.partition('=')
+        if not sep:
+            raise click.BadParameter(f"格式应为 类别=比例: {value}", param_hint='--attack')
+        try:
+            ratios[category.strip()] = float(ratio)
+        except ValueError:
+            raise click.BadParameter(f"比例不是数字: {value}", param_hint='--attack')
+    return ratios
+
+
+@click.command(context_settings={'help_option_names': ['-h', '--help']})
+@click.argument('output')
+@click.option('--lines', '-n', type=int, help='生成的行数')
+@click.option('--size', '-s', help='生成的（未压缩）大小，如500M、2GB')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='apache', show_default=True, help='日志格式')
+@click.option('--seed', default=0, show_default=True, help='随机种子')
+@click.option('--attack', 'attacks', multiple=True,
+              help=f"攻击比例，类别=比例，可重复（类别: {', '.join(ATTACK_CATEGORIES)}）；不指定时使用默认比例")
+@click.option('--bodies', is_flag=True, help='生成POST请求体（需要--format json）')
+@click.option('--rps', default=500.0, show_default=True, help='日志时间推进速率（请求/秒）')
+@click.option('--labels', help='写出攻击行标注的CSV文件（行号,类别）')
+@click.option('--quiet', '-q', is_flag=True, help='不输出统计')
+def main(output, lines, size, fmt, seed, attacks, bodies, rps, labels, quiet):
+    """生成合成访问日志写入OUTPUT（.gz结尾时压缩，"-"表示标准输出）"""
+    if lines is None and size is None:
+        raise click.UsageError("需要指定--lines或--size")
+    try:
+        generator = SyntheticLogGenerator(
+            fmt=fmt,
+            attack_ratios=parse_attacks(attacks),
+            seed=seed,
+            bodies=bodies,
+            requests_per_second=rps
+        )
+        start = time.monotonic()
+        stats = generator.write(output, lines=lines, size=parse_size(size) if size else None, labels_path=labels)
+    except SecurityManagerException as e:
+        raise click.ClickException(str(e))
+
+    if not quiet:
+        elapsed = time.monotonic() - start
+        categories = ', '.join(f"{name}={count:,}" for name, count in sorted(stats['by_category'].items()))
+        click.echo(
+            f"生成{stats['lines']:,}行，{stats['bytes'] / 1024 ** 2:,.1f} MiB（未压缩），"
+            f"攻击占{stats['attack_ratio'] * 100:.2f}%，{stats['lines'] / elapsed if elapsed > 0 else 0:,.0f} 行/秒\n"
+            f"{categories}",
+            err=True
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""列式事件归档查询命令行工具
+
+在waf_analyze.py --archive写入的归档上做向量化的分组计数和置信度分位数。
+
+示例：
+    python waf_query.py archive --group-by attack_type,hour,path_prefix --where is_attack=true
+    python waf_query.py archive --group-by ua_family --where start_time=2023-12-25T00:00:00
+    python waf_query.py archive --percentiles --by rule --q 50,90,99
+"""
+
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import click
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.exceptions import SecurityManagerException
+from app.forensics import EventArchive
+
+
+def parse_where(values):
+    """--where 条件=值，可重复"""
+    filters = {}
+    for value in values:
+        name, sep, raw = value.partition('=')
+        if not sep:
+            raise click.BadParameter(f"格式应为 条件=值: {value}", param_hint='--where')
+        name = name.strip()
+        if name in ('start_time', 'end_time'):
+            try:
+                filters[name] = datetime.fromisoformat(raw)
+            except ValueError:
+                raise click.BadParameter(f"时间格式应为ISO 8601: {value}", param_hint='--where')
+        elif name == 'is_attack':
+            filters[name] = raw.lower() in ('1', 'true', 'yes')
+        elif name == 'min_confidence':
+            try:
+                filters[name] = float(raw)
+            except ValueError:
+                raise click.BadParameter(f"置信度不是数字: {value}", param_hint='--where')
+        else:
+            filters[name] = raw
+    return filters
+
+
+def split(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+@click.command(context_settings={'help_option_names': ['-h', '--help']})
+@click.argument('archive_dir')
+@click.option('--group-by', '-g', default=None, help='逗号分隔的分组键，如 attack_type,hour,path_prefix:2')
+@click.option('--where', '-w', multiple=True, help='过滤条件 条件=值，可重复，如 is_attack=true、rule=942100')
+@click.option('--percentiles', is_flag=True, help='计算检测置信度的分位数而不是计数')
+@click.option('--by', default=None, help='分位数的分组键')
+@click.option('--q', 'quantiles', default='50,90,99', show_default=True, help='逗号分隔的分位数')
+@click.option('--limit', '-n', default=50, show_default=True, help='最多输出的分组数')
+@click.option('--json', 'as_json', is_flag=True, help='输出JSON')
+def main(archive_dir, group_by, where, percentiles, by, quantiles, limit, as_json):
+    """查询ARCHIVE_DIR中的列式事件归档"""
+    if not os.path.isdir(archive_dir):
+        raise click.BadParameter(f"找不到归档目录: {archive_dir}", param_hint='ARCHIVE_DIR')
+
+    started = time.perf_counter()
+    try:
+        archive = EventArchive(archive_dir)
+        query = archive.query(**parse_where(where))
+        if percentiles:
+            rows = query.percentiles(split(by), 'confidence', [float(q) for q in split(quantiles)])[:limit]
+        else:
+            rows = query.group_count(*split(group_by), limit=limit)
+    except SecurityManagerException as e:
+        raise click.ClickException(str(e))
+    elapsed = time.perf_counter() - started
+
+    if as_json:
+        click.echo(json.dumps(rows, ensure_ascii=False, indent=2, default=str))
+        return
+    for row in rows:
+        click.echo('  '.join(f"{key}={value}" for key, value in row.items()))
+    click.echo(f"扫描{archive.rows:,}个事件，{len(rows)}个分组，用时{elapsed:.2f}秒", err=True)
+
+
+if __name__ == "__main__":
+    main()